@@ -5,6 +5,7 @@ from Surface cimport SurfaceBase
 from Forcing cimport ForcingBase
 from NetCDFIO cimport  NetCDFIO_Stats
 from TimeStepping cimport  TimeStepping
+cimport RandomStream
 
 cdef class CasesBase:
     cdef:
@@ -20,6 +21,8 @@ cdef class CasesBase:
     cpdef io(self, NetCDFIO_Stats Stats)
     cpdef update_surface(self, GridMeanVariables GMV, TimeStepping TS)
     cpdef update_forcing(self, GridMeanVariables GMV, TimeStepping TS)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class Soares(CasesBase):
     cpdef initialize_reference(self, Grid Gr, ReferenceState Ref, NetCDFIO_Stats Stats)
@@ -32,6 +35,8 @@ cdef class Soares(CasesBase):
     cpdef update_forcing(self, GridMeanVariables GMV,  TimeStepping TS)
 
 cdef class Bomex(CasesBase):
+    cdef:
+        RandomStream.RandomStream Random
     cpdef initialize_reference(self, Grid Gr, ReferenceState Ref, NetCDFIO_Stats Stats)
     cpdef initialize_profiles(self, Grid Gr, GridMeanVariables GMV, ReferenceState Ref )
     cpdef initialize_surface(self, Grid Gr,  ReferenceState Ref )
@@ -8,6 +8,7 @@ from ReferenceState cimport ReferenceState
 from TimeStepping cimport  TimeStepping
 cimport Surface
 cimport Forcing
+cimport RandomStream
 from NetCDFIO cimport NetCDFIO_Stats
 from thermodynamic_functions cimport *
 import math as mt
@@ -19,7 +20,7 @@ def CasesFactory(namelist, paramlist):
     elif namelist['meta']['casename'] == 'Nieuwstadt':
         return Nieuwstadt(paramlist)
     elif namelist['meta']['casename'] == 'Bomex':
-        return Bomex(paramlist)
+        return Bomex(namelist, paramlist)
     elif namelist['meta']['casename'] == 'life_cycle_Tan2018':
         return life_cycle_Tan2018(paramlist)
     elif namelist['meta']['casename'] == 'Rico':
@@ -67,6 +68,14 @@ cdef class CasesBase:
         Stats.write_ts('lhf', self.Sur.lhf)
         Stats.write_ts('ustar', self.Sur.ustar)
         return
+    cpdef get_state(self, dict state, str prefix):
+        self.Sur.get_state(state, prefix + 'Sur.')
+        self.Fo.get_state(state, prefix + 'Fo.')
+        return
+    cpdef set_state(self, dict state, str prefix):
+        self.Sur.set_state(state, prefix + 'Sur.')
+        self.Fo.set_state(state, prefix + 'Fo.')
+        return
     cpdef update_surface(self, GridMeanVariables GMV, TimeStepping TS):
         return
     cpdef update_forcing(self, GridMeanVariables GMV,  TimeStepping TS):
@@ -260,8 +269,10 @@ cdef class Nieuwstadt(CasesBase):
         return
 
 cdef class Bomex(CasesBase):
-    def __init__(self, paramlist):
+    def __init__(self, namelist, paramlist):
         self.casename = 'Bomex'
+        # for the initial perturbations, independent of the stochastic entrainment
+        self.Random = RandomStream.RandomStream(namelist, 2 * namelist['grid']['nz'], 1)
         self.Sur = Surface.SurfaceFixedFlux(paramlist)
         self.Fo = Forcing.ForcingStandard()
         self.inversion_option = 'critical_Ri'
@@ -314,8 +325,8 @@ cdef class Bomex(CasesBase):
 
             #Set perturbations on qt and theta_l
             if Gr.z_half[k] <= 1600.0:
-                thetal[k] = thetal[k] + theta_pert*(np.random.random_sample()-0.5)
-                GMV.QT.values[k] = GMV.QT.values[k] + qt_pert*(np.random.random_sample()-0.5)
+                thetal[k] = thetal[k] + theta_pert*(self.Random.next_uniform()-0.5)
+                GMV.QT.values[k] = GMV.QT.values[k] + qt_pert*(self.Random.next_uniform()-0.5)
 
         if GMV.H.name == 'thetal':
             for k in xrange(Gr.gw,Gr.nzg-Gr.gw):
@@ -1425,7 +1436,6 @@ cdef class GABLS(CasesBase):
         cdef:
             double [:] thetal = np.zeros((Gr.nzg,), dtype=np.double, order='c')
             double ql=0.0, qi =0.0 # IC of GABLS cloud-free
-            double [:] theta_pert = np.random.random_sample(Gr.nzg)
             Py_ssize_t k
 
         for k in xrange(Gr.gw,Gr.nzg-Gr.gw):
@@ -3,6 +3,13 @@ from Grid cimport  Grid
 from ReferenceState cimport ReferenceState
 from EDMF_Rain cimport RainVariables
 
+# paths taken by a level in EnvironmentThermodynamics.sgs_quadrature
+cdef enum:
+    quadrature_path_mean = 0
+    quadrature_path_clear = 1
+    quadrature_path_low = 2
+    quadrature_path_full = 3
+
 cdef class EnvironmentVariable:
     cdef:
         double [:] values
@@ -11,7 +18,11 @@ cdef class EnvironmentVariable:
         str kind
         str name
         str units
+        bint antisymmetric_bcs
     cpdef set_bcs(self,Grid Gr)
+    cdef void set_bcs_c(self, Grid Gr) noexcept nogil
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class EnvironmentVariable_2m:
     cdef:
@@ -28,7 +39,11 @@ cdef class EnvironmentVariable_2m:
         str kind
         str name
         str units
+        # covariance of w, built from full-level values
+        bint is_tke
     cpdef set_bcs(self,Grid Gr)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class EnvironmentVariables:
     cdef:
@@ -60,6 +75,8 @@ cdef class EnvironmentVariables:
 
         str EnvThermo_scheme
 
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef initialize_io(self, NetCDFIO_Stats Stats )
     cpdef io(self, NetCDFIO_Stats Stats, ReferenceState Ref)
     cpdef env_cloud_diagnostics(self, ReferenceState Ref)
@@ -69,9 +86,16 @@ cdef class EnvironmentThermodynamics:
         Grid Gr
         ReferenceState Ref
         Py_ssize_t quadrature_order
+        int quadrature_threads
+        bint quadrature_adaptive
+        Py_ssize_t quadrature_order_min
+        double quadrature_nsigma
+        int [:] quadrature_path
 
-        double (*t_to_prog_fp)(double p0, double T, double qt, double ql, double qi) nogil
-        double (*prog_to_t_fp)(double H, double pd, double pv, double qt ) nogil
+        double (*t_to_prog_fp)(double p0, double T, double qt, double ql, double qi) noexcept nogil
+        double (*prog_to_t_fp)(double H, double pd, double pv, double qt ) noexcept nogil
+        double (*dprog_dT_fp)(double p0, double T, double qt) noexcept nogil
+        bint newton_saturation
 
         double [:] qt_dry
         double [:] th_dry
@@ -89,13 +113,20 @@ cdef class EnvironmentThermodynamics:
 
         str quadrature_type
 
-        void update_EnvVar(self, Py_ssize_t k, EnvironmentVariables EnvVar, double T, double H, double qt, double ql, double alpha) nogil
-        void update_EnvRain_sources(self, Py_ssize_t k, EnvironmentVariables EnvVar, double qr, double thl_rain_src) nogil
-        void update_cloud_dry(self, Py_ssize_t k, EnvironmentVariables EnvVar, double T, double H, double qt, double ql, double qv) nogil
+        void update_EnvVar(self, Py_ssize_t k, EnvironmentVariables EnvVar, double T, double H, double qt, double ql, double alpha) noexcept nogil
+        void update_EnvRain_sources(self, Py_ssize_t k, EnvironmentVariables EnvVar, double qr, double thl_rain_src) noexcept nogil
+        void update_cloud_dry(self, Py_ssize_t k, EnvironmentVariables EnvVar, double T, double H, double qt, double ql, double qv) noexcept nogil
 
-        void saturation_adjustment(self, EnvironmentVariables EnvVar)
+        void saturation_adjustment(self, EnvironmentVariables EnvVar) noexcept nogil
 
         void sgs_mean(self, EnvironmentVariables EnvVar, RainVariables Rain, double dt)
         void sgs_quadrature(self, EnvironmentVariables EnvVar, RainVariables Rain, double dt)
-
+        int quadrature_path_adaptive(self, Py_ssize_t k, EnvironmentVariables EnvVar) noexcept nogil
+        void sgs_quadrature_level(self, Py_ssize_t k, EnvironmentVariables EnvVar, RainVariables Rain,
+                                  double dt, int rain_flag, bint lognormal) noexcept nogil
+
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
+    cpdef initialize_io(self, NetCDFIO_Stats Stats)
+    cpdef io(self, NetCDFIO_Stats Stats)
     cpdef microphysics(self, EnvironmentVariables EnvVar, RainVariables Rain, double dt)
@@ -6,6 +6,7 @@
 import numpy as np
 import sys
 import cython
+from cython.parallel import prange
 
 include "parameters.pxi"
 
@@ -17,6 +18,7 @@ from Variables cimport VariableDiagnostic, GridMeanVariables
 from libc.math cimport fmax, fmin, sqrt, exp, erf, log, fabs
 from thermodynamic_functions cimport  *
 from microphysics_functions cimport *
+from utility_functions cimport gauss_hermite_nodes, gauss_hermite_weights
 
 cdef class EnvironmentVariable:
     def __init__(self, nz, loc, kind, name, units):
@@ -30,14 +32,19 @@ cdef class EnvironmentVariable:
         self.kind = kind
         self.name = name
         self.units = units
+        self.antisymmetric_bcs = name == 'w'
 
     cpdef set_bcs(self,Grid Gr):
+        self.set_bcs_c(Gr)
+        return
+
+    cdef void set_bcs_c(self, Grid Gr) noexcept nogil:
         cdef:
             Py_ssize_t i,k
             Py_ssize_t start_low = Gr.gw - 1
             Py_ssize_t start_high = Gr.nzg - Gr.gw - 1
 
-        if self.name == 'w':
+        if self.antisymmetric_bcs:
             self.values[start_high] = 0.0
             self.values[start_low] = 0.0
             for k in xrange(1,Gr.gw):
@@ -48,6 +55,16 @@ cdef class EnvironmentVariable:
                 self.values[start_high + k +1] = self.values[start_high  - k]
                 self.values[start_low - k] = self.values[start_low + 1 + k]
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'values'] = np.array(self.values)
+        state[prefix + 'flux'] = np.array(self.flux)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.values)[:] = state[prefix + 'values']
+        np.asarray(self.flux)[:] = state[prefix + 'flux']
+        return
+
 cdef class EnvironmentVariable_2m:
     def __init__(self, nz, loc, kind, name, units):
         self.values = np.zeros((nz,),dtype=np.double, order='c')
@@ -67,6 +84,7 @@ cdef class EnvironmentVariable_2m:
         self.kind = kind
         self.name = name
         self.units = units
+        self.is_tke = name == 'tke'
 
     cpdef set_bcs(self,Grid Gr):
         cdef:
@@ -78,6 +96,30 @@ cdef class EnvironmentVariable_2m:
             self.values[start_high + k +1] = self.values[start_high  - k]
             self.values[start_low - k] = self.values[start_low + 1 + k]
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'values'] = np.array(self.values)
+        state[prefix + 'dissipation'] = np.array(self.dissipation)
+        state[prefix + 'entr_gain'] = np.array(self.entr_gain)
+        state[prefix + 'detr_loss'] = np.array(self.detr_loss)
+        state[prefix + 'buoy'] = np.array(self.buoy)
+        state[prefix + 'press'] = np.array(self.press)
+        state[prefix + 'shear'] = np.array(self.shear)
+        state[prefix + 'interdomain'] = np.array(self.interdomain)
+        state[prefix + 'rain_src'] = np.array(self.rain_src)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.values)[:] = state[prefix + 'values']
+        np.asarray(self.dissipation)[:] = state[prefix + 'dissipation']
+        np.asarray(self.entr_gain)[:] = state[prefix + 'entr_gain']
+        np.asarray(self.detr_loss)[:] = state[prefix + 'detr_loss']
+        np.asarray(self.buoy)[:] = state[prefix + 'buoy']
+        np.asarray(self.press)[:] = state[prefix + 'press']
+        np.asarray(self.shear)[:] = state[prefix + 'shear']
+        np.asarray(self.interdomain)[:] = state[prefix + 'interdomain']
+        np.asarray(self.rain_src)[:] = state[prefix + 'rain_src']
+        return
+
 cdef class EnvironmentVariables:
     def __init__(self,  namelist, Grid Gr  ):
         cdef Py_ssize_t nz = Gr.nzg
@@ -139,6 +181,54 @@ cdef class EnvironmentVariables:
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        self.W.get_state(state, prefix + 'W.')
+        self.Area.get_state(state, prefix + 'Area.')
+        self.QT.get_state(state, prefix + 'QT.')
+        self.QL.get_state(state, prefix + 'QL.')
+        self.H.get_state(state, prefix + 'H.')
+        self.THL.get_state(state, prefix + 'THL.')
+        self.RH.get_state(state, prefix + 'RH.')
+        self.T.get_state(state, prefix + 'T.')
+        self.B.get_state(state, prefix + 'B.')
+        self.cloud_fraction.get_state(state, prefix + 'cloud_fraction.')
+        if self.calc_tke:
+            self.TKE.get_state(state, prefix + 'TKE.')
+        if self.calc_scalar_var:
+            self.Hvar.get_state(state, prefix + 'Hvar.')
+            self.QTvar.get_state(state, prefix + 'QTvar.')
+            self.HQTcov.get_state(state, prefix + 'HQTcov.')
+
+        state[prefix + 'cloud_base'] = self.cloud_base
+        state[prefix + 'cloud_top'] = self.cloud_top
+        state[prefix + 'cloud_cover'] = self.cloud_cover
+        state[prefix + 'lwp'] = self.lwp
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.W.set_state(state, prefix + 'W.')
+        self.Area.set_state(state, prefix + 'Area.')
+        self.QT.set_state(state, prefix + 'QT.')
+        self.QL.set_state(state, prefix + 'QL.')
+        self.H.set_state(state, prefix + 'H.')
+        self.THL.set_state(state, prefix + 'THL.')
+        self.RH.set_state(state, prefix + 'RH.')
+        self.T.set_state(state, prefix + 'T.')
+        self.B.set_state(state, prefix + 'B.')
+        self.cloud_fraction.set_state(state, prefix + 'cloud_fraction.')
+        if self.calc_tke:
+            self.TKE.set_state(state, prefix + 'TKE.')
+        if self.calc_scalar_var:
+            self.Hvar.set_state(state, prefix + 'Hvar.')
+            self.QTvar.set_state(state, prefix + 'QTvar.')
+            self.HQTcov.set_state(state, prefix + 'HQTcov.')
+
+        self.cloud_base = state[prefix + 'cloud_base']
+        self.cloud_top = state[prefix + 'cloud_top']
+        self.cloud_cover = state[prefix + 'cloud_cover']
+        self.lwp = state[prefix + 'lwp']
+        return
+
     cpdef initialize_io(self, NetCDFIO_Stats Stats):
         Stats.add_profile('env_w')
         Stats.add_profile('env_qt')
@@ -190,7 +280,6 @@ cdef class EnvironmentVariables:
 
         Stats.write_profile('env_cloud_fraction', self.cloud_fraction.values[self.Gr.gw : self.Gr.nzg-self.Gr.gw])
 
-        self.env_cloud_diagnostics(Ref)
         # Assuming amximum overlap in environmental clouds
         Stats.write_ts('env_cloud_cover', self.cloud_cover)
         Stats.write_ts('env_cloud_base',  self.cloud_base)
@@ -222,16 +311,50 @@ cdef class EnvironmentThermodynamics:
             self.quadrature_order = namelist['thermodynamics']['quadrature_order']
         except:
             self.quadrature_order = 3
+        if gauss_hermite_nodes(self.quadrature_order) == NULL:
+            sys.exit('EDMF_Environment: quadrature_order has to be between 1 and 20')
+        try:
+            self.quadrature_threads = namelist['thermodynamics']['quadrature_threads']
+        except:
+            self.quadrature_threads = 1
+        # adaptive quadrature: levels whose qt-H distribution stays quadrature_nsigma standard deviations
+        # away from saturation use a single point (clear) or quadrature_order_min points (cloudy)
+        try:
+            self.quadrature_adaptive = namelist['thermodynamics']['quadrature_adaptive']
+        except:
+            self.quadrature_adaptive = False
+        try:
+            self.quadrature_order_min = namelist['thermodynamics']['quadrature_order_min']
+        except:
+            self.quadrature_order_min = 2
+        try:
+            self.quadrature_nsigma = namelist['thermodynamics']['quadrature_nsigma']
+        except:
+            self.quadrature_nsigma = 4.0
+        if self.quadrature_order_min < 1 or self.quadrature_order_min > self.quadrature_order:
+            sys.exit('EDMF_Environment: quadrature_order_min has to be between 1 and quadrature_order')
         try:
             self.quadrature_type = namelist['thermodynamics']['quadrature_type']
         except:
             self.quadrature_type = 'gaussian'
+        try:
+            saturation_solver = namelist['thermodynamics']['saturation_solver']
+        except:
+            saturation_solver = 'secant'
+        if saturation_solver == 'newton':
+            self.newton_saturation = True
+        elif saturation_solver == 'secant':
+            self.newton_saturation = False
+        else:
+            sys.exit('EDMF_Environment: Unrecognized saturation_solver. Possible options: secant, newton')
         if EnvVar.H.name == 's':
             self.t_to_prog_fp = t_to_entropy_c
             self.prog_to_t_fp = eos_first_guess_entropy
+            self.dprog_dT_fp = dentropy_dT_sat_c
         elif EnvVar.H.name == 'thetal':
             self.t_to_prog_fp = t_to_thetali_c
             self.prog_to_t_fp = eos_first_guess_thetal
+            self.dprog_dT_fp = dthetali_dT_sat_c
 
         self.qt_dry = np.zeros(self.Gr.nzg, dtype=np.double, order='c')
         self.th_dry = np.zeros(self.Gr.nzg, dtype=np.double, order='c')
@@ -248,11 +371,59 @@ cdef class EnvironmentThermodynamics:
         self.prec_source_qt = np.zeros(self.Gr.nzg, dtype=np.double, order='c')
         self.prec_source_h  = np.zeros(self.Gr.nzg, dtype=np.double, order='c')
 
+        self.quadrature_path = np.zeros(self.Gr.nzg, dtype=np.intc, order='c')
+
+        return
+
+    cpdef initialize_io(self, NetCDFIO_Stats Stats):
+        if self.quadrature_adaptive:
+            Stats.add_ts('env_quadrature_levels_mean')
+            Stats.add_ts('env_quadrature_levels_clear')
+            Stats.add_ts('env_quadrature_levels_low')
+            Stats.add_ts('env_quadrature_levels_full')
+        return
+
+    cpdef io(self, NetCDFIO_Stats Stats):
+        cdef int [:] path = self.quadrature_path[self.Gr.gw:self.Gr.nzg-self.Gr.gw]
+        if self.quadrature_adaptive:
+            # number of levels that took each path in sgs_quadrature during the last call
+            Stats.write_ts('env_quadrature_levels_mean', np.sum(np.asarray(path) == quadrature_path_mean))
+            Stats.write_ts('env_quadrature_levels_clear', np.sum(np.asarray(path) == quadrature_path_clear))
+            Stats.write_ts('env_quadrature_levels_low', np.sum(np.asarray(path) == quadrature_path_low))
+            Stats.write_ts('env_quadrature_levels_full', np.sum(np.asarray(path) == quadrature_path_full))
+        return
+
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'qt_dry'] = np.array(self.qt_dry)
+        state[prefix + 'th_dry'] = np.array(self.th_dry)
+        state[prefix + 't_cloudy'] = np.array(self.t_cloudy)
+        state[prefix + 'qv_cloudy'] = np.array(self.qv_cloudy)
+        state[prefix + 'qt_cloudy'] = np.array(self.qt_cloudy)
+        state[prefix + 'th_cloudy'] = np.array(self.th_cloudy)
+        state[prefix + 'Hvar_rain_dt'] = np.array(self.Hvar_rain_dt)
+        state[prefix + 'QTvar_rain_dt'] = np.array(self.QTvar_rain_dt)
+        state[prefix + 'HQTcov_rain_dt'] = np.array(self.HQTcov_rain_dt)
+        state[prefix + 'prec_source_qt'] = np.array(self.prec_source_qt)
+        state[prefix + 'prec_source_h'] = np.array(self.prec_source_h)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.qt_dry)[:] = state[prefix + 'qt_dry']
+        np.asarray(self.th_dry)[:] = state[prefix + 'th_dry']
+        np.asarray(self.t_cloudy)[:] = state[prefix + 't_cloudy']
+        np.asarray(self.qv_cloudy)[:] = state[prefix + 'qv_cloudy']
+        np.asarray(self.qt_cloudy)[:] = state[prefix + 'qt_cloudy']
+        np.asarray(self.th_cloudy)[:] = state[prefix + 'th_cloudy']
+        np.asarray(self.Hvar_rain_dt)[:] = state[prefix + 'Hvar_rain_dt']
+        np.asarray(self.QTvar_rain_dt)[:] = state[prefix + 'QTvar_rain_dt']
+        np.asarray(self.HQTcov_rain_dt)[:] = state[prefix + 'HQTcov_rain_dt']
+        np.asarray(self.prec_source_qt)[:] = state[prefix + 'prec_source_qt']
+        np.asarray(self.prec_source_h)[:] = state[prefix + 'prec_source_h']
         return
 
     cdef void update_EnvVar(self, Py_ssize_t k, EnvironmentVariables EnvVar,
                             double T, double H, double qt, double ql,
-                            double rho) nogil :
+                            double rho) noexcept nogil :
         EnvVar.T.values[k]   = T
         EnvVar.THL.values[k] = H
         EnvVar.H.values[k]   = H
@@ -263,7 +434,7 @@ cdef class EnvironmentThermodynamics:
         return
 
     cdef void update_EnvRain_sources(self, Py_ssize_t k, EnvironmentVariables EnvVar,
-                                     double qr_src, double thl_rain_src) nogil:
+                                     double qr_src, double thl_rain_src) noexcept nogil:
 
         self.prec_source_qt[k] = -qr_src * EnvVar.Area.values[k]
         self.prec_source_h[k]  = thl_rain_src * EnvVar.Area.values[k]
@@ -272,7 +443,7 @@ cdef class EnvironmentThermodynamics:
 
     cdef void update_cloud_dry(self, Py_ssize_t k, EnvironmentVariables EnvVar,
                                double T, double th, double qt, double ql,
-                               double qv) nogil :
+                               double qv) noexcept nogil :
         if ql > 0.0:
             EnvVar.cloud_fraction.values[k] = 1.0
             self.th_cloudy[k]   = th
@@ -285,7 +456,7 @@ cdef class EnvironmentThermodynamics:
             self.qt_dry[k]      = qt
         return
 
-    cdef void saturation_adjustment(self, EnvironmentVariables EnvVar):
+    cdef void saturation_adjustment(self, EnvironmentVariables EnvVar) noexcept nogil:
 
         cdef:
             Py_ssize_t k
@@ -294,8 +465,13 @@ cdef class EnvironmentThermodynamics:
             mph_struct mph
             double rho
 
-        with nogil:
-            for k in xrange(gw, self.Gr.nzg-gw):
+        if self.newton_saturation:
+            # warm start from the current environment temperature
+            eos_column(self.t_to_prog_fp, self.prog_to_t_fp, self.dprog_dT_fp,
+                       self.Ref.p0_half, EnvVar.QT.values, EnvVar.H.values,
+                       EnvVar.T.values, EnvVar.QL.values, gw, self.Gr.nzg-gw)
+        for k in xrange(gw, self.Gr.nzg-gw):
+            if not self.newton_saturation:
                 sa  = eos(self.t_to_prog_fp, self.prog_to_t_fp,
                           self.Ref.p0_half[k], EnvVar.QT.values[k],
                           EnvVar.H.values[k]
@@ -303,17 +479,17 @@ cdef class EnvironmentThermodynamics:
 
                 EnvVar.T.values[k]   = sa.T
                 EnvVar.QL.values[k]  = sa.ql
-                rho = rho_c(self.Ref.p0_half[k], EnvVar.T.values[k],
-                                EnvVar.QT.values[k],
-                                EnvVar.QT.values[k] - EnvVar.QL.values[k]
-                               )
-                EnvVar.B.values[k] = buoyancy_c(self.Ref.rho0_half[k], rho)
-
-                self.update_cloud_dry(k, EnvVar,
-                                      EnvVar.T.values[k], EnvVar.THL.values[k],
-                                      EnvVar.QT.values[k], EnvVar.QL.values[k],
-                                      EnvVar.QT.values[k] - EnvVar.QL.values[k]
-                                     )
+            rho = rho_c(self.Ref.p0_half[k], EnvVar.T.values[k],
+                            EnvVar.QT.values[k],
+                            EnvVar.QT.values[k] - EnvVar.QL.values[k]
+                           )
+            EnvVar.B.values[k] = buoyancy_c(self.Ref.rho0_half[k], rho)
+
+            self.update_cloud_dry(k, EnvVar,
+                                  EnvVar.T.values[k], EnvVar.THL.values[k],
+                                  EnvVar.QT.values[k], EnvVar.QL.values[k],
+                                  EnvVar.QT.values[k] - EnvVar.QL.values[k]
+                                 )
         return
 
 
@@ -329,15 +505,24 @@ cdef class EnvironmentThermodynamics:
             sys.exit('EDMF_Environment: rain source terms are defined for thetal as model variable')
 
         with nogil:
+            if self.newton_saturation:
+                # condensation, warm started from the current environment temperature
+                eos_column(self.t_to_prog_fp, self.prog_to_t_fp, self.dprog_dT_fp,
+                           self.Ref.p0_half, EnvVar.QT.values, EnvVar.H.values,
+                           EnvVar.T.values, EnvVar.QL.values, gw, self.Gr.nzg-gw)
             for k in xrange(gw,self.Gr.nzg-gw):
                 # condensation
-                sa  = eos(
-                    self.t_to_prog_fp, self.prog_to_t_fp, self.Ref.p0_half[k],
-                    EnvVar.QT.values[k], EnvVar.H.values[k]
-                )
+                if self.newton_saturation:
+                    sa.T  = EnvVar.T.values[k]
+                    sa.ql = EnvVar.QL.values[k]
+                else:
+                    sa  = eos(
+                        self.t_to_prog_fp, self.prog_to_t_fp, self.Ref.p0_half[k],
+                        EnvVar.QT.values[k], EnvVar.H.values[k]
+                    )
                 # autoconversion and accretion
-                mph = microphysics_rain_src(
-                    Rain.rain_model,
+                mph = microphysics_rain_src_c(
+                    Rain.rain_flag,
                     EnvVar.QT.values[k],
                     sa.ql,
                     Rain.Env_QR.values[k],
@@ -353,8 +538,6 @@ cdef class EnvironmentThermodynamics:
         return
 
     cdef void sgs_quadrature(self, EnvironmentVariables EnvVar, RainVariables Rain, double dt):
-        a, w = np.polynomial.hermite.hermgauss(self.quadrature_order)
-
         #TODO - remember you output source terms multipierd by dt (bec. of instanteneous autoconcv)
         #TODO - add tendencies for GMV H, QT and QR due to rain
         #TODO - if we start using eos_smpl for the updrafts calculations
@@ -362,189 +545,235 @@ cdef class EnvironmentThermodynamics:
 
         cdef:
             Py_ssize_t gw = self.Gr.gw
-            Py_ssize_t k, m_q, m_h
-            double [:] abscissas = a
-            double [:] weights = w
+            Py_ssize_t k
+            int rain_flag = Rain.rain_flag
+            bint lognormal = self.quadrature_type == 'log-normal'
+
+        if EnvVar.H.name != 'thetal':
+            sys.exit('EDMF_Environment: rain source terms are only defined for thetal as model variable')
+
+        # every level is independent, so the levels can be distributed over threads
+        if self.quadrature_threads > 1:
+            with nogil:
+                for k in prange(gw, self.Gr.nzg-gw, num_threads=self.quadrature_threads, schedule='static'):
+                    self.sgs_quadrature_level(k, EnvVar, Rain, dt, rain_flag, lognormal)
+        else:
+            with nogil:
+                for k in xrange(gw, self.Gr.nzg-gw):
+                    self.sgs_quadrature_level(k, EnvVar, Rain, dt, rain_flag, lognormal)
+        return
+
+    cdef int quadrature_path_adaptive(self, Py_ssize_t k, EnvironmentVariables EnvVar) noexcept nogil:
+        # Saturation deficit of the mean state, at the temperature without condensate,
+        # relative to the standard deviation of qt - qv_star implied by the qt-H covariance matrix
+        cdef:
+            double p0 = self.Ref.p0_half[k]
+            double qt = EnvVar.QT.values[k]
+            double h = EnvVar.H.values[k]
+            double pv = pv_c(p0, qt, qt)
+            double T = self.prog_to_t_fp(h, p0 - pv, pv, qt)
+            double qv_s = qv_star_c(p0, qt, pv_star(T))
+            # d(qv_star)/dH from Clausius-Clapeyron, with dT/dH = T/H for thetal
+            double a = qv_s * latent_heat(T) / (Rv * T * T) * T / h
+            double sd_s = sqrt(fmax(EnvVar.QTvar.values[k] + a * a * EnvVar.Hvar.values[k]
+                                    - 2.0 * a * EnvVar.HQTcov.values[k], 0.0))
+            double deficit = qv_s - qt
+
+        if deficit > self.quadrature_nsigma * sd_s and EnvVar.cloud_fraction.values[k] == 0.0:
+            return quadrature_path_clear
+        elif deficit < -self.quadrature_nsigma * sd_s and EnvVar.cloud_fraction.values[k] > 1.0 - 1e-6:
+            return quadrature_path_low
+        return quadrature_path_full
+
+    cdef void sgs_quadrature_level(self, Py_ssize_t k, EnvironmentVariables EnvVar, RainVariables Rain,
+                                   double dt, int rain_flag, bint lognormal) noexcept nogil:
+        cdef:
+            Py_ssize_t m_q, m_h, idx
+            Py_ssize_t order = self.quadrature_order
+            int path = quadrature_path_mean
+            double *nodes
+            double *weights
             # arrays for storing quadarature points and ints for labeling items in the arrays
-            # a python dict would be nicer, but its 30% slower than this (for python 2.7. It might not be the case for python 3)
-            double[:] inner_env, outer_env, inner_src, outer_src
-            int i_ql, i_T, i_thl, i_rho, i_cf, i_qt_cld, i_qt_dry, i_T_cld, i_T_dry, i_rf
-            int i_SH_qt, i_Sqt_H, i_SH_H, i_Sqt_qt, i_Sqt, i_SH
+            # they live on the stack, so that each thread has its own copy
+            double inner_env[10]
+            double outer_env[10]
+            double inner_src[6]
+            double outer_src[6]
+            int i_ql = 0, i_T = 1, i_thl = 2, i_rho = 3, i_cf = 4, i_qt_cld = 5, i_qt_dry = 6, i_T_cld = 7, i_T_dry = 8, i_rf = 9
+            int i_SH_qt = 0, i_Sqt_H = 1, i_SH_H = 2, i_Sqt_qt = 3, i_Sqt = 4, i_SH = 5
             int env_len = 10
             int src_len = 6
 
             double h_hat, qt_hat, sd_h, sd_q, corr, mu_h_star, sigma_h_star, qt_var, sd2_hq, sd_cond_h_q
-            double sqpi_inv = 1.0/sqrt(pi)
-            double sqrt2 = sqrt(2.0)
+            double mu_q, mu_h
             double sd_q_lim
-            double epsilon
+            double epsilon = 10e-14 #np.finfo(np.float).eps
             eos_struct sa
             mph_struct mph
 
-        epsilon = 10e-14 #np.finfo(np.float).eps
-        if EnvVar.H.name != 'thetal':
-            sys.exit('EDMF_Environment: rain source terms are only defined for thetal as model variable')
-
-        # initialize the quadrature points and their labels
-        inner_env = np.zeros(env_len, dtype=np.double, order='c')
-        outer_env = np.zeros(env_len, dtype=np.double, order='c')
-        inner_src = np.zeros(src_len, dtype=np.double, order='c')
-        outer_src = np.zeros(src_len, dtype=np.double, order='c')
-        i_ql, i_T, i_thl, i_rho, i_cf, i_qt_cld, i_qt_dry, i_T_cld, i_T_dry, i_rf = range(env_len)
-        i_SH_qt, i_Sqt_H, i_SH_H, i_Sqt_qt, i_Sqt, i_SH = range(src_len)
-
-
-        for k in xrange(gw, self.Gr.nzg-gw):
-            if (EnvVar.QTvar.values[k] > epsilon and EnvVar.Hvar.values[k] > epsilon and fabs(EnvVar.HQTcov.values[k]) > epsilon
-                and EnvVar.QT.values[k] > epsilon and sqrt(EnvVar.QTvar.values[k]) < EnvVar.QT.values[k]) :
-
-                if self.quadrature_type == 'log-normal':
-                    # Lognormal parameters (mu, sd) from mean and variance
-                    sd_q = sqrt(log(EnvVar.QTvar.values[k]/EnvVar.QT.values[k]/EnvVar.QT.values[k] + 1.0))
-                    sd_h = sqrt(log(EnvVar.Hvar.values[k]/EnvVar.H.values[k]/EnvVar.H.values[k] + 1.0))
-                    # Enforce Schwarz's inequality
-                    corr = fmax(fmin(EnvVar.HQTcov.values[k]/sqrt(EnvVar.Hvar.values[k]*EnvVar.QTvar.values[k]),1.0),-1.0)
-                    sd2_hq = log(corr*sqrt(EnvVar.Hvar.values[k]*EnvVar.QTvar.values[k])
-                        /EnvVar.H.values[k]/EnvVar.QT.values[k] + 1.0)
-                    sd_cond_h_q = sqrt(fmax(sd_h*sd_h - sd2_hq*sd2_hq/sd_q/sd_q, 0.0))
-                    mu_q = log(EnvVar.QT.values[k]*EnvVar.QT.values[k]/sqrt(
-                        EnvVar.QT.values[k]*EnvVar.QT.values[k] + EnvVar.QTvar.values[k]))
-                    mu_h = log(EnvVar.H.values[k]*EnvVar.H.values[k]/sqrt(
-                        EnvVar.H.values[k]*EnvVar.H.values[k] + EnvVar.Hvar.values[k]))
-                else:
-                    sd_q = sqrt(EnvVar.QTvar.values[k])
-                    sd_h = sqrt(EnvVar.Hvar.values[k])
-                    corr = fmax(fmin(EnvVar.HQTcov.values[k]/fmax(sd_h*sd_q, 1e-13),1.0),-1.0)
-
-                    # limit sd_q to prevent negative qt_hat
-                    sd_q_lim = (1e-10 - EnvVar.QT.values[k])/(sqrt2 * abscissas[0])
+        if (EnvVar.QTvar.values[k] > epsilon and EnvVar.Hvar.values[k] > epsilon and fabs(EnvVar.HQTcov.values[k]) > epsilon
+            and EnvVar.QT.values[k] > epsilon and sqrt(EnvVar.QTvar.values[k]) < EnvVar.QT.values[k]) :
+            if self.quadrature_adaptive:
+                path = self.quadrature_path_adaptive(k, EnvVar)
+            else:
+                path = quadrature_path_full
+        self.quadrature_path[k] = path
+        if path == quadrature_path_low:
+            order = self.quadrature_order_min
+        nodes = gauss_hermite_nodes(order)
+        weights = gauss_hermite_weights(order)
+
+        if path == quadrature_path_full or path == quadrature_path_low:
+
+            if lognormal:
+                # Lognormal parameters (mu, sd) from mean and variance
+                sd_q = sqrt(log(EnvVar.QTvar.values[k]/EnvVar.QT.values[k]/EnvVar.QT.values[k] + 1.0))
+                sd_h = sqrt(log(EnvVar.Hvar.values[k]/EnvVar.H.values[k]/EnvVar.H.values[k] + 1.0))
+                # Enforce Schwarz's inequality
+                corr = fmax(fmin(EnvVar.HQTcov.values[k]/sqrt(EnvVar.Hvar.values[k]*EnvVar.QTvar.values[k]),1.0),-1.0)
+                sd2_hq = log(corr*sqrt(EnvVar.Hvar.values[k]*EnvVar.QTvar.values[k])
+                    /EnvVar.H.values[k]/EnvVar.QT.values[k] + 1.0)
+                sd_cond_h_q = sqrt(fmax(sd_h*sd_h - sd2_hq*sd2_hq/sd_q/sd_q, 0.0))
+                mu_q = log(EnvVar.QT.values[k]*EnvVar.QT.values[k]/sqrt(
+                    EnvVar.QT.values[k]*EnvVar.QT.values[k] + EnvVar.QTvar.values[k]))
+                mu_h = log(EnvVar.H.values[k]*EnvVar.H.values[k]/sqrt(
+                    EnvVar.H.values[k]*EnvVar.H.values[k] + EnvVar.Hvar.values[k]))
+            else:
+                sd_q = sqrt(EnvVar.QTvar.values[k])
+                sd_h = sqrt(EnvVar.Hvar.values[k])
+                corr = fmax(fmin(EnvVar.HQTcov.values[k]/fmax(sd_h*sd_q, 1e-13),1.0),-1.0)
+
+                # limit sd_q to prevent negative qt_hat
+                # a single quadrature point is the mean itself (nodes[0] = 0), it needs no limit
+                if order > 1:
+                    sd_q_lim = (1e-10 - EnvVar.QT.values[k])/nodes[0]
                     # walking backwards to assure your q_t will not be smaller than 1e-10
                     # TODO - check
                     # TODO - change 1e-13 and 1e-10 to some epislon
                     sd_q = fmin(sd_q, sd_q_lim)
-                    qt_var = sd_q * sd_q
-                    sigma_h_star = sqrt(fmax(1.0-corr*corr,0.0)) * sd_h
+                qt_var = sd_q * sd_q
+                sigma_h_star = sqrt(fmax(1.0-corr*corr,0.0)) * sd_h
+
+            # zero outer quadrature points
+            for idx in range(env_len):
+                outer_env[idx] = 0.0
+            for idx in range(src_len):
+                outer_src[idx] = 0.0
+
+            for m_q in xrange(order):
+                if lognormal:
+                    qt_hat = exp(mu_q + sd_q * nodes[m_q])
+                    mu_h_star = mu_h + sd2_hq/sd_q/sd_q*(log(qt_hat)-mu_q)
+                else:
+                    qt_hat    = EnvVar.QT.values[k] + sd_q * nodes[m_q]
+                    mu_h_star = EnvVar.H.values[k]  + corr * sd_h * nodes[m_q]
 
-                # zero outer quadrature points
+                # zero inner quadrature points
                 for idx in range(env_len):
-                    outer_env[idx] = 0.0
+                    inner_env[idx] = 0.0
                 for idx in range(src_len):
-                    outer_src[idx] = 0.0
+                    inner_src[idx] = 0.0
 
-                for m_q in xrange(self.quadrature_order):
-                    if self.quadrature_type == 'log-normal':
-                        qt_hat = exp(mu_q + sqrt2 * sd_q * abscissas[m_q])
-                        mu_h_star = mu_h + sd2_hq/sd_q/sd_q*(log(qt_hat)-mu_q)
+                for m_h in xrange(order):
+                    if lognormal:
+                        h_hat = exp(mu_h_star + sd_cond_h_q * nodes[m_h])
+                    else:
+                        h_hat = sigma_h_star * nodes[m_h] + mu_h_star
+
+                    # condensation
+                    sa  = eos(
+                        self.t_to_prog_fp, self.prog_to_t_fp,
+                        self.Ref.p0_half[k], qt_hat, h_hat
+                    )
+                    # autoconversion and accretion
+                    mph = microphysics_rain_src_c(
+                        rain_flag,
+                        qt_hat,
+                        sa.ql,
+                        Rain.Env_QR.values[k],
+                        EnvVar.Area.values[k],
+                        sa.T,
+                        self.Ref.p0_half[k],
+                        self.Ref.rho0_half[k],
+                        dt
+                    )
+
+                    # environmental variables
+                    inner_env[i_ql]     += mph.ql     * weights[m_h]
+                    inner_env[i_T]      += sa.T       * weights[m_h]
+                    inner_env[i_thl]    += mph.thl    * weights[m_h]
+                    inner_env[i_rho]    += mph.rho    * weights[m_h]
+                    # rain area fraction
+                    if mph.qr_src > 0.0:
+                        inner_env[i_rf]     += weights[m_h]
+                    # cloudy/dry categories for buoyancy in TKE
+                    if mph.ql  > 0.0:
+                        inner_env[i_cf]     +=          weights[m_h]
+                        inner_env[i_qt_cld] += mph.qt * weights[m_h]
+                        inner_env[i_T_cld]  += sa.T   * weights[m_h]
                     else:
-                        qt_hat    = EnvVar.QT.values[k] + sqrt2 * sd_q * abscissas[m_q]
-                        mu_h_star = EnvVar.H.values[k]  + sqrt2 * corr * sd_h * abscissas[m_q]
-
-                    # zero inner quadrature points
-                    for idx in range(env_len):
-                        inner_env[idx] = 0.0
-                    for idx in range(src_len):
-                        inner_src[idx] = 0.0
-
-                    for m_h in xrange(self.quadrature_order):
-                        if self.quadrature_type == 'log-normal':
-                            h_hat = exp(mu_h_star + sqrt2 * sd_cond_h_q * abscissas[m_h])
-                        else:
-                            h_hat = sqrt2 * sigma_h_star * abscissas[m_h] + mu_h_star
-
-                        with nogil:
-                            # condensation
-                            sa  = eos(
-                                self.t_to_prog_fp, self.prog_to_t_fp,
-                                self.Ref.p0_half[k], qt_hat, h_hat
-                            )
-                            # autoconversion and accretion
-                            mph = microphysics_rain_src(
-                                Rain.rain_model,
-                                qt_hat,
-                                sa.ql,
-                                Rain.Env_QR.values[k],
-                                EnvVar.Area.values[k],
-                                sa.T,
-                                self.Ref.p0_half[k],
-                                self.Ref.rho0_half[k],
-                                dt
-                            )
-
-                            # environmental variables
-                            inner_env[i_ql]     += mph.ql     * weights[m_h] * sqpi_inv
-                            inner_env[i_T]      += sa.T       * weights[m_h] * sqpi_inv
-                            inner_env[i_thl]    += mph.thl    * weights[m_h] * sqpi_inv
-                            inner_env[i_rho]    += mph.rho    * weights[m_h] * sqpi_inv
-                            # rain area fraction
-                            if mph.qr_src > 0.0:
-                                inner_env[i_rf]     += weights[m_h] * sqpi_inv
-                            # cloudy/dry categories for buoyancy in TKE
-                            if mph.ql  > 0.0:
-                                inner_env[i_cf]     +=          weights[m_h] * sqpi_inv
-                                inner_env[i_qt_cld] += mph.qt * weights[m_h] * sqpi_inv
-                                inner_env[i_T_cld]  += sa.T   * weights[m_h] * sqpi_inv
-                            else:
-                                inner_env[i_qt_dry] += mph.qt * weights[m_h] * sqpi_inv
-                                inner_env[i_T_dry]  += sa.T   * weights[m_h] * sqpi_inv
-                            # products for variance and covariance source terms
-                            inner_src[i_Sqt]    += -mph.qr_src                 * weights[m_h] * sqpi_inv
-                            inner_src[i_SH]     +=  mph.thl_rain_src           * weights[m_h] * sqpi_inv
-                            inner_src[i_Sqt_H]  += -mph.qr_src       * mph.thl * weights[m_h] * sqpi_inv
-                            inner_src[i_Sqt_qt] += -mph.qr_src       * mph.qt  * weights[m_h] * sqpi_inv
-                            inner_src[i_SH_H]   +=  mph.thl_rain_src * mph.thl * weights[m_h] * sqpi_inv
-                            inner_src[i_SH_qt]  +=  mph.thl_rain_src * mph.qt  * weights[m_h] * sqpi_inv
-
-                    for idx in range(env_len):
-                        outer_env[idx] += inner_env[idx] * weights[m_q] * sqpi_inv
-                    for idx in range(src_len):
-                        outer_src[idx] += inner_src[idx] * weights[m_q] * sqpi_inv
-
-                # update environmental variables
-                self.update_EnvVar(k, EnvVar, outer_env[i_T], outer_env[i_thl],\
-                                   outer_env[i_qt_cld] + outer_env[i_qt_dry],\
-                                   outer_env[i_ql], outer_env[i_rho])
-                self.update_EnvRain_sources(k, EnvVar, -outer_src[i_Sqt], outer_src[i_SH])
-
-                # update cloudy/dry variables for buoyancy in TKE
-                EnvVar.cloud_fraction.values[k] = outer_env[i_cf]
-                self.qt_dry[k]    = outer_env[i_qt_dry]
-                self.th_dry[k]    = theta_c(self.Ref.p0_half[k], outer_env[i_T_dry])
-                self.t_cloudy[k]  = outer_env[i_T_cld]
-                self.qv_cloudy[k] = outer_env[i_qt_cld] - outer_env[i_ql]
-                self.qt_cloudy[k] = outer_env[i_qt_cld]
-                self.th_cloudy[k] = theta_c(self.Ref.p0_half[k], outer_env[i_T_cld])
-
-                # update var/covar rain sources
-                self.Hvar_rain_dt[k]   = outer_src[i_SH_H]   - outer_src[i_SH]  * EnvVar.H.values[k]
-                self.QTvar_rain_dt[k]  = outer_src[i_Sqt_qt] - outer_src[i_Sqt] * EnvVar.QT.values[k]
-                self.HQTcov_rain_dt[k] = outer_src[i_SH_qt]  - outer_src[i_SH]  * EnvVar.QT.values[k] + \
-                                         outer_src[i_Sqt_H]  - outer_src[i_Sqt] * EnvVar.H.values[k]
+                        inner_env[i_qt_dry] += mph.qt * weights[m_h]
+                        inner_env[i_T_dry]  += sa.T   * weights[m_h]
+                    # products for variance and covariance source terms
+                    inner_src[i_Sqt]    += -mph.qr_src                 * weights[m_h]
+                    inner_src[i_SH]     +=  mph.thl_rain_src           * weights[m_h]
+                    inner_src[i_Sqt_H]  += -mph.qr_src       * mph.thl * weights[m_h]
+                    inner_src[i_Sqt_qt] += -mph.qr_src       * mph.qt  * weights[m_h]
+                    inner_src[i_SH_H]   +=  mph.thl_rain_src * mph.thl * weights[m_h]
+                    inner_src[i_SH_qt]  +=  mph.thl_rain_src * mph.qt  * weights[m_h]
 
-            else:
-                # if variance and covariance are zero do the same as in SA_mean
-                sa  = eos(
-                    self.t_to_prog_fp, self.prog_to_t_fp,
-                    self.Ref.p0_half[k], EnvVar.QT.values[k],
-                    EnvVar.H.values[k]
-                )
-                mph = microphysics_rain_src(
-                    Rain.rain_model,
-                    EnvVar.QT.values[k],
-                    sa.ql,
-                    Rain.Env_QR.values[k],
-                    EnvVar.Area.values[k],
-                    sa.T,
-                    self.Ref.p0_half[k],
-                    self.Ref.rho0_half[k],
-                    dt
-                )
-                self.update_EnvVar(k, EnvVar, sa.T, mph.thl, mph.qt, mph.ql, mph.rho)
-                self.update_EnvRain_sources(k, EnvVar, mph.qr_src, mph.thl_rain_src)
-                self.update_cloud_dry(k, EnvVar, sa.T, mph.th,  mph.qt, mph.ql, mph.qv)
+                for idx in range(env_len):
+                    outer_env[idx] += inner_env[idx] * weights[m_q]
+                for idx in range(src_len):
+                    outer_src[idx] += inner_src[idx] * weights[m_q]
+
+            # update environmental variables
+            self.update_EnvVar(k, EnvVar, outer_env[i_T], outer_env[i_thl],\
+                               outer_env[i_qt_cld] + outer_env[i_qt_dry],\
+                               outer_env[i_ql], outer_env[i_rho])
+            self.update_EnvRain_sources(k, EnvVar, -outer_src[i_Sqt], outer_src[i_SH])
+
+            # update cloudy/dry variables for buoyancy in TKE
+            EnvVar.cloud_fraction.values[k] = outer_env[i_cf]
+            self.qt_dry[k]    = outer_env[i_qt_dry]
+            self.th_dry[k]    = theta_c(self.Ref.p0_half[k], outer_env[i_T_dry])
+            self.t_cloudy[k]  = outer_env[i_T_cld]
+            self.qv_cloudy[k] = outer_env[i_qt_cld] - outer_env[i_ql]
+            self.qt_cloudy[k] = outer_env[i_qt_cld]
+            self.th_cloudy[k] = theta_c(self.Ref.p0_half[k], outer_env[i_T_cld])
+
+            # update var/covar rain sources
+            self.Hvar_rain_dt[k]   = outer_src[i_SH_H]   - outer_src[i_SH]  * EnvVar.H.values[k]
+            self.QTvar_rain_dt[k]  = outer_src[i_Sqt_qt] - outer_src[i_Sqt] * EnvVar.QT.values[k]
+            self.HQTcov_rain_dt[k] = outer_src[i_SH_qt]  - outer_src[i_SH]  * EnvVar.QT.values[k] + \
+                                     outer_src[i_Sqt_H]  - outer_src[i_Sqt] * EnvVar.H.values[k]
 
-                self.Hvar_rain_dt[k]   = 0.
-                self.QTvar_rain_dt[k]  = 0.
-                self.HQTcov_rain_dt[k] = 0.
+        else:
+            # if variance and covariance are zero, or the distribution cannot reach saturation,
+            # do the same as in SA_mean
+            sa  = eos(
+                self.t_to_prog_fp, self.prog_to_t_fp,
+                self.Ref.p0_half[k], EnvVar.QT.values[k],
+                EnvVar.H.values[k]
+            )
+            mph = microphysics_rain_src_c(
+                rain_flag,
+                EnvVar.QT.values[k],
+                sa.ql,
+                Rain.Env_QR.values[k],
+                EnvVar.Area.values[k],
+                sa.T,
+                self.Ref.p0_half[k],
+                self.Ref.rho0_half[k],
+                dt
+            )
+            self.update_EnvVar(k, EnvVar, sa.T, mph.thl, mph.qt, mph.ql, mph.rho)
+            self.update_EnvRain_sources(k, EnvVar, mph.qr_src, mph.thl_rain_src)
+            self.update_cloud_dry(k, EnvVar, sa.T, mph.th,  mph.qt, mph.ql, mph.qv)
+
+            self.Hvar_rain_dt[k]   = 0.
+            self.QTvar_rain_dt[k]  = 0.
+            self.HQTcov_rain_dt[k] = 0.
 
         return
 
@@ -1,5 +1,6 @@
 cimport Grid
 cimport ReferenceState
+cimport Workspace
 from Variables cimport GridMeanVariables
 from EDMF_Environment cimport EnvironmentThermodynamics
 from EDMF_Updrafts cimport UpdraftThermodynamics
@@ -18,10 +19,13 @@ cdef class RainVariable:
         double [:] flux
 
     cpdef set_bcs(self, Grid.Grid Gr)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class RainVariables:
     cdef:
         str rain_model
+        int rain_flag
 
         double mean_rwp
         double env_rwp
@@ -38,6 +42,8 @@ cdef class RainVariables:
         RainVariable Env_QR
         RainVariable Env_RainArea
 
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef initialize_io(self, NetCDFIO_Stats Stats)
     cpdef io(self, NetCDFIO_Stats, ReferenceState.ReferenceState Ref,\
              UpdraftThermodynamics UpdThermo,\
@@ -51,10 +57,14 @@ cdef class RainPhysics:
     cdef :
         Grid.Grid Gr
         ReferenceState.ReferenceState Ref
+        Workspace.Workspace Work
 
         double [:] rain_evap_source_h
         double [:] rain_evap_source_qt
 
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
+
     cpdef solve_rain_fall(
         self, GridMeanVariables GMV, TimeStepping TS, RainVariable QR,
         RainVariable RainArea
@@ -10,6 +10,7 @@ import sys
 
 cimport Grid
 cimport ReferenceState
+cimport Workspace
 from Variables cimport GridMeanVariables
 from EDMF_Environment cimport EnvironmentThermodynamics
 from EDMF_Updrafts cimport UpdraftThermodynamics
@@ -39,6 +40,18 @@ cdef class RainVariable:
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'values'] = np.array(self.values)
+        state[prefix + 'new']    = np.array(self.new)
+        state[prefix + 'flux']   = np.array(self.flux)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.values)[:] = state[prefix + 'values']
+        np.asarray(self.new)[:]    = state[prefix + 'new']
+        np.asarray(self.flux)[:]   = state[prefix + 'flux']
+        return
+
 cdef class RainVariables:
     def __init__(self, namelist, Grid.Grid Gr):
         self.Gr = Gr
@@ -67,9 +80,39 @@ cdef class RainVariables:
 
         if self.rain_model not in ["None", "cutoff", "clima_1m"]:
             sys.exit('rain model not recognized')
+        # for microphysics_rain_src_c, which can be called without the gil
+        self.rain_flag = rain_model_flag(self.rain_model)
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        self.QR.get_state(          state, prefix + 'QR.')
+        self.Upd_QR.get_state(      state, prefix + 'Upd_QR.')
+        self.Env_QR.get_state(      state, prefix + 'Env_QR.')
+        self.RainArea.get_state(    state, prefix + 'RainArea.')
+        self.Upd_RainArea.get_state(state, prefix + 'Upd_RainArea.')
+        self.Env_RainArea.get_state(state, prefix + 'Env_RainArea.')
+
+        state[prefix + 'mean_rwp']         = self.mean_rwp
+        state[prefix + 'upd_rwp']          = self.upd_rwp
+        state[prefix + 'env_rwp']          = self.env_rwp
+        state[prefix + 'cutoff_rain_rate'] = self.cutoff_rain_rate
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.QR.set_state(          state, prefix + 'QR.')
+        self.Upd_QR.set_state(      state, prefix + 'Upd_QR.')
+        self.Env_QR.set_state(      state, prefix + 'Env_QR.')
+        self.RainArea.set_state(    state, prefix + 'RainArea.')
+        self.Upd_RainArea.set_state(state, prefix + 'Upd_RainArea.')
+        self.Env_RainArea.set_state(state, prefix + 'Env_RainArea.')
+
+        self.mean_rwp         = state[prefix + 'mean_rwp']
+        self.upd_rwp          = state[prefix + 'upd_rwp']
+        self.env_rwp          = state[prefix + 'env_rwp']
+        self.cutoff_rain_rate = state[prefix + 'cutoff_rain_rate']
+        return
+
     cpdef initialize_io(self, NetCDFIO_Stats Stats):
         Stats.add_profile('qr_mean')
         Stats.add_profile('updraft_qr')
@@ -145,15 +188,26 @@ cdef class RainVariables:
         return
 
 cdef class RainPhysics:
-    def __init__(self, Grid.Grid Gr, ReferenceState.ReferenceState Ref):
+    def __init__(self, Grid.Grid Gr, ReferenceState.ReferenceState Ref, Workspace.Workspace Work):
         self.Gr = Gr
         self.Ref = Ref
+        self.Work = Work
 
         self.rain_evap_source_h  = np.zeros((Gr.nzg,), dtype=np.double, order='c')
         self.rain_evap_source_qt = np.zeros((Gr.nzg,), dtype=np.double, order='c')
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'rain_evap_source_h']  = np.array(self.rain_evap_source_h)
+        state[prefix + 'rain_evap_source_qt'] = np.array(self.rain_evap_source_qt)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.rain_evap_source_h)[:]  = state[prefix + 'rain_evap_source_h']
+        np.asarray(self.rain_evap_source_qt)[:] = state[prefix + 'rain_evap_source_qt']
+        return
+
     cpdef solve_rain_fall(
         self,
         GridMeanVariables GMV,
@@ -173,62 +227,68 @@ cdef class RainPhysics:
             double CFL_limit = 0.5
             double rho_frac, area_frac
 
-            double [:] term_vel     = np.zeros((nzg,), dtype=np.double, order='c')
-            double [:] term_vel_new = np.zeros((nzg,), dtype=np.double, order='c')
+            Py_ssize_t work_mark = self.Work.mark()
+            double [:] term_vel
+            double [:] term_vel_new
 
             double dt_rain
             double t_elapsed = 0.
 
-        # helper to calculate the rain velocity
-        # TODO: assuming GMV.W = 0
-        for k in xrange(nzg - gw - 1, gw - 1, -1):
-            term_vel[k] = terminal_velocity(
-                              QR.values[k],
-                              self.Ref.rho0_half[k]
-                           )
-
-        # calculate the allowed timestep (CFL_limit >= v dt / dz)
-        if max(term_vel[:]) != 0.:
-            dt_rain = np.minimum(dt_model, CFL_limit * self.Gr.dz / max(term_vel[:]))
+        try:
+            term_vel = self.Work.borrow()
+            term_vel_new = self.Work.borrow()
 
-        # rain falling through the domain
-        while t_elapsed < dt_model:
+            # helper to calculate the rain velocity
+            # TODO: assuming GMV.W = 0
             for k in xrange(nzg - gw - 1, gw - 1, -1):
+                term_vel[k] = terminal_velocity(
+                                  QR.values[k],
+                                  self.Ref.rho0_half[k]
+                               )
 
-                CFL_out = dt_rain / dz * term_vel[k]
+            # calculate the allowed timestep (CFL_limit >= v dt / dz)
+            if max(term_vel[:]) != 0.:
+                dt_rain = np.minimum(dt_model, CFL_limit * self.Gr.dz / max(term_vel[:]))
 
-                if k == (nzg - gw - 1):
-                    CFL_in = 0.
-                else:
-                    CFL_in = dt_rain / dz * term_vel[k+1]
+            # rain falling through the domain
+            while t_elapsed < dt_model:
+                for k in xrange(nzg - gw - 1, gw - 1, -1):
 
-                rho_frac  = self.Ref.rho0_half[k+1] / self.Ref.rho0_half[k]
-                area_frac = 1. # RainArea.values[k] / RainArea.new[k]
+                    CFL_out = dt_rain / dz * term_vel[k]
 
-                QR.new[k] = (QR.values[k]   * (1 - CFL_out) +\
-                             QR.values[k+1] * CFL_in * rho_frac) * area_frac
-                if QR.new[k] != 0.:
-                    RainArea.new[k] = 1.
+                    if k == (nzg - gw - 1):
+                        CFL_in = 0.
+                    else:
+                        CFL_in = dt_rain / dz * term_vel[k+1]
 
-                term_vel_new[k] = terminal_velocity(
-                                      QR.new[k],
-                                      self.Ref.rho0_half[k]
-                                  )
+                    rho_frac  = self.Ref.rho0_half[k+1] / self.Ref.rho0_half[k]
+                    area_frac = 1. # RainArea.values[k] / RainArea.new[k]
 
-            t_elapsed += dt_rain
+                    QR.new[k] = (QR.values[k]   * (1 - CFL_out) +\
+                                 QR.values[k+1] * CFL_in * rho_frac) * area_frac
+                    if QR.new[k] != 0.:
+                        RainArea.new[k] = 1.
 
-            QR.values[:] = QR.new[:]
-            RainArea.values[:] = RainArea.new[:]
+                    term_vel_new[k] = terminal_velocity(
+                                          QR.new[k],
+                                          self.Ref.rho0_half[k]
+                                      )
 
-            term_vel[:] = term_vel_new[:]
+                t_elapsed += dt_rain
 
-            if np.max(np.abs(term_vel[:])) > np.finfo(float).eps:
-                dt_rain = np.minimum(dt_model - t_elapsed,
-                                     CFL_limit * self.Gr.dz / max(term_vel[:])
-                                    )
-            else:
-                dt_rain = dt_model - t_elapsed
+                QR.values[:] = QR.new[:]
+                RainArea.values[:] = RainArea.new[:]
 
+                term_vel[:] = term_vel_new[:]
+
+                if np.max(np.abs(term_vel[:])) > np.finfo(float).eps:
+                    dt_rain = np.minimum(dt_model - t_elapsed,
+                                         CFL_limit * self.Gr.dz / max(term_vel[:])
+                                        )
+                else:
+                    dt_rain = dt_model - t_elapsed
+        finally:
+            self.Work.release(work_mark)
         return
 
     cpdef solve_rain_evap(
@@ -17,7 +17,12 @@ cdef class UpdraftVariable:
         str kind
         str name
         str units
+        bint antisymmetric_bcs
     cpdef set_bcs(self, Grid.Grid Gr)
+    cdef void set_bcs_c(self, Grid.Grid Gr) noexcept nogil
+    cdef double max_value(self) noexcept nogil
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class UpdraftVariables:
     cdef:
@@ -41,41 +46,51 @@ cdef class UpdraftVariables:
         double [:] cloud_top
         double [:] updraft_top
         double [:] cloud_cover
+        int [:] active_kmax
 
         double updraft_fraction
         double lwp
 
     cpdef initialize(self, GridMeanVariables GMV)
     cpdef initialize_DryBubble(self, GridMeanVariables GMV, ReferenceState.ReferenceState Ref)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef initialize_io(self, NetCDFIO_Stats Stats)
     cpdef io(self, NetCDFIO_Stats Stats, ReferenceState.ReferenceState Ref)
-    cpdef set_means(self, GridMeanVariables GMV)
+    cdef void set_means(self, GridMeanVariables GMV) noexcept nogil
     cpdef set_new_with_values(self)
     cpdef set_old_with_values(self)
-    cpdef set_values_with_new(self)
-    cpdef upd_cloud_diagnostics(self, ReferenceState.ReferenceState Ref)
+    cdef void set_values_with_new(self) noexcept nogil
+    cdef void upd_cloud_diagnostics(self, ReferenceState.ReferenceState Ref) noexcept nogil
+    cdef void update_active_window(self, Py_ssize_t margin) noexcept nogil
 
 cdef class UpdraftThermodynamics:
     cdef:
-        double (*t_to_prog_fp)(double p0, double T, double qt, double ql, double qi) nogil
-        double (*prog_to_t_fp)(double H, double pd, double pv, double qt ) nogil
+        double (*t_to_prog_fp)(double p0, double T, double qt, double ql, double qi) noexcept nogil
+        double (*prog_to_t_fp)(double H, double pd, double pv, double qt ) noexcept nogil
+        double (*dprog_dT_fp)(double p0, double T, double qt) noexcept nogil
+        bint newton_saturation
 
         Grid.Grid Gr
         ReferenceState.ReferenceState Ref
         Py_ssize_t n_updraft
+        int updraft_threads
 
         double [:,:] prec_source_h
         double [:,:] prec_source_qt
         double [:] prec_source_h_tot
         double [:] prec_source_qt_tot
 
-    cpdef buoyancy(
+    cdef void buoyancy(
         self, UpdraftVariables UpdVar, EnvironmentVariables EnvVar,
         GridMeanVariables GMV, bint extrap
-    )
+    ) noexcept nogil
+
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
     # helper functions to calculate autoconversion source terms to THL and QT
     cpdef clear_precip_sources(self)
     cpdef update_total_precip_sources(self)
 
-    cpdef microphysics(self, UpdraftVariables UpdVar, RainVariables Rain, double dt)
+    cdef void microphysics(self, UpdraftVariables UpdVar, RainVariables Rain, double dt) noexcept nogil
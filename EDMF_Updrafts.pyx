@@ -5,6 +5,7 @@
 #cython: cdivision=False
 
 import numpy as np
+import sys
 include "parameters.pxi"
 from thermodynamic_functions cimport  *
 from microphysics_functions cimport  *
@@ -16,6 +17,7 @@ from Variables cimport GridMeanVariables
 from NetCDFIO cimport NetCDFIO_Stats
 from EDMF_Environment cimport EnvironmentVariables
 from libc.math cimport fmax, fmin
+from cython.parallel import prange
 
 cdef class UpdraftVariable:
     def __init__(self, nu, nz, loc, kind, name, units):
@@ -33,16 +35,20 @@ cdef class UpdraftVariable:
         self.kind = kind
         self.name = name
         self.units = units
+        self.antisymmetric_bcs = name == 'w'
 
     cpdef set_bcs(self,Grid.Grid Gr):
+        self.set_bcs_c(Gr)
+        return
+
+    cdef void set_bcs_c(self, Grid.Grid Gr) noexcept nogil:
         cdef:
             Py_ssize_t i,k
             Py_ssize_t start_low = Gr.gw - 1
             Py_ssize_t start_high = Gr.nzg - Gr.gw - 1
+            Py_ssize_t n_updrafts = self.values.shape[0]
 
-        n_updrafts = np.shape(self.values)[0]
-
-        if self.name == 'w':
+        if self.antisymmetric_bcs:
             for i in xrange(n_updrafts):
                 self.values[i,start_high] = 0.0
                 self.values[i,start_low] = 0.0
@@ -57,6 +63,36 @@ cdef class UpdraftVariable:
 
         return
 
+    # maximum over all updrafts and levels, ghost points included
+    cdef double max_value(self) noexcept nogil:
+        cdef:
+            Py_ssize_t i, k
+            double vmax = self.values[0,0]
+
+        for i in xrange(self.values.shape[0]):
+            for k in xrange(self.values.shape[1]):
+                if self.values[i,k] > vmax:
+                    vmax = self.values[i,k]
+        return vmax
+
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'values'] = np.array(self.values)
+        state[prefix + 'new'] = np.array(self.new)
+        state[prefix + 'old'] = np.array(self.old)
+        state[prefix + 'tendencies'] = np.array(self.tendencies)
+        state[prefix + 'flux'] = np.array(self.flux)
+        state[prefix + 'bulkvalues'] = np.array(self.bulkvalues)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.values)[:,:] = state[prefix + 'values']
+        np.asarray(self.new)[:,:] = state[prefix + 'new']
+        np.asarray(self.old)[:,:] = state[prefix + 'old']
+        np.asarray(self.tendencies)[:,:] = state[prefix + 'tendencies']
+        np.asarray(self.flux)[:,:] = state[prefix + 'flux']
+        np.asarray(self.bulkvalues)[:] = state[prefix + 'bulkvalues']
+        return
+
 
 cdef class UpdraftVariables:
     def __init__(self, nu, namelist, paramlist, Grid.Grid Gr):
@@ -104,6 +140,10 @@ cdef class UpdraftVariables:
         self.cloud_cover    = np.zeros((nu,),  dtype=np.double, order='c')
         self.updraft_top    = np.zeros((nu,),  dtype=np.double, order='c')
 
+        # upper bound (exclusive) of the levels each updraft can reach in a sub-step
+        self.active_kmax    = np.zeros((nu,),  dtype=np.intc, order='c')
+        self.active_kmax[:] = nzg - Gr.gw
+
         self.lwp = 0.
         return
 
@@ -251,6 +291,44 @@ cdef class UpdraftVariables:
         return
 
 
+    cpdef get_state(self, dict state, str prefix):
+        self.W.get_state(state, prefix + 'W.')
+        self.Area.get_state(state, prefix + 'Area.')
+        self.QT.get_state(state, prefix + 'QT.')
+        self.QL.get_state(state, prefix + 'QL.')
+        self.H.get_state(state, prefix + 'H.')
+        self.RH.get_state(state, prefix + 'RH.')
+        self.THL.get_state(state, prefix + 'THL.')
+        self.T.get_state(state, prefix + 'T.')
+        self.B.get_state(state, prefix + 'B.')
+
+        state[prefix + 'cloud_fraction'] = np.array(self.cloud_fraction)
+        state[prefix + 'cloud_base'] = np.array(self.cloud_base)
+        state[prefix + 'cloud_top'] = np.array(self.cloud_top)
+        state[prefix + 'cloud_cover'] = np.array(self.cloud_cover)
+        state[prefix + 'updraft_top'] = np.array(self.updraft_top)
+        state[prefix + 'lwp'] = self.lwp
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.W.set_state(state, prefix + 'W.')
+        self.Area.set_state(state, prefix + 'Area.')
+        self.QT.set_state(state, prefix + 'QT.')
+        self.QL.set_state(state, prefix + 'QL.')
+        self.H.set_state(state, prefix + 'H.')
+        self.RH.set_state(state, prefix + 'RH.')
+        self.THL.set_state(state, prefix + 'THL.')
+        self.T.set_state(state, prefix + 'T.')
+        self.B.set_state(state, prefix + 'B.')
+
+        np.asarray(self.cloud_fraction)[:] = state[prefix + 'cloud_fraction']
+        np.asarray(self.cloud_base)[:] = state[prefix + 'cloud_base']
+        np.asarray(self.cloud_top)[:] = state[prefix + 'cloud_top']
+        np.asarray(self.cloud_cover)[:] = state[prefix + 'cloud_cover']
+        np.asarray(self.updraft_top)[:] = state[prefix + 'updraft_top']
+        self.lwp = state[prefix + 'lwp']
+        return
+
     cpdef initialize_io(self, NetCDFIO_Stats Stats):
         Stats.add_profile('updraft_area')
         Stats.add_profile('updraft_w')
@@ -275,46 +353,48 @@ cdef class UpdraftVariables:
         Stats.add_ts('updraft_lwp')
         return
 
-    cpdef set_means(self, GridMeanVariables GMV):
+    cdef void set_means(self, GridMeanVariables GMV) noexcept nogil:
 
         cdef:
             Py_ssize_t i, k
 
-        self.Area.bulkvalues = np.sum(self.Area.values,axis=0)
-        self.W.bulkvalues[:] = 0.0
-        self.QT.bulkvalues[:] = 0.0
-        self.QL.bulkvalues[:] = 0.0
-        self.H.bulkvalues[:] = 0.0
-        self.T.bulkvalues[:] = 0.0
-        self.B.bulkvalues[:] = 0.0
-        self.RH.bulkvalues[:] = 0.0
-
-        with nogil:
-            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                if self.Area.bulkvalues[k] > 1.0e-20:
-                    for i in xrange(self.n_updrafts):
-                        self.QT.bulkvalues[k] += self.Area.values[i,k] * self.QT.values[i,k]/self.Area.bulkvalues[k]
-                        self.QL.bulkvalues[k] += self.Area.values[i,k] * self.QL.values[i,k]/self.Area.bulkvalues[k]
-                        self.H.bulkvalues[k] += self.Area.values[i,k] * self.H.values[i,k]/self.Area.bulkvalues[k]
-                        self.T.bulkvalues[k] += self.Area.values[i,k] * self.T.values[i,k]/self.Area.bulkvalues[k]
-                        self.RH.bulkvalues[k] += self.Area.values[i,k] * self.RH.values[i,k]/self.Area.bulkvalues[k]
-                        self.B.bulkvalues[k] += self.Area.values[i,k] * self.B.values[i,k]/self.Area.bulkvalues[k]
-                        self.W.bulkvalues[k] += ((self.Area.values[i,k] + self.Area.values[i,k+1]) * self.W.values[i,k]
-                                            /(self.Area.bulkvalues[k] + self.Area.bulkvalues[k+1]))
+        for k in xrange(self.Gr.nzg):
+            self.Area.bulkvalues[k] = 0.0
+            for i in xrange(self.n_updrafts):
+                self.Area.bulkvalues[k] += self.Area.values[i,k]
+            self.W.bulkvalues[k] = 0.0
+            self.QT.bulkvalues[k] = 0.0
+            self.QL.bulkvalues[k] = 0.0
+            self.H.bulkvalues[k] = 0.0
+            self.T.bulkvalues[k] = 0.0
+            self.B.bulkvalues[k] = 0.0
+            self.RH.bulkvalues[k] = 0.0
+
+        for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
+            if self.Area.bulkvalues[k] > 1.0e-20:
+                for i in xrange(self.n_updrafts):
+                    self.QT.bulkvalues[k] += self.Area.values[i,k] * self.QT.values[i,k]/self.Area.bulkvalues[k]
+                    self.QL.bulkvalues[k] += self.Area.values[i,k] * self.QL.values[i,k]/self.Area.bulkvalues[k]
+                    self.H.bulkvalues[k] += self.Area.values[i,k] * self.H.values[i,k]/self.Area.bulkvalues[k]
+                    self.T.bulkvalues[k] += self.Area.values[i,k] * self.T.values[i,k]/self.Area.bulkvalues[k]
+                    self.RH.bulkvalues[k] += self.Area.values[i,k] * self.RH.values[i,k]/self.Area.bulkvalues[k]
+                    self.B.bulkvalues[k] += self.Area.values[i,k] * self.B.values[i,k]/self.Area.bulkvalues[k]
+                    self.W.bulkvalues[k] += ((self.Area.values[i,k] + self.Area.values[i,k+1]) * self.W.values[i,k]
+                                        /(self.Area.bulkvalues[k] + self.Area.bulkvalues[k+1]))
 
-                else:
-                    self.QT.bulkvalues[k] = GMV.QT.values[k]
-                    self.QL.bulkvalues[k] = 0.0
-                    self.H.bulkvalues[k] = GMV.H.values[k]
-                    self.RH.bulkvalues[k] = GMV.RH.values[k]
-                    self.T.bulkvalues[k] = GMV.T.values[k]
-                    self.B.bulkvalues[k] = 0.0
-                    self.W.bulkvalues[k] = 0.0
-
-                if self.QL.bulkvalues[k] > 1e-8 and self.Area.bulkvalues[k] > 1e-3:
-                    self.cloud_fraction[k] = 1.0
-                else:
-                    self.cloud_fraction[k] = 0.
+            else:
+                self.QT.bulkvalues[k] = GMV.QT.values[k]
+                self.QL.bulkvalues[k] = 0.0
+                self.H.bulkvalues[k] = GMV.H.values[k]
+                self.RH.bulkvalues[k] = GMV.RH.values[k]
+                self.T.bulkvalues[k] = GMV.T.values[k]
+                self.B.bulkvalues[k] = 0.0
+                self.W.bulkvalues[k] = 0.0
+
+            if self.QL.bulkvalues[k] > 1e-8 and self.Area.bulkvalues[k] > 1e-3:
+                self.cloud_fraction[k] = 1.0
+            else:
+                self.cloud_fraction[k] = 0.
         return
 
     # quick utility to set "new" arrays with values in the "values" arrays
@@ -348,18 +428,17 @@ cdef class UpdraftVariables:
         return
 
     # quick utility to set "tmp" arrays with values in the "new" arrays
-    cpdef set_values_with_new(self):
-        with nogil:
-            for i in xrange(self.n_updrafts):
-                for k in xrange(self.Gr.nzg):
-                    self.W.values[i,k] = self.W.new[i,k]
-                    self.Area.values[i,k] = self.Area.new[i,k]
-                    self.QT.values[i,k] = self.QT.new[i,k]
-                    self.QL.values[i,k] = self.QL.new[i,k]
-                    self.H.values[i,k] = self.H.new[i,k]
-                    self.THL.values[i,k] = self.THL.new[i,k]
-                    self.T.values[i,k] = self.T.new[i,k]
-                    self.B.values[i,k] = self.B.new[i,k]
+    cdef void set_values_with_new(self) noexcept nogil:
+        for i in xrange(self.n_updrafts):
+            for k in xrange(self.Gr.nzg):
+                self.W.values[i,k] = self.W.new[i,k]
+                self.Area.values[i,k] = self.Area.new[i,k]
+                self.QT.values[i,k] = self.QT.new[i,k]
+                self.QL.values[i,k] = self.QL.new[i,k]
+                self.H.values[i,k] = self.H.new[i,k]
+                self.THL.values[i,k] = self.THL.new[i,k]
+                self.T.values[i,k] = self.T.new[i,k]
+                self.B.values[i,k] = self.B.new[i,k]
         return
 
     cpdef io(self, NetCDFIO_Stats Stats, ReferenceState.ReferenceState Ref):
@@ -379,7 +458,6 @@ cdef class UpdraftVariables:
         Stats.write_profile('updraft_temperature', self.T.bulkvalues[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_profile('updraft_buoyancy', self.B.bulkvalues[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
 
-        self.upd_cloud_diagnostics(Ref)
         Stats.write_profile('updraft_cloud_fraction', self.cloud_fraction[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         # Note definition of cloud cover : each updraft is associated with a cloud cover equal to the maximum
         # area fraction of the updraft where ql > 0. Each updraft is assumed to have maximum overlap with respect to
@@ -391,7 +469,7 @@ cdef class UpdraftVariables:
         Stats.write_ts('updraft_lwp',         self.lwp)
         return
 
-    cpdef upd_cloud_diagnostics(self, ReferenceState.ReferenceState Ref):
+    cdef void upd_cloud_diagnostics(self, ReferenceState.ReferenceState Ref) noexcept nogil:
         cdef Py_ssize_t i, k
         self.lwp = 0.
 
@@ -417,20 +495,59 @@ cdef class UpdraftVariables:
         return
 
 
+    cdef void update_active_window(self, Py_ssize_t margin) noexcept nogil:
+        """
+        find the levels each updraft can reach within one sub-step: the window ends
+        margin levels above the highest level with updraft area (the explicit area
+        update moves the updraft top by at most one level, the implicit one to any level)
+        """
+        cdef:
+            Py_ssize_t i, k
+            Py_ssize_t gw = self.Gr.gw
+            Py_ssize_t nz = self.Gr.nzg - self.Gr.gw
+
+        for i in xrange(self.n_updrafts):
+            # the lowest level is always fed by the surface boundary condition
+            self.active_kmax[i] = min(gw + 1 + margin, nz)
+            for k in xrange(nz-1, gw, -1):
+                if self.Area.values[i,k] > 0.0:
+                    self.active_kmax[i] = min(k + 1 + margin, nz)
+                    break
+        return
+
+
 cdef class UpdraftThermodynamics:
-    def __init__(self, n_updraft, Grid.Grid Gr,
+    def __init__(self, n_updraft, namelist, Grid.Grid Gr,
                  ReferenceState.ReferenceState Ref, UpdraftVariables UpdVar,
                  RainVariables Rain):
         self.Gr = Gr
         self.Ref = Ref
         self.n_updraft = n_updraft
 
+        try:
+            saturation_solver = namelist['thermodynamics']['saturation_solver']
+        except:
+            saturation_solver = 'secant'
+        if saturation_solver == 'newton':
+            self.newton_saturation = True
+        elif saturation_solver == 'secant':
+            self.newton_saturation = False
+        else:
+            sys.exit('EDMF_Updrafts: Unrecognized saturation_solver. Possible options: secant, newton')
+
+        try:
+            self.updraft_threads = namelist['turbulence']['EDMF_PrognosticTKE']['updraft_threads']
+        except:
+            self.updraft_threads = 1
+
         if UpdVar.H.name == 's':
             self.t_to_prog_fp = t_to_entropy_c
             self.prog_to_t_fp = eos_first_guess_entropy
+            self.dprog_dT_fp = dentropy_dT_sat_c
         elif UpdVar.H.name == 'thetal':
             self.t_to_prog_fp = t_to_thetali_c
             self.prog_to_t_fp = eos_first_guess_thetal
+            self.dprog_dT_fp = dthetali_dT_sat_c
 
         # rain source from each updraft from all sub-timesteps
         self.prec_source_h  = np.zeros((n_updraft, Gr.nzg), dtype=np.double, order='c')
@@ -442,6 +559,20 @@ cdef class UpdraftThermodynamics:
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'prec_source_h'] = np.array(self.prec_source_h)
+        state[prefix + 'prec_source_qt'] = np.array(self.prec_source_qt)
+        state[prefix + 'prec_source_h_tot'] = np.array(self.prec_source_h_tot)
+        state[prefix + 'prec_source_qt_tot'] = np.array(self.prec_source_qt_tot)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.prec_source_h)[:,:] = state[prefix + 'prec_source_h']
+        np.asarray(self.prec_source_qt)[:,:] = state[prefix + 'prec_source_qt']
+        np.asarray(self.prec_source_h_tot)[:] = state[prefix + 'prec_source_h_tot']
+        np.asarray(self.prec_source_qt_tot)[:] = state[prefix + 'prec_source_qt_tot']
+        return
+
     cpdef clear_precip_sources(self):
         """
         clear precipitation source terms for QT and H from each updraft
@@ -458,98 +589,107 @@ cdef class UpdraftThermodynamics:
         self.prec_source_qt_tot = np.sum(self.prec_source_qt, axis=0)
         return
 
-    cpdef buoyancy(self, UpdraftVariables UpdVar, EnvironmentVariables EnvVar,
-                   GridMeanVariables GMV, bint extrap):
+    cdef void buoyancy(self, UpdraftVariables UpdVar, EnvironmentVariables EnvVar,
+                       GridMeanVariables GMV, bint extrap) noexcept nogil:
         cdef:
             Py_ssize_t k, i
             double rho, qv, qt, t, h
             Py_ssize_t gw = self.Gr.gw
+            eos_struct sa
 
-        UpdVar.Area.bulkvalues = np.sum(UpdVar.Area.values,axis=0)
+        for k in xrange(self.Gr.nzg):
+            UpdVar.Area.bulkvalues[k] = 0.0
+            for i in xrange(self.n_updraft):
+                UpdVar.Area.bulkvalues[k] += UpdVar.Area.values[i,k]
 
         if not extrap:
-            with nogil:
-                for i in xrange(self.n_updraft):
-                    for k in xrange(self.Gr.nzg):
-                        if UpdVar.Area.values[i,k] > 0.0:
-                            qv = UpdVar.QT.values[i,k] - UpdVar.QL.values[i,k]
-                            rho = rho_c(self.Ref.p0_half[k], UpdVar.T.values[i,k], UpdVar.QT.values[i,k], qv)
-                            UpdVar.B.values[i,k] = buoyancy_c(self.Ref.rho0_half[k], rho)
-                        else:
-                            UpdVar.B.values[i,k] = EnvVar.B.values[k]
-                        UpdVar.RH.values[i,k] = relative_humidity_c(self.Ref.p0_half[k], UpdVar.QT.values[i,k],
-                                                    UpdVar.QL.values[i,k], 0.0, UpdVar.T.values[i,k])
+            for i in xrange(self.n_updraft):
+                for k in xrange(self.Gr.nzg):
+                    if UpdVar.Area.values[i,k] > 0.0:
+                        qv = UpdVar.QT.values[i,k] - UpdVar.QL.values[i,k]
+                        rho = rho_c(self.Ref.p0_half[k], UpdVar.T.values[i,k], UpdVar.QT.values[i,k], qv)
+                        UpdVar.B.values[i,k] = buoyancy_c(self.Ref.rho0_half[k], rho)
+                    else:
+                        UpdVar.B.values[i,k] = EnvVar.B.values[k]
+                    UpdVar.RH.values[i,k] = relative_humidity_c(self.Ref.p0_half[k], UpdVar.QT.values[i,k],
+                                                UpdVar.QL.values[i,k], 0.0, UpdVar.T.values[i,k])
         else:
-            with nogil:
-                for i in xrange(self.n_updraft):
-                    for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                        if UpdVar.Area.values[i,k] > 0.0:
-                            qt = UpdVar.QT.values[i,k]
-                            qv = UpdVar.QT.values[i,k] - UpdVar.QL.values[i,k]
-                            h = UpdVar.H.values[i,k]
-                            t = UpdVar.T.values[i,k]
-                            rho = rho_c(self.Ref.p0_half[k], t, qt, qv)
-                            UpdVar.B.values[i,k] = buoyancy_c(self.Ref.rho0_half[k], rho)
-                            UpdVar.RH.values[i,k] = relative_humidity_c(self.Ref.p0_half[k], qt, qt-qv, 0.0, t)
-                        elif UpdVar.Area.values[i,k-1] > 0.0 and k>self.Gr.gw:
+            for i in xrange(self.n_updraft):
+                for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
+                    if UpdVar.Area.values[i,k] > 0.0:
+                        qt = UpdVar.QT.values[i,k]
+                        qv = UpdVar.QT.values[i,k] - UpdVar.QL.values[i,k]
+                        h = UpdVar.H.values[i,k]
+                        t = UpdVar.T.values[i,k]
+                        rho = rho_c(self.Ref.p0_half[k], t, qt, qv)
+                        UpdVar.B.values[i,k] = buoyancy_c(self.Ref.rho0_half[k], rho)
+                        UpdVar.RH.values[i,k] = relative_humidity_c(self.Ref.p0_half[k], qt, qt-qv, 0.0, t)
+                    elif UpdVar.Area.values[i,k-1] > 0.0 and k>self.Gr.gw:
+                        if self.newton_saturation:
+                            # warm start from the updraft temperature one level below
+                            sa = eos_newton(self.t_to_prog_fp, self.prog_to_t_fp, self.dprog_dT_fp,
+                                            self.Ref.p0_half[k], qt, h, t)
+                        else:
                             sa = eos(self.t_to_prog_fp, self.prog_to_t_fp, self.Ref.p0_half[k],
                                      qt, h)
-                            qt -= sa.ql
-                            qv = qt
-                            t = sa.T
-                            rho = rho_c(self.Ref.p0_half[k], t, qt, qv)
-                            UpdVar.B.values[i,k] = buoyancy_c(self.Ref.rho0_half[k], rho)
-                            UpdVar.RH.values[i,k] = relative_humidity_c(self.Ref.p0_half[k], qt, qt-qv, 0.0, t)
-                        else:
-                            UpdVar.B.values[i,k] = EnvVar.B.values[k]
-                            UpdVar.RH.values[i,k] = EnvVar.RH.values[k]
+                        qt -= sa.ql
+                        qv = qt
+                        t = sa.T
+                        rho = rho_c(self.Ref.p0_half[k], t, qt, qv)
+                        UpdVar.B.values[i,k] = buoyancy_c(self.Ref.rho0_half[k], rho)
+                        UpdVar.RH.values[i,k] = relative_humidity_c(self.Ref.p0_half[k], qt, qt-qv, 0.0, t)
+                    else:
+                        UpdVar.B.values[i,k] = EnvVar.B.values[k]
+                        UpdVar.RH.values[i,k] = EnvVar.RH.values[k]
 
 
-        with nogil:
-            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                GMV.B.values[k] = (1.0 - UpdVar.Area.bulkvalues[k]) * EnvVar.B.values[k]
-                for i in xrange(self.n_updraft):
-                    GMV.B.values[k] += UpdVar.Area.values[i,k] * UpdVar.B.values[i,k]
-                for i in xrange(self.n_updraft):
-                    UpdVar.B.values[i,k] -= GMV.B.values[k]
-                EnvVar.B.values[k] -= GMV.B.values[k]
+        for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
+            GMV.B.values[k] = (1.0 - UpdVar.Area.bulkvalues[k]) * EnvVar.B.values[k]
+            for i in xrange(self.n_updraft):
+                GMV.B.values[k] += UpdVar.Area.values[i,k] * UpdVar.B.values[i,k]
+            for i in xrange(self.n_updraft):
+                UpdVar.B.values[i,k] -= GMV.B.values[k]
+            EnvVar.B.values[k] -= GMV.B.values[k]
 
         return
 
-    cpdef microphysics(self, UpdraftVariables UpdVar, RainVariables Rain, double dt):
+    cdef void microphysics(self, UpdraftVariables UpdVar, RainVariables Rain, double dt) noexcept nogil:
         """
         compute precipitation source terms
         """
         cdef:
             Py_ssize_t k, i
+            Py_ssize_t nz = self.Gr.nzg - self.Gr.gw
 
             rain_struct rst
             mph_struct  mph
             eos_struct  sa
 
-        with nogil:
-            for i in xrange(self.n_updraft):
-                for k in xrange(self.Gr.nzg):
-
-                    # autoconversion and accretion
-                    mph = microphysics_rain_src(
-                        Rain.rain_model,
-                        UpdVar.QT.new[i,k],
-                        UpdVar.QL.new[i,k],
-                        Rain.Upd_QR.values[k],
-                        UpdVar.Area.new[i,k],
-                        UpdVar.T.new[i,k],
-                        self.Ref.p0_half[k],
-                        self.Ref.rho0_half[k],
-                        dt
-                    )
-
-                    # update Updraft.new
-                    UpdVar.QT.new[i,k] = mph.qt
-                    UpdVar.QL.new[i,k] = mph.ql
-                    UpdVar.H.new[i,k]  = mph.thl
-
-                    # update rain sources of state variables
-                    self.prec_source_qt[i,k] -= mph.qr_src * UpdVar.Area.new[i,k]
-                    self.prec_source_h[i,k]  += mph.thl_rain_src * UpdVar.Area.new[i,k]
+        for i in prange(self.n_updraft, num_threads=self.updraft_threads, schedule='static'):
+            for k in xrange(self.Gr.nzg):
+                # no updraft area between the active window and the upper ghost levels
+                if k >= UpdVar.active_kmax[i] and k < nz:
+                    continue
+
+                # autoconversion and accretion
+                mph = microphysics_rain_src_c(
+                    Rain.rain_flag,
+                    UpdVar.QT.new[i,k],
+                    UpdVar.QL.new[i,k],
+                    Rain.Upd_QR.values[k],
+                    UpdVar.Area.new[i,k],
+                    UpdVar.T.new[i,k],
+                    self.Ref.p0_half[k],
+                    self.Ref.rho0_half[k],
+                    dt
+                )
+
+                # update Updraft.new
+                UpdVar.QT.new[i,k] = mph.qt
+                UpdVar.QL.new[i,k] = mph.ql
+                UpdVar.H.new[i,k]  = mph.thl
+
+                # update rain sources of state variables
+                self.prec_source_qt[i,k] -= mph.qr_src * UpdVar.Area.new[i,k]
+                self.prec_source_h[i,k]  += mph.thl_rain_src * UpdVar.Area.new[i,k]
         return
@@ -24,6 +24,8 @@ cdef class ForcingBase:
     cpdef coriolis_force(self, VariablePrognostic U, VariablePrognostic V)
     cpdef initialize_io(self, NetCDFIO_Stats Stats)
     cpdef io(self, NetCDFIO_Stats Stats)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class ForcingNone(ForcingBase):
     cpdef initialize(self, GridMeanVariables GMV)
@@ -55,6 +57,8 @@ cdef class ForcingDYCOMS_RF01(ForcingBase):
         double [:] f_rad # radiative flux at cell edges
 
     cpdef initialize(self, GridMeanVariables GMV)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef calculate_radiation(self, GridMeanVariables GMV)
     cpdef update(self, GridMeanVariables GMV)
     cpdef coriolis_force(self, VariablePrognostic U, VariablePrognostic V)
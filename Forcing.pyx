@@ -40,6 +40,21 @@ cdef class ForcingBase:
         return
     cpdef io(self, NetCDFIO_Stats Stats):
         return
+    # the forcing profiles can be time dependent, so they are part of the restart state
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'subsidence'] = np.array(self.subsidence)
+        state[prefix + 'dTdt'] = np.array(self.dTdt)
+        state[prefix + 'dqtdt'] = np.array(self.dqtdt)
+        state[prefix + 'ug'] = np.array(self.ug)
+        state[prefix + 'vg'] = np.array(self.vg)
+        return
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.subsidence)[:] = state[prefix + 'subsidence']
+        np.asarray(self.dTdt)[:] = state[prefix + 'dTdt']
+        np.asarray(self.dqtdt)[:] = state[prefix + 'dqtdt']
+        np.asarray(self.ug)[:] = state[prefix + 'ug']
+        np.asarray(self.vg)[:] = state[prefix + 'vg']
+        return
 
 
 cdef class ForcingNone(ForcingBase):
@@ -144,6 +159,16 @@ cdef class ForcingDYCOMS_RF01(ForcingBase):
         self.f_rad = np.zeros((self.Gr.nzg + 1), dtype=np.double, order='c') # radiative flux at cell edges
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        ForcingBase.get_state(self, state, prefix)
+        state[prefix + 'f_rad'] = np.array(self.f_rad)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        ForcingBase.set_state(self, state, prefix)
+        np.asarray(self.f_rad)[:] = state[prefix + 'f_rad']
+        return
+
     cpdef calculate_radiation(self, GridMeanVariables GMV):
         """
         see eq. 3 in Stevens et. al. 2005 DYCOMS paper
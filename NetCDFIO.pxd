@@ -6,6 +6,33 @@ cdef class NetCDFIO_Stats:
         object root_grp
         object profiles_grp
         object ts_grp
+        object reference_grp
+
+        # output records kept in memory until the next flush
+        dict profile_buffer
+        dict ts_buffer
+        double [:] t_buffer
+        Py_ssize_t buffer_records
+        Py_ssize_t n_buffered
+        Py_ssize_t n_written
+
+        # output manifest
+        list include_patterns
+        list exclude_patterns
+
+        # time averaged output
+        public bint time_average
+        bint time_average_minmax
+        bint time_average_variance
+        dict profile_averages
+        dict ts_averages
+        Py_ssize_t n_samples
+        double sample_time
+
+        # background writer thread
+        object writer
+        object write_queue
+        object writer_error
 
         str stats_file_name
         str stats_path
@@ -19,13 +46,21 @@ cdef class NetCDFIO_Stats:
 
 
     cpdef setup_stats_file(self)
+    cpdef bint requested(self, var_name)
+    cpdef bint registered(self, var_name)
     cpdef add_profile(self, var_name)
     cpdef add_reference_profile(self, var_name)
     cpdef add_ts(self, var_name)
     cpdef open_files(self)
     cpdef close_files(self)
+    cpdef flush(self)
+    cpdef write_records(self, Py_ssize_t start, t, dict profiles, dict ts, Py_ssize_t n)
+    cpdef check_writer(self)
     cpdef write_profile(self, var_name, double[:] data)
     cpdef write_reference_profile(self, var_name, double[:] data)
     cpdef write_ts(self, var_name, double data)
     cpdef write_simulation_time(self, double t)
+    cpdef new_record(self, double t)
+    cdef accumulate(self, dict averages, var_name, data)
+    cpdef write_averages(self)
 
@@ -8,7 +8,14 @@
 
 import netCDF4 as nc
 import os
+import json
 import shutil
+import threading
+import fnmatch
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from TimeStepping cimport TimeStepping
 
@@ -17,11 +24,18 @@ import numpy as np
 cimport numpy as np
 import cython
 
+# Output folder of a simulation, named after the last 5 characters of its uuid
+def output_path(namelist):
+    uuid = str(namelist['meta']['uuid'])
+    return str(os.path.join(namelist['output']['output_root'] + 'Output.' + namelist['meta']['simname'] + '.'
+                            + uuid[len(uuid)-5:len(uuid)]))
+
 cdef class NetCDFIO_Stats:
     def __init__(self, namelist, paramlist, Grid Gr):
         self.root_grp = None
         self.profiles_grp = None
         self.ts_grp = None
+        self.reference_grp = None
         self.Gr = Gr
 
         self.last_output_time = 0.0
@@ -29,12 +43,71 @@ cdef class NetCDFIO_Stats:
 
         self.frequency = namelist['stats_io']['frequency']
 
+        # number of output records buffered in memory before they are written as one block
+        try:
+            self.buffer_records = namelist['stats_io']['buffer_records']
+        except:
+            self.buffer_records = 1
+            print('NetCDFIO_Stats: defaulting to writing every output record')
+        self.profile_buffer = {}
+        self.ts_buffer = {}
+        self.t_buffer = np.zeros((self.buffer_records,), dtype=np.double, order='c')
+        self.n_buffered = 0
+        self.n_written = 0
+
+        # output manifest: only variables matching one of the include patterns and none of the
+        # exclude patterns are registered and written
+        try:
+            self.include_patterns = [str(pattern) for pattern in namelist['stats_io']['include']]
+        except:
+            self.include_patterns = ['*']
+        try:
+            self.exclude_patterns = [str(pattern) for pattern in namelist['stats_io']['exclude']]
+        except:
+            self.exclude_patterns = []
+
+        # time averaging: every timestep is sampled and only the running mean (and optionally
+        # min/max and variance) over each output interval is written
+        try:
+            self.time_average = namelist['stats_io']['time_average']
+        except:
+            self.time_average = False
+        try:
+            self.time_average_minmax = namelist['stats_io']['time_average_minmax']
+        except:
+            self.time_average_minmax = False
+        try:
+            self.time_average_variance = namelist['stats_io']['time_average_variance']
+        except:
+            self.time_average_variance = False
+        self.profile_averages = {}
+        self.ts_averages = {}
+        self.n_samples = 0
+        self.sample_time = 0.0
+
+        # optionally hand the flushed records to a writer thread, so that the
+        # time stepping continues while netCDF4/HDF5 writes to disk
+        try:
+            background_writer = namelist['stats_io']['background_writer']
+        except:
+            background_writer = False
+        try:
+            queue_size = namelist['stats_io']['writer_queue_size']
+        except:
+            queue_size = 4
+        self.writer = None
+        self.writer_error = None
+        if background_writer:
+            self.write_queue = queue.Queue(maxsize=queue_size)
+        else:
+            self.write_queue = None
+
         # Setup the statistics output path
-        outpath = str(os.path.join(namelist['output']['output_root'] + 'Output.' + namelist['meta']['simname'] + '.'
-                                   + self.uuid[len(self.uuid )-5:len(self.uuid)]))
+        outpath = output_path(namelist)
 
+        # the folders of forked simulations and sweep members are inside the folder of their parent
         try:
-            os.mkdir(outpath)
+            os.makedirs(outpath)
         except:
             pass
 
@@ -62,19 +135,107 @@ cdef class NetCDFIO_Stats:
         shutil.copyfile(os.path.join( './', namelist['meta']['simname'] + '.in'),
                         os.path.join( outpath, namelist['meta']['simname'] + '.in'))
 
-        shutil.copyfile(os.path.join( './paramlist_'+paramlist['meta']['casename']+ '.in'),
-                        os.path.join( outpath, 'paramlist_'+paramlist['meta']['casename']+ '.in'))
+        # the paramlist is written from memory, sweep members only have it there
+        with open(os.path.join( outpath, 'paramlist_'+paramlist['meta']['casename']+ '.in'), 'w') as fh:
+            json.dump(paramlist, fh, sort_keys=True, indent=4)
         self.setup_stats_file()
         return
 
     cpdef open_files(self):
-        self.root_grp = nc.Dataset(self.path_plus_file, 'r+', format='NETCDF4')
-        self.profiles_grp = self.root_grp.groups['profiles']
-        self.ts_grp = self.root_grp.groups['timeseries']
+        # the stats file stays open for the whole run
+        if self.root_grp is None:
+            self.root_grp = nc.Dataset(self.path_plus_file, 'r+', format='NETCDF4')
+            self.profiles_grp = self.root_grp.groups['profiles']
+            self.ts_grp = self.root_grp.groups['timeseries']
+            self.reference_grp = self.root_grp.groups['reference']
         return
 
     cpdef close_files(self):
-        self.root_grp.close()
+        if self.root_grp is not None:
+            # the file is closed also when the records cannot be written
+            try:
+                self.flush()
+            finally:
+                try:
+                    if self.writer is not None:
+                        self.write_queue.put(None)
+                        self.writer.join()
+                        self.writer = None
+                        self.check_writer()
+                finally:
+                    self.root_grp.close()
+                    self.root_grp = None
+                    self.profiles_grp = None
+                    self.ts_grp = None
+                    self.reference_grp = None
+        return
+
+    cpdef flush(self):
+        """
+        Write the buffered output records to the stats file as one block per variable
+        """
+        cdef:
+            Py_ssize_t n = self.n_buffered
+            Py_ssize_t start = self.n_written
+
+        if n == 0:
+            return
+
+        if self.write_queue is None:
+            self.write_records(start, self.t_buffer[:n], self.profile_buffer, self.ts_buffer, n)
+        else:
+            self.check_writer()
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.writer_loop)
+                self.writer.daemon = True
+                self.writer.start()
+            # the writer gets its own copy of the records, the buffers are reused right away
+            profiles = {}
+            for var_name, buffer in self.profile_buffer.items():
+                profiles[var_name] = buffer[:n, :].copy()
+            ts = {}
+            for var_name, buffer in self.ts_buffer.items():
+                ts[var_name] = buffer[:n].copy()
+            # blocks while the queue is full
+            self.write_queue.put((start, np.array(self.t_buffer[:n]), profiles, ts, n))
+
+        for buffer in self.profile_buffer.values():
+            buffer[:, :] = nc.default_fillvals['f8']
+        for buffer in self.ts_buffer.values():
+            buffer[:] = nc.default_fillvals['f8']
+
+        self.n_written += n
+        self.n_buffered = 0
+        return
+
+    cpdef write_records(self, Py_ssize_t start, t, dict profiles, dict ts, Py_ssize_t n):
+        self.profiles_grp.variables['t'][start:start+n] = np.array(t)
+        self.ts_grp.variables['t'][start:start+n] = np.array(t)
+        for var_name, buffer in profiles.items():
+            self.profiles_grp.variables[var_name][start:start+n, :] = buffer[:n, :]
+        for var_name, buffer in ts.items():
+            self.ts_grp.variables[var_name][start:start+n] = buffer[:n]
+        self.root_grp.sync()
+        return
+
+    def writer_loop(self):
+        while True:
+            record = self.write_queue.get()
+            if record is None:
+                break
+            # keep draining the queue after an error so that the main loop never blocks
+            if self.writer_error is None:
+                try:
+                    self.write_records(*record)
+                except Exception as e:
+                    self.writer_error = e
+        return
+
+    cpdef check_writer(self):
+        if self.writer_error is not None:
+            error = self.writer_error
+            self.writer_error = None
+            raise RuntimeError('NetCDFIO_Stats: background writer failed: ' + str(error))
         return
 
     cpdef setup_stats_file(self):
@@ -110,39 +271,65 @@ cdef class NetCDFIO_Stats:
         ts_grp.createVariable('t', 'f8', ('t'))
 
         root_grp.close()
+        self.open_files()
         return
 
-    cpdef add_profile(self, var_name):
-
-        root_grp = nc.Dataset(self.path_plus_file, 'r+', format='NETCDF4')
-        profile_grp = root_grp.groups['profiles']
-        new_var = profile_grp.createVariable(var_name, 'f8', ('t', 'z'))
-
-        root_grp.close()
+    cpdef bint requested(self, var_name):
+        """
+        Check a variable name against the include and exclude patterns of the output manifest
+        """
+        for pattern in self.exclude_patterns:
+            if fnmatch.fnmatchcase(var_name, pattern):
+                return False
+        for pattern in self.include_patterns:
+            if fnmatch.fnmatchcase(var_name, pattern):
+                return True
+        return False
+
+    cpdef bint registered(self, var_name):
+        """
+        True if the variable was added to the stats file, use it to skip computing unused diagnostics
+        """
+        return var_name in self.profile_buffer or var_name in self.ts_buffer
 
+    cpdef add_profile(self, var_name):
+        if not self.requested(var_name):
+            return
+        names = [var_name]
+        if self.time_average and self.time_average_minmax:
+            names += [var_name + '_min', var_name + '_max']
+        if self.time_average and self.time_average_variance:
+            names += [var_name + '_var']
+        for name in names:
+            self.profiles_grp.createVariable(name, 'f8', ('t', 'z'))
+            self.profile_buffer[name] = np.full((self.buffer_records, self.Gr.nz),
+                                                nc.default_fillvals['f8'], dtype=np.double, order='c')
         return
 
     cpdef add_reference_profile(self, var_name):
-        root_grp = nc.Dataset(self.path_plus_file, 'r+', format='NETCDF4')
-        reference_grp = root_grp.groups['reference']
-        new_var = reference_grp.createVariable(var_name, 'f8', ('z',))
-        root_grp.close()
-
+        self.reference_grp.createVariable(var_name, 'f8', ('z',))
         return
 
     cpdef add_ts(self, var_name):
-
-        root_grp = nc.Dataset(self.path_plus_file, 'r+', format='NETCDF4')
-        ts_grp = root_grp.groups['timeseries']
-        new_var = ts_grp.createVariable(var_name, 'f8', ('t',))
-
-        root_grp.close()
+        if not self.requested(var_name):
+            return
+        names = [var_name]
+        if self.time_average and self.time_average_minmax:
+            names += [var_name + '_min', var_name + '_max']
+        if self.time_average and self.time_average_variance:
+            names += [var_name + '_var']
+        for name in names:
+            self.ts_grp.createVariable(name, 'f8', ('t',))
+            self.ts_buffer[name] = np.full((self.buffer_records,),
+                                           nc.default_fillvals['f8'], dtype=np.double, order='c')
         return
 
-    @cython.wraparound(True)
     cpdef write_profile(self, var_name, double[:] data):
-        var = self.profiles_grp.variables[var_name]
-        var[-1, :] = np.array(data)
+        if var_name in self.profile_buffer:
+            if self.time_average:
+                self.accumulate(self.profile_averages, var_name, data)
+            else:
+                self.profile_buffer[var_name][self.n_buffered-1, :] = data
         return
 
     cpdef write_reference_profile(self, var_name, double[:] data):
@@ -154,30 +341,84 @@ cdef class NetCDFIO_Stats:
         :return:
         '''
 
-        root_grp = nc.Dataset(self.path_plus_file, 'r+', format='NETCDF4')
-        reference_grp = root_grp.groups['reference']
-        var = reference_grp.variables[var_name]
+        var = self.reference_grp.variables[var_name]
         var[:] = np.array(data)
-        root_grp.close()
         return
 
-    @cython.wraparound(True)
     cpdef write_ts(self, var_name, double data):
-        var = self.ts_grp.variables[var_name]
-        var[-1] = data
+        if var_name in self.ts_buffer:
+            if self.time_average:
+                self.accumulate(self.ts_averages, var_name, data)
+            else:
+                self.ts_buffer[var_name][self.n_buffered-1] = data
         return
 
-    cpdef write_simulation_time(self, double t):
-
-
+    cdef accumulate(self, dict averages, var_name, data):
+        # running count, mean, sum of squared deviations (Welford), min and max, updated in place;
+        # the last entry is scratch space for the deviation from the mean
+        cdef double n
+        x = np.asarray(data, dtype=np.double)
+        if var_name not in averages:
+            averages[var_name] = [1, x.copy(),
+                                  np.zeros_like(x) if self.time_average_variance else None,
+                                  x.copy() if self.time_average_minmax else None,
+                                  x.copy() if self.time_average_minmax else None,
+                                  np.empty_like(x)]
+            return
+        acc = averages[var_name]
+        acc[0] += 1
+        n = acc[0]
+        delta = acc[5]
+        np.subtract(x, acc[1], out=delta)
+        np.multiply(delta, 1.0/n, out=delta)
+        np.add(acc[1], delta, out=acc[1])
+        if self.time_average_variance:
+            # (x - old mean) * (x - new mean) = n (n-1) ((x - old mean)/n)^2
+            np.multiply(delta, delta, out=delta)
+            np.multiply(delta, n * (n - 1.0), out=delta)
+            np.add(acc[2], delta, out=acc[2])
+        if self.time_average_minmax:
+            np.minimum(acc[3], x, out=acc[3])
+            np.maximum(acc[4], x, out=acc[4])
+        return
 
-        # Write to profiles group
-        profile_t = self.profiles_grp.variables['t']
-        profile_t[profile_t.shape[0]] = t
+    cpdef write_averages(self):
+        """
+        Write the statistics accumulated since the last call as one output record
+        """
+        cdef Py_ssize_t row
+
+        if self.n_samples == 0:
+            return
+        self.new_record(self.sample_time)
+        row = self.n_buffered - 1
+        for buffer, averages in [(self.profile_buffer, self.profile_averages), (self.ts_buffer, self.ts_averages)]:
+            for var_name, acc in averages.items():
+                buffer[var_name][row, ...] = acc[1]
+                if self.time_average_minmax:
+                    buffer[var_name + '_min'][row, ...] = acc[3]
+                    buffer[var_name + '_max'][row, ...] = acc[4]
+                if self.time_average_variance:
+                    buffer[var_name + '_var'][row, ...] = acc[2] / acc[0]
+        self.profile_averages = {}
+        self.ts_averages = {}
+        self.n_samples = 0
+        return
 
-        # Write to timeseries group
-        ts_t = self.ts_grp.variables['t']
-        ts_t[ts_t.shape[0]] = t
+    cpdef write_simulation_time(self, double t):
+        # with time averaging every call is one more sample, the record is written by write_averages
+        if self.time_average:
+            self.n_samples += 1
+            self.sample_time = t
+        else:
+            self.new_record(t)
+        return
 
+    cpdef new_record(self, double t):
+        # starts a new output record, the following write_profile and write_ts calls fill it
+        if self.n_buffered == self.buffer_records:
+            self.flush()
+        self.t_buffer[self.n_buffered] = t
+        self.n_buffered += 1
         return
 
@@ -0,0 +1,12 @@
+cdef class RandomStream:
+    cdef:
+        public long seed
+        object generator
+        double [:] uniform
+        Py_ssize_t position
+
+    cpdef refill(self)
+    cdef double next_uniform(self) nogil
+    cdef double poisson(self, double lam) nogil
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
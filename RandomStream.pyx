@@ -0,0 +1,96 @@
+#!python
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: initializedcheck=False
+#cython: cdivision=True
+
+import numpy as np
+from libc.math cimport exp, sqrt, log, lgamma, fabs, floor
+
+# Random numbers for the stochastic parts of the parameterization.
+# The stream has its own seeded generator, so runs (and ensemble members) are reproducible,
+# and its uniform draws are generated in bulk by refill(), so they can be used from C loops.
+# Streams with the same seed but a different stream number are independent.
+cdef class RandomStream:
+
+    def __init__(self, namelist, Py_ssize_t buffer_size, Py_ssize_t stream=0):
+        try:
+            self.seed = namelist['stochastic']['seed']
+        except:
+            self.seed = 0
+
+        if stream == 0:
+            self.generator = np.random.RandomState(self.seed)
+        else:
+            self.generator = np.random.RandomState([self.seed, stream])
+        self.uniform = np.zeros(buffer_size, dtype=np.double, order='c')
+        self.position = buffer_size
+
+        return
+
+    cpdef refill(self):
+        np.asarray(self.uniform)[:] = self.generator.random_sample(self.uniform.shape[0])
+        self.position = 0
+        return
+
+    cdef double next_uniform(self) nogil:
+        if self.position >= self.uniform.shape[0]:
+            with gil:
+                self.refill()
+        self.position += 1
+        return self.uniform[self.position-1]
+
+    cdef double poisson(self, double lam) nogil:
+        # Poisson draw by inversion of the cumulative distribution for small means and by
+        # transformed rejection with squeeze (PTRS, Hormann 1993) for large means, both exact
+        cdef:
+            double u, v, us, p, F
+            double slam, loglam, a, b, invalpha, vr
+            double k = 0.0
+
+        if lam <= 0.0:
+            return 0.0
+        elif lam < 10.0:
+            u = self.next_uniform()
+            p = exp(-lam)
+            F = p
+            while u > F and p > 0.0:
+                k += 1.0
+                p *= lam/k
+                F += p
+            return k
+        else:
+            slam = sqrt(lam)
+            loglam = log(lam)
+            b = 0.931 + 2.53 * slam
+            a = -0.059 + 0.02483 * b
+            invalpha = 1.1239 + 1.1328/(b - 3.4)
+            vr = 0.9277 - 3.6224/(b - 2.0)
+            while True:
+                u = self.next_uniform() - 0.5
+                v = self.next_uniform()
+                us = 0.5 - fabs(u)
+                k = floor((2.0 * a/us + b) * u + lam + 0.43)
+                if us >= 0.07 and v <= vr:
+                    return k
+                if k < 0.0 or (us < 0.013 and v > us):
+                    continue
+                if log(v) + log(invalpha) - log(a/(us * us) + b) <= -lam + k * loglam - lgamma(k + 1.0):
+                    return k
+
+    cpdef get_state(self, dict state, str prefix):
+        rng_state = self.generator.get_state()
+        state[prefix + 'keys'] = rng_state[1]
+        state[prefix + 'pos'] = rng_state[2]
+        state[prefix + 'has_gauss'] = rng_state[3]
+        state[prefix + 'cached_gaussian'] = rng_state[4]
+        state[prefix + 'uniform'] = np.array(self.uniform)
+        state[prefix + 'position'] = self.position
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.generator.set_state(('MT19937', state[prefix + 'keys'], int(state[prefix + 'pos']),
+                                  int(state[prefix + 'has_gauss']), float(state[prefix + 'cached_gaussian'])))
+        np.asarray(self.uniform)[:] = state[prefix + 'uniform']
+        self.position = state[prefix + 'position']
+        return
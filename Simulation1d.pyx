@@ -1,4 +1,7 @@
 import time
+import copy
+import os
+import sys
 import numpy as np
 cimport numpy as np
 from Variables cimport GridMeanVariables
@@ -10,43 +13,152 @@ cimport Cases
 from Surface cimport  SurfaceBase
 from Cases cimport  CasesBase
 from NetCDFIO cimport NetCDFIO_Stats
+from NetCDFIO import output_path
 cimport TimeStepping
+from thermodynamic_functions import initialize_lookup_tables
 
 class Simulation1d:
 
-    def __init__(self, namelist, paramlist):
-        self.Gr = Grid.Grid(namelist)
+    def __init__(self, namelist, paramlist, Gr=None, Stats=None):
+        initialize_lookup_tables(namelist)
+        # simulations forked from one another can share one (read-only) grid
+        if Gr is None:
+            self.Gr = Grid.Grid(namelist)
+        else:
+            self.Gr = Gr
         self.Ref = ReferenceState.ReferenceState(self.Gr)
         self.GMV = GridMeanVariables(namelist, self.Gr, self.Ref)
         self.Case = CasesFactory(namelist, paramlist)
         self.Turb = ParameterizationFactory(namelist,paramlist, self.Gr, self.Ref)
         self.TS = TimeStepping.TimeStepping(namelist)
-        self.Stats = NetCDFIO_Stats(namelist, paramlist, self.Gr)
+        if Stats is None:
+            self.Stats = NetCDFIO_Stats(namelist, paramlist, self.Gr)
+        else:
+            self.Stats = Stats
+
+        # checkpoints of the full model state, written next to the stats output
+        try:
+            self.checkpoint_frequency = namelist['restart']['checkpoint_frequency']
+        except:
+            self.checkpoint_frequency = 0.0
+        # the time averages of the stats output are not part of the state, a checkpoint
+        # has to be written right after they are written out and reset
+        if (self.checkpoint_frequency > 0.0 and self.Stats.time_average
+            and np.mod(self.checkpoint_frequency, self.Stats.frequency) != 0.0):
+            sys.exit('Simulation1d: >>checkpoint_frequency<< must be a multiple of the stats frequency when >>time_average<< is True')
+        try:
+            self.restart_file = namelist['restart']['input_file']
+        except:
+            self.restart_file = None
+        self.output_path = output_path(namelist)
+        self.checkpoint_path = str(os.path.join(self.output_path, 'restart'))
+        self.simname = str(namelist['meta']['simname'])
         return
 
-    def initialize(self, namelist):
+    # state is a dict returned by get_state of another simulation, the run
+    # then continues from that state instead of the initial profiles
+    def initialize(self, namelist, state=None):
         self.Case.initialize_reference(self.Gr, self.Ref, self.Stats)
         self.Case.initialize_profiles(self.Gr, self.GMV, self.Ref)
         self.Case.initialize_surface(self.Gr, self.Ref )
         self.Case.initialize_forcing(self.Gr, self.Ref, self.GMV)
         self.Turb.initialize(self.Case, self.GMV, self.Ref)
+        if state is not None:
+            self.set_state(state)
+        elif self.restart_file is not None:
+            self.restart(self.restart_file)
         self.initialize_io()
-        self.io()
+        # a run that continues from a saved state only writes the records the original run would have written
+        if (state is None and self.restart_file is None) or np.mod(self.TS.t, self.Stats.frequency) == 0:
+            self.io()
+            if self.Stats.time_average:
+                self.Stats.write_averages()
 
         return
 
     def run(self):
-        while self.TS.t <= self.TS.t_max:
-            self.GMV.zero_tendencies()
-            self.Case.update_surface(self.GMV, self.TS)
-            self.Case.update_forcing(self.GMV, self.TS)
-            self.Turb.update(self.GMV, self.Case, self.TS)
-            self.TS.update()
-            # Apply the tendencies, also update the BCs and diagnostic thermodynamics
-            self.GMV.update(self.TS)
-            self.Turb.update_GMV_diagnostics(self.GMV)
+        # the stats records are buffered, write them out also when a step fails
+        try:
+            while self.TS.t <= self.TS.t_max:
+                self.step()
+        finally:
+            self.Stats.close_files()
+        return
+
+    def step(self):
+        self.GMV.zero_tendencies()
+        self.Case.update_surface(self.GMV, self.TS)
+        self.Case.update_forcing(self.GMV, self.TS)
+        self.Turb.update(self.GMV, self.Case, self.TS)
+        self.TS.update()
+        # Apply the tendencies, also update the BCs and diagnostic thermodynamics
+        self.GMV.update(self.TS)
+        self.Turb.update_GMV_diagnostics(self.GMV)
+        # with time averaged output every timestep is sampled, io only reads the model state
+        if self.Stats.time_average:
+            self.io()
             if np.mod(self.TS.t, self.Stats.frequency) == 0:
-                self.io()
+                self.Stats.write_averages()
+        elif np.mod(self.TS.t, self.Stats.frequency) == 0:
+            self.io()
+        if self.checkpoint_frequency > 0.0 and np.mod(self.TS.t, self.checkpoint_frequency) == 0:
+            self.checkpoint(os.path.join(self.checkpoint_path,
+                                         'Checkpoint.' + self.simname + '.' + str(int(self.TS.t)) + '.npz'))
+        return
+
+    def get_state(self):
+        '''
+        Collect the model state in a dict of numpy arrays
+        '''
+        state = {}
+        self.TS.get_state(state, 'TS.')
+        self.GMV.get_state(state, 'GMV.')
+        self.Case.get_state(state, 'Case.')
+        self.Turb.get_state(state, 'Turb.')
+        return state
+
+    def set_state(self, state):
+        self.TS.set_state(state, 'TS.')
+        self.GMV.set_state(state, 'GMV.')
+        self.Case.set_state(state, 'Case.')
+        self.Turb.set_state(state, 'Turb.')
+        return
+
+    def fork(self, namelist, paramlists):
+        '''
+        Start one child simulation per paramlist from the current state of this one, e.g. to
+        share a spin-up period between the members of a parameter sweep. The state is copied
+        in memory, the children get their own output folders inside the output folder of this one.
+        '''
+        state = self.get_state()
+        children = []
+        uuid = str(namelist['meta']['uuid'])
+        for i in xrange(len(paramlists)):
+            namelist_child = copy.deepcopy(namelist)
+            namelist_child['output']['output_root'] = os.path.join(self.output_path, '')
+            namelist_child['meta']['uuid'] = uuid + '.' + '%05d' % i
+            child = Simulation1d(namelist_child, paramlists[i], Gr=self.Gr)
+            child.initialize(namelist_child, state=state)
+            children.append(child)
+        return children
+
+    def checkpoint(self, path):
+        try:
+            os.makedirs(os.path.dirname(path))
+        except:
+            pass
+        with open(path, 'wb') as f:
+            np.savez(f, **self.get_state())
+        print('Checkpoint written to ' + path)
+        return
+
+    # Has to be called after the case and turbulence scheme are initialized,
+    # so that all arrays are allocated with the right shape
+    def restart(self, path):
+        data = np.load(path)
+        self.set_state(dict(data))
+        data.close()
+        print('Restarting from ' + path + ' at t = ' + str(self.TS.t))
         return
 
     def initialize_io(self):
@@ -57,12 +169,10 @@ class Simulation1d:
         return
 
     def io(self):
-        self.Stats.open_files()
         self.Stats.write_simulation_time(self.TS.t)
         self.GMV.io(self.Stats)
         self.Case.io(self.Stats)
         self.Turb.io(self.Stats, self.TS)
-        self.Stats.close_files()
         return
 
     def force_io(self):
@@ -29,6 +29,8 @@ cdef class SurfaceBase:
     cpdef initialize(self)
     cpdef update(self, GridMeanVariables GMV)
     cpdef free_convection_windspeed(self, GridMeanVariables GMV)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class SurfaceNone(SurfaceBase):
     cpdef initialize(self)
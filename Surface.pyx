@@ -41,6 +41,44 @@ cdef class SurfaceBase:
         self.windspeed = np.sqrt(self.windspeed*self.windspeed  + (1.2 *wstar)*(1.2 * wstar) )
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'zrough'] = self.zrough
+        state[prefix + 'Tsurface'] = self.Tsurface
+        state[prefix + 'qsurface'] = self.qsurface
+        state[prefix + 'shf'] = self.shf
+        state[prefix + 'lhf'] = self.lhf
+        state[prefix + 'cm'] = self.cm
+        state[prefix + 'ch'] = self.ch
+        state[prefix + 'cq'] = self.cq
+        state[prefix + 'bflux'] = self.bflux
+        state[prefix + 'windspeed'] = self.windspeed
+        state[prefix + 'ustar'] = self.ustar
+        state[prefix + 'rho_qtflux'] = self.rho_qtflux
+        state[prefix + 'rho_hflux'] = self.rho_hflux
+        state[prefix + 'rho_uflux'] = self.rho_uflux
+        state[prefix + 'rho_vflux'] = self.rho_vflux
+        state[prefix + 'obukhov_length'] = self.obukhov_length
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.zrough = state[prefix + 'zrough']
+        self.Tsurface = state[prefix + 'Tsurface']
+        self.qsurface = state[prefix + 'qsurface']
+        self.shf = state[prefix + 'shf']
+        self.lhf = state[prefix + 'lhf']
+        self.cm = state[prefix + 'cm']
+        self.ch = state[prefix + 'ch']
+        self.cq = state[prefix + 'cq']
+        self.bflux = state[prefix + 'bflux']
+        self.windspeed = state[prefix + 'windspeed']
+        self.ustar = state[prefix + 'ustar']
+        self.rho_qtflux = state[prefix + 'rho_qtflux']
+        self.rho_hflux = state[prefix + 'rho_hflux']
+        self.rho_uflux = state[prefix + 'rho_uflux']
+        self.rho_vflux = state[prefix + 'rho_vflux']
+        self.obukhov_length = state[prefix + 'obukhov_length']
+        return
+
 
 cdef class SurfaceNone(SurfaceBase):
     def __init__(self):
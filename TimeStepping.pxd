@@ -6,4 +6,6 @@ cdef class TimeStepping:
         public double dti
         public Py_ssize_t nstep
 
-    cpdef update(self)
\ No newline at end of file
+    cpdef update(self)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
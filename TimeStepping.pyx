@@ -30,4 +30,14 @@ cdef class TimeStepping:
     cpdef update(self):
         self.t += self.dt
         self.nstep += 1
-        return
\ No newline at end of file
+        return
+
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 't'] = self.t
+        state[prefix + 'nstep'] = self.nstep
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.t = state[prefix + 't']
+        self.nstep = state[prefix + 'nstep']
+        return
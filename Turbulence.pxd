@@ -24,6 +24,8 @@ cdef class ParameterizationBase:
     cpdef initialize(self, CasesBase Case, GridMeanVariables GMV, ReferenceState Ref)
     cpdef initialize_io(self, NetCDFIO_Stats Stats)
     cpdef io(self, NetCDFIO_Stats Stats, TimeStepping TS)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef update(self,GridMeanVariables GMV, CasesBase Case, TimeStepping TS)
     cpdef update_inversion(self, GridMeanVariables GMV, option)
     cpdef compute_eddy_diffusivities_similarity(self, GridMeanVariables GMV, CasesBase Case)
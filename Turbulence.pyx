@@ -55,6 +55,24 @@ cdef class ParameterizationBase:
     cpdef io(self, NetCDFIO_Stats Stats, TimeStepping TS):
         return
 
+    # Copy the state that is carried from one timestep to the next into (and back out of)
+    # a dict of numpy arrays, used for checkpoints and restarts
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'turbulence_tendency'] = np.array(self.turbulence_tendency)
+        self.KM.get_state(state, prefix + 'KM.')
+        self.KH.get_state(state, prefix + 'KH.')
+        state[prefix + 'zi'] = self.zi
+        state[prefix + 'wstar'] = self.wstar
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.turbulence_tendency)[:] = state[prefix + 'turbulence_tendency']
+        self.KM.set_state(state, prefix + 'KM.')
+        self.KH.set_state(state, prefix + 'KH.')
+        self.zi = state[prefix + 'zi']
+        self.wstar = state[prefix + 'wstar']
+        return
+
     # Calculate the tendency of the grid mean variables due to turbulence as
     # the difference between the values at the beginning and  end of all substeps taken
     cpdef update(self,GridMeanVariables GMV, CasesBase Case, TimeStepping TS):
@@ -189,7 +207,9 @@ cdef class SimilarityED(ParameterizationBase):
             double [:] a = np.zeros((nz,),dtype=np.double, order='c')
             double [:] b = np.zeros((nz,),dtype=np.double, order='c')
             double [:] c = np.zeros((nz,),dtype=np.double, order='c')
-            double [:] x = np.zeros((nz,),dtype=np.double, order='c')
+            double [:,:] x = np.zeros((4,nz),dtype=np.double, order='c')
+            double [:] scratch = np.zeros((nz,),dtype=np.double, order='c')
+            double [:] pivot = np.zeros((nz,),dtype=np.double, order='c')
             double [:] dummy_ae = np.ones((nzg,),dtype=np.double, order='c')
             double [:] rho_K_m = np.zeros((nzg,),dtype=np.double, order='c')
 
@@ -202,50 +222,26 @@ cdef class SimilarityED(ParameterizationBase):
         construct_tridiag_diffusion(nzg, gw, self.Gr.dzi, TS.dt, &rho_K_m[0],
                                     &self.Ref.rho0_half[0], &dummy_ae[0] ,&a[0], &b[0], &c[0])
 
-        # Solve QT
-        with nogil:
-            for k in xrange(nz):
-                x[k] = GMV.QT.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_qtflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
-
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
-        with nogil:
-            for k in xrange(nz):
-                GMV.QT.new[k+gw] = x[k]
-
-        # Solve H
-        with nogil:
-            for k in xrange(nz):
-                x[k] = GMV.H.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_hflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
-
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
-        with nogil:
-            for k in xrange(nz):
-                GMV.H.new[k+gw] = x[k]
-
-
-        # Solve U
-        with nogil:
-            for k in xrange(nz):
-                x[k] = GMV.U.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_uflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
-
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
-        with nogil:
-            for k in xrange(nz):
-                GMV.U.new[k+gw] = x[k]
-
-        # Solve V
+        # Solve QT, H, U and V together
         with nogil:
             for k in xrange(nz):
-                x[k] = GMV.V.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_vflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
+                x[0,k] = GMV.QT.values[k+gw]
+                x[1,k] = GMV.H.values[k+gw]
+                x[2,k] = GMV.U.values[k+gw]
+                x[3,k] = GMV.V.values[k+gw]
+            x[0,0] = x[0,0] + TS.dt * Case.Sur.rho_qtflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
+            x[1,0] = x[1,0] + TS.dt * Case.Sur.rho_hflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
+            x[2,0] = x[2,0] + TS.dt * Case.Sur.rho_uflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
+            x[3,0] = x[3,0] + TS.dt * Case.Sur.rho_vflux * self.Gr.dzi * self.Ref.alpha0_half[gw]
+
+            tridiag_factor(nz, &a[0], &b[0], &c[0], &scratch[0], &pivot[0])
+            tridiag_solve_factored(nz, 4, &x[0,0], nz, &a[0], &b[0], &scratch[0], &pivot[0])
 
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
-        with nogil:
             for k in xrange(nz):
-                GMV.V.new[k+gw] = x[k]
+                GMV.QT.new[k+gw] = x[0,k]
+                GMV.H.new[k+gw] = x[1,k]
+                GMV.U.new[k+gw] = x[2,k]
+                GMV.V.new[k+gw] = x[3,k]
 
         self.update_GMV_diagnostics(GMV)
         ParameterizationBase.update(self, GMV,Case, TS)
@@ -1,6 +1,8 @@
 cimport EDMF_Updrafts
 cimport EDMF_Environment
 cimport EDMF_Rain
+cimport RandomStream
+cimport Workspace
 
 from Grid cimport Grid
 from Variables cimport VariablePrognostic, VariableDiagnostic, GridMeanVariables
@@ -12,6 +14,18 @@ from NetCDFIO cimport NetCDFIO_Stats
 from turbulence_functions cimport *
 from Turbulence cimport ParameterizationBase
 
+# grid-mean values decompose_environment subtracts the updrafts from
+cdef enum:
+    decompose_values = 0
+    decompose_mf_update = 1
+
+# updraft aspect ratio in the non-hydrostatic pressure closures (pressure_closure_asp_label)
+cdef enum:
+    asp_unknown = -1
+    asp_const = 0
+    asp_z_dependent = 1
+    asp_median = 2
+
 cdef class EDMF_PrognosticTKE(ParameterizationBase):
     cdef:
         Py_ssize_t n_updrafts
@@ -25,18 +39,27 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         EDMF_Rain.RainVariables Rain
         EDMF_Rain.RainPhysics RainPhysics
 
-        entr_struct (*entr_detr_fp) (entr_in_struct entr_in) nogil
+        RandomStream.RandomStream Random
+        Workspace.Workspace Work
+        Py_ssize_t update_calls
+
+        void (*entr_detr_fp) (entr_column_struct *col) noexcept nogil
 
-        pressure_buoy_struct (*pressure_func_buoy) (pressure_in_struct press_in) nogil
-        pressure_drag_struct (*pressure_func_drag) (pressure_in_struct press_in) nogil
+        pressure_buoy_struct (*pressure_func_buoy) (pressure_in_struct press_in) noexcept nogil
+        pressure_drag_struct (*pressure_func_drag) (pressure_in_struct press_in) noexcept nogil
 
         bint use_const_plume_spacing
         bint similarity_diffusivity
         bint use_steady_updrafts
+        bint implicit_updrafts
+        bint fused_updraft_substeps
+        bint active_window
+        int updraft_threads
         bint calc_scalar_var
         bint calc_tke
 
         str asp_label
+        int asp_flag
         bint drag_sign
         double surface_area
         double minimum_area
@@ -59,6 +82,10 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         double pressure_normalmode_adv_coeff
         double pressure_normalmode_drag_coeff
         double dt_upd
+        Py_ssize_t updraft_substeps
+        double updraft_courant
+        double updraft_solve_time
+        Py_ssize_t updraft_solve_calls
         double constant_plume_spacing
         double aspect_ratio
         double [:,:] entr_sc
@@ -70,7 +97,13 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         double [:,:] nh_pressure_b
         double [:,:] asp_ratio
         double [:,:] b_coeff
+        double [:,:] area_median_work
         double [:,:] b_mix
+        # inputs of the entrainment closures that are not stored elsewhere
+        double [:,:] entr_w_upd
+        double [:] entr_w_env
+        double [:] entr_a_env
+        double [:,:] entr_poisson
         double [:,:] frac_turb_entr
         double [:,:] frac_turb_entr_full
         double [:,:] turb_entr_W
@@ -141,25 +174,32 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
     cpdef initialize(self, CasesBase Case, GridMeanVariables GMV, ReferenceState Ref)
     cpdef initialize_io(self, NetCDFIO_Stats Stats)
     cpdef io(self, NetCDFIO_Stats Stats, TimeStepping TS)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef update(self,GridMeanVariables GMV, CasesBase Case, TimeStepping TS)
     cpdef compute_prognostic_updrafts(self, GridMeanVariables GMV, CasesBase Case, TimeStepping TS)
+    cdef void solve_updraft_substeps(self, GridMeanVariables GMV, CasesBase Case, double dt, Py_ssize_t window_margin) nogil
     cpdef compute_diagnostic_updrafts(self, GridMeanVariables GMV, CasesBase Case)
     cpdef update_inversion(self, GridMeanVariables GMV, option)
     cpdef compute_mixing_length(self, double obukhov_length, double ustar, GridMeanVariables GMV)
     cpdef compute_eddy_diffusivities_tke(self, GridMeanVariables GMV, CasesBase Case)
-    cpdef compute_horizontal_eddy_diffusivities(self, GridMeanVariables GMV)
+    cdef void compute_horizontal_eddy_diffusivities(self, GridMeanVariables GMV) noexcept nogil
     cpdef reset_surface_covariance(self, GridMeanVariables GMV, CasesBase Case)
     cpdef compute_pressure_plume_spacing(self, GridMeanVariables GMV,  CasesBase Case)
-    cpdef compute_nh_pressure(self)
+    cdef void compute_nh_pressure(self) noexcept nogil
+    cdef void compute_nh_pressure_column(self, Py_ssize_t i) noexcept nogil
 
     cpdef set_updraft_surface_bc(self, GridMeanVariables GMV, CasesBase Case)
-    cpdef decompose_environment(self, GridMeanVariables GMV, whichvals)
-    cpdef compute_turbulent_entrainment(self, GridMeanVariables GMV, CasesBase Case)
-    cpdef compute_entrainment_detrainment(self, GridMeanVariables GMV, CasesBase Case)
-    cpdef zero_area_fraction_cleanup(self, GridMeanVariables GMV)
-    cpdef set_subdomain_bcs(self)
-    cpdef solve_updraft_velocity_area(self)
-    cpdef solve_updraft_scalars(self, GridMeanVariables GMV)
+    cdef void decompose_environment(self, GridMeanVariables GMV, int whichvals) noexcept nogil
+    cdef void compute_turbulent_entrainment(self, GridMeanVariables GMV, CasesBase Case) noexcept nogil
+    cdef void compute_entrainment_detrainment(self, GridMeanVariables GMV, CasesBase Case) nogil
+    cdef void compute_entrainment_detrainment_column(self, Py_ssize_t i, entr_column_struct col) noexcept nogil
+    cdef void zero_area_fraction_cleanup(self, GridMeanVariables GMV) noexcept nogil
+    cdef void set_subdomain_bcs(self) noexcept nogil
+    cdef void solve_updraft_velocity_area(self) noexcept nogil
+    cdef void solve_updraft_scalars(self, GridMeanVariables GMV) noexcept nogil
+    cdef void solve_updraft_velocity_area_implicit(self) noexcept nogil
+    cdef void solve_updraft_scalars_implicit(self, GridMeanVariables GMV) noexcept nogil
     cpdef update_GMV_MF(self, GridMeanVariables GMV, TimeStepping TS)
     cpdef update_GMV_ED(self, GridMeanVariables GMV, CasesBase Case, TimeStepping TS)
     cpdef compute_covariance(self, GridMeanVariables GMV, CasesBase Case, TimeStepping TS)
@@ -178,18 +218,21 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
     cpdef compute_covariance_rain(self, TimeStepping TS, GridMeanVariables GMV)
     cdef void compute_covariance_interdomain_src(self, EDMF_Updrafts.UpdraftVariable au, EDMF_Updrafts.UpdraftVariable phi_u, EDMF_Updrafts.UpdraftVariable psi_u,
                         EDMF_Environment.EnvironmentVariable phi_e,  EDMF_Environment.EnvironmentVariable psi_e, EDMF_Environment.EnvironmentVariable_2m covar_e)
-    cdef void update_covariance_ED(self, GridMeanVariables GMV, CasesBase Case,TimeStepping TS, VariablePrognostic GmvVar1, VariablePrognostic GmvVar2,
-            VariableDiagnostic GmvCovar, EDMF_Environment.EnvironmentVariable_2m Covar, EDMF_Environment.EnvironmentVariable  EnvVar1, EDMF_Environment.EnvironmentVariable  EnvVar2,
-            EDMF_Updrafts.UpdraftVariable UpdVar1, EDMF_Updrafts.UpdraftVariable UpdVar2)
+    cdef void update_covariance_ED(self, GridMeanVariables GMV, CasesBase Case,TimeStepping TS)
+    cdef void compute_covariance_entr_sink(self, bint is_tke, double *D_env) noexcept nogil
+    cdef void construct_covariance_matrix(self, bint is_tke, double *ae, double *whalf, double *D_env,
+                                          double *rho_ae_K_m, double dti, double *a, double *b, double *c) noexcept nogil
+    cdef void construct_covariance_rhs(self, EDMF_Environment.EnvironmentVariable_2m Covar, double [:] ae_old,
+                                       double dti, double *x)
     cpdef compute_tke_transport(self)
     cpdef compute_tke_advection(self)
     cpdef update_GMV_diagnostics(self, GridMeanVariables GMV)
-    cpdef double compute_zbl_qt_grad(self, GridMeanVariables GMV)
-    cdef get_GMV_CoVar(self, EDMF_Updrafts.UpdraftVariable au,
+    cdef double compute_zbl_qt_grad(self, GridMeanVariables GMV) noexcept nogil
+    cdef void get_GMV_CoVar(self, EDMF_Updrafts.UpdraftVariable au,
                         EDMF_Updrafts.UpdraftVariable phi_u, EDMF_Updrafts.UpdraftVariable psi_u,
                         EDMF_Environment.EnvironmentVariable phi_e,  EDMF_Environment.EnvironmentVariable psi_e,
                         EDMF_Environment.EnvironmentVariable_2m covar_e,
-                       double *gmv_phi, double *gmv_psi, double *gmv_covar)
+                       double *gmv_phi, double *gmv_psi, double *gmv_covar) noexcept nogil
     cdef get_env_covar_from_GMV(self, EDMF_Updrafts.UpdraftVariable au,
                                 EDMF_Updrafts.UpdraftVariable phi_u, EDMF_Updrafts.UpdraftVariable psi_u,
                                 EDMF_Environment.EnvironmentVariable phi_e, EDMF_Environment.EnvironmentVariable psi_e,
@@ -8,10 +8,13 @@ import numpy as np
 include "parameters.pxi"
 import cython
 import sys
+import time
 from Grid cimport Grid
 cimport EDMF_Updrafts
 cimport EDMF_Environment
 cimport EDMF_Rain
+cimport RandomStream
+cimport Workspace
 from Variables cimport VariablePrognostic, VariableDiagnostic, GridMeanVariables
 from Surface cimport SurfaceBase
 from Cases cimport  CasesBase
@@ -23,6 +26,7 @@ from microphysics_functions cimport *
 from turbulence_functions cimport *
 from utility_functions cimport *
 from libc.math cimport fmax, sqrt, exp, pow, cbrt, fmin, fabs
+from cython.parallel import prange
 from cpython.mem cimport PyMem_Malloc, PyMem_Realloc, PyMem_Free
 
 cdef class EDMF_PrognosticTKE(ParameterizationBase):
@@ -44,6 +48,37 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         except:
             self.use_steady_updrafts = False
 
+        try:
+            updraft_solver = str(namelist['turbulence']['EDMF_PrognosticTKE']['updraft_solver'])
+        except:
+            updraft_solver = 'explicit'
+        if updraft_solver == 'explicit':
+            self.implicit_updrafts = False
+        elif updraft_solver == 'implicit':
+            self.implicit_updrafts = True
+        else:
+            sys.exit('Turbulence--EDMF_PrognosticTKE: updraft_solver must be explicit or implicit')
+
+        # run the updraft sub-steps in a single loop without the GIL (False: step through them from Python)
+        try:
+            self.fused_updraft_substeps = namelist['turbulence']['EDMF_PrognosticTKE']['fused_updraft_substeps']
+        except:
+            self.fused_updraft_substeps = True
+        # restrict the updraft kernels to the levels the updrafts can reach (False: always the full column)
+        try:
+            self.active_window = namelist['turbulence']['EDMF_PrognosticTKE']['active_window']
+        except:
+            self.active_window = True
+        self.updraft_solve_time = 0.0
+        self.updraft_solve_calls = 0
+
+        # OpenMP threads over the updrafts in the updraft kernels; the kernels
+        # that loop over updrafts with prange have to be called without the GIL
+        try:
+            self.updraft_threads = namelist['turbulence']['EDMF_PrognosticTKE']['updraft_threads']
+        except:
+            self.updraft_threads = 1
+
         try:
             self.calc_tke = namelist['turbulence']['EDMF_PrognosticTKE']['calculate_tke']
         except:
@@ -120,6 +155,15 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         except:
             self.asp_label = 'const'
             print('Turbulence--EDMF_PrognosticTKE: H/2R defaulting to constant')
+        if self.asp_label == 'z_dependent':
+            self.asp_flag = asp_z_dependent
+        elif self.asp_label == 'median':
+            self.asp_flag = asp_median
+        elif self.asp_label == 'const':
+            self.asp_flag = asp_const
+        else:
+            self.asp_flag = asp_unknown
+            print('Turbulence--EDMF_PrognosticTKE: H/2R option is not recognized')
 
         try:
             self.similarity_diffusivity = namelist['turbulence']['EDMF_PrognosticTKE']['use_similarity_diffusivity']
@@ -194,17 +238,23 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         self.Rain = EDMF_Rain.RainVariables(namelist, Gr)
         if self.use_steady_updrafts == True and self.Rain.rain_model != "None":
             sys.exit('PrognosticTKE: rain model is available for prognostic updrafts only')
-        self.RainPhysics = EDMF_Rain.RainPhysics(Gr, Ref)
+        # Scratch profiles for the kernel temporaries: enough rows for the largest kernel (io)
+        # plus one row per updraft kept for the area median work
+        self.Work = Workspace.Workspace(24 + self.n_updrafts, Gr.nzg)
+        self.update_calls = 0
+        self.RainPhysics = EDMF_Rain.RainPhysics(Gr, Ref, self.Work)
 
         # Create the updraft variable class (major diagnostic and prognostic variables)
         self.UpdVar = EDMF_Updrafts.UpdraftVariables(self.n_updrafts, namelist,paramlist, Gr)
         # Create the class for updraft thermodynamics
-        self.UpdThermo = EDMF_Updrafts.UpdraftThermodynamics(self.n_updrafts, Gr, Ref, self.UpdVar, self.Rain)
+        self.UpdThermo = EDMF_Updrafts.UpdraftThermodynamics(self.n_updrafts, namelist, Gr, Ref, self.UpdVar, self.Rain)
 
         # Create the environment variable class (major diagnostic and prognostic variables)
         self.EnvVar = EDMF_Environment.EnvironmentVariables(namelist,Gr)
         # Create the class for environment thermodynamics
         self.EnvThermo = EDMF_Environment.EnvironmentThermodynamics(namelist, Gr, Ref, self.EnvVar, self.Rain)
+        # Random numbers for stochastic entrainment (one draw per level and updraft per call)
+        self.Random = RandomStream.RandomStream(namelist, 2 * self.n_updrafts * Gr.nzg)
 
         # Entrainment rates
         self.entr_sc = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
@@ -215,6 +265,10 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
         self.sorting_function = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
         self.b_mix = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
+        self.entr_w_upd = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
+        self.entr_w_env = np.zeros((Gr.nzg,),dtype=np.double,order='c')
+        self.entr_a_env = np.zeros((Gr.nzg,),dtype=np.double,order='c')
+        self.entr_poisson = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
 
         # turbulent entrainment
         self.frac_turb_entr = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
@@ -230,6 +284,8 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         self.nh_pressure_drag = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
         self.asp_ratio = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
         self.b_coeff = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double,order='c')
+        # scratch space for the median updraft area of the 'median' aspect ratio
+        self.area_median_work = self.Work.borrow_rows(self.n_updrafts)
 
         # Mass flux
         self.m = np.zeros((self.n_updrafts, Gr.nzg),dtype=np.double, order='c')
@@ -284,6 +340,124 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             self.UpdVar.initialize_DryBubble(GMV, Ref)
         else:
             self.UpdVar.initialize(GMV)
+        self.UpdVar.upd_cloud_diagnostics(Ref)
+        self.EnvVar.env_cloud_diagnostics(Ref)
+        return
+
+    cpdef get_state(self, dict state, str prefix):
+        ParameterizationBase.get_state(self, state, prefix)
+        self.UpdVar.get_state(state, prefix + 'UpdVar.')
+        self.UpdThermo.get_state(state, prefix + 'UpdThermo.')
+        self.EnvVar.get_state(state, prefix + 'EnvVar.')
+        self.EnvThermo.get_state(state, prefix + 'EnvThermo.')
+        self.Rain.get_state(state, prefix + 'Rain.')
+        self.RainPhysics.get_state(state, prefix + 'RainPhysics.')
+        self.Random.get_state(state, prefix + 'Random.')
+
+        state[prefix + 'entr_sc'] = np.array(self.entr_sc)
+        state[prefix + 'detr_sc'] = np.array(self.detr_sc)
+        state[prefix + 'sorting_function'] = np.array(self.sorting_function)
+        state[prefix + 'b_mix'] = np.array(self.b_mix)
+        state[prefix + 'frac_turb_entr'] = np.array(self.frac_turb_entr)
+        state[prefix + 'frac_turb_entr_full'] = np.array(self.frac_turb_entr_full)
+        state[prefix + 'turb_entr_W'] = np.array(self.turb_entr_W)
+        state[prefix + 'turb_entr_H'] = np.array(self.turb_entr_H)
+        state[prefix + 'turb_entr_QT'] = np.array(self.turb_entr_QT)
+        state[prefix + 'nh_pressure'] = np.array(self.nh_pressure)
+        state[prefix + 'nh_pressure_b'] = np.array(self.nh_pressure_b)
+        state[prefix + 'nh_pressure_adv'] = np.array(self.nh_pressure_adv)
+        state[prefix + 'nh_pressure_drag'] = np.array(self.nh_pressure_drag)
+        state[prefix + 'asp_ratio'] = np.array(self.asp_ratio)
+        state[prefix + 'b_coeff'] = np.array(self.b_coeff)
+        state[prefix + 'm'] = np.array(self.m)
+        state[prefix + 'horizontal_KM'] = np.array(self.horizontal_KM)
+        state[prefix + 'horizontal_KH'] = np.array(self.horizontal_KH)
+        state[prefix + 'mixing_length'] = np.array(self.mixing_length)
+        state[prefix + 'tke_transport'] = np.array(self.tke_transport)
+        state[prefix + 'tke_advection'] = np.array(self.tke_advection)
+        state[prefix + 'area_surface_bc'] = np.array(self.area_surface_bc)
+        state[prefix + 'w_surface_bc'] = np.array(self.w_surface_bc)
+        state[prefix + 'h_surface_bc'] = np.array(self.h_surface_bc)
+        state[prefix + 'qt_surface_bc'] = np.array(self.qt_surface_bc)
+        state[prefix + 'pressure_plume_spacing'] = np.array(self.pressure_plume_spacing)
+        state[prefix + 'massflux_tendency_h'] = np.array(self.massflux_tendency_h)
+        state[prefix + 'massflux_tendency_qt'] = np.array(self.massflux_tendency_qt)
+        state[prefix + 'diffusive_tendency_h'] = np.array(self.diffusive_tendency_h)
+        state[prefix + 'diffusive_tendency_qt'] = np.array(self.diffusive_tendency_qt)
+        state[prefix + 'massflux_h'] = np.array(self.massflux_h)
+        state[prefix + 'massflux_qt'] = np.array(self.massflux_qt)
+        state[prefix + 'diffusive_flux_h'] = np.array(self.diffusive_flux_h)
+        state[prefix + 'diffusive_flux_qt'] = np.array(self.diffusive_flux_qt)
+        state[prefix + 'diffusive_flux_u'] = np.array(self.diffusive_flux_u)
+        state[prefix + 'diffusive_flux_v'] = np.array(self.diffusive_flux_v)
+        state[prefix + 'prandtl_nvec'] = np.array(self.prandtl_nvec)
+        state[prefix + 'mls'] = np.array(self.mls)
+        state[prefix + 'ml_ratio'] = np.array(self.ml_ratio)
+        state[prefix + 'l_entdet'] = np.array(self.l_entdet)
+        state[prefix + 'b'] = np.array(self.b)
+        if self.calc_tke:
+            state[prefix + 'massflux_tke'] = np.array(self.massflux_tke)
+        state[prefix + 'dt_upd'] = self.dt_upd
+        state[prefix + 'entr_surface_bc'] = self.entr_surface_bc
+        state[prefix + 'detr_surface_bc'] = self.detr_surface_bc
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        ParameterizationBase.set_state(self, state, prefix)
+        self.UpdVar.set_state(state, prefix + 'UpdVar.')
+        self.UpdThermo.set_state(state, prefix + 'UpdThermo.')
+        self.EnvVar.set_state(state, prefix + 'EnvVar.')
+        self.EnvThermo.set_state(state, prefix + 'EnvThermo.')
+        self.Rain.set_state(state, prefix + 'Rain.')
+        self.RainPhysics.set_state(state, prefix + 'RainPhysics.')
+        self.Random.set_state(state, prefix + 'Random.')
+
+        np.asarray(self.entr_sc)[:,:] = state[prefix + 'entr_sc']
+        np.asarray(self.detr_sc)[:,:] = state[prefix + 'detr_sc']
+        np.asarray(self.sorting_function)[:,:] = state[prefix + 'sorting_function']
+        np.asarray(self.b_mix)[:,:] = state[prefix + 'b_mix']
+        np.asarray(self.frac_turb_entr)[:,:] = state[prefix + 'frac_turb_entr']
+        np.asarray(self.frac_turb_entr_full)[:,:] = state[prefix + 'frac_turb_entr_full']
+        np.asarray(self.turb_entr_W)[:,:] = state[prefix + 'turb_entr_W']
+        np.asarray(self.turb_entr_H)[:,:] = state[prefix + 'turb_entr_H']
+        np.asarray(self.turb_entr_QT)[:,:] = state[prefix + 'turb_entr_QT']
+        np.asarray(self.nh_pressure)[:,:] = state[prefix + 'nh_pressure']
+        np.asarray(self.nh_pressure_b)[:,:] = state[prefix + 'nh_pressure_b']
+        np.asarray(self.nh_pressure_adv)[:,:] = state[prefix + 'nh_pressure_adv']
+        np.asarray(self.nh_pressure_drag)[:,:] = state[prefix + 'nh_pressure_drag']
+        np.asarray(self.asp_ratio)[:,:] = state[prefix + 'asp_ratio']
+        np.asarray(self.b_coeff)[:,:] = state[prefix + 'b_coeff']
+        np.asarray(self.m)[:,:] = state[prefix + 'm']
+        np.asarray(self.horizontal_KM)[:,:] = state[prefix + 'horizontal_KM']
+        np.asarray(self.horizontal_KH)[:,:] = state[prefix + 'horizontal_KH']
+        np.asarray(self.mixing_length)[:] = state[prefix + 'mixing_length']
+        np.asarray(self.tke_transport)[:] = state[prefix + 'tke_transport']
+        np.asarray(self.tke_advection)[:] = state[prefix + 'tke_advection']
+        np.asarray(self.area_surface_bc)[:] = state[prefix + 'area_surface_bc']
+        np.asarray(self.w_surface_bc)[:] = state[prefix + 'w_surface_bc']
+        np.asarray(self.h_surface_bc)[:] = state[prefix + 'h_surface_bc']
+        np.asarray(self.qt_surface_bc)[:] = state[prefix + 'qt_surface_bc']
+        np.asarray(self.pressure_plume_spacing)[:] = state[prefix + 'pressure_plume_spacing']
+        np.asarray(self.massflux_tendency_h)[:] = state[prefix + 'massflux_tendency_h']
+        np.asarray(self.massflux_tendency_qt)[:] = state[prefix + 'massflux_tendency_qt']
+        np.asarray(self.diffusive_tendency_h)[:] = state[prefix + 'diffusive_tendency_h']
+        np.asarray(self.diffusive_tendency_qt)[:] = state[prefix + 'diffusive_tendency_qt']
+        np.asarray(self.massflux_h)[:] = state[prefix + 'massflux_h']
+        np.asarray(self.massflux_qt)[:] = state[prefix + 'massflux_qt']
+        np.asarray(self.diffusive_flux_h)[:] = state[prefix + 'diffusive_flux_h']
+        np.asarray(self.diffusive_flux_qt)[:] = state[prefix + 'diffusive_flux_qt']
+        np.asarray(self.diffusive_flux_u)[:] = state[prefix + 'diffusive_flux_u']
+        np.asarray(self.diffusive_flux_v)[:] = state[prefix + 'diffusive_flux_v']
+        np.asarray(self.prandtl_nvec)[:] = state[prefix + 'prandtl_nvec']
+        np.asarray(self.mls)[:] = state[prefix + 'mls']
+        np.asarray(self.ml_ratio)[:] = state[prefix + 'ml_ratio']
+        np.asarray(self.l_entdet)[:] = state[prefix + 'l_entdet']
+        np.asarray(self.b)[:] = state[prefix + 'b']
+        if self.calc_tke:
+            np.asarray(self.massflux_tke)[:] = state[prefix + 'massflux_tke']
+        self.dt_upd = state[prefix + 'dt_upd']
+        self.entr_surface_bc = state[prefix + 'entr_surface_bc']
+        self.detr_surface_bc = state[prefix + 'detr_surface_bc']
         return
 
     # Initialize the IO pertaining to this class
@@ -291,6 +465,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
         self.UpdVar.initialize_io(Stats)
         self.EnvVar.initialize_io(Stats)
+        self.EnvThermo.initialize_io(Stats)
         self.Rain.initialize_io(Stats)
 
         Stats.add_profile('eddy_viscosity')
@@ -309,6 +484,10 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         Stats.add_profile('sorting_function')
         Stats.add_profile('b_mix')
         Stats.add_ts('rd')
+        Stats.add_ts('updraft_substeps')
+        Stats.add_ts('updraft_courant')
+        Stats.add_ts('updraft_solve_time')
+        Stats.add_ts('workspace_allocations')
         Stats.add_profile('turbulent_entrainment')
         Stats.add_profile('turbulent_entrainment_full')
         Stats.add_profile('turbulent_entrainment_W')
@@ -372,82 +551,135 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             Py_ssize_t k, i
             Py_ssize_t kmin = self.Gr.gw
             Py_ssize_t kmax = self.Gr.nzg-self.Gr.gw
-            double [:] mean_entr_sc = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_nh_pressure = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_nh_pressure_adv = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_nh_pressure_drag = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_nh_pressure_b = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_asp_ratio = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_b_coeff = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-
-            double [:] mean_detr_sc = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] massflux = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mf_h = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mf_qt = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_frac_turb_entr = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_frac_turb_entr_full = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_turb_entr_W = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_turb_entr_H = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_turb_entr_QT = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_horizontal_KM = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_horizontal_KH = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_sorting_function = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
-            double [:] mean_b_mix = np.zeros((self.Gr.nzg,), dtype=np.double, order='c')
+            Py_ssize_t work_mark
+            double [:] mean_entr_sc
+            double [:] mean_nh_pressure
+            double [:] mean_nh_pressure_adv
+            double [:] mean_nh_pressure_drag
+            double [:] mean_nh_pressure_b
+            double [:] mean_asp_ratio
+            double [:] mean_b_coeff
+
+            double [:] mean_detr_sc
+            double [:] massflux
+            double [:] mf_h
+            double [:] mf_qt
+            double [:] mean_frac_turb_entr
+            double [:] mean_frac_turb_entr_full
+            double [:] mean_turb_entr_W
+            double [:] mean_turb_entr_H
+            double [:] mean_turb_entr_QT
+            double [:] mean_horizontal_KM
+            double [:] mean_horizontal_KH
+            double [:] mean_sorting_function
+            double [:] mean_b_mix
+            bint write_upd_means = False
 
         self.UpdVar.io(Stats, self.Ref)
         self.EnvVar.io(Stats, self.Ref)
+        self.EnvThermo.io(Stats)
         self.Rain.io(Stats, self.Ref, self.UpdThermo, self.EnvThermo, TS)
 
         Stats.write_profile('eddy_viscosity', self.KM.values[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_profile('eddy_diffusivity', self.KH.values[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_ts('rd', np.mean(self.pressure_plume_spacing))
-        with nogil:
-            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                mf_h[k] = interp2pt(self.massflux_h[k], self.massflux_h[k-1])
-                mf_qt[k] = interp2pt(self.massflux_qt[k], self.massflux_qt[k-1])
-                if self.UpdVar.Area.bulkvalues[k] > 0.0:
-                    for i in xrange(self.n_updrafts):
-                        massflux[k] += interp2pt(self.m[i,k], self.m[i,k-1])
-                        mean_entr_sc[k] += self.UpdVar.Area.values[i,k] * self.entr_sc[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_detr_sc[k] += self.UpdVar.Area.values[i,k] * self.detr_sc[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_nh_pressure[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_nh_pressure_b[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure_b[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_nh_pressure_adv[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure_adv[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_nh_pressure_drag[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure_drag[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_asp_ratio[k] += self.UpdVar.Area.values[i,k] * self.asp_ratio[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_b_coeff[k] += self.UpdVar.Area.values[i,k] * self.b_coeff[i,k]/self.UpdVar.Area.bulkvalues[k]
-
-                        mean_frac_turb_entr_full[k] += self.UpdVar.Area.values[i,k] * self.frac_turb_entr_full[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_frac_turb_entr[k] += self.UpdVar.Area.values[i,k] * self.frac_turb_entr[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_turb_entr_W[k] += self.UpdVar.Area.values[i,k] * self.turb_entr_W[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_turb_entr_H[k] += self.UpdVar.Area.values[i,k] * self.turb_entr_H[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_turb_entr_QT[k] += self.UpdVar.Area.values[i,k] * self.turb_entr_QT[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_horizontal_KM[k] += self.UpdVar.Area.values[i,k] * self.horizontal_KM[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_horizontal_KH[k] += self.UpdVar.Area.values[i,k] * self.horizontal_KH[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_sorting_function[k] += self.UpdVar.Area.values[i,k] * self.sorting_function[i,k]/self.UpdVar.Area.bulkvalues[k]
-                        mean_b_mix[k] += self.UpdVar.Area.values[i,k] * self.b_mix[i,k]/self.UpdVar.Area.bulkvalues[k]
-
-        Stats.write_profile('turbulent_entrainment', mean_frac_turb_entr[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('turbulent_entrainment_full', mean_frac_turb_entr_full[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('turbulent_entrainment_W', mean_turb_entr_W[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('turbulent_entrainment_H', mean_turb_entr_H[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('turbulent_entrainment_QT', mean_turb_entr_QT[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('horizontal_KM', mean_horizontal_KM[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('horizontal_KH', mean_horizontal_KH[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('entrainment_sc', mean_entr_sc[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('detrainment_sc', mean_detr_sc[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('sorting_function', mean_sorting_function[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('b_mix', mean_b_mix[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('nh_pressure', mean_nh_pressure[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('nh_pressure_adv', mean_nh_pressure_adv[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('nh_pressure_drag', mean_nh_pressure_drag[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('nh_pressure_b', mean_nh_pressure_b[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('asp_ratio', mean_asp_ratio[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('b_coeff', mean_b_coeff[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-
-        Stats.write_profile('massflux', massflux[self.Gr.gw:self.Gr.nzg-self.Gr.gw ])
-        Stats.write_profile('massflux_h', mf_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('massflux_qt', mf_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+        Stats.write_ts('updraft_substeps', self.updraft_substeps)
+        Stats.write_ts('updraft_courant', self.updraft_courant)
+        # mean wall-clock time of compute_prognostic_updrafts since the last output
+        Stats.write_ts('updraft_solve_time', self.updraft_solve_time/max(self.updraft_solve_calls, 1))
+        self.updraft_solve_time = 0.0
+        self.updraft_solve_calls = 0
+        Stats.write_ts('workspace_allocations', self.Work.allocations/float(max(self.update_calls, 1)))
+        self.Work.allocations = 0
+        self.update_calls = 0
+
+        # the updraft means below are only computed if the output manifest asks for one of them
+        for var_name in ['turbulent_entrainment', 'turbulent_entrainment_full', 'turbulent_entrainment_W',
+                         'turbulent_entrainment_H', 'turbulent_entrainment_QT', 'horizontal_KM', 'horizontal_KH',
+                         'entrainment_sc', 'detrainment_sc', 'sorting_function', 'b_mix', 'nh_pressure',
+                         'nh_pressure_adv', 'nh_pressure_drag', 'nh_pressure_b', 'asp_ratio', 'b_coeff',
+                         'massflux', 'massflux_h', 'massflux_qt', 'total_flux_h', 'total_flux_qt']:
+            if Stats.registered(var_name):
+                write_upd_means = True
+                break
+
+        if write_upd_means:
+            work_mark = self.Work.mark()
+            mean_entr_sc = self.Work.borrow()
+            mean_nh_pressure = self.Work.borrow()
+            mean_nh_pressure_adv = self.Work.borrow()
+            mean_nh_pressure_drag = self.Work.borrow()
+            mean_nh_pressure_b = self.Work.borrow()
+            mean_asp_ratio = self.Work.borrow()
+            mean_b_coeff = self.Work.borrow()
+
+            mean_detr_sc = self.Work.borrow()
+            massflux = self.Work.borrow()
+            mf_h = self.Work.borrow()
+            mf_qt = self.Work.borrow()
+            mean_frac_turb_entr = self.Work.borrow()
+            mean_frac_turb_entr_full = self.Work.borrow()
+            mean_turb_entr_W = self.Work.borrow()
+            mean_turb_entr_H = self.Work.borrow()
+            mean_turb_entr_QT = self.Work.borrow()
+            mean_horizontal_KM = self.Work.borrow()
+            mean_horizontal_KH = self.Work.borrow()
+            mean_sorting_function = self.Work.borrow()
+            mean_b_mix = self.Work.borrow()
+
+            with nogil:
+                for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
+                    mf_h[k] = interp2pt(self.massflux_h[k], self.massflux_h[k-1])
+                    mf_qt[k] = interp2pt(self.massflux_qt[k], self.massflux_qt[k-1])
+                    if self.UpdVar.Area.bulkvalues[k] > 0.0:
+                        for i in xrange(self.n_updrafts):
+                            massflux[k] += interp2pt(self.m[i,k], self.m[i,k-1])
+                            mean_entr_sc[k] += self.UpdVar.Area.values[i,k] * self.entr_sc[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_detr_sc[k] += self.UpdVar.Area.values[i,k] * self.detr_sc[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_nh_pressure[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_nh_pressure_b[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure_b[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_nh_pressure_adv[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure_adv[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_nh_pressure_drag[k] += self.UpdVar.Area.values[i,k] * self.nh_pressure_drag[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_asp_ratio[k] += self.UpdVar.Area.values[i,k] * self.asp_ratio[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_b_coeff[k] += self.UpdVar.Area.values[i,k] * self.b_coeff[i,k]/self.UpdVar.Area.bulkvalues[k]
+
+                            mean_frac_turb_entr_full[k] += self.UpdVar.Area.values[i,k] * self.frac_turb_entr_full[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_frac_turb_entr[k] += self.UpdVar.Area.values[i,k] * self.frac_turb_entr[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_turb_entr_W[k] += self.UpdVar.Area.values[i,k] * self.turb_entr_W[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_turb_entr_H[k] += self.UpdVar.Area.values[i,k] * self.turb_entr_H[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_turb_entr_QT[k] += self.UpdVar.Area.values[i,k] * self.turb_entr_QT[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_horizontal_KM[k] += self.UpdVar.Area.values[i,k] * self.horizontal_KM[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_horizontal_KH[k] += self.UpdVar.Area.values[i,k] * self.horizontal_KH[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_sorting_function[k] += self.UpdVar.Area.values[i,k] * self.sorting_function[i,k]/self.UpdVar.Area.bulkvalues[k]
+                            mean_b_mix[k] += self.UpdVar.Area.values[i,k] * self.b_mix[i,k]/self.UpdVar.Area.bulkvalues[k]
+
+            Stats.write_profile('turbulent_entrainment', mean_frac_turb_entr[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('turbulent_entrainment_full', mean_frac_turb_entr_full[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('turbulent_entrainment_W', mean_turb_entr_W[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('turbulent_entrainment_H', mean_turb_entr_H[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('turbulent_entrainment_QT', mean_turb_entr_QT[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('horizontal_KM', mean_horizontal_KM[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('horizontal_KH', mean_horizontal_KH[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('entrainment_sc', mean_entr_sc[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('detrainment_sc', mean_detr_sc[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('sorting_function', mean_sorting_function[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('b_mix', mean_b_mix[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('nh_pressure', mean_nh_pressure[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('nh_pressure_adv', mean_nh_pressure_adv[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('nh_pressure_drag', mean_nh_pressure_drag[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('nh_pressure_b', mean_nh_pressure_b[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('asp_ratio', mean_asp_ratio[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('b_coeff', mean_b_coeff[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+
+            Stats.write_profile('massflux', massflux[self.Gr.gw:self.Gr.nzg-self.Gr.gw ])
+            Stats.write_profile('massflux_h', mf_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('massflux_qt', mf_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
+            Stats.write_profile('total_flux_h', np.add(mf_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw],
+                                                       self.diffusive_flux_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw]))
+            Stats.write_profile('total_flux_qt', np.add(mf_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw],
+                                                        self.diffusive_flux_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw]))
+            self.Work.release(work_mark)
+
         Stats.write_profile('massflux_tendency_h', self.massflux_tendency_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_profile('massflux_tendency_qt', self.massflux_tendency_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_profile('diffusive_flux_h', self.diffusive_flux_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
@@ -456,10 +688,6 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         Stats.write_profile('diffusive_flux_v', self.diffusive_flux_v[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_profile('diffusive_tendency_h', self.diffusive_tendency_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
         Stats.write_profile('diffusive_tendency_qt', self.diffusive_tendency_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw])
-        Stats.write_profile('total_flux_h', np.add(mf_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw],
-                                                   self.diffusive_flux_h[self.Gr.gw:self.Gr.nzg-self.Gr.gw]))
-        Stats.write_profile('total_flux_qt', np.add(mf_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw],
-                                                    self.diffusive_flux_qt[self.Gr.gw:self.Gr.nzg-self.Gr.gw]))
         Stats.write_profile('mixing_length', self.mixing_length[kmin:kmax])
         Stats.write_profile('updraft_qt_precip', self.UpdThermo.prec_source_qt_tot[kmin:kmax])
         Stats.write_profile('updraft_thetal_precip', self.UpdThermo.prec_source_h_tot[kmin:kmax])
@@ -469,34 +697,45 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         Stats.write_profile('mixing_length_ratio', self.ml_ratio[kmin:kmax])
         Stats.write_profile('entdet_balance_length', self.l_entdet[kmin:kmax])
         Stats.write_profile('interdomain_tke_t', self.b[kmin:kmax])
+        # budget terms that are only diagnosed for output
         if self.calc_tke:
-            self.compute_covariance_dissipation(self.EnvVar.TKE)
-            Stats.write_profile('tke_dissipation', self.EnvVar.TKE.dissipation[kmin:kmax])
+            if Stats.registered('tke_dissipation'):
+                self.compute_covariance_dissipation(self.EnvVar.TKE)
+                Stats.write_profile('tke_dissipation', self.EnvVar.TKE.dissipation[kmin:kmax])
             Stats.write_profile('tke_entr_gain', self.EnvVar.TKE.entr_gain[kmin:kmax])
-            self.compute_covariance_detr(self.EnvVar.TKE)
-            Stats.write_profile('tke_detr_loss', self.EnvVar.TKE.detr_loss[kmin:kmax])
+            if Stats.registered('tke_detr_loss'):
+                self.compute_covariance_detr(self.EnvVar.TKE)
+                Stats.write_profile('tke_detr_loss', self.EnvVar.TKE.detr_loss[kmin:kmax])
             Stats.write_profile('tke_shear', self.EnvVar.TKE.shear[kmin:kmax])
             Stats.write_profile('tke_buoy', self.EnvVar.TKE.buoy[kmin:kmax])
             Stats.write_profile('tke_pressure', self.EnvVar.TKE.press[kmin:kmax])
             Stats.write_profile('tke_interdomain', self.EnvVar.TKE.interdomain[kmin:kmax])
-            self.compute_tke_transport()
-            Stats.write_profile('tke_transport', self.tke_transport[kmin:kmax])
-            self.compute_tke_advection()
-            Stats.write_profile('tke_advection', self.tke_advection[kmin:kmax])
+            if Stats.registered('tke_transport'):
+                self.compute_tke_transport()
+                Stats.write_profile('tke_transport', self.tke_transport[kmin:kmax])
+            if Stats.registered('tke_advection'):
+                self.compute_tke_advection()
+                Stats.write_profile('tke_advection', self.tke_advection[kmin:kmax])
 
         if self.calc_scalar_var:
-            self.compute_covariance_dissipation(self.EnvVar.Hvar)
-            Stats.write_profile('Hvar_dissipation', self.EnvVar.Hvar.dissipation[kmin:kmax])
-            self.compute_covariance_dissipation(self.EnvVar.QTvar)
-            Stats.write_profile('QTvar_dissipation', self.EnvVar.QTvar.dissipation[kmin:kmax])
-            self.compute_covariance_dissipation(self.EnvVar.HQTcov)
-            Stats.write_profile('HQTcov_dissipation', self.EnvVar.HQTcov.dissipation[kmin:kmax])
+            if Stats.registered('Hvar_dissipation'):
+                self.compute_covariance_dissipation(self.EnvVar.Hvar)
+                Stats.write_profile('Hvar_dissipation', self.EnvVar.Hvar.dissipation[kmin:kmax])
+            if Stats.registered('QTvar_dissipation'):
+                self.compute_covariance_dissipation(self.EnvVar.QTvar)
+                Stats.write_profile('QTvar_dissipation', self.EnvVar.QTvar.dissipation[kmin:kmax])
+            if Stats.registered('HQTcov_dissipation'):
+                self.compute_covariance_dissipation(self.EnvVar.HQTcov)
+                Stats.write_profile('HQTcov_dissipation', self.EnvVar.HQTcov.dissipation[kmin:kmax])
             Stats.write_profile('Hvar_entr_gain', self.EnvVar.Hvar.entr_gain[kmin:kmax])
             Stats.write_profile('QTvar_entr_gain', self.EnvVar.QTvar.entr_gain[kmin:kmax])
             Stats.write_profile('HQTcov_entr_gain', self.EnvVar.HQTcov.entr_gain[kmin:kmax])
-            self.compute_covariance_detr(self.EnvVar.Hvar)
-            self.compute_covariance_detr(self.EnvVar.QTvar)
-            self.compute_covariance_detr(self.EnvVar.HQTcov)
+            if Stats.registered('Hvar_detr_loss'):
+                self.compute_covariance_detr(self.EnvVar.Hvar)
+            if Stats.registered('QTvar_detr_loss'):
+                self.compute_covariance_detr(self.EnvVar.QTvar)
+            if Stats.registered('HQTcov_detr_loss'):
+                self.compute_covariance_detr(self.EnvVar.HQTcov)
             Stats.write_profile('Hvar_detr_loss', self.EnvVar.Hvar.detr_loss[kmin:kmax])
             Stats.write_profile('QTvar_detr_loss', self.EnvVar.QTvar.detr_loss[kmin:kmax])
             Stats.write_profile('HQTcov_detr_loss', self.EnvVar.HQTcov.detr_loss[kmin:kmax])
@@ -518,11 +757,12 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             Py_ssize_t kmin = self.Gr.gw
             Py_ssize_t kmax = self.Gr.nzg - self.Gr.gw
 
+        self.update_calls += 1
         self.update_inversion(GMV, Case.inversion_option)
         self.compute_pressure_plume_spacing(GMV, Case)
         self.wstar = get_wstar(Case.Sur.bflux, self.zi)
         if TS.nstep == 0:
-            self.decompose_environment(GMV, 'values')
+            self.decompose_environment(GMV, decompose_values)
 
             if Case.casename == 'DryBubble':
                 self.EnvThermo.saturation_adjustment(self.EnvVar)
@@ -540,7 +780,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                         self.EnvVar.QTvar.values[k] = GMV.QTvar.values[k]
                         self.EnvVar.HQTcov.values[k] = GMV.HQTcov.values[k]
 
-        self.decompose_environment(GMV, 'values')
+        self.decompose_environment(GMV, decompose_values)
         if self.use_steady_updrafts:
             self.compute_diagnostic_updrafts(GMV, Case)
         else:
@@ -548,7 +788,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
         # TODO -maybe not needed? - both diagnostic and prognostic updrafts end with decompose_environment
         # But in general ok here without thermodynamics because MF doesnt depend directly on buoyancy
-        self.decompose_environment(GMV, 'values')
+        self.decompose_environment(GMV, decompose_values)
         self.update_GMV_MF(GMV, TS)
         # (###)
         # decompose_environment +  EnvThermo.saturation_adjustment + UpdThermo.buoyancy should always be used together
@@ -557,7 +797,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         #   - the buoyancy of updrafts and environment is updated such that
         #     the mean buoyancy with repect to reference state alpha_0 is zero.
 
-        self.decompose_environment(GMV, 'mf_update')
+        self.decompose_environment(GMV, decompose_mf_update)
         self.EnvThermo.microphysics(self.EnvVar, self.Rain, TS.dt) # saturation adjustment + rain creation
         # Sink of environmental QT and H due to rain creation is applied in tridiagonal solver
         self.UpdThermo.buoyancy(self.UpdVar, self.EnvVar, GMV, self.extrapolate_buoyancy)
@@ -599,40 +839,118 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         cdef:
             Py_ssize_t iter_
             double time_elapsed = 0.0
+            # levels the updraft top can advance per sub-step, any number with the implicit solver
+            Py_ssize_t window_margin = self.Gr.nzg if self.implicit_updrafts or not self.active_window else 1
+            double wall_start = time.time()
 
         self.set_subdomain_bcs()
         self.UpdVar.set_new_with_values()
         self.UpdVar.set_old_with_values()
 
         self.set_updraft_surface_bc(GMV, Case)
-        self.dt_upd = np.minimum(TS.dt, 0.5 * self.Gr.dz/fmax(np.max(self.UpdVar.W.values),1e-10))
-
+        self.UpdVar.update_active_window(window_margin)
         self.UpdThermo.clear_precip_sources()
 
+        if self.fused_updraft_substeps:
+            with nogil:
+                self.solve_updraft_substeps(GMV, Case, TS.dt, window_margin)
+            self.UpdThermo.update_total_precip_sources()
+            self.updraft_solve_time += time.time() - wall_start
+            self.updraft_solve_calls += 1
+            return
+
+        if self.implicit_updrafts:
+            self.dt_upd = TS.dt
+        else:
+            self.dt_upd = np.minimum(TS.dt, 0.5 * self.Gr.dz/fmax(np.max(self.UpdVar.W.values),1e-10))
+
+        self.updraft_substeps = 0
+        self.updraft_courant = 0.0
+
         while time_elapsed < TS.dt:
-            self.compute_entrainment_detrainment(GMV, Case)
-            if self.turbulent_entrainment_factor > 1.0e-6:
-                self.compute_horizontal_eddy_diffusivities(GMV)
-                self.compute_turbulent_entrainment(GMV,Case)
-            self.compute_nh_pressure()
-            self.solve_updraft_velocity_area()
-            self.solve_updraft_scalars(GMV)
-            self.UpdThermo.microphysics(self.UpdVar, self.Rain, TS.dt) # causes division error in dry bubble first time step
+            self.updraft_substeps += 1
+            self.updraft_courant = fmax(self.updraft_courant, np.max(self.UpdVar.W.values) * self.dt_upd * self.Gr.dzi)
+            with nogil:
+                self.compute_entrainment_detrainment(GMV, Case)
+                if self.turbulent_entrainment_factor > 1.0e-6:
+                    self.compute_horizontal_eddy_diffusivities(GMV)
+                    self.compute_turbulent_entrainment(GMV,Case)
+                self.compute_nh_pressure()
+                if self.implicit_updrafts:
+                    self.solve_updraft_velocity_area_implicit()
+                    self.solve_updraft_scalars_implicit(GMV)
+                else:
+                    self.solve_updraft_velocity_area()
+                    self.solve_updraft_scalars(GMV)
+                self.UpdThermo.microphysics(self.UpdVar, self.Rain, TS.dt) # causes division error in dry bubble first time step
 
             self.UpdVar.set_values_with_new()
             self.zero_area_fraction_cleanup(GMV)
+            self.UpdVar.update_active_window(window_margin)
             time_elapsed += self.dt_upd
-            self.dt_upd = np.minimum(TS.dt-time_elapsed,  0.5 * self.Gr.dz/fmax(np.max(self.UpdVar.W.values),1e-10))
+            if self.implicit_updrafts:
+                self.dt_upd = TS.dt-time_elapsed
+            else:
+                self.dt_upd = np.minimum(TS.dt-time_elapsed,  0.5 * self.Gr.dz/fmax(np.max(self.UpdVar.W.values),1e-10))
             # (####)
             # TODO - see comment (###)
             # It would be better to have a simple linear rule for updating environment here
             # instead of calling EnvThermo saturation adjustment scheme for every updraft.
-            self.decompose_environment(GMV, 'values')
+            self.decompose_environment(GMV, decompose_values)
             self.EnvThermo.saturation_adjustment(self.EnvVar)
             self.UpdThermo.buoyancy(self.UpdVar, self.EnvVar, GMV, self.extrapolate_buoyancy)
             self.set_subdomain_bcs()
 
         self.UpdThermo.update_total_precip_sources()
+        self.updraft_solve_time += time.time() - wall_start
+        self.updraft_solve_calls += 1
+        return
+
+    # The sub-step loop of compute_prognostic_updrafts, with the same sequence of calls
+    # but without going through Python between them
+    cdef void solve_updraft_substeps(self, GridMeanVariables GMV, CasesBase Case, double dt,
+                                     Py_ssize_t window_margin) nogil:
+        cdef:
+            double time_elapsed = 0.0
+
+        if self.implicit_updrafts:
+            self.dt_upd = dt
+        else:
+            self.dt_upd = fmin(dt, 0.5 * self.Gr.dz/fmax(self.UpdVar.W.max_value(),1e-10))
+
+        self.updraft_substeps = 0
+        self.updraft_courant = 0.0
+
+        while time_elapsed < dt:
+            self.updraft_substeps += 1
+            self.updraft_courant = fmax(self.updraft_courant, self.UpdVar.W.max_value() * self.dt_upd * self.Gr.dzi)
+            self.compute_entrainment_detrainment(GMV, Case)
+            if self.turbulent_entrainment_factor > 1.0e-6:
+                self.compute_horizontal_eddy_diffusivities(GMV)
+                self.compute_turbulent_entrainment(GMV,Case)
+            self.compute_nh_pressure()
+            if self.implicit_updrafts:
+                self.solve_updraft_velocity_area_implicit()
+                self.solve_updraft_scalars_implicit(GMV)
+            else:
+                self.solve_updraft_velocity_area()
+                self.solve_updraft_scalars(GMV)
+            self.UpdThermo.microphysics(self.UpdVar, self.Rain, dt)
+
+            self.UpdVar.set_values_with_new()
+            self.zero_area_fraction_cleanup(GMV)
+            self.UpdVar.update_active_window(window_margin)
+            time_elapsed += self.dt_upd
+            if self.implicit_updrafts:
+                self.dt_upd = dt-time_elapsed
+            else:
+                self.dt_upd = fmin(dt-time_elapsed,  0.5 * self.Gr.dz/fmax(self.UpdVar.W.max_value(),1e-10))
+            # TODO - see comment (####)
+            self.decompose_environment(GMV, decompose_values)
+            self.EnvThermo.saturation_adjustment(self.EnvVar)
+            self.UpdThermo.buoyancy(self.UpdVar, self.EnvVar, GMV, self.extrapolate_buoyancy)
+            self.set_subdomain_bcs()
+
         return
 
     cpdef compute_diagnostic_updrafts(self, GridMeanVariables GMV, CasesBase Case):
@@ -643,13 +961,12 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             double dzi = self.Gr.dzi
             eos_struct sa
             mph_struct mph
-            entr_struct ret
-            entr_in_struct input
             double a,b,c, w, w_km,  w_mid, w_low, denom, arg
             double entr_w, detr_w, B_k, area_k, w2
 
         self.set_updraft_surface_bc(GMV, Case)
-        self.compute_entrainment_detrainment(GMV, Case)
+        with nogil:
+            self.compute_entrainment_detrainment(GMV, Case)
 
         with nogil:
             for i in xrange(self.n_updrafts):
@@ -683,7 +1000,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         self.UpdVar.H.set_bcs(self.Gr)
 
         # TODO - see comment (####)
-        self.decompose_environment(GMV, 'values')
+        self.decompose_environment(GMV, decompose_values)
         self.EnvThermo.saturation_adjustment(self.EnvVar)
         self.UpdThermo.buoyancy(self.UpdVar, self.EnvVar, GMV, self.extrapolate_buoyancy)
 
@@ -746,7 +1063,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                         self.UpdVar.T.values[i,k] = sa.T
 
         # TODO - see comment (####)
-        self.decompose_environment(GMV, 'values')
+        self.decompose_environment(GMV, decompose_values)
         self.EnvThermo.saturation_adjustment(self.EnvVar)
         self.UpdThermo.buoyancy(self.UpdVar, self.EnvVar, GMV, self.extrapolate_buoyancy)
 
@@ -761,7 +1078,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
     cpdef compute_mixing_length(self, double obukhov_length, double ustar, GridMeanVariables GMV):
 
         cdef:
-            Py_ssize_t k
+            Py_ssize_t k, j, nn, jmin
             Py_ssize_t gw = self.Gr.gw
             double tau =  get_mixing_tau(self.zi, self.wstar)
             double l1, l2, l3, z_, N
@@ -771,217 +1088,217 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             double lh, cpm, prefactor, d_buoy_thetal_dry, d_buoy_qt_dry
             double d_buoy_thetal_cloudy, d_buoy_qt_cloudy, d_buoy_thetal_total, d_buoy_qt_total
             double grad_thl_plus=0.0, grad_qt_plus=0.0, grad_thv_plus=0.0
-            double thv, grad_qt, grad_qt_low, grad_thv_low, grad_thv
+            double thv, grad_thl, grad_thl_low, grad_qt, grad_qt_low, grad_thv_low, grad_thv, grad_th_eff
             double grad_b_thl, grad_b_qt
             double m_eps = 1.0e-9 # Epsilon to avoid zero
             double a, c_neg, wc_upd_nn, wc_env, frac_turb_entr_half
 
 
         if (self.mixing_scheme == 'sbl'):
-            for k in xrange(gw, self.Gr.nzg-gw):
-                z_ = self.Gr.z_half[k]
-                # kz scale (surface layer)
-                if obukhov_length < 0.0: #unstable
-                    l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff) * fmin(
-                     (1.0 - 100.0 * z_/obukhov_length)**0.2, 1.0/vkb )
-                else: # neutral or stable
-                    l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff)
-
-                # Shear-dissipation TKE equilibrium scale (Stable)
-                shear2 = pow((GMV.U.values[k+1] - GMV.U.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
-                    pow((GMV.V.values[k+1] - GMV.V.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
-                    pow((self.EnvVar.W.values[k] - self.EnvVar.W.values[k-1]) * self.Gr.dzi, 2)
-
-                qt_dry = self.EnvThermo.qt_dry[k]
-                th_dry = self.EnvThermo.th_dry[k]
-                t_cloudy = self.EnvThermo.t_cloudy[k]
-                qv_cloudy = self.EnvThermo.qv_cloudy[k]
-                qt_cloudy = self.EnvThermo.qt_cloudy[k]
-                th_cloudy = self.EnvThermo.th_cloudy[k]
-                lh = latent_heat(t_cloudy)
-                cpm = cpm_c(qt_cloudy)
-                grad_thl_low = grad_thl_plus
-                grad_qt_low = grad_qt_plus
-                grad_thl_plus = (self.EnvVar.THL.values[k+1] - self.EnvVar.THL.values[k]) * self.Gr.dzi
-                grad_qt_plus  = (self.EnvVar.QT.values[k+1]  - self.EnvVar.QT.values[k])  * self.Gr.dzi
-                grad_thl = interp2pt(grad_thl_low, grad_thl_plus)
-                grad_qt = interp2pt(grad_qt_low, grad_qt_plus)
-                # g/theta_ref
-                prefactor = g * ( Rd / self.Ref.alpha0_half[k] /self.Ref.p0_half[k]) * exner_c(self.Ref.p0_half[k])
-
-                d_buoy_thetal_dry = prefactor * (1.0 + (eps_vi-1.0) * qt_dry)
-                d_buoy_qt_dry = prefactor * th_dry * (eps_vi-1.0)
-
-                if self.EnvVar.cloud_fraction.values[k] > 0.0:
-                    d_buoy_thetal_cloudy = (prefactor * (1.0 + eps_vi * (1.0 + lh / Rv / t_cloudy) * qv_cloudy - qt_cloudy )
-                                             / (1.0 + lh * lh / cpm / Rv / t_cloudy / t_cloudy * qv_cloudy))
-                    d_buoy_qt_cloudy = (lh / cpm / t_cloudy * d_buoy_thetal_cloudy - prefactor) * th_cloudy
-                else:
-                    d_buoy_thetal_cloudy = 0.0
-                    d_buoy_qt_cloudy = 0.0
-
-                d_buoy_thetal_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_thetal_cloudy
-                                        + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_thetal_dry)
-                d_buoy_qt_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_qt_cloudy
-                                    + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_qt_dry)
-
-                # Partial buoyancy gradients
-                grad_b_thl  = grad_thl * d_buoy_thetal_total
-                grad_b_qt = grad_qt  * d_buoy_qt_total
-                ri_grad = fmin( grad_b_thl/fmax(shear2, m_eps) + grad_b_qt/fmax(shear2, m_eps) , 0.25)
-
-                # Turbulent Prandtl number:
-                if obukhov_length > 0.0 and ri_grad>0.0: #stable
-                    # CSB (Dan Li, 2019), with Pr_neutral=0.74 and w1=40.0/13.0
-                    self.prandtl_nvec[k] = self.prandtl_number*( 2.0*ri_grad/
-                        (1.0+(53.0/13.0)*ri_grad -sqrt( (1.0+(53.0/13.0)*ri_grad)**2.0 - 4.0*ri_grad ) ) )
-                else:
-                    self.prandtl_nvec[k] = self.prandtl_number
-
-                l3 = sqrt(self.tke_diss_coeff/fmax(self.tke_ed_coeff, m_eps)) * sqrt(self.EnvVar.TKE.values[k])
-                l3 /= sqrt(fmax(shear2 - grad_b_thl/self.prandtl_nvec[k] - grad_b_qt/self.prandtl_nvec[k], m_eps))
-                if ( shear2 - grad_b_thl/self.prandtl_nvec[k] - grad_b_qt/self.prandtl_nvec[k] < m_eps):
-                    l3 = 1.0e6
-
-                # Limiting stratification scale (Deardorff, 1976)
-                thv = theta_virt_c(self.Ref.p0_half[k], self.EnvVar.T.values[k], self.EnvVar.QT.values[k],
-                    self.EnvVar.QL.values[k])
-                grad_thv_low = grad_thv_plus
-                grad_thv_plus = ( theta_virt_c(self.Ref.p0_half[k+1], self.EnvVar.T.values[k+1], self.EnvVar.QT.values[k+1],
-                    self.EnvVar.QL.values[k+1])  -  thv) * self.Gr.dzi
-                grad_thv = interp2pt(grad_thv_low, grad_thv_plus)
-
-                N = sqrt(fmax(g/thv*grad_thv, 0.0))
-                if N > 0.0:
-                    l1 = fmin(sqrt(fmax(self.static_stab_coeff*self.EnvVar.TKE.values[k],0.0))/N, 1.0e6)
-                else:
-                    l1 = 1.0e6
+            with nogil:
+                for k in xrange(gw, self.Gr.nzg-gw):
+                    z_ = self.Gr.z_half[k]
+                    # kz scale (surface layer)
+                    if obukhov_length < 0.0: #unstable
+                        l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff) * fmin(
+                         (1.0 - 100.0 * z_/obukhov_length)**0.2, 1.0/vkb )
+                    else: # neutral or stable
+                        l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff)
+
+                    # Shear-dissipation TKE equilibrium scale (Stable)
+                    shear2 = pow((GMV.U.values[k+1] - GMV.U.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
+                        pow((GMV.V.values[k+1] - GMV.V.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
+                        pow((self.EnvVar.W.values[k] - self.EnvVar.W.values[k-1]) * self.Gr.dzi, 2)
+
+                    qt_dry = self.EnvThermo.qt_dry[k]
+                    th_dry = self.EnvThermo.th_dry[k]
+                    t_cloudy = self.EnvThermo.t_cloudy[k]
+                    qv_cloudy = self.EnvThermo.qv_cloudy[k]
+                    qt_cloudy = self.EnvThermo.qt_cloudy[k]
+                    th_cloudy = self.EnvThermo.th_cloudy[k]
+                    lh = latent_heat(t_cloudy)
+                    cpm = cpm_c(qt_cloudy)
+                    grad_thl_low = grad_thl_plus
+                    grad_qt_low = grad_qt_plus
+                    grad_thl_plus = (self.EnvVar.THL.values[k+1] - self.EnvVar.THL.values[k]) * self.Gr.dzi
+                    grad_qt_plus  = (self.EnvVar.QT.values[k+1]  - self.EnvVar.QT.values[k])  * self.Gr.dzi
+                    grad_thl = interp2pt(grad_thl_low, grad_thl_plus)
+                    grad_qt = interp2pt(grad_qt_low, grad_qt_plus)
+                    # g/theta_ref
+                    prefactor = g * ( Rd / self.Ref.alpha0_half[k] /self.Ref.p0_half[k]) * exner_c(self.Ref.p0_half[k])
+
+                    d_buoy_thetal_dry = prefactor * (1.0 + (eps_vi-1.0) * qt_dry)
+                    d_buoy_qt_dry = prefactor * th_dry * (eps_vi-1.0)
+
+                    if self.EnvVar.cloud_fraction.values[k] > 0.0:
+                        d_buoy_thetal_cloudy = (prefactor * (1.0 + eps_vi * (1.0 + lh / Rv / t_cloudy) * qv_cloudy - qt_cloudy )
+                                                 / (1.0 + lh * lh / cpm / Rv / t_cloudy / t_cloudy * qv_cloudy))
+                        d_buoy_qt_cloudy = (lh / cpm / t_cloudy * d_buoy_thetal_cloudy - prefactor) * th_cloudy
+                    else:
+                        d_buoy_thetal_cloudy = 0.0
+                        d_buoy_qt_cloudy = 0.0
+
+                    d_buoy_thetal_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_thetal_cloudy
+                                            + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_thetal_dry)
+                    d_buoy_qt_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_qt_cloudy
+                                        + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_qt_dry)
+
+                    # Partial buoyancy gradients
+                    grad_b_thl  = grad_thl * d_buoy_thetal_total
+                    grad_b_qt = grad_qt  * d_buoy_qt_total
+                    ri_grad = fmin( grad_b_thl/fmax(shear2, m_eps) + grad_b_qt/fmax(shear2, m_eps) , 0.25)
+
+                    # Turbulent Prandtl number:
+                    if obukhov_length > 0.0 and ri_grad>0.0: #stable
+                        # CSB (Dan Li, 2019), with Pr_neutral=0.74 and w1=40.0/13.0
+                        self.prandtl_nvec[k] = self.prandtl_number*( 2.0*ri_grad/
+                            (1.0+(53.0/13.0)*ri_grad -sqrt( (1.0+(53.0/13.0)*ri_grad)**2.0 - 4.0*ri_grad ) ) )
+                    else:
+                        self.prandtl_nvec[k] = self.prandtl_number
+
+                    l3 = sqrt(self.tke_diss_coeff/fmax(self.tke_ed_coeff, m_eps)) * sqrt(self.EnvVar.TKE.values[k])
+                    l3 /= sqrt(fmax(shear2 - grad_b_thl/self.prandtl_nvec[k] - grad_b_qt/self.prandtl_nvec[k], m_eps))
+                    if ( shear2 - grad_b_thl/self.prandtl_nvec[k] - grad_b_qt/self.prandtl_nvec[k] < m_eps):
+                        l3 = 1.0e6
+
+                    # Limiting stratification scale (Deardorff, 1976)
+                    thv = theta_virt_c(self.Ref.p0_half[k], self.EnvVar.T.values[k], self.EnvVar.QT.values[k],
+                        self.EnvVar.QL.values[k])
+                    grad_thv_low = grad_thv_plus
+                    grad_thv_plus = ( theta_virt_c(self.Ref.p0_half[k+1], self.EnvVar.T.values[k+1], self.EnvVar.QT.values[k+1],
+                        self.EnvVar.QL.values[k+1])  -  thv) * self.Gr.dzi
+                    grad_thv = interp2pt(grad_thv_low, grad_thv_plus)
+
+                    N = sqrt(fmax(g/thv*grad_thv, 0.0))
+                    if N > 0.0:
+                        l1 = fmin(sqrt(fmax(self.static_stab_coeff*self.EnvVar.TKE.values[k],0.0))/N, 1.0e6)
+                    else:
+                        l1 = 1.0e6
 
-                l[0]=l1; l[1]=l3; l[2]=l2;
+                    l[0]=l1; l[1]=l3; l[2]=l2;
 
-                j = 0
-                while(j<len(l)):
-                    if l[j]<m_eps or l[j]>1.0e6:
-                        l[j] = 1.0e6
-                    j += 1
-                self.mls[k] = np.argmin(l)
-                self.mixing_length[k] = auto_smooth_minimum(l, 0.1)
-                self.ml_ratio[k] = self.mixing_length[k]/l[int(self.mls[k])]
+                    for j in xrange(3):
+                        if l[j]<m_eps or l[j]>1.0e6:
+                            l[j] = 1.0e6
+                    jmin = argmin_c(l, 3)
+                    self.mls[k] = jmin
+                    self.mixing_length[k] = auto_smooth_minimum_c(l, 3, 0.1)
+                    self.ml_ratio[k] = self.mixing_length[k]/l[jmin]
 
         elif (self.mixing_scheme == 'sbtd_eq'):
-            for k in xrange(gw, self.Gr.nzg-gw):
-                z_ = self.Gr.z_half[k]
-                # kz scale (surface layer)
-                if obukhov_length < 0.0: #unstable
-                    l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff) * fmin(
-                     (1.0 - 100.0 * z_/obukhov_length)**0.2, 1.0/vkb )
-                else: # neutral or stable
-                    l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff)
-
-                # Buoyancy-shear-subdomain exchange-dissipation TKE equilibrium scale
-                shear2 = pow((GMV.U.values[k+1] - GMV.U.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
-                    pow((GMV.V.values[k+1] - GMV.V.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
-                    pow((self.EnvVar.W.values[k] - self.EnvVar.W.values[k-1]) * self.Gr.dzi, 2)
-
-                qt_dry = self.EnvThermo.qt_dry[k]
-                th_dry = self.EnvThermo.th_dry[k]
-                t_cloudy = self.EnvThermo.t_cloudy[k]
-                qv_cloudy = self.EnvThermo.qv_cloudy[k]
-                qt_cloudy = self.EnvThermo.qt_cloudy[k]
-                th_cloudy = self.EnvThermo.th_cloudy[k]
-                lh = latent_heat(t_cloudy)
-                cpm = cpm_c(qt_cloudy)
-                grad_thl_low = grad_thl_plus
-                grad_qt_low = grad_qt_plus
-                grad_thl_plus = (self.EnvVar.THL.values[k+1] - self.EnvVar.THL.values[k]) * self.Gr.dzi
-                grad_qt_plus  = (self.EnvVar.QT.values[k+1]  - self.EnvVar.QT.values[k])  * self.Gr.dzi
-                grad_thl = interp2pt(grad_thl_low, grad_thl_plus)
-                grad_qt = interp2pt(grad_qt_low, grad_qt_plus)
-                # g/theta_ref
-                prefactor = g * ( Rd / self.Ref.alpha0_half[k] /self.Ref.p0_half[k]) * exner_c(self.Ref.p0_half[k])
-
-                d_buoy_thetal_dry = prefactor * (1.0 + (eps_vi-1.0) * qt_dry)
-                d_buoy_qt_dry = prefactor * th_dry * (eps_vi-1.0)
-
-                if self.EnvVar.cloud_fraction.values[k] > 0.0:
-                    d_buoy_thetal_cloudy = (prefactor * (1.0 + eps_vi * (1.0 + lh / Rv / t_cloudy) * qv_cloudy - qt_cloudy )
-                                             / (1.0 + lh * lh / cpm / Rv / t_cloudy / t_cloudy * qv_cloudy))
-                    d_buoy_qt_cloudy = (lh / cpm / t_cloudy * d_buoy_thetal_cloudy - prefactor) * th_cloudy
-                else:
-                    d_buoy_thetal_cloudy = 0.0
-                    d_buoy_qt_cloudy = 0.0
-
-                d_buoy_thetal_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_thetal_cloudy
-                                        + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_thetal_dry)
-                d_buoy_qt_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_qt_cloudy
-                                    + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_qt_dry)
-
-                # Partial buoyancy gradients
-                grad_b_thl = grad_thl * d_buoy_thetal_total
-                grad_b_qt  = grad_qt  * d_buoy_qt_total
-                ri_grad = fmin( grad_b_thl/fmax(shear2, m_eps) + grad_b_qt/fmax(shear2, m_eps) , 0.25)
-
-                # Turbulent Prandtl number:
-                if obukhov_length > 0.0 and ri_grad>0.0: #stable
-                    # CSB (Dan Li, 2019), with Pr_neutral=0.74 and w1=40.0/13.0
-                    self.prandtl_nvec[k] = self.prandtl_number*( 2.0*ri_grad/
-                        (1.0+(53.0/13.0)*ri_grad -sqrt( (1.0+(53.0/13.0)*ri_grad)**2.0 - 4.0*ri_grad ) ) )
-                else:
-                    self.prandtl_nvec[k] = self.prandtl_number
-
-                # Production/destruction terms
-                a = self.tke_ed_coeff*(shear2 - grad_b_thl/self.prandtl_nvec[k] - grad_b_qt/self.prandtl_nvec[k])* sqrt(self.EnvVar.TKE.values[k])
-                # Dissipation term
-                c_neg = self.tke_diss_coeff*self.EnvVar.TKE.values[k]*sqrt(self.EnvVar.TKE.values[k])
-                # Subdomain exchange term
-                self.b[k] = 0.0
-                for nn in xrange(self.n_updrafts):
-                    wc_upd_nn = (self.UpdVar.W.values[nn,k] + self.UpdVar.W.values[nn,k-1])/2.0
-                    wc_env = (self.EnvVar.W.values[k] + self.EnvVar.W.values[k-1])/2.0
-                    frac_turb_entr_half = interp2pt(self.frac_turb_entr_full[nn,k],self.frac_turb_entr_full[nn,k-1])
-                    self.b[k] += self.UpdVar.Area.values[nn,k]*wc_upd_nn*self.detr_sc[nn,k]/(1.0-self.UpdVar.Area.bulkvalues[k])*(
-                        (wc_upd_nn-wc_env)*(wc_upd_nn-wc_env)/2.0-self.EnvVar.TKE.values[k]) - self.UpdVar.Area.values[nn,k]*wc_upd_nn*(
-                        wc_upd_nn-wc_env)*frac_turb_entr_half*wc_env/(1.0-self.UpdVar.Area.bulkvalues[k])
-
-                if abs(a) > m_eps and 4.0*a*c_neg > - self.b[k]*self.b[k]:
-                    self.l_entdet[k] = fmax( -self.b[k]/2.0/a + sqrt( self.b[k]*self.b[k] + 4.0*a*c_neg )/2.0/a, 0.0)
-                elif abs(a) < m_eps and abs(self.b[k]) > m_eps:
-                    self.l_entdet[k] = c_neg/self.b[k]
-
-                l3 = self.l_entdet[k]
-
-                # Limiting stratification scale (Deardorff, 1976)
-                thv = theta_virt_c(self.Ref.p0_half[k], self.EnvVar.T.values[k], self.EnvVar.QT.values[k],
-                    self.EnvVar.QL.values[k])
-                grad_thv_low = grad_thv_plus
-                grad_thv_plus = ( theta_virt_c(self.Ref.p0_half[k+1], self.EnvVar.T.values[k+1], self.EnvVar.QT.values[k+1],
-                    self.EnvVar.QL.values[k+1]) - thv) * self.Gr.dzi
-                grad_thv = interp2pt(grad_thv_low, grad_thv_plus)
-
-                # Effective static stability using environmental mean.
-                # Set lambda for now to environmental cloud_fraction (TBD: Rain)
-                grad_th_eff = (1.0-self.EnvVar.cloud_fraction.values[k])*grad_thv + self.EnvVar.cloud_fraction.values[k]*(
-                    1.0/exp( - latent_heat(self.EnvVar.T.values[k]) * self.EnvVar.QL.values[k]
-                        / cpm_c(self.EnvVar.QT.values[k]) / self.EnvVar.T.values[k] )*(
-                        (1.0+ (eps_vi-1.0)*self.EnvVar.QT.values[k])*grad_thl+(eps_vi-1.0)*self.EnvVar.THL.values[k]*grad_qt))
-
-                N = sqrt(fmax(g/thv*grad_th_eff, 0.0))
-                if N > 0.0:
-                    l1 = fmin(sqrt(fmax(self.static_stab_coeff*self.EnvVar.TKE.values[k],0.0))/N, 1.0e6)
-                else:
-                    l1 = 1.0e6
+            with nogil:
+                for k in xrange(gw, self.Gr.nzg-gw):
+                    z_ = self.Gr.z_half[k]
+                    # kz scale (surface layer)
+                    if obukhov_length < 0.0: #unstable
+                        l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff) * fmin(
+                         (1.0 - 100.0 * z_/obukhov_length)**0.2, 1.0/vkb )
+                    else: # neutral or stable
+                        l2 = vkb * z_ /(sqrt(self.EnvVar.TKE.values[self.Gr.gw]/ustar/ustar)*self.tke_ed_coeff)
+
+                    # Buoyancy-shear-subdomain exchange-dissipation TKE equilibrium scale
+                    shear2 = pow((GMV.U.values[k+1] - GMV.U.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
+                        pow((GMV.V.values[k+1] - GMV.V.values[k-1]) * 0.5 * self.Gr.dzi, 2) + \
+                        pow((self.EnvVar.W.values[k] - self.EnvVar.W.values[k-1]) * self.Gr.dzi, 2)
+
+                    qt_dry = self.EnvThermo.qt_dry[k]
+                    th_dry = self.EnvThermo.th_dry[k]
+                    t_cloudy = self.EnvThermo.t_cloudy[k]
+                    qv_cloudy = self.EnvThermo.qv_cloudy[k]
+                    qt_cloudy = self.EnvThermo.qt_cloudy[k]
+                    th_cloudy = self.EnvThermo.th_cloudy[k]
+                    lh = latent_heat(t_cloudy)
+                    cpm = cpm_c(qt_cloudy)
+                    grad_thl_low = grad_thl_plus
+                    grad_qt_low = grad_qt_plus
+                    grad_thl_plus = (self.EnvVar.THL.values[k+1] - self.EnvVar.THL.values[k]) * self.Gr.dzi
+                    grad_qt_plus  = (self.EnvVar.QT.values[k+1]  - self.EnvVar.QT.values[k])  * self.Gr.dzi
+                    grad_thl = interp2pt(grad_thl_low, grad_thl_plus)
+                    grad_qt = interp2pt(grad_qt_low, grad_qt_plus)
+                    # g/theta_ref
+                    prefactor = g * ( Rd / self.Ref.alpha0_half[k] /self.Ref.p0_half[k]) * exner_c(self.Ref.p0_half[k])
+
+                    d_buoy_thetal_dry = prefactor * (1.0 + (eps_vi-1.0) * qt_dry)
+                    d_buoy_qt_dry = prefactor * th_dry * (eps_vi-1.0)
+
+                    if self.EnvVar.cloud_fraction.values[k] > 0.0:
+                        d_buoy_thetal_cloudy = (prefactor * (1.0 + eps_vi * (1.0 + lh / Rv / t_cloudy) * qv_cloudy - qt_cloudy )
+                                                 / (1.0 + lh * lh / cpm / Rv / t_cloudy / t_cloudy * qv_cloudy))
+                        d_buoy_qt_cloudy = (lh / cpm / t_cloudy * d_buoy_thetal_cloudy - prefactor) * th_cloudy
+                    else:
+                        d_buoy_thetal_cloudy = 0.0
+                        d_buoy_qt_cloudy = 0.0
+
+                    d_buoy_thetal_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_thetal_cloudy
+                                            + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_thetal_dry)
+                    d_buoy_qt_total = (self.EnvVar.cloud_fraction.values[k] * d_buoy_qt_cloudy
+                                        + (1.0-self.EnvVar.cloud_fraction.values[k]) * d_buoy_qt_dry)
+
+                    # Partial buoyancy gradients
+                    grad_b_thl = grad_thl * d_buoy_thetal_total
+                    grad_b_qt  = grad_qt  * d_buoy_qt_total
+                    ri_grad = fmin( grad_b_thl/fmax(shear2, m_eps) + grad_b_qt/fmax(shear2, m_eps) , 0.25)
+
+                    # Turbulent Prandtl number:
+                    if obukhov_length > 0.0 and ri_grad>0.0: #stable
+                        # CSB (Dan Li, 2019), with Pr_neutral=0.74 and w1=40.0/13.0
+                        self.prandtl_nvec[k] = self.prandtl_number*( 2.0*ri_grad/
+                            (1.0+(53.0/13.0)*ri_grad -sqrt( (1.0+(53.0/13.0)*ri_grad)**2.0 - 4.0*ri_grad ) ) )
+                    else:
+                        self.prandtl_nvec[k] = self.prandtl_number
+
+                    # Production/destruction terms
+                    a = self.tke_ed_coeff*(shear2 - grad_b_thl/self.prandtl_nvec[k] - grad_b_qt/self.prandtl_nvec[k])* sqrt(self.EnvVar.TKE.values[k])
+                    # Dissipation term
+                    c_neg = self.tke_diss_coeff*self.EnvVar.TKE.values[k]*sqrt(self.EnvVar.TKE.values[k])
+                    # Subdomain exchange term
+                    self.b[k] = 0.0
+                    for nn in xrange(self.n_updrafts):
+                        wc_upd_nn = (self.UpdVar.W.values[nn,k] + self.UpdVar.W.values[nn,k-1])/2.0
+                        wc_env = (self.EnvVar.W.values[k] + self.EnvVar.W.values[k-1])/2.0
+                        frac_turb_entr_half = interp2pt(self.frac_turb_entr_full[nn,k],self.frac_turb_entr_full[nn,k-1])
+                        self.b[k] += self.UpdVar.Area.values[nn,k]*wc_upd_nn*self.detr_sc[nn,k]/(1.0-self.UpdVar.Area.bulkvalues[k])*(
+                            (wc_upd_nn-wc_env)*(wc_upd_nn-wc_env)/2.0-self.EnvVar.TKE.values[k]) - self.UpdVar.Area.values[nn,k]*wc_upd_nn*(
+                            wc_upd_nn-wc_env)*frac_turb_entr_half*wc_env/(1.0-self.UpdVar.Area.bulkvalues[k])
+
+                    if fabs(a) > m_eps and 4.0*a*c_neg > - self.b[k]*self.b[k]:
+                        self.l_entdet[k] = fmax( -self.b[k]/2.0/a + sqrt( self.b[k]*self.b[k] + 4.0*a*c_neg )/2.0/a, 0.0)
+                    elif fabs(a) < m_eps and fabs(self.b[k]) > m_eps:
+                        self.l_entdet[k] = c_neg/self.b[k]
+
+                    l3 = self.l_entdet[k]
+
+                    # Limiting stratification scale (Deardorff, 1976)
+                    thv = theta_virt_c(self.Ref.p0_half[k], self.EnvVar.T.values[k], self.EnvVar.QT.values[k],
+                        self.EnvVar.QL.values[k])
+                    grad_thv_low = grad_thv_plus
+                    grad_thv_plus = ( theta_virt_c(self.Ref.p0_half[k+1], self.EnvVar.T.values[k+1], self.EnvVar.QT.values[k+1],
+                        self.EnvVar.QL.values[k+1]) - thv) * self.Gr.dzi
+                    grad_thv = interp2pt(grad_thv_low, grad_thv_plus)
+
+                    # Effective static stability using environmental mean.
+                    # Set lambda for now to environmental cloud_fraction (TBD: Rain)
+                    grad_th_eff = (1.0-self.EnvVar.cloud_fraction.values[k])*grad_thv + self.EnvVar.cloud_fraction.values[k]*(
+                        1.0/exp( - latent_heat(self.EnvVar.T.values[k]) * self.EnvVar.QL.values[k]
+                            / cpm_c(self.EnvVar.QT.values[k]) / self.EnvVar.T.values[k] )*(
+                            (1.0+ (eps_vi-1.0)*self.EnvVar.QT.values[k])*grad_thl+(eps_vi-1.0)*self.EnvVar.THL.values[k]*grad_qt))
+
+                    N = sqrt(fmax(g/thv*grad_th_eff, 0.0))
+                    if N > 0.0:
+                        l1 = fmin(sqrt(fmax(self.static_stab_coeff*self.EnvVar.TKE.values[k],0.0))/N, 1.0e6)
+                    else:
+                        l1 = 1.0e6
 
-                l[0]=l1; l[1]=l3; l[2]=l2;
+                    l[0]=l1; l[1]=l3; l[2]=l2;
 
-                j = 0
-                while(j<len(l)):
-                    if l[j]<m_eps or l[j]>1.0e6:
-                        l[j] = 1.0e6
-                    j += 1
+                    for j in xrange(3):
+                        if l[j]<m_eps or l[j]>1.0e6:
+                            l[j] = 1.0e6
 
-                self.mls[k] = np.argmin(l)
-                self.mixing_length[k] = lamb_smooth_minimum(l, 0.1, 1.5)
-                self.ml_ratio[k] = self.mixing_length[k]/l[int(self.mls[k])]
+                    jmin = argmin_c(l, 3)
+                    self.mls[k] = jmin
+                    self.mixing_length[k] = lamb_smooth_minimum_c(l, 3, 0.1, 1.5)
+                    self.ml_ratio[k] = self.mixing_length[k]/l[jmin]
 
         else:
             # default mixing scheme , see Tan et al. (2018)
@@ -1023,23 +1340,19 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
         return
 
-    cpdef compute_horizontal_eddy_diffusivities(self, GridMeanVariables GMV):
+    cdef void compute_horizontal_eddy_diffusivities(self, GridMeanVariables GMV) noexcept nogil:
         cdef:
             Py_ssize_t i, k
-            double R_up
-            double [:] ae = np.subtract(np.ones((self.Gr.nzg,),dtype=np.double, order='c'),self.UpdVar.Area.bulkvalues)
-            double l[2]
 
-        with nogil:
-            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                for i in xrange(self.n_updrafts):
-                    if self.UpdVar.Area.values[i,k]>0.0:
-                        self.horizontal_KM[i,k] = self.UpdVar.Area.values[i,k]*self.turbulent_entrainment_factor \
-                        *sqrt(fmax(self.EnvVar.TKE.values[k],0.0))*self.pressure_plume_spacing[i]
-                        self.horizontal_KH[i,k] = self.horizontal_KM[i,k] / self.prandtl_nvec[k]
-                    else:
-                        self.horizontal_KM[i,k] = 0.0
-                        self.horizontal_KH[i,k] = 0.0
+        for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
+            for i in xrange(self.n_updrafts):
+                if self.UpdVar.Area.values[i,k]>0.0:
+                    self.horizontal_KM[i,k] = self.UpdVar.Area.values[i,k]*self.turbulent_entrainment_factor \
+                    *sqrt(fmax(self.EnvVar.TKE.values[k],0.0))*self.pressure_plume_spacing[i]
+                    self.horizontal_KH[i,k] = self.horizontal_KM[i,k] / self.prandtl_nvec[k]
+                else:
+                    self.horizontal_KM[i,k] = 0.0
+                    self.horizontal_KH[i,k] = 0.0
 
         return
 
@@ -1076,7 +1389,7 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
         a_ = a_total/self.n_updrafts
         for i in xrange(self.n_updrafts):
-            surface_scalar_coeff= percentile_bounds_mean_norm(1.0-a_total+i*a_, 1.0-a_total + (i+1)*a_ , 1000)
+            surface_scalar_coeff= percentile_bounds_mean_norm(1.0-a_total+i*a_, 1.0-a_total + (i+1)*a_)
             self.area_surface_bc[i] = a_
             self.w_surface_bc[i] = 0.0
             self.h_surface_bc[i] = (GMV.H.values[gw] + surface_scalar_coeff * sqrt(h_var))
@@ -1113,9 +1426,9 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
 
     # Find values of environmental variables by subtracting updraft values from grid mean values
-    # whichvals used to check which substep we are on--correspondingly use 'GMV.SomeVar.value' (last timestep value)
-    # or GMV.SomeVar.mf_update (GMV value following massflux substep)
-    cpdef decompose_environment(self, GridMeanVariables GMV, whichvals):
+    # whichvals used to check which substep we are on--correspondingly use 'GMV.SomeVar.value' (last timestep value, decompose_values)
+    # or GMV.SomeVar.mf_update (GMV value following massflux substep, decompose_mf_update)
+    cdef void decompose_environment(self, GridMeanVariables GMV, int whichvals) noexcept nogil:
 
         # first make sure the 'bulkvalues' of the updraft variables are updated
         self.UpdVar.set_means(GMV)
@@ -1124,19 +1437,18 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             Py_ssize_t k, gw = self.Gr.gw
             double val1, val2, au_full
 
-        if whichvals == 'values':
-            with nogil:
-                for k in xrange(self.Gr.nzg-1):
-                    val1 = 1.0/(1.0-self.UpdVar.Area.bulkvalues[k])
-                    val2 = self.UpdVar.Area.bulkvalues[k] * val1
-
-                    self.EnvVar.Area.values[k] = 1.0 - self.UpdVar.Area.bulkvalues[k]
-                    self.EnvVar.QT.values[k] = fmax(val1 * GMV.QT.values[k] - val2 * self.UpdVar.QT.bulkvalues[k],0.0) #Yair - this is here to prevent negative QT
-                    self.EnvVar.H.values[k] = val1 * GMV.H.values[k] - val2 * self.UpdVar.H.bulkvalues[k]
-                    # Have to account for staggering of W--interpolate area fraction to the "full" grid points
-                    # Assuming GMV.W = 0!
-                    au_full = 0.5 * (self.UpdVar.Area.bulkvalues[k+1] + self.UpdVar.Area.bulkvalues[k])
-                    self.EnvVar.W.values[k] = -au_full/(1.0-au_full) * self.UpdVar.W.bulkvalues[k]
+        if whichvals == decompose_values:
+            for k in xrange(self.Gr.nzg-1):
+                val1 = 1.0/(1.0-self.UpdVar.Area.bulkvalues[k])
+                val2 = self.UpdVar.Area.bulkvalues[k] * val1
+
+                self.EnvVar.Area.values[k] = 1.0 - self.UpdVar.Area.bulkvalues[k]
+                self.EnvVar.QT.values[k] = fmax(val1 * GMV.QT.values[k] - val2 * self.UpdVar.QT.bulkvalues[k],0.0) #Yair - this is here to prevent negative QT
+                self.EnvVar.H.values[k] = val1 * GMV.H.values[k] - val2 * self.UpdVar.H.bulkvalues[k]
+                # Have to account for staggering of W--interpolate area fraction to the "full" grid points
+                # Assuming GMV.W = 0!
+                au_full = 0.5 * (self.UpdVar.Area.bulkvalues[k+1] + self.UpdVar.Area.bulkvalues[k])
+                self.EnvVar.W.values[k] = -au_full/(1.0-au_full) * self.UpdVar.W.bulkvalues[k]
 
             if self.calc_tke:
                 self.get_GMV_CoVar(self.UpdVar.Area,self.UpdVar.W, self.UpdVar.W, self.EnvVar.W, self.EnvVar.W, self.EnvVar.TKE, &GMV.W.values[0],&GMV.W.values[0], &GMV.TKE.values[0])
@@ -1147,20 +1459,19 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
 
 
-        elif whichvals == 'mf_update':
+        elif whichvals == decompose_mf_update:
             # same as above but replace GMV.SomeVar.values with GMV.SomeVar.mf_update
 
-            with nogil:
-                for k in xrange(self.Gr.nzg-1):
-                    val1 = 1.0/(1.0-self.UpdVar.Area.bulkvalues[k])
-                    val2 = self.UpdVar.Area.bulkvalues[k] * val1
+            for k in xrange(self.Gr.nzg-1):
+                val1 = 1.0/(1.0-self.UpdVar.Area.bulkvalues[k])
+                val2 = self.UpdVar.Area.bulkvalues[k] * val1
 
-                    self.EnvVar.QT.values[k] = fmax(val1 * GMV.QT.mf_update[k] - val2 * self.UpdVar.QT.bulkvalues[k],0.0)#Yair - this is here to prevent negative QT
-                    self.EnvVar.H.values[k] = val1 * GMV.H.mf_update[k] - val2 * self.UpdVar.H.bulkvalues[k]
-                    # Have to account for staggering of W
-                    # Assuming GMV.W = 0!
-                    au_full = 0.5 * (self.UpdVar.Area.bulkvalues[k+1] + self.UpdVar.Area.bulkvalues[k])
-                    self.EnvVar.W.values[k] = -au_full/(1.0-au_full) * self.UpdVar.W.bulkvalues[k]
+                self.EnvVar.QT.values[k] = fmax(val1 * GMV.QT.mf_update[k] - val2 * self.UpdVar.QT.bulkvalues[k],0.0)#Yair - this is here to prevent negative QT
+                self.EnvVar.H.values[k] = val1 * GMV.H.mf_update[k] - val2 * self.UpdVar.H.bulkvalues[k]
+                # Have to account for staggering of W
+                # Assuming GMV.W = 0!
+                au_full = 0.5 * (self.UpdVar.Area.bulkvalues[k+1] + self.UpdVar.Area.bulkvalues[k])
+                self.EnvVar.W.values[k] = -au_full/(1.0-au_full) * self.UpdVar.W.bulkvalues[k]
 
             if self.calc_tke:
                 self.get_GMV_CoVar(self.UpdVar.Area,self.UpdVar.W, self.UpdVar.W, self.EnvVar.W, self.EnvVar.W, self.EnvVar.TKE,
@@ -1179,21 +1490,21 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
     # Note: this assumes all variables are defined on half levels not full levels (i.e. phi, psi are not w)
     # if covar_e.name is not 'tke'.
-    cdef get_GMV_CoVar(self, EDMF_Updrafts.UpdraftVariable au,
+    cdef void get_GMV_CoVar(self, EDMF_Updrafts.UpdraftVariable au,
                         EDMF_Updrafts.UpdraftVariable phi_u, EDMF_Updrafts.UpdraftVariable psi_u,
                         EDMF_Environment.EnvironmentVariable phi_e,  EDMF_Environment.EnvironmentVariable psi_e,
                         EDMF_Environment.EnvironmentVariable_2m covar_e,
-                       double *gmv_phi, double *gmv_psi, double *gmv_covar):
+                       double *gmv_phi, double *gmv_psi, double *gmv_covar) noexcept nogil:
         cdef:
             Py_ssize_t i,k
-            double [:] ae = np.subtract(np.ones((self.Gr.nzg,),dtype=np.double, order='c'),au.bulkvalues)
+            double ae
             double phi_diff, psi_diff
             double tke_factor = 1.0
 
 
-        #with nogil:
         for k in xrange(self.Gr.nzg):
-            if covar_e.name == 'tke':
+            ae = 1.0 - au.bulkvalues[k]
+            if covar_e.is_tke:
                 tke_factor = 0.5
                 phi_diff = interp2pt(phi_e.values[k-1]-gmv_phi[k-1], phi_e.values[k]-gmv_phi[k])
                 psi_diff = interp2pt(psi_e.values[k-1]-gmv_psi[k-1], psi_e.values[k]-gmv_psi[k])
@@ -1203,9 +1514,9 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                 psi_diff = psi_e.values[k]-gmv_psi[k]
 
 
-            gmv_covar[k] = tke_factor * ae[k] * phi_diff * psi_diff + ae[k] * covar_e.values[k]
+            gmv_covar[k] = tke_factor * ae * phi_diff * psi_diff + ae * covar_e.values[k]
             for i in xrange(self.n_updrafts):
-                if covar_e.name == 'tke':
+                if covar_e.is_tke:
                     phi_diff = interp2pt(phi_u.values[i,k-1]-gmv_phi[k-1], phi_u.values[i,k]-gmv_phi[k])
                     psi_diff = interp2pt(psi_u.values[i,k-1]-gmv_psi[k-1], psi_u.values[i,k]-gmv_psi[k])
                 else:
@@ -1254,131 +1565,157 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                 covar_e.values[k] = 0.0
         return
 
-    cpdef compute_turbulent_entrainment(self, GridMeanVariables GMV, CasesBase Case):
+    cdef void compute_turbulent_entrainment(self, GridMeanVariables GMV, CasesBase Case) noexcept nogil:
         cdef:
-            Py_ssize_t k
+            Py_ssize_t i, k
             double tau =  get_mixing_tau(self.zi, self.wstar)
             double a, a_full, K, K_full, R_up, R_up_full, wu_half, we_half
             double ed_mf_ratio, b_upd_full, b_env_full, env_tke_full
 
-        with nogil:
-            for i in xrange(self.n_updrafts):
-                for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                    a = self.UpdVar.Area.values[i,k]
-                    a_full = interp2pt(self.UpdVar.Area.values[i,k], self.UpdVar.Area.values[i,k+1])
-                    R_up = self.pressure_plume_spacing[i]
-                    R_up_full = self.pressure_plume_spacing[i]
-                    wu_half = interp2pt(self.UpdVar.W.values[i,k], self.UpdVar.W.values[i,k-1])
-                    we_half = interp2pt(self.EnvVar.W.values[k], self.EnvVar.W.values[k-1])
-                    if a*wu_half  > 0.0:
-                        self.turb_entr_H[i,k]  = (2.0/R_up**2.0)*self.Ref.rho0_half[k] * a * self.horizontal_KH[i,k]  * \
-                                                    (self.EnvVar.H.values[k] - self.UpdVar.H.values[i,k])
-                        self.turb_entr_QT[i,k] = (2.0/R_up**2.0)*self.Ref.rho0_half[k]* a * self.horizontal_KH[i,k]  * \
-                                                     (self.EnvVar.QT.values[k] - self.UpdVar.QT.values[i,k])
-                        self.frac_turb_entr[i,k]    = (2.0/R_up**2.0) * self.horizontal_KH[i,k] / wu_half/a
-                    else:
-                        self.turb_entr_H[i,k] = 0.0
-                        self.turb_entr_QT[i,k] = 0.0
-
-                    if a_full*self.UpdVar.W.values[i,k] > 0.0:
-                        K_full = interp2pt(self.horizontal_KM[i,k],self.horizontal_KM[i,k-1])
-                        b_upd_full = interp2pt(self.UpdVar.B.values[i,k], self.UpdVar.B.values[i,k-1])
-                        b_env_full = interp2pt(self.EnvVar.B.values[k], self.EnvVar.B.values[k-1])
-                        env_tke_full = interp2pt(self.EnvVar.TKE.buoy[k], self.EnvVar.TKE.buoy[k-1])
-
-                        self.turb_entr_W[i,k]  = (2.0/R_up_full**2.0)*self.Ref.rho0[k] * a_full * K_full  * \
-                                                    (self.EnvVar.W.values[k]-self.UpdVar.W.values[i,k])
-                        self.frac_turb_entr_full[i,k] = (2.0/R_up_full**2.0) * K_full / self.UpdVar.W.values[i,k] / a_full
-                    else:
-                        self.turb_entr_W[i,k] = 0.0
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
+            for k in xrange(self.Gr.gw, self.UpdVar.active_kmax[i]):
+                a = self.UpdVar.Area.values[i,k]
+                a_full = interp2pt(self.UpdVar.Area.values[i,k], self.UpdVar.Area.values[i,k+1])
+                R_up = self.pressure_plume_spacing[i]
+                R_up_full = self.pressure_plume_spacing[i]
+                wu_half = interp2pt(self.UpdVar.W.values[i,k], self.UpdVar.W.values[i,k-1])
+                we_half = interp2pt(self.EnvVar.W.values[k], self.EnvVar.W.values[k-1])
+                if a*wu_half  > 0.0:
+                    self.turb_entr_H[i,k]  = (2.0/R_up**2.0)*self.Ref.rho0_half[k] * a * self.horizontal_KH[i,k]  * \
+                                                (self.EnvVar.H.values[k] - self.UpdVar.H.values[i,k])
+                    self.turb_entr_QT[i,k] = (2.0/R_up**2.0)*self.Ref.rho0_half[k]* a * self.horizontal_KH[i,k]  * \
+                                                 (self.EnvVar.QT.values[k] - self.UpdVar.QT.values[i,k])
+                    self.frac_turb_entr[i,k]    = (2.0/R_up**2.0) * self.horizontal_KH[i,k] / wu_half/a
+                else:
+                    self.turb_entr_H[i,k] = 0.0
+                    self.turb_entr_QT[i,k] = 0.0
+
+                if a_full*self.UpdVar.W.values[i,k] > 0.0:
+                    K_full = interp2pt(self.horizontal_KM[i,k],self.horizontal_KM[i,k-1])
+                    b_upd_full = interp2pt(self.UpdVar.B.values[i,k], self.UpdVar.B.values[i,k-1])
+                    b_env_full = interp2pt(self.EnvVar.B.values[k], self.EnvVar.B.values[k-1])
+                    env_tke_full = interp2pt(self.EnvVar.TKE.buoy[k], self.EnvVar.TKE.buoy[k-1])
+
+                    self.turb_entr_W[i,k]  = (2.0/R_up_full**2.0)*self.Ref.rho0[k] * a_full * K_full  * \
+                                                (self.EnvVar.W.values[k]-self.UpdVar.W.values[i,k])
+                    self.frac_turb_entr_full[i,k] = (2.0/R_up_full**2.0) * K_full / self.UpdVar.W.values[i,k] / a_full
+                else:
+                    self.turb_entr_W[i,k] = 0.0
+
+            for k in xrange(self.UpdVar.active_kmax[i], self.Gr.nzg-self.Gr.gw):
+                self.turb_entr_H[i,k] = 0.0
+                self.turb_entr_QT[i,k] = 0.0
+                self.turb_entr_W[i,k] = 0.0
 
         return
 
-    cpdef compute_entrainment_detrainment(self, GridMeanVariables GMV, CasesBase Case):
+    cdef void compute_entrainment_detrainment(self, GridMeanVariables GMV, CasesBase Case) nogil:
         cdef:
-            Py_ssize_t k
-            entr_struct ret
-            entr_in_struct input
-            eos_struct sa
-            double transport_plus, transport_minus
+            Py_ssize_t i, k
+            Py_ssize_t kmin = self.Gr.gw
+            entr_column_struct col
+            double zbl
             long quadrature_order = 3
 
         self.UpdVar.upd_cloud_diagnostics(self.Ref)
 
-        input.wstar = self.wstar
-
-        input.dz = self.Gr.dz
-        input.zbl = self.compute_zbl_qt_grad(GMV)
-        input.sort_pow = self.sorting_power
-        input.c_ent = self.entrainment_factor
-        input.c_det = self.detrainment_factor
-        input.c_mu = self.entrainment_sigma
-        input.c_mu0 = self.entrainment_scale
-        input.c_ed_mf = self.entrainment_ed_mf_sigma
-        input.chi_upd = self.updraft_mixing_frac
-        input.tke_coef = self.entrainment_smin_tke_coeff
-        input.quadrature_order = quadrature_order
+        zbl = self.compute_zbl_qt_grad(GMV)
+        col.dz = self.Gr.dz
+        col.zbl = zbl
+        col.sort_pow = self.sorting_power
+        col.c_ent = self.entrainment_factor
+        col.c_det = self.detrainment_factor
+        col.c_mu = self.entrainment_sigma
+        col.c_mu0 = self.entrainment_scale
+        col.c_ed_mf = self.entrainment_ed_mf_sigma
+        col.chi_upd = self.updraft_mixing_frac
+        col.tke_coef = self.entrainment_smin_tke_coeff
+        col.quadrature_order = quadrature_order
+
+        # environment and grid-mean inputs are the same for all updrafts
+        col.z = &self.Gr.z_half[kmin]
+        col.p0 = &self.Ref.p0_half[kmin]
+        col.rho0 = &self.Ref.rho0_half[kmin]
+        col.tke = &self.EnvVar.TKE.values[kmin]
+        col.buoy_ed_flux = &self.EnvVar.TKE.buoy[kmin]
+        col.RH_env = &self.EnvVar.RH.values[kmin]
+        col.ql_env = &self.EnvVar.QL.values[kmin]
+        col.qt_env = &self.EnvVar.QT.values[kmin]
+        col.H_env = &self.EnvVar.H.values[kmin]
+        col.b_env = &self.EnvVar.B.values[kmin]
+        col.b_mean = &GMV.B.values[kmin]
+        col.env_Hvar = &self.EnvVar.Hvar.values[kmin]
+        col.env_QTvar = &self.EnvVar.QTvar.values[kmin]
+        col.env_HQTcov = &self.EnvVar.HQTcov.values[kmin]
+        col.w_env = &self.entr_w_env[kmin]
+        col.a_env = &self.entr_a_env[kmin]
+        for k in xrange(kmin, self.Gr.nzg-self.Gr.gw):
+            self.entr_w_env[k] = interp2pt(self.EnvVar.W.values[k],self.EnvVar.W.values[k-1])
+            self.entr_a_env[k] = 1.0-self.UpdVar.Area.bulkvalues[k]
+
+        # the random draws are taken in a fixed order, before the updrafts are distributed over threads,
+        # the stream refills its buffer when it runs out
         for i in xrange(self.n_updrafts):
-            input.zi = self.UpdVar.cloud_base[i]
-            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                input.buoy_ed_flux = self.EnvVar.TKE.buoy[k]
-                if self.UpdVar.Area.values[i,k]>0.0:
-                    input.b_upd = self.UpdVar.B.values[i,k]
-                    input.w_upd = interp2pt(self.UpdVar.W.values[i,k],self.UpdVar.W.values[i,k-1])
-                    input.dwdz = (self.UpdVar.W.values[i,k]-self.UpdVar.W.values[i,k-1])/self.Gr.dz
-                    input.z = self.Gr.z_half[k]
-                    input.a_upd = self.UpdVar.Area.values[i,k]
-                    input.a_env = 1.0-self.UpdVar.Area.bulkvalues[k]
-                    input.tke = self.EnvVar.TKE.values[k]
-                    input.ml = self.mixing_length[k]
-                    input.qt_env = self.EnvVar.QT.values[k]
-                    input.ql_env = self.EnvVar.QL.values[k]
-                    input.H_env = self.EnvVar.H.values[k]
-                    input.T_env = self.EnvVar.T.values[k]
-                    input.b_env = self.EnvVar.B.values[k]
-                    input.b_mean = GMV.B.values[k]
-                    input.w_env = interp2pt(self.EnvVar.W.values[k],self.EnvVar.W.values[k-1])
-                    input.H_up = self.UpdVar.H.values[i,k]
-                    input.T_up = self.UpdVar.T.values[i,k]
-                    input.qt_up = self.UpdVar.QT.values[i,k]
-                    input.ql_up = self.UpdVar.QL.values[i,k]
-                    input.ql_env = self.EnvVar.QL.values[k]
-                    input.p0 = self.Ref.p0_half[k]
-                    input.rho0 = self.Ref.rho0_half[k]
-                    input.env_Hvar = self.EnvVar.Hvar.values[k]
-                    input.env_QTvar = self.EnvVar.QTvar.values[k]
-                    input.env_HQTcov = self.EnvVar.HQTcov.values[k]
-                    input.rd = self.pressure_plume_spacing[i]
-                    input.nh_pressure = self.nh_pressure[i,k]
-                    input.RH_upd = self.UpdVar.RH.values[i,k]
-                    input.RH_env = self.EnvVar.RH.values[k]
-
-                    if self.calc_tke:
-                            input.tke = self.EnvVar.TKE.values[k]
-
-                    input.T_mean = (self.EnvVar.T.values[k]+self.UpdVar.T.values[i,k])/2
+            for k in xrange(kmin, self.UpdVar.active_kmax[i]):
+                if self.UpdVar.Area.values[i,k] > 0.0:
                     ## Ignacio
-                    if input.zbl-self.UpdVar.cloud_base[i] > 0.0:
-                        input.poisson = np.random.poisson(self.Gr.dz/((input.zbl-self.UpdVar.cloud_base[i])/10.0))
+                    if zbl-self.UpdVar.cloud_base[i] > 0.0:
+                        self.entr_poisson[i,k] = self.Random.poisson(self.Gr.dz/((zbl-self.UpdVar.cloud_base[i])/10.0))
                     else:
-                        input.poisson = 0.0
+                        self.entr_poisson[i,k] = 0.0
                     ## End: Ignacio
-                    ret = self.entr_detr_fp(input)
-                    self.entr_sc[i,k] = ret.entr_sc
-                    self.detr_sc[i,k] = ret.detr_sc
-                    self.sorting_function[i,k] = ret.sorting_function
-                    self.b_mix[i,k] = ret.b_mix
 
-                else:
-                    self.entr_sc[i,k] = 0.0
-                    self.detr_sc[i,k] = 0.0
-                    self.sorting_function[i,k] = 0.0
-                    self.b_mix[i,k] = self.EnvVar.B.values[k]
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
+            self.compute_entrainment_detrainment_column(i, col)
         return
 
-    cpdef double compute_zbl_qt_grad(self, GridMeanVariables GMV):
+    # col holds the updraft-independent inputs of the closure; being a copy, the updraft
+    # columns can be filled in on several threads at once
+    cdef void compute_entrainment_detrainment_column(self, Py_ssize_t i, entr_column_struct col) noexcept nogil:
+        cdef:
+            Py_ssize_t k
+            Py_ssize_t kmin = self.Gr.gw
+            Py_ssize_t kmax
+
+        # the column ends at the highest level with updraft area
+        kmax = kmin
+        for k in xrange(kmin, self.UpdVar.active_kmax[i]):
+            if self.UpdVar.Area.values[i,k] > 0.0:
+                kmax = k + 1
+                self.entr_w_upd[i,k] = interp2pt(self.UpdVar.W.values[i,k],self.UpdVar.W.values[i,k-1])
+            self.sorting_function[i,k] = 0.0
+            self.b_mix[i,k] = 0.0
+
+        if kmax > kmin:
+            col.n = kmax - kmin
+            col.zi = self.UpdVar.cloud_base[i]
+            col.a_upd = &self.UpdVar.Area.values[i,kmin]
+            col.b_upd = &self.UpdVar.B.values[i,kmin]
+            col.w_upd = &self.entr_w_upd[i,kmin]
+            col.poisson = &self.entr_poisson[i,kmin]
+            col.RH_upd = &self.UpdVar.RH.values[i,kmin]
+            col.ql_up = &self.UpdVar.QL.values[i,kmin]
+            col.qt_up = &self.UpdVar.QT.values[i,kmin]
+            col.H_up = &self.UpdVar.H.values[i,kmin]
+            col.entr_sc = &self.entr_sc[i,kmin]
+            col.detr_sc = &self.detr_sc[i,kmin]
+            col.sorting_function = &self.sorting_function[i,kmin]
+            col.b_mix = &self.b_mix[i,kmin]
+            self.entr_detr_fp(&col)
+
+        # levels without updraft area
+        for k in xrange(kmin, self.Gr.nzg-self.Gr.gw):
+            if not self.UpdVar.Area.values[i,k] > 0.0:
+                self.entr_sc[i,k] = 0.0
+                self.detr_sc[i,k] = 0.0
+                self.sorting_function[i,k] = 0.0
+                self.b_mix[i,k] = self.EnvVar.B.values[k]
+        return
+
+    cdef double compute_zbl_qt_grad(self, GridMeanVariables GMV) noexcept nogil:
     # computes inversion height as z with max gradient of qt
         cdef:
+            Py_ssize_t k
             double qt_up, qt_, z_
             double zbl_qt = 0.0
             double qt_grad = 0.0
@@ -1405,62 +1742,68 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                 self.pressure_plume_spacing[i] = fmax(self.aspect_ratio*self.UpdVar.updraft_top[i], 500.0*self.aspect_ratio)
         return
 
-    cpdef compute_nh_pressure(self):
+    cdef void compute_nh_pressure(self) noexcept nogil:
+        cdef:
+            Py_ssize_t i
+
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
+            self.compute_nh_pressure_column(i)
+        return
+
+    cdef void compute_nh_pressure_column(self, Py_ssize_t i) noexcept nogil:
         cdef:
-            Py_ssize_t i,k, alen
+            Py_ssize_t k, alen
             pressure_buoy_struct ret_b
             pressure_drag_struct ret_w
             pressure_in_struct input
 
-        for i in xrange(self.n_updrafts):
-            input.updraft_top = self.UpdVar.updraft_top[i]
-            alen = len(np.argwhere(self.UpdVar.Area.values[i,self.Gr.gw:self.Gr.nzg-self.Gr.gw]))
-            input.a_med = np.median(self.UpdVar.Area.values[i,self.Gr.gw:self.Gr.nzg-self.Gr.gw][:alen])
-            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-                input.a_kfull = interp2pt(self.UpdVar.Area.values[i,k], self.UpdVar.Area.values[i,k+1])
-                if input.a_kfull >= self.minimum_area:
-                    input.dzi = self.Gr.dzi
-                    input.dz = self.Gr.dz
-                    input.z_full = self.Gr.z[k]
-
-                    input.b_kfull = interp2pt(self.UpdVar.B.values[i,k], self.UpdVar.B.values[i,k+1])
-                    input.rho0_kfull = self.Ref.rho0[k]
-                    input.bcoeff_tan18 = self.pressure_buoy_coeff
-                    input.alpha1 = self.pressure_normalmode_buoy_coeff1
-                    input.alpha2 = self.pressure_normalmode_buoy_coeff2
-                    input.beta1 = self.pressure_normalmode_adv_coeff
-                    input.beta2 = self.pressure_normalmode_drag_coeff
-                    input.rd = self.pressure_plume_spacing[i]
-                    input.w_kfull = self.UpdVar.W.values[i,k]
-                    input.w_kmfull = self.UpdVar.W.values[i,k-1]
-                    input.w_kenv = self.EnvVar.W.values[k]
-                    input.drag_sign = self.drag_sign
-
-                    if self.asp_label == 'z_dependent':
-                        input.asp_ratio = input.updraft_top/2.0/sqrt(input.a_kfull)/input.rd
-                    elif self.asp_label == 'median':
-                        input.asp_ratio = input.updraft_top/2.0/sqrt(input.a_med)/input.rd
-                    elif self.asp_label == 'const':
-                        # _ret.asp_ratio = 1.72
-                        input.asp_ratio = 1.0
-
-                    if input.a_kfull>0.0:
-                        ret_b = self.pressure_func_buoy(input)
-                        ret_w = self.pressure_func_drag(input)
-                        self.nh_pressure_b[i,k] = ret_b.nh_pressure_b
-                        self.nh_pressure_adv[i,k] = ret_w.nh_pressure_adv
-                        self.nh_pressure_drag[i,k] = ret_w.nh_pressure_drag
-
-                        self.b_coeff[i,k] = ret_b.b_coeff
-                        self.asp_ratio[i,k] = input.asp_ratio
-
-                    else:
-                        self.nh_pressure_b[i,k] = 0.0
-                        self.nh_pressure_adv[i,k] = 0.0
-                        self.nh_pressure_drag[i,k] = 0.0
+        input.updraft_top = self.UpdVar.updraft_top[i]
+        if self.asp_flag == asp_median:
+            # median of the area over as many levels from the surface as there are levels with
+            # updraft area; there is no updraft area above the active levels
+            alen = 0
+            for k in xrange(self.Gr.gw, self.UpdVar.active_kmax[i]):
+                if self.UpdVar.Area.values[i,k] != 0.0:
+                    alen += 1
+            input.a_med = median_c(&self.UpdVar.Area.values[i,self.Gr.gw], alen, &self.area_median_work[i,0])
+        for k in xrange(self.Gr.gw, self.UpdVar.active_kmax[i]):
+            input.a_kfull = interp2pt(self.UpdVar.Area.values[i,k], self.UpdVar.Area.values[i,k+1])
+            if input.a_kfull >= self.minimum_area:
+                input.dzi = self.Gr.dzi
+                input.dz = self.Gr.dz
+                input.z_full = self.Gr.z[k]
+
+                input.b_kfull = interp2pt(self.UpdVar.B.values[i,k], self.UpdVar.B.values[i,k+1])
+                input.rho0_kfull = self.Ref.rho0[k]
+                input.bcoeff_tan18 = self.pressure_buoy_coeff
+                input.alpha1 = self.pressure_normalmode_buoy_coeff1
+                input.alpha2 = self.pressure_normalmode_buoy_coeff2
+                input.beta1 = self.pressure_normalmode_adv_coeff
+                input.beta2 = self.pressure_normalmode_drag_coeff
+                input.rd = self.pressure_plume_spacing[i]
+                input.w_kfull = self.UpdVar.W.values[i,k]
+                input.w_kmfull = self.UpdVar.W.values[i,k-1]
+                input.w_kenv = self.EnvVar.W.values[k]
+                input.drag_sign = self.drag_sign
+
+                if self.asp_flag == asp_z_dependent:
+                    input.asp_ratio = input.updraft_top/2.0/sqrt(input.a_kfull)/input.rd
+                elif self.asp_flag == asp_median:
+                    input.asp_ratio = input.updraft_top/2.0/sqrt(input.a_med)/input.rd
+                elif self.asp_flag == asp_const:
+                    # _ret.asp_ratio = 1.72
+                    input.asp_ratio = 1.0
+
+                if input.a_kfull>0.0:
+                    ret_b = self.pressure_func_buoy(input)
+                    ret_w = self.pressure_func_drag(input)
+                    self.nh_pressure_b[i,k] = ret_b.nh_pressure_b
+                    self.nh_pressure_adv[i,k] = ret_w.nh_pressure_adv
+                    self.nh_pressure_drag[i,k] = ret_w.nh_pressure_drag
+
+                    self.b_coeff[i,k] = ret_b.b_coeff
+                    self.asp_ratio[i,k] = input.asp_ratio
 
-                        self.b_coeff[i,k] = 0.0
-                        self.asp_ratio[i,k] = 0.0
                 else:
                     self.nh_pressure_b[i,k] = 0.0
                     self.nh_pressure_adv[i,k] = 0.0
@@ -1468,15 +1811,31 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
 
                     self.b_coeff[i,k] = 0.0
                     self.asp_ratio[i,k] = 0.0
+            else:
+                self.nh_pressure_b[i,k] = 0.0
+                self.nh_pressure_adv[i,k] = 0.0
+                self.nh_pressure_drag[i,k] = 0.0
 
-                self.nh_pressure[i,k] = self.nh_pressure_b[i,k] + self.nh_pressure_adv[i,k] + self.nh_pressure_drag[i,k]
+                self.b_coeff[i,k] = 0.0
+                self.asp_ratio[i,k] = 0.0
+
+            self.nh_pressure[i,k] = self.nh_pressure_b[i,k] + self.nh_pressure_adv[i,k] + self.nh_pressure_drag[i,k]
+
+        for k in xrange(self.UpdVar.active_kmax[i], self.Gr.nzg-self.Gr.gw):
+            self.nh_pressure_b[i,k] = 0.0
+            self.nh_pressure_adv[i,k] = 0.0
+            self.nh_pressure_drag[i,k] = 0.0
+            self.b_coeff[i,k] = 0.0
+            self.asp_ratio[i,k] = 0.0
+            self.nh_pressure[i,k] = 0.0
 
         return
 
 
-    cpdef zero_area_fraction_cleanup(self, GridMeanVariables GMV):
+    cdef void zero_area_fraction_cleanup(self, GridMeanVariables GMV) noexcept nogil:
         cdef:
             Py_ssize_t i, k
+            double a_sum
 
         for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
             for i in xrange(self.n_updrafts):
@@ -1490,7 +1849,10 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                     self.UpdVar.QL.values[i,k] = GMV.QL.values[k]
                     self.UpdVar.THL.values[i,k] = GMV.THL.values[k]
 
-            if np.sum(self.UpdVar.Area.values[:,k])==0.0:
+            a_sum = 0.0
+            for i in xrange(self.n_updrafts):
+                a_sum += self.UpdVar.Area.values[i,k]
+            if a_sum==0.0:
                 self.EnvVar.W.values[k] = GMV.W.values[k]
                 self.EnvVar.B.values[k] = GMV.B.values[k]
                 self.EnvVar.H.values[k] = GMV.H.values[k]
@@ -1502,24 +1864,24 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
         return
 
 
-    cpdef set_subdomain_bcs(self):
+    cdef void set_subdomain_bcs(self) noexcept nogil:
 
-        self.UpdVar.W.set_bcs(self.Gr)
-        self.UpdVar.Area.set_bcs(self.Gr)
-        self.UpdVar.H.set_bcs(self.Gr)
-        self.UpdVar.QT.set_bcs(self.Gr)
-        self.UpdVar.T.set_bcs(self.Gr)
-        self.UpdVar.B.set_bcs(self.Gr)
+        self.UpdVar.W.set_bcs_c(self.Gr)
+        self.UpdVar.Area.set_bcs_c(self.Gr)
+        self.UpdVar.H.set_bcs_c(self.Gr)
+        self.UpdVar.QT.set_bcs_c(self.Gr)
+        self.UpdVar.T.set_bcs_c(self.Gr)
+        self.UpdVar.B.set_bcs_c(self.Gr)
 
-        self.EnvVar.W.set_bcs(self.Gr)
-        self.EnvVar.H.set_bcs(self.Gr)
-        self.EnvVar.T.set_bcs(self.Gr)
-        self.EnvVar.QL.set_bcs(self.Gr)
-        self.EnvVar.QT.set_bcs(self.Gr)
+        self.EnvVar.W.set_bcs_c(self.Gr)
+        self.EnvVar.H.set_bcs_c(self.Gr)
+        self.EnvVar.T.set_bcs_c(self.Gr)
+        self.EnvVar.QL.set_bcs_c(self.Gr)
+        self.EnvVar.QT.set_bcs_c(self.Gr)
 
         return
 
-    cpdef solve_updraft_velocity_area(self):
+    cdef void solve_updraft_velocity_area(self) noexcept nogil:
         cdef:
             Py_ssize_t i, k
             Py_ssize_t gw = self.Gr.gw
@@ -1532,134 +1894,298 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             double adv, buoy, exch # groupings of terms in velocity discrete equation
 
 
-        with nogil:
-            for i in xrange(self.n_updrafts):
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
+            self.entr_sc[i,gw] = self.entr_surface_bc
+            self.detr_sc[i,gw] = self.detr_surface_bc
+            self.UpdVar.W.new[i,gw-1] = self.w_surface_bc[i]
+            self.UpdVar.Area.new[i,gw] = self.area_surface_bc[i]
+            au_lim = self.max_area
+
+            for k in range(gw, self.UpdVar.active_kmax[i]):
+
+                # First solve for updated area fraction at k+1
+                whalf_kp = interp2pt(self.UpdVar.W.values[i,k], self.UpdVar.W.values[i,k+1])
+                whalf_k = interp2pt(self.UpdVar.W.values[i,k-1], self.UpdVar.W.values[i,k])
+                adv = -self.Ref.alpha0_half[k+1] * dzi *( self.Ref.rho0_half[k+1] * self.UpdVar.Area.values[i,k+1] * whalf_kp
+                                                          -self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * whalf_k)
+                entr_term = self.UpdVar.Area.values[i,k+1] * whalf_kp * (self.entr_sc[i,k+1] )
+                detr_term = self.UpdVar.Area.values[i,k+1] * whalf_kp * (- self.detr_sc[i,k+1])
+
+                self.UpdVar.Area.new[i,k+1]  = fmax(dt_ * (adv + entr_term + detr_term) + self.UpdVar.Area.values[i,k+1], 0.0)
+
+                if self.UpdVar.Area.new[i,k+1] > au_lim:
+                    self.UpdVar.Area.new[i,k+1] = au_lim
+                    if self.UpdVar.Area.values[i,k+1] > 0.0:
+                        self.detr_sc[i,k+1] = (((au_lim-self.UpdVar.Area.values[i,k+1])* dti_ - adv -entr_term)/(-self.UpdVar.Area.values[i,k+1]  * whalf_kp))
+                    else:
+                        # this detrainment rate won't affect scalars but would affect velocity
+                        self.detr_sc[i,k+1] = (((au_lim-self.UpdVar.Area.values[i,k+1])* dti_ - adv -entr_term)/(-au_lim  * whalf_kp))
+
+                # Now solve for updraft velocity at k
+                rho_ratio = self.Ref.rho0[k-1]/self.Ref.rho0[k]
+                anew_k = interp2pt(self.UpdVar.Area.new[i,k], self.UpdVar.Area.new[i,k+1])
+
+                if anew_k >= self.minimum_area:
+                    a_k = interp2pt(self.UpdVar.Area.values[i,k], self.UpdVar.Area.values[i,k+1])
+                    a_km = interp2pt(self.UpdVar.Area.values[i,k-1], self.UpdVar.Area.values[i,k])
+                    entr_w = interp2pt(self.entr_sc[i,k], self.entr_sc[i,k+1])
+                    detr_w = interp2pt(self.detr_sc[i,k], self.detr_sc[i,k+1])
+                    B_k = interp2pt(self.UpdVar.B.values[i,k], self.UpdVar.B.values[i,k+1])
+
+                    adv = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k] * self.UpdVar.W.values[i,k] * dzi
+                           - self.Ref.rho0[k-1] * a_km * self.UpdVar.W.values[i,k-1] * self.UpdVar.W.values[i,k-1] * dzi)
+                    exch = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k]
+                            * (entr_w * self.EnvVar.W.values[k] - detr_w * self.UpdVar.W.values[i,k] ) + self.turb_entr_W[i,k])
+                    buoy= self.Ref.rho0[k] * a_k * B_k
+                    self.UpdVar.W.new[i,k] = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k] * dti_
+                                              -adv + exch + buoy + self.nh_pressure[i,k])/(self.Ref.rho0[k] * anew_k * dti_)
+
+                    if self.UpdVar.W.new[i,k] <= 0.0:
+                        self.UpdVar.W.new[i,k] = 0.0
+                        self.UpdVar.Area.new[i,k+1] = 0.0
+                        #break
+                else:
+                    self.UpdVar.W.new[i,k] = 0.0
+                    self.UpdVar.Area.new[i,k+1] = 0.0
+                    # keep this in mind if we modify updraft top treatment!
+                    #break
+
+            # no updraft can reach the levels above the active window
+            for k in xrange(self.UpdVar.active_kmax[i], self.Gr.nzg-gw):
+                self.UpdVar.W.new[i,k] = 0.0
+                self.UpdVar.Area.new[i,k+1] = 0.0
+
+
+        return
+
+    cdef void solve_updraft_scalars(self, GridMeanVariables GMV) noexcept nogil:
+        cdef:
+            Py_ssize_t k, i
+            double dzi = self.Gr.dzi
+            double dti_ = 1.0/self.dt_upd
+            double m_k, m_km
+            Py_ssize_t gw = self.Gr.gw
+            double H_entr, QT_entr
+            double c1, c2, c3, c4
+            eos_struct sa
+
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
+
+            # at the surface:
+            if self.UpdVar.Area.new[i,gw] >= self.minimum_area:
+                self.UpdVar.H.new[i,gw] = self.h_surface_bc[i]
+                self.UpdVar.QT.new[i,gw] = self.qt_surface_bc[i]
+            else:
+                self.UpdVar.H.new[i,gw]  = GMV.H.values[gw]
+                self.UpdVar.QT.new[i,gw] = GMV.QT.values[gw]
+
+            # saturation adjustment
+            sa = eos(
+                self.UpdThermo.t_to_prog_fp, self.UpdThermo.prog_to_t_fp,
+                self.Ref.p0_half[gw], self.UpdVar.QT.new[i,gw],
+                self.UpdVar.H.new[i,gw]
+            )
+            self.UpdVar.QL.new[i,gw] = sa.ql
+            self.UpdVar.T.new[i,gw] = sa.T
+
+            # starting from the bottom do entrainment at each level
+            for k in xrange(gw+1, self.UpdVar.active_kmax[i]):
+                H_entr = self.EnvVar.H.values[k]
+                QT_entr = self.EnvVar.QT.values[k]
+
+                # write the discrete equations in form:
+                # c1 * phi_new[k] = c2 * phi[k] + c3 * phi[k-1] + c4 * phi_entr
+                if self.UpdVar.Area.new[i,k] >= self.minimum_area:
+                    m_k = (self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k]
+                           * interp2pt(self.UpdVar.W.values[i,k-1], self.UpdVar.W.values[i,k]))
+                    m_km = (self.Ref.rho0_half[k-1] * self.UpdVar.Area.values[i,k-1]
+                           * interp2pt(self.UpdVar.W.values[i,k-2], self.UpdVar.W.values[i,k-1]))
+                    c1 = self.Ref.rho0_half[k] * self.UpdVar.Area.new[i,k] * dti_
+                    c2 = (self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * dti_
+                          - m_k * (dzi + self.detr_sc[i,k]))
+                    c3 = m_km * dzi
+                    c4 = m_k * self.entr_sc[i,k]
+
+                    self.UpdVar.H.new[i,k] =  (c2 * self.UpdVar.H.values[i,k]  + c3 * self.UpdVar.H.values[i,k-1]
+                                               + c4 * H_entr + self.turb_entr_H[i,k])/c1
+                    self.UpdVar.QT.new[i,k] = (c2 * self.UpdVar.QT.values[i,k] + c3 * self.UpdVar.QT.values[i,k-1]
+                                               + c4 * QT_entr + self.turb_entr_QT[i,k])/c1
+
+                else:
+                    self.UpdVar.H.new[i,k]  = GMV.H.values[k]
+                    self.UpdVar.QT.new[i,k] = GMV.QT.values[k]
+
+                # saturation adjustment
+                sa = eos(
+                    self.UpdThermo.t_to_prog_fp,
+                    self.UpdThermo.prog_to_t_fp,
+                    self.Ref.p0_half[k],
+                    self.UpdVar.QT.new[i,k],
+                    self.UpdVar.H.new[i,k]
+                )
+                self.UpdVar.QL.new[i,k] = sa.ql
+                self.UpdVar.T.new[i,k] = sa.T
+
+            # above the active window the updraft takes the grid-mean state,
+            # as in zero_area_fraction_cleanup
+            for k in xrange(self.UpdVar.active_kmax[i], self.Gr.nzg-gw):
+                self.UpdVar.H.new[i,k]  = GMV.H.values[k]
+                self.UpdVar.QT.new[i,k] = GMV.QT.values[k]
+                self.UpdVar.QL.new[i,k] = GMV.QL.values[k]
+                self.UpdVar.T.new[i,k] = GMV.T.values[k]
+
+        return
+
+    # Backward-Euler counterparts of solve_updraft_velocity_area and solve_updraft_scalars
+    # for updraft_solver = implicit. Vertical advection is upwind, so each level only depends
+    # on the new values below it and the equations are solved by marching up from the surface;
+    # the updraft top can then rise by any number of levels in one step. The velocities in the
+    # area fluxes are lagged and updated by Picard iteration, repeating the march with the
+    # velocities of the previous one (the start of step velocities in the first). Detrainment,
+    # the velocity outflow and the pressure drag are treated implicitly and entrainment
+    # explicitly, which keeps area fraction and velocity non-negative for any time step.
+    cdef void solve_updraft_velocity_area_implicit(self) noexcept nogil:
+        cdef:
+            Py_ssize_t i, k, iter_
+            Py_ssize_t gw = self.Gr.gw
+            Py_ssize_t n_iter = 3
+            double dzi = self.Gr.dzi
+            double dti_ = 1.0/self.dt_upd
+            double whalf_kp, whalf_k
+            double au_lim
+            double anew_k, anew_km, a_k, entr_w, detr_w, B_k
+            double num, den, lin, quad, drag
+
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
+            au_lim = self.max_area
+            for k in xrange(gw, self.UpdVar.active_kmax[i]+1):
+                self.UpdVar.W.new[i,k] = self.UpdVar.W.values[i,k]
+
+            for iter_ in range(n_iter):
                 self.entr_sc[i,gw] = self.entr_surface_bc
                 self.detr_sc[i,gw] = self.detr_surface_bc
                 self.UpdVar.W.new[i,gw-1] = self.w_surface_bc[i]
                 self.UpdVar.Area.new[i,gw] = self.area_surface_bc[i]
-                au_lim = self.max_area
 
-                for k in range(gw, self.Gr.nzg-gw):
+                for k in range(gw, self.UpdVar.active_kmax[i]):
 
-                    # First solve for updated area fraction at k+1
-                    whalf_kp = interp2pt(self.UpdVar.W.values[i,k], self.UpdVar.W.values[i,k+1])
-                    whalf_k = interp2pt(self.UpdVar.W.values[i,k-1], self.UpdVar.W.values[i,k])
-                    adv = -self.Ref.alpha0_half[k+1] * dzi *( self.Ref.rho0_half[k+1] * self.UpdVar.Area.values[i,k+1] * whalf_kp
-                                                              -self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * whalf_k)
-                    entr_term = self.UpdVar.Area.values[i,k+1] * whalf_kp * (self.entr_sc[i,k+1] )
-                    detr_term = self.UpdVar.Area.values[i,k+1] * whalf_kp * (- self.detr_sc[i,k+1])
-
-                    self.UpdVar.Area.new[i,k+1]  = fmax(dt_ * (adv + entr_term + detr_term) + self.UpdVar.Area.values[i,k+1], 0.0)
+                    # First solve for updated area fraction at k+1, W.new at k and above
+                    # still holds the velocity of the previous iteration
+                    whalf_kp = interp2pt(self.UpdVar.W.new[i,k], self.UpdVar.W.new[i,k+1])
+                    whalf_k = interp2pt(self.UpdVar.W.new[i,k-1], self.UpdVar.W.new[i,k])
+                    num = (self.UpdVar.Area.values[i,k+1] * (dti_ + whalf_kp * self.entr_sc[i,k+1])
+                           + self.Ref.alpha0_half[k+1] * self.Ref.rho0_half[k] * self.UpdVar.Area.new[i,k] * whalf_k * dzi)
+                    den = dti_ + whalf_kp * (dzi + self.detr_sc[i,k+1])
+                    self.UpdVar.Area.new[i,k+1] = num/den
 
                     if self.UpdVar.Area.new[i,k+1] > au_lim:
                         self.UpdVar.Area.new[i,k+1] = au_lim
-                        if self.UpdVar.Area.values[i,k+1] > 0.0:
-                            self.detr_sc[i,k+1] = (((au_lim-self.UpdVar.Area.values[i,k+1])* dti_ - adv -entr_term)/(-self.UpdVar.Area.values[i,k+1]  * whalf_kp))
-                        else:
-                            # this detrainment rate won't affect scalars but would affect velocity
-                            self.detr_sc[i,k+1] = (((au_lim-self.UpdVar.Area.values[i,k+1])* dti_ - adv -entr_term)/(-au_lim  * whalf_kp))
+                        # the detrainment is adjusted once, with the final velocities
+                        if whalf_kp > 0.0 and iter_ == n_iter - 1:
+                            self.detr_sc[i,k+1] = (num/au_lim - dti_)/whalf_kp - dzi
 
                     # Now solve for updraft velocity at k
-                    rho_ratio = self.Ref.rho0[k-1]/self.Ref.rho0[k]
                     anew_k = interp2pt(self.UpdVar.Area.new[i,k], self.UpdVar.Area.new[i,k+1])
 
                     if anew_k >= self.minimum_area:
                         a_k = interp2pt(self.UpdVar.Area.values[i,k], self.UpdVar.Area.values[i,k+1])
-                        a_km = interp2pt(self.UpdVar.Area.values[i,k-1], self.UpdVar.Area.values[i,k])
+                        anew_km = interp2pt(self.UpdVar.Area.new[i,k-1], self.UpdVar.Area.new[i,k])
                         entr_w = interp2pt(self.entr_sc[i,k], self.entr_sc[i,k+1])
                         detr_w = interp2pt(self.detr_sc[i,k], self.detr_sc[i,k+1])
                         B_k = interp2pt(self.UpdVar.B.values[i,k], self.UpdVar.B.values[i,k+1])
 
-                        adv = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k] * self.UpdVar.W.values[i,k] * dzi
-                               - self.Ref.rho0[k-1] * a_km * self.UpdVar.W.values[i,k-1] * self.UpdVar.W.values[i,k-1] * dzi)
-                        exch = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k]
-                                * (entr_w * self.EnvVar.W.values[k] - detr_w * self.UpdVar.W.values[i,k] ) + self.turb_entr_W[i,k])
-                        buoy= self.Ref.rho0[k] * a_k * B_k
-                        self.UpdVar.W.new[i,k] = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k] * dti_
-                                                  -adv + exch + buoy + self.nh_pressure[i,k])/(self.Ref.rho0[k] * anew_k * dti_)
-
-                        if self.UpdVar.W.new[i,k] <= 0.0:
+                        num = (self.Ref.rho0[k] * a_k * self.UpdVar.W.values[i,k] * (dti_ + entr_w * self.EnvVar.W.values[k])
+                               + self.Ref.rho0[k-1] * anew_km * self.UpdVar.W.new[i,k-1] * self.UpdVar.W.new[i,k-1] * dzi
+                               + self.turb_entr_W[i,k] + self.Ref.rho0[k] * a_k * B_k + self.nh_pressure[i,k])
+                        # the outflow and detrainment are quadratic in the new velocity
+                        lin = self.Ref.rho0[k] * anew_k * dti_
+                        quad = self.Ref.rho0[k] * anew_k * (dzi + detr_w)
+                        # a decelerating drag is scaled with the new velocity
+                        drag = self.nh_pressure_drag[i,k]
+                        if drag < 0.0 and self.UpdVar.W.values[i,k] > 0.0:
+                            num = num - drag
+                            lin = lin - drag/self.UpdVar.W.values[i,k]
+                        if num > 0.0:
+                            self.UpdVar.W.new[i,k] = 2.0 * num/(lin + sqrt(lin * lin + 4.0 * quad * num))
+                        else:
                             self.UpdVar.W.new[i,k] = 0.0
                             self.UpdVar.Area.new[i,k+1] = 0.0
-                            #break
                     else:
                         self.UpdVar.W.new[i,k] = 0.0
                         self.UpdVar.Area.new[i,k+1] = 0.0
-                        # keep this in mind if we modify updraft top treatment!
-                        #break
 
+            # no updraft can reach the levels above the active window
+            for k in xrange(self.UpdVar.active_kmax[i], self.Gr.nzg-gw):
+                self.UpdVar.W.new[i,k] = 0.0
+                self.UpdVar.Area.new[i,k+1] = 0.0
 
         return
 
-    cpdef solve_updraft_scalars(self, GridMeanVariables GMV):
+    cdef void solve_updraft_scalars_implicit(self, GridMeanVariables GMV) noexcept nogil:
         cdef:
             Py_ssize_t k, i
             double dzi = self.Gr.dzi
             double dti_ = 1.0/self.dt_upd
-            double m_k, m_km
+            double m_old, m_entr, m_in
             Py_ssize_t gw = self.Gr.gw
-            double H_entr, QT_entr
-            double c1, c2, c3, c4
             eos_struct sa
 
-        with nogil:
-            for i in xrange(self.n_updrafts):
+        for i in prange(self.n_updrafts, num_threads=self.updraft_threads, schedule='static'):
 
-                # at the surface:
-                if self.UpdVar.Area.new[i,gw] >= self.minimum_area:
-                    self.UpdVar.H.new[i,gw] = self.h_surface_bc[i]
-                    self.UpdVar.QT.new[i,gw] = self.qt_surface_bc[i]
+            # at the surface:
+            if self.UpdVar.Area.new[i,gw] >= self.minimum_area:
+                self.UpdVar.H.new[i,gw] = self.h_surface_bc[i]
+                self.UpdVar.QT.new[i,gw] = self.qt_surface_bc[i]
+            else:
+                self.UpdVar.H.new[i,gw]  = GMV.H.values[gw]
+                self.UpdVar.QT.new[i,gw] = GMV.QT.values[gw]
+
+            # saturation adjustment
+            sa = eos(
+                self.UpdThermo.t_to_prog_fp, self.UpdThermo.prog_to_t_fp,
+                self.Ref.p0_half[gw], self.UpdVar.QT.new[i,gw],
+                self.UpdVar.H.new[i,gw]
+            )
+            self.UpdVar.QL.new[i,gw] = sa.ql
+            self.UpdVar.T.new[i,gw] = sa.T
+
+            # starting from the bottom mix the updraft mass already at k, the mass advected
+            # from below and the entrained mass; their sum is the updraft mass at the new time
+            # (less detrainment), which is what the implicit area equation conserves
+            for k in xrange(gw+1, self.UpdVar.active_kmax[i]):
+                if self.UpdVar.Area.new[i,k] >= self.minimum_area:
+                    m_old = self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * dti_
+                    m_entr = (self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * self.entr_sc[i,k]
+                              * interp2pt(self.UpdVar.W.new[i,k-1], self.UpdVar.W.new[i,k]))
+                    m_in = (self.Ref.rho0_half[k-1] * self.UpdVar.Area.new[i,k-1] * dzi
+                            * interp2pt(self.UpdVar.W.new[i,k-2], self.UpdVar.W.new[i,k-1]))
+
+                    self.UpdVar.H.new[i,k] = (m_old * self.UpdVar.H.values[i,k] + m_in * self.UpdVar.H.new[i,k-1]
+                                              + m_entr * self.EnvVar.H.values[k] + self.turb_entr_H[i,k])/(m_old + m_in + m_entr)
+                    self.UpdVar.QT.new[i,k] = (m_old * self.UpdVar.QT.values[i,k] + m_in * self.UpdVar.QT.new[i,k-1]
+                                               + m_entr * self.EnvVar.QT.values[k] + self.turb_entr_QT[i,k])/(m_old + m_in + m_entr)
                 else:
-                    self.UpdVar.H.new[i,gw]  = GMV.H.values[gw]
-                    self.UpdVar.QT.new[i,gw] = GMV.QT.values[gw]
+                    self.UpdVar.H.new[i,k]  = GMV.H.values[k]
+                    self.UpdVar.QT.new[i,k] = GMV.QT.values[k]
 
                 # saturation adjustment
                 sa = eos(
-                    self.UpdThermo.t_to_prog_fp, self.UpdThermo.prog_to_t_fp,
-                    self.Ref.p0_half[gw], self.UpdVar.QT.new[i,gw],
-                    self.UpdVar.H.new[i,gw]
+                    self.UpdThermo.t_to_prog_fp,
+                    self.UpdThermo.prog_to_t_fp,
+                    self.Ref.p0_half[k],
+                    self.UpdVar.QT.new[i,k],
+                    self.UpdVar.H.new[i,k]
                 )
-                self.UpdVar.QL.new[i,gw] = sa.ql
-                self.UpdVar.T.new[i,gw] = sa.T
-
-                # starting from the bottom do entrainment at each level
-                for k in xrange(gw+1, self.Gr.nzg-gw):
-                    H_entr = self.EnvVar.H.values[k]
-                    QT_entr = self.EnvVar.QT.values[k]
-
-                    # write the discrete equations in form:
-                    # c1 * phi_new[k] = c2 * phi[k] + c3 * phi[k-1] + c4 * phi_entr
-                    if self.UpdVar.Area.new[i,k] >= self.minimum_area:
-                        m_k = (self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k]
-                               * interp2pt(self.UpdVar.W.values[i,k-1], self.UpdVar.W.values[i,k]))
-                        m_km = (self.Ref.rho0_half[k-1] * self.UpdVar.Area.values[i,k-1]
-                               * interp2pt(self.UpdVar.W.values[i,k-2], self.UpdVar.W.values[i,k-1]))
-                        c1 = self.Ref.rho0_half[k] * self.UpdVar.Area.new[i,k] * dti_
-                        c2 = (self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * dti_
-                              - m_k * (dzi + self.detr_sc[i,k]))
-                        c3 = m_km * dzi
-                        c4 = m_k * self.entr_sc[i,k]
-
-                        self.UpdVar.H.new[i,k] =  (c2 * self.UpdVar.H.values[i,k]  + c3 * self.UpdVar.H.values[i,k-1]
-                                                   + c4 * H_entr + self.turb_entr_H[i,k])/c1
-                        self.UpdVar.QT.new[i,k] = (c2 * self.UpdVar.QT.values[i,k] + c3 * self.UpdVar.QT.values[i,k-1]
-                                                   + c4 * QT_entr + self.turb_entr_QT[i,k])/c1
-
-                    else:
-                        self.UpdVar.H.new[i,k]  = GMV.H.values[k]
-                        self.UpdVar.QT.new[i,k] = GMV.QT.values[k]
+                self.UpdVar.QL.new[i,k] = sa.ql
+                self.UpdVar.T.new[i,k] = sa.T
 
-                    # saturation adjustment
-                    sa = eos(
-                        self.UpdThermo.t_to_prog_fp,
-                        self.UpdThermo.prog_to_t_fp,
-                        self.Ref.p0_half[k],
-                        self.UpdVar.QT.new[i,k],
-                        self.UpdVar.H.new[i,k]
-                    )
-                    self.UpdVar.QL.new[i,k] = sa.ql
-                    self.UpdVar.T.new[i,k] = sa.T
+            # above the active window the updraft takes the grid-mean state,
+            # as in zero_area_fraction_cleanup
+            for k in xrange(self.UpdVar.active_kmax[i], self.Gr.nzg-gw):
+                self.UpdVar.H.new[i,k]  = GMV.H.values[k]
+                self.UpdVar.QT.new[i,k] = GMV.QT.values[k]
+                self.UpdVar.QL.new[i,k] = GMV.QL.values[k]
+                self.UpdVar.T.new[i,k] = GMV.T.values[k]
 
         return
 
@@ -1734,101 +2260,109 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             Py_ssize_t nzg = self.Gr.nzg
             Py_ssize_t nz = self.Gr.nz
             double dzi = self.Gr.dzi
-            double [:] a = np.zeros((nz,),dtype=np.double, order='c') # for tridiag solver
-            double [:] b = np.zeros((nz,),dtype=np.double, order='c') # for tridiag solver
-            double [:] c = np.zeros((nz,),dtype=np.double, order='c') # for tridiag solver
-            double [:] x = np.zeros((nz,),dtype=np.double, order='c') # for tridiag solver
-            double [:] ae = np.subtract(np.ones((nzg,),dtype=np.double, order='c'),self.UpdVar.Area.bulkvalues) # area of environment
-            double [:] rho_ae_K = np.zeros((nzg,),dtype=np.double, order='c')
+            Py_ssize_t work_mark = self.Work.mark()
+            double [:] a
+            double [:] b
+            double [:] c
+            double [:,:] x
+            double [:] scratch
+            double [:] pivot
+            double [:] ae
+            double [:] rho_ae_K
 
-        with nogil:
-            for k in xrange(nzg-1):
-                rho_ae_K[k] = 0.5 * (ae[k]*self.KH.values[k]+ ae[k+1]*self.KH.values[k+1]) * self.Ref.rho0[k]
-
-        # Matrix is the same for all variables that use the same eddy diffusivity, we can construct once and reuse
-        construct_tridiag_diffusion(nzg, gw, dzi, TS.dt, &rho_ae_K[0], &self.Ref.rho0_half[0],
-                                    &ae[0], &a[0], &b[0], &c[0])
-
-        # Solve QT
-        with nogil:
-            for k in xrange(nz):
-                x[k] =  self.EnvVar.QT.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_qtflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
+        try:
+            a = self.Work.borrow() # for tridiag solver
+            b = self.Work.borrow() # for tridiag solver
+            c = self.Work.borrow() # for tridiag solver
+            x = self.Work.borrow_rows(2) # for tridiag solver, one row per variable
+            scratch = self.Work.borrow() # for tridiag solver
+            pivot = self.Work.borrow() # for tridiag solver
+            ae = self.Work.borrow() # area of environment
+            rho_ae_K = self.Work.borrow()
 
-        with nogil:
-            for k in xrange(nz):
-                GMV.QT.new[k+gw] = fmax(\
-                                   GMV.QT.mf_update[k+gw]\
-                                   + ae[k+gw] *(x[k] - self.EnvVar.QT.values[k+gw])\
-                                   + self.EnvThermo.prec_source_qt[k+gw]\
-                                   + self.RainPhysics.rain_evap_source_qt[k+gw]
-                                   ,0.0)
-                self.diffusive_tendency_qt[k+gw] = (GMV.QT.new[k+gw] - GMV.QT.mf_update[k+gw]) * TS.dti
-            # get the diffusive flux
-            self.diffusive_flux_qt[gw] = interp2pt(Case.Sur.rho_qtflux, -rho_ae_K[gw] * dzi *(self.EnvVar.QT.values[gw+1]-self.EnvVar.QT.values[gw]) )
-            for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
-                self.diffusive_flux_qt[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KH.values[k] * dzi * (self.EnvVar.QT.values[k+1]-self.EnvVar.QT.values[k-1])
-
-        # Solve H
-        with nogil:
-            for k in xrange(nz):
-                x[k] = self.EnvVar.H.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_hflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
+            with nogil:
+                for k in xrange(nzg):
+                    ae[k] = 1.0 - self.UpdVar.Area.bulkvalues[k]
+                for k in xrange(nzg-1):
+                    rho_ae_K[k] = 0.5 * (ae[k]*self.KH.values[k]+ ae[k+1]*self.KH.values[k+1]) * self.Ref.rho0[k]
 
-        with nogil:
-            for k in xrange(nz):
-                GMV.H.new[k+gw] = GMV.H.mf_update[k+gw]\
-                                  + ae[k+gw] *(x[k] - self.EnvVar.H.values[k+gw])\
-                                  + self.EnvThermo.prec_source_h[k+gw]\
-                                  + self.RainPhysics.rain_evap_source_h[k+gw]
-                self.diffusive_tendency_h[k+gw] = (GMV.H.new[k+gw] - GMV.H.mf_update[k+gw]) * TS.dti
-            # get the diffusive flux
-            self.diffusive_flux_h[gw] = interp2pt(Case.Sur.rho_hflux, -rho_ae_K[gw] * dzi *(self.EnvVar.H.values[gw+1]-self.EnvVar.H.values[gw]) )
-            for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
-                self.diffusive_flux_h[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KH.values[k] * dzi * (self.EnvVar.H.values[k+1]-self.EnvVar.H.values[k-1])
-
-        # Solve U
-        with nogil:
-            for k in xrange(nzg-1):
-                rho_ae_K[k] = 0.5 * (ae[k]*self.KM.values[k]+ ae[k+1]*self.KM.values[k+1]) * self.Ref.rho0[k]
+            # Matrix is the same for all variables that use the same eddy diffusivity, we can construct and factor once
+            construct_tridiag_diffusion(nzg, gw, dzi, TS.dt, &rho_ae_K[0], &self.Ref.rho0_half[0],
+                                        &ae[0], &a[0], &b[0], &c[0])
 
-        # Matrix is the same for all variables that use the same eddy diffusivity, we can construct once and reuse
-        construct_tridiag_diffusion(nzg, gw, dzi, TS.dt, &rho_ae_K[0], &self.Ref.rho0_half[0],
-                                    &ae[0], &a[0], &b[0], &c[0])
-        with nogil:
-            for k in xrange(nz):
-                x[k] = GMV.U.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_uflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
+            # Solve QT and H together
+            with nogil:
+                for k in xrange(nz):
+                    x[0,k] = self.EnvVar.QT.values[k+gw]
+                    x[1,k] = self.EnvVar.H.values[k+gw]
+                x[0,0] = x[0,0] + TS.dt * Case.Sur.rho_qtflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
+                x[1,0] = x[1,0] + TS.dt * Case.Sur.rho_hflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
+                tridiag_factor(nz, &a[0], &b[0], &c[0], &scratch[0], &pivot[0])
+                tridiag_solve_factored(nz, 2, &x[0,0], x.shape[1], &a[0], &b[0], &scratch[0], &pivot[0])
 
-        with nogil:
-            for k in xrange(nz):
-                GMV.U.new[k+gw] = x[k]
-            self.diffusive_flux_u[gw] = interp2pt(Case.Sur.rho_uflux, -rho_ae_K[gw] * dzi *(GMV.U.values[gw+1]-GMV.U.values[gw]) )
-            for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
-                self.diffusive_flux_u[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KM.values[k] * dzi * (GMV.U.values[k+1]-GMV.U.values[k-1])
+            with nogil:
+                for k in xrange(nz):
+                    GMV.QT.new[k+gw] = fmax(\
+                                       GMV.QT.mf_update[k+gw]\
+                                       + ae[k+gw] *(x[0,k] - self.EnvVar.QT.values[k+gw])\
+                                       + self.EnvThermo.prec_source_qt[k+gw]\
+                                       + self.RainPhysics.rain_evap_source_qt[k+gw]
+                                       ,0.0)
+                    self.diffusive_tendency_qt[k+gw] = (GMV.QT.new[k+gw] - GMV.QT.mf_update[k+gw]) * TS.dti
+                # get the diffusive flux
+                self.diffusive_flux_qt[gw] = interp2pt(Case.Sur.rho_qtflux, -rho_ae_K[gw] * dzi *(self.EnvVar.QT.values[gw+1]-self.EnvVar.QT.values[gw]) )
+                for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
+                    self.diffusive_flux_qt[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KH.values[k] * dzi * (self.EnvVar.QT.values[k+1]-self.EnvVar.QT.values[k-1])
 
-        # Solve V
-        with nogil:
-            for k in xrange(nz):
-                x[k] = GMV.V.values[k+gw]
-            x[0] = x[0] + TS.dt * Case.Sur.rho_vflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
+            with nogil:
+                for k in xrange(nz):
+                    GMV.H.new[k+gw] = GMV.H.mf_update[k+gw]\
+                                      + ae[k+gw] *(x[1,k] - self.EnvVar.H.values[k+gw])\
+                                      + self.EnvThermo.prec_source_h[k+gw]\
+                                      + self.RainPhysics.rain_evap_source_h[k+gw]
+                    self.diffusive_tendency_h[k+gw] = (GMV.H.new[k+gw] - GMV.H.mf_update[k+gw]) * TS.dti
+                # get the diffusive flux
+                self.diffusive_flux_h[gw] = interp2pt(Case.Sur.rho_hflux, -rho_ae_K[gw] * dzi *(self.EnvVar.H.values[gw+1]-self.EnvVar.H.values[gw]) )
+                for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
+                    self.diffusive_flux_h[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KH.values[k] * dzi * (self.EnvVar.H.values[k+1]-self.EnvVar.H.values[k-1])
+
+            # Solve U and V together
+            with nogil:
+                for k in xrange(nzg-1):
+                    rho_ae_K[k] = 0.5 * (ae[k]*self.KM.values[k]+ ae[k+1]*self.KM.values[k+1]) * self.Ref.rho0[k]
 
-        with nogil:
-            for k in xrange(nz):
-                GMV.V.new[k+gw] = x[k]
-            self.diffusive_flux_v[gw] = interp2pt(Case.Sur.rho_vflux, -rho_ae_K[gw] * dzi *(GMV.V.values[gw+1]-GMV.V.values[gw]) )
-            for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
-                self.diffusive_flux_v[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KM.values[k] * dzi * (GMV.V.values[k+1]-GMV.V.values[k-1])
+            # Matrix is the same for all variables that use the same eddy diffusivity, we can construct and factor once
+            construct_tridiag_diffusion(nzg, gw, dzi, TS.dt, &rho_ae_K[0], &self.Ref.rho0_half[0],
+                                        &ae[0], &a[0], &b[0], &c[0])
+            with nogil:
+                for k in xrange(nz):
+                    x[0,k] = GMV.U.values[k+gw]
+                    x[1,k] = GMV.V.values[k+gw]
+                x[0,0] = x[0,0] + TS.dt * Case.Sur.rho_uflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
+                x[1,0] = x[1,0] + TS.dt * Case.Sur.rho_vflux * dzi * self.Ref.alpha0_half[gw]/ae[gw]
+                tridiag_factor(nz, &a[0], &b[0], &c[0], &scratch[0], &pivot[0])
+                tridiag_solve_factored(nz, 2, &x[0,0], x.shape[1], &a[0], &b[0], &scratch[0], &pivot[0])
 
-        GMV.QT.set_bcs(self.Gr)
-        GMV.H.set_bcs(self.Gr)
-        GMV.U.set_bcs(self.Gr)
-        GMV.V.set_bcs(self.Gr)
+            with nogil:
+                for k in xrange(nz):
+                    GMV.U.new[k+gw] = x[0,k]
+                self.diffusive_flux_u[gw] = interp2pt(Case.Sur.rho_uflux, -rho_ae_K[gw] * dzi *(GMV.U.values[gw+1]-GMV.U.values[gw]) )
+                for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
+                    self.diffusive_flux_u[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KM.values[k] * dzi * (GMV.U.values[k+1]-GMV.U.values[k-1])
 
+            with nogil:
+                for k in xrange(nz):
+                    GMV.V.new[k+gw] = x[1,k]
+                self.diffusive_flux_v[gw] = interp2pt(Case.Sur.rho_vflux, -rho_ae_K[gw] * dzi *(GMV.V.values[gw+1]-GMV.V.values[gw]) )
+                for k in xrange(self.Gr.gw+1, self.Gr.nzg-self.Gr.gw):
+                    self.diffusive_flux_v[k] = -0.5 * self.Ref.rho0_half[k]*ae[k] * self.KM.values[k] * dzi * (GMV.V.values[k+1]-GMV.V.values[k-1])
+
+            GMV.QT.set_bcs(self.Gr)
+            GMV.H.set_bcs(self.Gr)
+            GMV.U.set_bcs(self.Gr)
+            GMV.V.set_bcs(self.Gr)
+        finally:
+            self.Work.release(work_mark)
         return
 
     cpdef compute_tke_buoy(self, GridMeanVariables GMV):
@@ -1921,6 +2455,12 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                 GMV.B.values[k] = (self.UpdVar.Area.bulkvalues[k] * self.UpdVar.B.bulkvalues[k] \
                                     + (1.0 - self.UpdVar.Area.bulkvalues[k]) * self.EnvVar.B.values[k])
 
+        # the updraft top sets the plume spacing of the next timestep and the cloud cover of the
+        # subdomains the grid-mean cloud cover, so they are updated every timestep and not only
+        # when the stats are written
+        self.UpdVar.upd_cloud_diagnostics(self.Ref)
+        self.EnvVar.env_cloud_diagnostics(self.Ref)
+
         return
 
     cpdef compute_covariance(self, GridMeanVariables GMV, CasesBase Case, TimeStepping TS):
@@ -1950,12 +2490,9 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
             self.GMV_third_m(GMV.W_third_m,  self.EnvVar.TKE,  self.EnvVar.W,  self.UpdVar.W)
 
         self.reset_surface_covariance(GMV, Case)
-        if self.calc_tke:
-            self.update_covariance_ED(GMV, Case,TS, GMV.W, GMV.W, GMV.TKE, self.EnvVar.TKE, self.EnvVar.W, self.EnvVar.W, self.UpdVar.W, self.UpdVar.W)
+        if self.calc_tke or self.calc_scalar_var:
+            self.update_covariance_ED(GMV, Case,TS)
         if self.calc_scalar_var:
-            self.update_covariance_ED(GMV, Case,TS, GMV.H, GMV.H, GMV.Hvar, self.EnvVar.Hvar, self.EnvVar.H, self.EnvVar.H, self.UpdVar.H, self.UpdVar.H)
-            self.update_covariance_ED(GMV, Case,TS, GMV.QT,GMV.QT, GMV.QTvar, self.EnvVar.QTvar, self.EnvVar.QT, self.EnvVar.QT, self.UpdVar.QT, self.UpdVar.QT)
-            self.update_covariance_ED(GMV, Case,TS, GMV.H, GMV.QT, GMV.HQTcov, self.EnvVar.HQTcov, self.EnvVar.H, self.EnvVar.QT, self.UpdVar.H, self.UpdVar.QT)
             self.cleanup_covariance(GMV)
         return
 
@@ -2234,127 +2771,223 @@ cdef class EDMF_PrognosticTKE(ParameterizationBase):
                 self.tke_transport[k] = interp2pt(drho_ae_K_m_de_low, drho_ae_K_m_de_plus)
         return
 
-    cdef void update_covariance_ED(self, GridMeanVariables GMV, CasesBase Case,TimeStepping TS, VariablePrognostic GmvVar1, VariablePrognostic GmvVar2,
-            VariableDiagnostic GmvCovar, EDMF_Environment.EnvironmentVariable_2m Covar, EDMF_Environment.EnvironmentVariable  EnvVar1, EDMF_Environment.EnvironmentVariable  EnvVar2,
-                                   EDMF_Updrafts.UpdraftVariable  UpdVar1, EDMF_Updrafts.UpdraftVariable  UpdVar2):
+    # The second moments are advanced with one implicit solve per eddy diffusivity: TKE uses KM, while the
+    # scalar (co)variances share the KH matrix and are solved together, each with its own right hand side
+    cdef void update_covariance_ED(self, GridMeanVariables GMV, CasesBase Case,TimeStepping TS):
         cdef:
             Py_ssize_t k, kk, i
             Py_ssize_t gw = self.Gr.gw
             Py_ssize_t nzg = self.Gr.nzg
             Py_ssize_t nz = self.Gr.nz
-            double dzi = self.Gr.dzi
             double dti = TS.dti
-            double alpha0LL  = self.Ref.alpha0_half[self.Gr.gw]
-            double zLL = self.Gr.z_half[self.Gr.gw]
-            double [:] a = np.zeros((nz,),dtype=np.double, order='c')
-            double [:] b = np.zeros((nz,),dtype=np.double, order='c')
-            double [:] c = np.zeros((nz,),dtype=np.double, order='c')
-            double [:] x = np.zeros((nz,),dtype=np.double, order='c')
-            double [:] ae = np.subtract(np.ones((nzg,),dtype=np.double, order='c'),self.UpdVar.Area.bulkvalues)
-            double [:] ae_old = np.subtract(np.ones((nzg,),dtype=np.double, order='c'), np.sum(self.UpdVar.Area.old,axis=0))
-            double [:] rho_ae_K_m = np.zeros((nzg,),dtype=np.double, order='c')
-            double [:] whalf = np.zeros((nzg,),dtype=np.double, order='c')
-            double  D_env = 0.0
-            double Covar_surf, wu_half, K, Kp
+            Py_ssize_t work_mark = self.Work.mark()
+            double [:] a
+            double [:] b
+            double [:] c
+            double [:,:] x
+            double [:] scratch
+            double [:] pivot
+            double [:] ae
+            double [:] ae_old
+            double [:] rho_ae_K_m
+            double [:] whalf
+            double [:] D_env
+            double au_old
+            bint is_tke
+
+        try:
+            a = self.Work.borrow()
+            b = self.Work.borrow()
+            c = self.Work.borrow()
+            x = self.Work.borrow_rows(3)
+            scratch = self.Work.borrow()
+            pivot = self.Work.borrow()
+            ae = self.Work.borrow()
+            ae_old = self.Work.borrow()
+            rho_ae_K_m = self.Work.borrow()
+            whalf = self.Work.borrow()
+            D_env = self.Work.borrow()
+
+            with nogil:
+                for k in xrange(nzg):
+                    ae[k] = 1.0 - self.UpdVar.Area.bulkvalues[k]
+                    au_old = 0.0
+                    for i in xrange(self.n_updrafts):
+                        au_old += self.UpdVar.Area.old[i,k]
+                    ae_old[k] = 1.0 - au_old
+                for k in xrange(1,nzg-1):
+                    whalf[k] = interp2pt(self.EnvVar.W.values[k-1], self.EnvVar.W.values[k])
+
+            # Not necessary if BCs for variances are applied to environment.
+            # if GmvCovar.name=='tke':
+            #     GmvCovar.values[gw] =get_surface_tke(Case.Sur.ustar, self.wstar, self.Gr.z_half[gw], Case.Sur.obukhov_length)
+            # elif GmvCovar.name=='thetal_var':
+            #     GmvCovar.values[gw] = get_surface_variance(Case.Sur.rho_hflux * alpha0LL, Case.Sur.rho_hflux * alpha0LL, Case.Sur.ustar, zLL, Case.Sur.obukhov_length)
+            # elif GmvCovar.name=='qt_var':
+            #     GmvCovar.values[gw] = get_surface_variance(Case.Sur.rho_qtflux * alpha0LL, Case.Sur.rho_qtflux * alpha0LL, Case.Sur.ustar, zLL, Case.Sur.obukhov_length)
+            # elif GmvCovar.name=='thetal_qt_covar':
+            #     GmvCovar.values[gw] = get_surface_variance(Case.Sur.rho_hflux * alpha0LL, Case.Sur.rho_qtflux * alpha0LL, Case.Sur.ustar, zLL, Case.Sur.obukhov_length)
+            # self.get_env_covar_from_GMV(self.UpdVar.Area, UpdVar1, UpdVar2, EnvVar1, EnvVar2, Covar, &GmvVar1.values[0], &GmvVar2.values[0], &GmvCovar.values[0])
+
+            if self.calc_tke:
+                is_tke = self.EnvVar.TKE.is_tke
+                self.construct_covariance_rhs(self.EnvVar.TKE, ae_old, dti, &x[0,0])
+                with nogil:
+                    self.compute_covariance_entr_sink(is_tke, &D_env[0])
+                    self.construct_covariance_matrix(is_tke, &ae[0], &whalf[0], &D_env[0], &rho_ae_K_m[0], dti, &a[0], &b[0], &c[0])
+                    tridiag_factor(nz, &a[0], &b[0], &c[0], &scratch[0], &pivot[0])
+                    tridiag_solve_factored(nz, 1, &x[0,0], x.shape[1], &a[0], &b[0], &scratch[0], &pivot[0])
+                    for kk in xrange(nz):
+                        k = kk + gw
+                        self.EnvVar.TKE.values[k] = fmax(x[0,kk],0.0)
+                self.EnvVar.TKE.set_bcs(self.Gr)
+                self.get_GMV_CoVar(self.UpdVar.Area, self.UpdVar.W, self.UpdVar.W, self.EnvVar.W, self.EnvVar.W, self.EnvVar.TKE,
+                                   &GMV.W.values[0], &GMV.W.values[0], &GMV.TKE.values[0])
+
+            if self.calc_scalar_var:
+                is_tke = self.EnvVar.Hvar.is_tke
+                self.construct_covariance_rhs(self.EnvVar.Hvar, ae_old, dti, &x[0,0])
+                self.construct_covariance_rhs(self.EnvVar.QTvar, ae_old, dti, &x[1,0])
+                self.construct_covariance_rhs(self.EnvVar.HQTcov, ae_old, dti, &x[2,0])
+                with nogil:
+                    self.compute_covariance_entr_sink(is_tke, &D_env[0])
+                    self.construct_covariance_matrix(is_tke, &ae[0], &whalf[0], &D_env[0], &rho_ae_K_m[0], dti, &a[0], &b[0], &c[0])
+                    tridiag_factor(nz, &a[0], &b[0], &c[0], &scratch[0], &pivot[0])
+                    tridiag_solve_factored(nz, 3, &x[0,0], x.shape[1], &a[0], &b[0], &scratch[0], &pivot[0])
+                    for kk in xrange(nz):
+                        k = kk + gw
+                        self.EnvVar.Hvar.values[k] = fmax(x[0,kk],0.0)
+                        self.EnvVar.QTvar.values[k] = fmax(x[1,kk],0.0)
+                        self.EnvVar.HQTcov.values[k] = fmax(x[2,kk], - sqrt(self.EnvVar.Hvar.values[k]*self.EnvVar.QTvar.values[k]))
+                        self.EnvVar.HQTcov.values[k] = fmin(x[2,kk],   sqrt(self.EnvVar.Hvar.values[k]*self.EnvVar.QTvar.values[k]))
+                self.EnvVar.Hvar.set_bcs(self.Gr)
+                self.EnvVar.QTvar.set_bcs(self.Gr)
+                self.EnvVar.HQTcov.set_bcs(self.Gr)
+                self.get_GMV_CoVar(self.UpdVar.Area, self.UpdVar.H, self.UpdVar.H, self.EnvVar.H, self.EnvVar.H, self.EnvVar.Hvar,
+                                   &GMV.H.values[0], &GMV.H.values[0], &GMV.Hvar.values[0])
+                self.get_GMV_CoVar(self.UpdVar.Area, self.UpdVar.QT, self.UpdVar.QT, self.EnvVar.QT, self.EnvVar.QT, self.EnvVar.QTvar,
+                                   &GMV.QT.values[0], &GMV.QT.values[0], &GMV.QTvar.values[0])
+                self.get_GMV_CoVar(self.UpdVar.Area, self.UpdVar.H, self.UpdVar.QT, self.EnvVar.H, self.EnvVar.QT, self.EnvVar.HQTcov,
+                                   &GMV.H.values[0], &GMV.QT.values[0], &GMV.HQTcov.values[0])
+        finally:
+            self.Work.release(work_mark)
+        return
+
+    # Entrainment sink of an environmental second moment on the interior levels, summed over the updrafts;
+    # turbulent entrainment is taken on full levels for TKE
+    cdef void compute_covariance_entr_sink(self, bint is_tke, double *D_env) noexcept nogil:
+        cdef:
+            Py_ssize_t k, kk, i
+            Py_ssize_t gw = self.Gr.gw
+            double turb_entr, wu_half
+
+        for kk in xrange(self.Gr.nz):
+            k = kk+gw
+            D_env[kk] = 0.0
+
+            for i in xrange(self.n_updrafts):
+                if self.UpdVar.Area.values[i,k]>self.minimum_area:
+                    if is_tke:
+                        turb_entr = interp2pt(self.frac_turb_entr_full[i,k-1], self.frac_turb_entr_full[i,k])
+                    else:
+                        turb_entr = self.frac_turb_entr[i,k]
+
+                    wu_half = interp2pt(self.UpdVar.W.values[i,k-1], self.UpdVar.W.values[i,k])
+                    D_env[kk] += self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * wu_half * (self.entr_sc[i,k]+ turb_entr)
+                else:
+                    D_env[kk] = 0.0
+        return
+
+    # Implicit matrix for an environmental second moment: diffusion with KM for TKE or KH otherwise,
+    # advection by the environmental w, entrainment sink D_env and dissipation
+    cdef void construct_covariance_matrix(self, bint is_tke, double *ae, double *whalf, double *D_env,
+                                          double *rho_ae_K_m, double dti, double *a, double *b, double *c) noexcept nogil:
+        cdef:
+            Py_ssize_t k, kk
+            Py_ssize_t gw = self.Gr.gw
+            Py_ssize_t nzg = self.Gr.nzg
+            Py_ssize_t nz = self.Gr.nz
+            double dzi = self.Gr.dzi
+            double K, Kp
 
         for k in xrange(1,nzg-1):
-            if  Covar.name == 'tke':
+            if is_tke:
                 K = self.KM.values[k]
                 Kp = self.KM.values[k+1]
             else:
                 K = self.KH.values[k]
                 Kp = self.KH.values[k+1]
             rho_ae_K_m[k] = 0.5 * (ae[k]*K+ ae[k+1]*Kp)* self.Ref.rho0[k]
-            whalf[k] = interp2pt(self.EnvVar.W.values[k-1], self.EnvVar.W.values[k])
-        wu_half = interp2pt(self.UpdVar.W.bulkvalues[gw-1], self.UpdVar.W.bulkvalues[gw])
-
-        # Not necessary if BCs for variances are applied to environment.
-        # if GmvCovar.name=='tke':
-        #     GmvCovar.values[gw] =get_surface_tke(Case.Sur.ustar, self.wstar, self.Gr.z_half[gw], Case.Sur.obukhov_length)
-        # elif GmvCovar.name=='thetal_var':
-        #     GmvCovar.values[gw] = get_surface_variance(Case.Sur.rho_hflux * alpha0LL, Case.Sur.rho_hflux * alpha0LL, Case.Sur.ustar, zLL, Case.Sur.obukhov_length)
-        # elif GmvCovar.name=='qt_var':
-        #     GmvCovar.values[gw] = get_surface_variance(Case.Sur.rho_qtflux * alpha0LL, Case.Sur.rho_qtflux * alpha0LL, Case.Sur.ustar, zLL, Case.Sur.obukhov_length)
-        # elif GmvCovar.name=='thetal_qt_covar':
-        #     GmvCovar.values[gw] = get_surface_variance(Case.Sur.rho_hflux * alpha0LL, Case.Sur.rho_qtflux * alpha0LL, Case.Sur.ustar, zLL, Case.Sur.obukhov_length)
-        # self.get_env_covar_from_GMV(self.UpdVar.Area, UpdVar1, UpdVar2, EnvVar1, EnvVar2, Covar, &GmvVar1.values[0], &GmvVar2.values[0], &GmvCovar.values[0])
-
-        Covar_surf = Covar.values[gw]
+
+        for kk in xrange(nz):
+            k = kk+gw
+            a[kk] = (- rho_ae_K_m[k-1] * dzi * dzi )
+            b[kk] = (self.Ref.rho0_half[k] * ae[k] * dti - self.Ref.rho0_half[k] * ae[k] * whalf[k] * dzi
+                     + rho_ae_K_m[k] * dzi * dzi + rho_ae_K_m[k-1] * dzi * dzi
+                     + D_env[kk]
+                     + self.Ref.rho0_half[k] * ae[k] * self.tke_diss_coeff
+                                *sqrt(fmax(self.EnvVar.TKE.values[k],0))/fmax(self.mixing_length[k],1.0) )
+            c[kk] = (self.Ref.rho0_half[k+1] * ae[k+1] * whalf[k+1] * dzi - rho_ae_K_m[k] * dzi * dzi)
+
+        # the surface value is held fixed and the top boundary has zero gradient
+        a[0] = 0.0
+        b[0] = 1.0
+        c[0] = 0.0
+
+        b[nz-1] += c[nz-1]
+        c[nz-1] = 0.0
+
+        return
+
+    # Right hand side for the environmental second moment Covar, with its sources from the current step
+    cdef void construct_covariance_rhs(self, EDMF_Environment.EnvironmentVariable_2m Covar, double [:] ae_old,
+                                       double dti, double *x):
+        cdef:
+            Py_ssize_t k, kk
+            Py_ssize_t gw = self.Gr.gw
+            Py_ssize_t nz = self.Gr.nz
 
         with nogil:
             for kk in xrange(nz):
                 k = kk+gw
-                D_env = 0.0
-
-                for i in xrange(self.n_updrafts):
-                    if self.UpdVar.Area.values[i,k]>self.minimum_area:
-                        with gil:
-                            if Covar.name == 'tke':
-                                turb_entr = interp2pt(self.frac_turb_entr_full[i,k-1], self.frac_turb_entr_full[i,k])
-                            else:
-                                turb_entr = self.frac_turb_entr[i,k]
-
-                            R_up = self.pressure_plume_spacing[i]
-                            wu_half = interp2pt(self.UpdVar.W.values[i,k-1], self.UpdVar.W.values[i,k])
-                            D_env += self.Ref.rho0_half[k] * self.UpdVar.Area.values[i,k] * wu_half * (self.entr_sc[i,k]+ turb_entr)
-                    else:
-                        D_env = 0.0
-
-                a[kk] = (- rho_ae_K_m[k-1] * dzi * dzi )
-                b[kk] = (self.Ref.rho0_half[k] * ae[k] * dti - self.Ref.rho0_half[k] * ae[k] * whalf[k] * dzi
-                         + rho_ae_K_m[k] * dzi * dzi + rho_ae_K_m[k-1] * dzi * dzi
-                         + D_env
-                         + self.Ref.rho0_half[k] * ae[k] * self.tke_diss_coeff
-                                    *sqrt(fmax(self.EnvVar.TKE.values[k],0))/fmax(self.mixing_length[k],1.0) )
-                c[kk] = (self.Ref.rho0_half[k+1] * ae[k+1] * whalf[k+1] * dzi - rho_ae_K_m[k] * dzi * dzi)
                 x[kk] = (self.Ref.rho0_half[k] * ae_old[k] * Covar.values[k] * dti
                          + Covar.press[k] + Covar.buoy[k] + Covar.shear[k] + Covar.entr_gain[k] +  Covar.rain_src[k]) #
-
-                a[0] = 0.0
-                b[0] = 1.0
-                c[0] = 0.0
-                x[0] = Covar_surf
-
-                b[nz-1] += c[nz-1]
-                c[nz-1] = 0.0
-        tridiag_solve(self.Gr.nz, &x[0],&a[0], &b[0], &c[0])
-
-        for kk in xrange(nz):
-            k = kk + gw
-            if Covar.name == 'thetal_qt_covar':
-                Covar.values[k] = fmax(x[kk], - sqrt(self.EnvVar.Hvar.values[k]*self.EnvVar.QTvar.values[k]))
-                Covar.values[k] = fmin(x[kk],   sqrt(self.EnvVar.Hvar.values[k]*self.EnvVar.QTvar.values[k]))
-            else:
-                Covar.values[k] = fmax(x[kk],0.0)
-        Covar.set_bcs(self.Gr)
-
-        self.get_GMV_CoVar(self.UpdVar.Area, UpdVar1, UpdVar2, EnvVar1, EnvVar2, Covar, &GmvVar1.values[0], &GmvVar2.values[0], &GmvCovar.values[0])
+            x[0] = Covar.values[gw]
 
         return
 
     cdef void GMV_third_m(self, VariableDiagnostic Gmv_third_m, EDMF_Environment.EnvironmentVariable_2m env_covar,
                            EDMF_Environment.EnvironmentVariable  env_mean, EDMF_Updrafts.UpdraftVariable  upd_mean):
         cdef:
-            double [:] ae = np.subtract(np.ones((self.Gr.nzg,),dtype=np.double, order='c'),self.UpdVar.Area.bulkvalues)
+            Py_ssize_t work_mark = self.Work.mark()
+            double [:] ae
             double [:,:] au = self.UpdVar.Area.values
             double Upd_cubed, GMVv_, GMVcov_
 
-        for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
-            GMVv_   = ae[k]*env_mean.values[k]
-            for i in xrange(self.n_updrafts):
-                GMVv_ += au[i,k]*upd_mean.values[i,k]
+        try:
+            ae = self.Work.borrow()
 
-            if env_covar.name == 'tke':
-                Envcov_ = -self.horizontal_KM[i,k]*(self.EnvVar.W.values[k+1]-self.EnvVar.W.values[k-1])/(2.0*self.Gr.dz)
-            else:
-                Envcov_ = env_covar.values[k]
+            for k in xrange(self.Gr.nzg):
+                ae[k] = 1.0 - self.UpdVar.Area.bulkvalues[k]
 
-            Upd_cubed = 0.0
-            GMVcov_ = ae[k]*(Envcov_ + (env_mean.values[k] - GMVv_)**2.0)
-            for i in xrange(self.n_updrafts):
-                GMVcov_ += au[i,k]*(upd_mean.values[i,k] - GMVv_)**2.0
-                Upd_cubed += au[i,k]*upd_mean.values[i,k]**3
+            for k in xrange(self.Gr.gw, self.Gr.nzg-self.Gr.gw):
+                GMVv_   = ae[k]*env_mean.values[k]
+                for i in xrange(self.n_updrafts):
+                    GMVv_ += au[i,k]*upd_mean.values[i,k]
+
+                if env_covar.name == 'tke':
+                    Envcov_ = -self.horizontal_KM[i,k]*(self.EnvVar.W.values[k+1]-self.EnvVar.W.values[k-1])/(2.0*self.Gr.dz)
+                else:
+                    Envcov_ = env_covar.values[k]
+
+                Upd_cubed = 0.0
+                GMVcov_ = ae[k]*(Envcov_ + (env_mean.values[k] - GMVv_)**2.0)
+                for i in xrange(self.n_updrafts):
+                    GMVcov_ += au[i,k]*(upd_mean.values[i,k] - GMVv_)**2.0
+                    Upd_cubed += au[i,k]*upd_mean.values[i,k]**3
 
-            Gmv_third_m.values[k] = Upd_cubed + ae[k]*(env_mean.values[k]**3 + 3.0*env_mean.values[k]*Envcov_) - GMVv_**3.0- 3.0*GMVcov_*GMVv_
-        Gmv_third_m.values[self.Gr.gw] = 0.0 # this is here as first value is biased with BC area fraction
+                Gmv_third_m.values[k] = Upd_cubed + ae[k]*(env_mean.values[k]**3 + 3.0*env_mean.values[k]*Envcov_) - GMVv_**3.0- 3.0*GMVcov_*GMVv_
+            Gmv_third_m.values[self.Gr.gw] = 0.0 # this is here as first value is biased with BC area fraction
+        finally:
+            self.Work.release(work_mark)
         return
@@ -16,6 +16,8 @@ cdef class VariablePrognostic:
         str units
     cpdef set_bcs(self, Grid Gr)
     cpdef zero_tendencies(self, Grid Gr)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class VariableDiagnostic:
     cdef:
@@ -26,6 +28,8 @@ cdef class VariableDiagnostic:
         str name
         str units
     cpdef set_bcs(self, Grid Gr)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
 
 cdef class GridMeanVariables:
     cdef:
@@ -53,8 +57,8 @@ cdef class GridMeanVariables:
         VariableDiagnostic THVvar
         VariableDiagnostic cloud_fraction
 
-        double (*t_to_prog_fp)(double p0, double T,  double qt, double ql, double qi)   nogil
-        double (*prog_to_t_fp)(double H, double pd, double pv, double qt ) nogil
+        double (*t_to_prog_fp)(double p0, double T,  double qt, double ql, double qi) noexcept nogil
+        double (*prog_to_t_fp)(double H, double pd, double pv, double qt ) noexcept nogil
 
         bint calc_tke
         bint calc_scalar_var
@@ -67,6 +71,8 @@ cdef class GridMeanVariables:
 
     cpdef zero_tendencies(self)
     cpdef update(self, TimeStepping TS)
+    cpdef get_state(self, dict state, str prefix)
+    cpdef set_state(self, dict state, str prefix)
     cpdef initialize_io(self, NetCDFIO_Stats Stats)
     cpdef io(self, NetCDFIO_Stats Stats)
     cpdef mean_cloud_diagnostics(self)
@@ -81,6 +81,20 @@ cdef class VariablePrognostic:
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'values'] = np.array(self.values)
+        state[prefix + 'new'] = np.array(self.new)
+        state[prefix + 'mf_update'] = np.array(self.mf_update)
+        state[prefix + 'tendencies'] = np.array(self.tendencies)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.values)[:] = state[prefix + 'values']
+        np.asarray(self.new)[:] = state[prefix + 'new']
+        np.asarray(self.mf_update)[:] = state[prefix + 'mf_update']
+        np.asarray(self.tendencies)[:] = state[prefix + 'tendencies']
+        return
+
 cdef class VariableDiagnostic:
 
     def __init__(self,nz_tot,loc, kind, bc, name, units):
@@ -118,6 +132,14 @@ cdef class VariableDiagnostic:
 
         return
 
+    cpdef get_state(self, dict state, str prefix):
+        state[prefix + 'values'] = np.array(self.values)
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        np.asarray(self.values)[:] = state[prefix + 'values']
+        return
+
 cdef class GridMeanVariables:
     def __init__(self, namelist, Grid Gr, ReferenceState Ref):
         self.Gr = Gr
@@ -229,6 +251,66 @@ cdef class GridMeanVariables:
         self.zero_tendencies()
         return
 
+    # Copy the prognostic and diagnostic state into (and back out of) a dict of numpy arrays,
+    # used for checkpoints and restarts
+    cpdef get_state(self, dict state, str prefix):
+        self.U.get_state(state, prefix + 'U.')
+        self.V.get_state(state, prefix + 'V.')
+        self.W.get_state(state, prefix + 'W.')
+        self.QT.get_state(state, prefix + 'QT.')
+        self.H.get_state(state, prefix + 'H.')
+        self.RH.get_state(state, prefix + 'RH.')
+
+        self.QL.get_state(state, prefix + 'QL.')
+        self.T.get_state(state, prefix + 'T.')
+        self.B.get_state(state, prefix + 'B.')
+        self.THL.get_state(state, prefix + 'THL.')
+        self.cloud_fraction.get_state(state, prefix + 'cloud_fraction.')
+        if self.calc_tke:
+            self.TKE.get_state(state, prefix + 'TKE.')
+            self.W_third_m.get_state(state, prefix + 'W_third_m.')
+        if self.calc_scalar_var:
+            self.QTvar.get_state(state, prefix + 'QTvar.')
+            self.QT_third_m.get_state(state, prefix + 'QT_third_m.')
+            self.Hvar.get_state(state, prefix + 'Hvar.')
+            self.H_third_m.get_state(state, prefix + 'H_third_m.')
+            self.HQTcov.get_state(state, prefix + 'HQTcov.')
+
+        state[prefix + 'lwp'] = self.lwp
+        state[prefix + 'cloud_base'] = self.cloud_base
+        state[prefix + 'cloud_top'] = self.cloud_top
+        state[prefix + 'cloud_cover'] = self.cloud_cover
+        return
+
+    cpdef set_state(self, dict state, str prefix):
+        self.U.set_state(state, prefix + 'U.')
+        self.V.set_state(state, prefix + 'V.')
+        self.W.set_state(state, prefix + 'W.')
+        self.QT.set_state(state, prefix + 'QT.')
+        self.H.set_state(state, prefix + 'H.')
+        self.RH.set_state(state, prefix + 'RH.')
+
+        self.QL.set_state(state, prefix + 'QL.')
+        self.T.set_state(state, prefix + 'T.')
+        self.B.set_state(state, prefix + 'B.')
+        self.THL.set_state(state, prefix + 'THL.')
+        self.cloud_fraction.set_state(state, prefix + 'cloud_fraction.')
+        if self.calc_tke:
+            self.TKE.set_state(state, prefix + 'TKE.')
+            self.W_third_m.set_state(state, prefix + 'W_third_m.')
+        if self.calc_scalar_var:
+            self.QTvar.set_state(state, prefix + 'QTvar.')
+            self.QT_third_m.set_state(state, prefix + 'QT_third_m.')
+            self.Hvar.set_state(state, prefix + 'Hvar.')
+            self.H_third_m.set_state(state, prefix + 'H_third_m.')
+            self.HQTcov.set_state(state, prefix + 'HQTcov.')
+
+        self.lwp = state[prefix + 'lwp']
+        self.cloud_base = state[prefix + 'cloud_base']
+        self.cloud_top = state[prefix + 'cloud_top']
+        self.cloud_cover = state[prefix + 'cloud_cover']
+        return
+
     cpdef initialize_io(self, NetCDFIO_Stats Stats):
         Stats.add_profile('u_mean')
         Stats.add_profile('v_mean')
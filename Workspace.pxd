@@ -0,0 +1,10 @@
+cdef class Workspace:
+    cdef:
+        double [:,:] rows
+        Py_ssize_t position
+        public long allocations
+
+    cdef Py_ssize_t mark(self)
+    cdef release(self, Py_ssize_t position)
+    cdef double [:] borrow(self)
+    cdef double [:,:] borrow_rows(self, Py_ssize_t n)
@@ -0,0 +1,42 @@
+#!python
+#cython: boundscheck=False
+#cython: wraparound=False
+#cython: initializedcheck=False
+#cython: cdivision=True
+
+import numpy as np
+
+# Scratch memory for the temporaries of the parameterization kernels.
+# The workspace is a stack of profiles of length nzg allocated once at construction: a kernel
+# records mark(), borrows zeroed rows and gives them back with release(mark) before returning.
+# Requests the stack cannot serve fall back to a new array and are counted in allocations.
+cdef class Workspace:
+
+    def __init__(self, Py_ssize_t n_rows, Py_ssize_t nzg):
+        self.rows = np.zeros((n_rows, nzg), dtype=np.double, order='c')
+        self.position = 0
+        self.allocations = 0
+        return
+
+    cdef Py_ssize_t mark(self):
+        return self.position
+
+    cdef release(self, Py_ssize_t position):
+        self.position = position
+        return
+
+    cdef double [:] borrow(self):
+        return self.borrow_rows(1)[0,:]
+
+    cdef double [:,:] borrow_rows(self, Py_ssize_t n):
+        cdef:
+            double [:,:] block
+
+        if self.position + n > self.rows.shape[0]:
+            self.allocations += 1
+            return np.zeros((n, self.rows.shape[1]), dtype=np.double, order='c')
+
+        block = self.rows[self.position:self.position+n, :]
+        block[:,:] = 0.0
+        self.position += n
+        return block
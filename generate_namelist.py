@@ -26,6 +26,15 @@ def main():
     namelist_defaults['thermodynamics']['sgs'] = 'quadrature'
     namelist_defaults['thermodynamics']['quadrature_order'] = 3
     namelist_defaults['thermodynamics']['quadrature_type'] = "log-normal" #'gaussian' or 'log-normal'
+    namelist_defaults['thermodynamics']['quadrature_threads'] = 1 # OpenMP threads over the levels in sgs_quadrature
+    namelist_defaults['thermodynamics']['quadrature_adaptive'] = False # fewer quadrature points away from cloud edges
+    namelist_defaults['thermodynamics']['quadrature_order_min'] = 2
+    namelist_defaults['thermodynamics']['quadrature_nsigma'] = 4.0
+    namelist_defaults['thermodynamics']['saturation_solver'] = 'secant' # 'secant' or warm started 'newton'
+    namelist_defaults['thermodynamics']['lookup_tables'] = False # tabulated pv_star and latent_heat
+    namelist_defaults['thermodynamics']['lookup_dT'] = 0.05
+    namelist_defaults['thermodynamics']['lookup_max_error'] = 1e-5
+    namelist_defaults['thermodynamics']['lookup_max_halvings'] = 10 # of lookup_dT, to reach lookup_max_error
 
     namelist_defaults['time_stepping'] = {}
 
@@ -40,6 +49,10 @@ def main():
     namelist_defaults['turbulence']['EDMF_PrognosticTKE']['entrainment'] = 'moisture_deficit'
     namelist_defaults['turbulence']['EDMF_PrognosticTKE']['extrapolate_buoyancy'] = True
     namelist_defaults['turbulence']['EDMF_PrognosticTKE']['use_steady_updrafts'] = False
+    namelist_defaults['turbulence']['EDMF_PrognosticTKE']['updraft_solver'] = 'explicit' # 'explicit' (sub-stepped) or 'implicit'
+    namelist_defaults['turbulence']['EDMF_PrognosticTKE']['fused_updraft_substeps'] = True
+    namelist_defaults['turbulence']['EDMF_PrognosticTKE']['active_window'] = True # False: updraft kernels over the full column
+    namelist_defaults['turbulence']['EDMF_PrognosticTKE']['updraft_threads'] = 1 # OpenMP threads over the updrafts
     namelist_defaults['turbulence']['EDMF_PrognosticTKE']['use_local_micro'] = True
     namelist_defaults['turbulence']['EDMF_PrognosticTKE']['use_constant_plume_spacing'] = False
     namelist_defaults['turbulence']['EDMF_PrognosticTKE']['use_similarity_diffusivity'] = False
@@ -58,6 +71,18 @@ def main():
     namelist_defaults['stats_io'] = {}
     namelist_defaults['stats_io']['stats_dir'] = 'stats'
     namelist_defaults['stats_io']['frequency'] = 60.0
+    namelist_defaults['stats_io']['buffer_records'] = 10
+    namelist_defaults['stats_io']['background_writer'] = False
+    namelist_defaults['stats_io']['include'] = ['*'] # glob patterns of the variables to output
+    namelist_defaults['stats_io']['exclude'] = []
+    namelist_defaults['stats_io']['time_average'] = False
+
+    namelist_defaults['restart'] = {}
+    namelist_defaults['restart']['checkpoint_frequency'] = 0.0 # seconds, 0 disables the checkpoints
+    namelist_defaults['restart']['input_file'] = None
+
+    namelist_defaults['stochastic'] = {}
+    namelist_defaults['stochastic']['seed'] = 0 # seed of the random numbers used in the stochastic entrainment
 
     namelist_defaults['meta'] = {}
 
@@ -5,14 +5,14 @@ from libc.math cimport fmax, exp, sqrt, fmin
 from thermodynamic_functions cimport *
 include "parameters.pxi"
 
-cdef double rain_source_to_thetal(double p0, double T, double qr) nogil :
+cdef double rain_source_to_thetal(double p0, double T, double qr) noexcept nogil :
     """
     Source term for thetal because of qr transitioning between the working fluid and rain
     (simple version to avoid exponents)
     """
     return latent_heat(T) * qr / exner_c(p0) / cpd
 
-cdef double rain_source_to_thetal_detailed(double p0, double T, double qt, double ql, double qr) nogil :
+cdef double rain_source_to_thetal_detailed(double p0, double T, double qt, double ql, double qr) noexcept nogil :
     """
     Source term for thetal because of qr transitioning between the working fluid and rain
     (more detailed version, but still ignoring dqt/dqr)
@@ -28,7 +28,7 @@ cdef double rain_source_to_thetal_detailed(double p0, double T, double qt, doubl
 # instantly convert all cloud water exceeding a threshold to rain water
 # the threshold is specified as axcess saturation
 # rain water is immediately removed from the domain
-cdef double acnv_instant(double ql, double qt, double T, double p0) nogil :
+cdef double acnv_instant(double ql, double qt, double T, double p0) noexcept nogil :
 
     cdef double psat = pv_star(T)
     cdef double qsat = qv_star_c(p0, qt, psat)
@@ -36,12 +36,12 @@ cdef double acnv_instant(double ql, double qt, double T, double p0) nogil :
     return fmax(0.0, ql - max_supersaturation * qsat)
 
 # CLIMA microphysics rates
-cdef double terminal_velocity_single_drop_coeff(double rho) nogil:
+cdef double terminal_velocity_single_drop_coeff(double rho) noexcept nogil:
 
     return sqrt(8./3 / C_drag * (rho_cloud_liq / rho - 1.))
 
 
-cdef double terminal_velocity(double q_rai, double rho) nogil:
+cdef double terminal_velocity(double q_rai, double rho) noexcept nogil:
 
     cdef double v_c = terminal_velocity_single_drop_coeff(rho)
     cdef double gamma_9_2 = 11.631728396567448
@@ -55,17 +55,17 @@ cdef double terminal_velocity(double q_rai, double rho) nogil:
     return term_vel
 
 
-cdef double conv_q_vap_to_q_liq(double q_sat_liq, double q_liq) nogil:
+cdef double conv_q_vap_to_q_liq(double q_sat_liq, double q_liq) noexcept nogil:
 
   return (q_sat_liq - q_liq) / tau_cond_evap
 
 
-cdef double conv_q_liq_to_q_rai_acnv(double q_liq) nogil:
+cdef double conv_q_liq_to_q_rai_acnv(double q_liq) noexcept nogil:
 
   return fmax(0., q_liq - q_liq_threshold) / tau_acnv
 
 
-cdef double conv_q_liq_to_q_rai_accr(double q_liq, double q_rai, double rho) nogil:
+cdef double conv_q_liq_to_q_rai_accr(double q_liq, double q_rai, double rho) noexcept nogil:
 
   cdef double v_c = terminal_velocity_single_drop_coeff(rho)
   cdef double gamma_7_2 = 3.3233509704478426
@@ -77,7 +77,7 @@ cdef double conv_q_liq_to_q_rai_accr(double q_liq, double q_rai, double rho) nog
 
 
 cdef double conv_q_rai_to_q_vap(double q_rai, double q_tot, double q_liq,
-                                  double T, double p, double rho) nogil:
+                                  double T, double p, double rho) noexcept nogil:
 
   cdef double L = latent_heat(T)
   cdef double gamma_11_4 = 1.6083594219855457
@@ -104,6 +104,19 @@ cdef double conv_q_rai_to_q_vap(double q_rai, double q_tot, double q_liq,
   return S * F_param * G_param * sqrt(MP_n_0) / rho
 
 
+cdef int rain_model_flag(str rain_model):
+    """
+    integer flag of the rain model, for use in microphysics_rain_src_c
+    """
+    if rain_model == 'clima_1m':
+        return rain_model_clima_1m
+    elif rain_model == 'cutoff':
+        return rain_model_cutoff
+    elif rain_model == 'None':
+        return rain_model_none
+    else:
+        sys.exit('rain model not recognized')
+
 cdef mph_struct microphysics_rain_src(
                   str rain_model,
                   double qt,
@@ -121,6 +134,29 @@ cdef mph_struct microphysics_rain_src(
       new values: qt, ql, qv, thl, th, alpha
       rates: qr_src, thl_rain_src
     """
+    #TODO - temporary way to handle different autoconversion rates
+    # cython doesn't allow for string comparison without gil
+    cdef int flag
+    with gil:
+        flag = rain_model_flag(rain_model)
+
+    return microphysics_rain_src_c(flag, qt, ql, qr, area, T, p0, rho, dt)
+
+cdef mph_struct microphysics_rain_src_c(
+                  int rain_model,
+                  double qt,
+                  double ql,
+                  double qr,
+                  double area,
+                  double T,
+                  double p0,
+                  double rho,
+                  double dt) noexcept nogil:
+
+    """
+    same as microphysics_rain_src, with the rain model given by its flag,
+    so that it can be called without the gil
+    """
     # TODO assumes no ice
     cdef mph_struct _ret
     _ret.qv    = qt - ql
@@ -128,32 +164,17 @@ cdef mph_struct microphysics_rain_src(
     _ret.th    = theta_c(p0, T)
     _ret.rho = rho_c(p0, T, qt, _ret.qv)
 
-    #TODO - temporary way to handle different autoconversion rates
-    # cython doesn't allow for string comparison without gil
-    tmp_clima_acnv_flag = False
-    tmp_cutoff_acnv_flag = False
-    tmp_no_acnv_flag = False
-    with gil:
-        if rain_model == 'clima_1m':
-            tmp_clima_acnv_flag = True
-        elif rain_model == 'cutoff':
-            tmp_cutoff_acnv_flag = True
-        elif rain_model == 'None':
-            tmp_no_acnv_flag = True
-        else:
-            sys.exit('rain model not recognized')
-
     if area > 0.:
-        if tmp_clima_acnv_flag:
+        if rain_model == rain_model_clima_1m:
             _ret.qr_src = fmin(ql,
                                   (conv_q_liq_to_q_rai_acnv(ql) +
                                    conv_q_liq_to_q_rai_accr(ql, qr, rho)) * dt
                               )
 
-        if tmp_cutoff_acnv_flag:
+        elif rain_model == rain_model_cutoff:
             _ret.qr_src = fmin(ql, acnv_instant(ql, qt, T, p0))
 
-        if tmp_no_acnv_flag:
+        else:
             _ret.qr_src = 0.
 
         _ret.thl_rain_src = rain_source_to_thetal(p0, T, _ret.qr_src)
@@ -170,7 +191,7 @@ cdef mph_struct microphysics_rain_src(
     return _ret
 
 cdef rain_struct rain_area(double source_area,  double source_qr,
-                           double current_area, double current_qr ) nogil:
+                           double current_area, double current_qr ) noexcept nogil:
     """
     Source terams for rain and rain area
     assuming constant rain area fraction of 1
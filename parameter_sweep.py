@@ -1,170 +1,188 @@
-import subprocess
 import argparse
+import copy
 import json
-import pprint
-from sys import exit
-import uuid
-import ast
+import multiprocessing
 import numpy as np
 import netCDF4 as nc
 import os
 
-# python parameter_sweep.py case_name
+import Simulation1d
+from Grid import Grid
+from NetCDFIO import NetCDFIO_Stats, output_path
+
+# diagnostics gathered from every sweep member
+sweep_ts = ['lwp_mean', 'cloud_cover_mean', 'cloud_top_mean', 'cloud_base_mean']
+sweep_profiles = ['updraft_area', 'ql_mean', 'updraft_w', 'thetal_mean', 'massflux',
+                  'buoyancy_mean', 'env_tke', 'updraft_thetal_precip']
+
+# python parameter_sweep.py case_name [--nprocs N] [--spinup SECONDS]
 def main():
     parser = argparse.ArgumentParser(prog='Paramlist Generator')
     parser.add_argument('case_name')
+    parser.add_argument('--nprocs', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--spinup', type=float, default=0.0,
+                        help='run the first SECONDS once with paramlist_<case_name>.in and start all members from there')
     args = parser.parse_args()
     case_name = args.case_name
 
     file_case = open(case_name + '_sweep.in').read()
     namelist = json.loads(file_case)
-    uuid = namelist['meta']['uuid']
-    print(uuid)
-    path = namelist['output']['output_root'] + 'Output.' + case_name + '.' + uuid[-5:] + '/stats/Stats.' + case_name + '.nc'
-    path1 = namelist['output']['output_root'] + 'Output.' + case_name + '.' + uuid[-5:] + '/paramlist_sweep.in'
-    tmax = namelist['time_stepping']['t_max']
-    #dt   = namelist['time_stepping']['dt']
-    freq = namelist['stats_io']['frequency']
-    nz   = namelist['grid']['nz']
-    nt = int(tmax/freq)+1
-    print nt
-    II=1
+
     nvar = 11
     sweep_var = np.linspace(0.7, 2.2, num=nvar)
+    paramlists = [sweep(sweep_var_i) for sweep_var_i in sweep_var]
+
+    print('========================')
+    print('running ' + case_name + ' sweep of ' + str(nvar) + ' members on ' + str(args.nprocs) + ' processes')
+    print('========================')
+    state = None
+    if args.spinup > 0.0:
+        paramlist = json.loads(open('paramlist_' + case_name + '.in').read())
+        state = spinup(namelist, paramlist, args.spinup)
+    results = run_sweep(namelist, paramlists, args.nprocs, state)
+
+    destination = namelist['output']['output_root'] + 'Stats.sweep_' + case_name + '.nc'
+    write_sweep(destination, namelist, sweep_var, results)
+    print('========================')
+    print('======= SWEEP END ======')
+    print('========================')
+    return
 
-    #sweep_var = [0.05,0.06,0.07,0.08,0.09,0.1,0.11,0.12,0.13,0.14,0.15,0.16,0.17,0.18]
-
-
-
-    _z = np.zeros((nz))
-    _t = np.zeros((nt))
-    _lwp = np.zeros((nt,nvar))
-    _cloud_cover = np.zeros((nt,nvar))
-    _cloud_top = np.zeros((nt,nvar))
-    _cloud_base = np.zeros((nt,nvar))
-    _updraft_area = np.zeros((nt,nz,nvar))
-    _ql_mean = np.zeros((nt,nz,nvar))
-    _updraft_w = np.zeros((nt,nz,nvar))
-    _thetal_mean = np.zeros((nt,nz,nvar))
-    _massflux = np.zeros((nt, nz, nvar))
-    _buoyancy_mean = np.zeros((nt,nz,nvar))
-    _env_tke = np.zeros((nt,nz,nvar))
-    _updraft_thetal_precip = np.zeros((nt,nz,nvar))
-    _sweep_var = np.zeros(nvar)
-
-    for i in range(0,nvar):
-        sweep_var_i = sweep_var[i]
-        paramlist = sweep(sweep_var_i)
-        write_file(paramlist)
-        file_case = open('paramlist_sweep.in').read()
-        current = json.loads(file_case)
-
-        print('========================')
-        print('running '+case_name+' var = '+ str(sweep_var_i))
-        print('========================')
-        subprocess.call("python main.py " + case_name + "_sweep.in paramlist_sweep.in", shell=True)
-
-        data = nc.Dataset(path, 'r')
-        zz = data.groups['profiles'].variables['z']
-        tt = data.groups['profiles'].variables['t']
-
-        lwp_ = np.multiply(data.groups['timeseries'].variables['lwp'], 1.0)
-        cloud_cover_ = np.multiply(data.groups['timeseries'].variables['cloud_cover'],1.0)
-        cloud_top_ = np.multiply(data.groups['timeseries'].variables['cloud_top'],1.0)
-        cloud_base_ = np.multiply(data.groups['timeseries'].variables['cloud_base'],1.0)
-
-        updraft_area_ = np.multiply(data.groups['profiles'].variables['updraft_area'],1.0)
-        ql_mean_ = np.multiply(data.groups['profiles'].variables['ql_mean'],1.0)
-        updraft_w_ = np.multiply(data.groups['profiles'].variables['updraft_w'],1.0)
-        thetal_mean_ = np.multiply(data.groups['profiles'].variables['thetal_mean'],1.0)
-        massflux_ = np.multiply(data.groups['profiles'].variables['massflux'], 1.0)
-        buoyancy_mean_ = np.multiply(data.groups['profiles'].variables['buoyancy_mean'],1.0)
-        env_tke_ = np.multiply(data.groups['profiles'].variables['env_tke'],1.0)
-        updraft_thetal_precip_ = np.multiply(data.groups['profiles'].variables['updraft_thetal_precip'], 1.0)
-        print np.shape(lwp_)
-        try:
 
-            _lwp[:, II] = lwp_[0:nt]
-            _cloud_cover[:,II] = cloud_cover_[0:nt]
-            _cloud_top[:,II] = cloud_top_[0:nt]
-            _cloud_base[:,II] = cloud_base_[0:nt]
-            _t = tt[0:nt]
-            _z = zz
-            _updraft_area[:,:,II] = updraft_area_[0:nt,0:nz]
-            _ql_mean[:,:,II] = ql_mean_[0:nt,0:nz]
-            _updraft_w[:,:,II] = updraft_w_[0:nt,0:nz]
-            _thetal_mean[:,:,II] = thetal_mean_[0:nt,0:nz]
-            _massflux[:, :, II] = massflux_[0:nt, 0:nz]
-            _buoyancy_mean[:,:,II] = buoyancy_mean_[0:nt,0:nz]
-            _env_tke[:,:,II] = env_tke_[0:nt,0:nz]
-            _updraft_thetal_precip[:,:,II] = updraft_thetal_precip_[0:nt,0:nz]
-            _sweep_var[II] = sweep_var_i
-            II += 1
-        except:
-            pass
-
-
-
-        os.remove(path)
-        os.remove(path1)
-
-    destination = '/Users/yaircohen/Documents/SCAMPy_out/parameter_sweep/'
-    out_stats = nc.Dataset(destination + '/Stats.sweep_' + case_name + '.nc', 'w', format='NETCDF4')
+class NetCDFIO_StatsSweep(NetCDFIO_Stats):
+    """
+    NetCDFIO_Stats that also keeps the sweep diagnostics in memory,
+    so that they do not have to be read back from the stats file.
+    The records are taken as they are written to the stats file, so they are
+    time averaged as in the file and only contain the variables of the output manifest.
+    """
+    def __init__(self, namelist, paramlist, Gr):
+        NetCDFIO_Stats.__init__(self, namelist, paramlist, Gr)
+        self.t = []
+        self.records = {}
+        for var_name in sweep_ts + sweep_profiles:
+            self.records[var_name] = []
+        return
+
+    def write_records(self, start, t, profiles, ts, n):
+        NetCDFIO_Stats.write_records(self, start, t, profiles, ts, n)
+        self.t.extend(np.array(t[:n]))
+        for var_name in sweep_profiles:
+            if var_name in profiles:
+                self.records[var_name].extend(np.array(profiles[var_name][:n, :]))
+        for var_name in sweep_ts:
+            if var_name in ts:
+                self.records[var_name].extend(np.array(ts[var_name][:n]))
+        return
+
+
+def spinup(namelist, paramlist, t_spinup):
+    """
+    Run the spin-up period shared by all sweep members and return the model state at its end.
+    """
+    namelist_spinup = copy.deepcopy(namelist)
+    namelist_spinup['time_stepping']['t_max'] = t_spinup
+    Simulation = Simulation1d.Simulation1d(namelist_spinup, paramlist)
+    Simulation.initialize(namelist_spinup)
+    Simulation.run()
+    return Simulation.get_state()
+
+
+def run_member(args):
+    """
+    Run one sweep member in this process and return its diagnostics.
+    If state is not None the member starts from it instead of the initial profiles.
+    Returns None if the simulation fails.
+    """
+    i, namelist, paramlist, state = args
+    # the serial sweep passes the same namelist to every member
+    namelist = copy.deepcopy(namelist)
+    paramlist = copy.deepcopy(paramlist)
+    # every member writes to its own output folder, inside the one of the sweep
+    namelist['output']['output_root'] = os.path.join(output_path(namelist), '')
+    namelist['meta']['uuid'] = str(namelist['meta']['uuid']) + '.' + '%05d' % i
+    paramlist['meta']['casename'] = paramlist['meta']['casename'] + '_' + '%05d' % i
+    Stats = None
+    try:
+        Gr = Grid(namelist)
+        Stats = NetCDFIO_StatsSweep(namelist, paramlist, Gr)
+        Simulation = Simulation1d.Simulation1d(namelist, paramlist, Gr=Gr, Stats=Stats)
+        Simulation.initialize(namelist, state=state)
+        Simulation.run()
+    except Exception as e:
+        print('sweep member ' + str(i) + ' failed: ' + str(e))
+        # keep the records written before the failure
+        if Stats is not None:
+            Stats.close_files()
+        return None
+
+    # variables left out by the output manifest are not in the results
+    data = {'t': np.array(Stats.t)}
+    for var_name in sweep_ts + sweep_profiles:
+        if Stats.registered(var_name):
+            data[var_name] = np.array(Stats.records[var_name])
+    return data
+
+
+def run_sweep(namelist, paramlists, nprocs, state=None):
+    """
+    Run all paramlists on a pool of nprocs processes. The results are in the same order as paramlists.
+    """
+    args = [(i, namelist, paramlists[i], state) for i in range(len(paramlists))]
+    if nprocs > 1:
+        pool = multiprocessing.Pool(processes=min(nprocs, len(paramlists)))
+        try:
+            results = pool.map(run_member, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [run_member(a) for a in args]
+    return results
+
+
+def write_sweep(destination, namelist, sweep_var, results):
+    """
+    Write the diagnostics of all successful sweep members into one file with a var dimension.
+    """
+    members = [i for i in range(len(results)) if results[i] is not None]
+    if len(members) == 0:
+        print('no sweep member completed, nothing to write')
+        return
+    nz = namelist['grid']['nz']
+    dz = namelist['grid']['dz']
+    nt = min([np.shape(results[i]['t'])[0] for i in members])
+    nvar = len(members)
+
+    out_stats = nc.Dataset(destination, 'w', format='NETCDF4')
     grp_stats = out_stats.createGroup('profiles')
     grp_stats.createDimension('z', nz)
     grp_stats.createDimension('t', nt)
-    grp_stats.createDimension('var', II)
+    grp_stats.createDimension('var', nvar)
 
     t = grp_stats.createVariable('t', 'f4', 't')
     z = grp_stats.createVariable('z', 'f4', 'z')
     var = grp_stats.createVariable('var', 'f4', 'var')
-    lwp = grp_stats.createVariable('lwp', 'f4', ('t', 'var'))
-    cloud_cover = grp_stats.createVariable('cloud_cover', 'f4', ('t', 'var'))
-    cloud_top = grp_stats.createVariable('cloud_top', 'f4', ('t', 'var'))
-    cloud_base = grp_stats.createVariable('cloud_base', 'f4', ('t', 'var'))
-    updraft_area = grp_stats.createVariable('updraft_area', 'f4', ('t', 'z','var'))
-    ql_mean = grp_stats.createVariable('ql_mean', 'f4', ('t', 'z', 'var'))
-    updraft_w = grp_stats.createVariable('updraft_w', 'f4', ('t', 'z', 'var'))
-    thetal_mean = grp_stats.createVariable('thetal_mean', 'f4', ('t', 'z', 'var'))
-    massflux = grp_stats.createVariable('massflux', 'f4', ('t', 'z', 'var'))
-    buoyancy_mean = grp_stats.createVariable('buoyancy_mean', 'f4', ('t', 'z', 'var'))
-    env_tke = grp_stats.createVariable('env_tke', 'f4', ('t', 'z', 'var'))
-    updraft_thetal_precip = grp_stats.createVariable('updraft_thetal_precip', 'f4', ('t', 'z', 'var'))
-    print '---------------------------------'
-    print np.shape(var)
-    print np.shape(_sweep_var)
-    print II
-    print '---------------------------------'
-    var[:] = _sweep_var[0:II]
-    print np.shape(_t)
-    print np.shape(t)
-    #t[:] = _t
-    #z[:] = _z
-    print '---------------------------------'
-    print np.shape(lwp)
-    print np.shape(_lwp)
-    print II
-    print '---------------------------------'
-
-    lwp[:,:] = _lwp[:,0:II]
-    cloud_cover[:,:] = _cloud_cover[:,0:II]
-    cloud_top[:,:] = _cloud_top[:,0:II]
-    cloud_base[:,:] = _cloud_base[:,0:II]
-    updraft_area[:,:,:] = _updraft_area[:,:,0:II]
-    ql_mean[:,:,:] = _ql_mean[:,:,0:II]
-    updraft_w[:,:,:] = _updraft_w[:,:,0:II]
-    massflux[:,:,:] = _massflux[:,:,0:II]
-    buoyancy_mean[:,:,:] = _buoyancy_mean[:,:,0:II]
-    env_tke[:,:,:] = _env_tke[:,:,0:II]
-    updraft_thetal_precip[:, :, :] = _updraft_thetal_precip[:,:,0:II]
+    t[:] = results[members[0]]['t'][0:nt]
+    z[:] = (np.arange(nz) + 0.5) * dz
+    var[:] = np.array([sweep_var[i] for i in members])
+
+    for var_name in sweep_ts + sweep_profiles:
+        if var_name not in results[members[0]]:
+            print('sweep variable ' + var_name + ' is not in the output manifest (stats_io include/exclude), not written')
+    for var_name in sweep_ts:
+        if var_name not in results[members[0]]:
+            continue
+        out = grp_stats.createVariable(var_name, 'f4', ('t', 'var'))
+        out[:, :] = np.stack([results[i][var_name][0:nt] for i in members], axis=-1)
+    for var_name in sweep_profiles:
+        if var_name not in results[members[0]]:
+            continue
+        out = grp_stats.createVariable(var_name, 'f4', ('t', 'z', 'var'))
+        out[:, :, :] = np.stack([results[i][var_name][0:nt, 0:nz] for i in members], axis=-1)
 
     out_stats.close()
-    print('========================')
-    print('======= SWEEP END ======')
-    print('========================')
-
-
-
+    return
 
 
 def sweep(sweep_var_i): # vel_pressure_coeff_i
@@ -200,13 +218,5 @@ def sweep(sweep_var_i): # vel_pressure_coeff_i
 
     return  paramlist
 
-def write_file(paramlist):
-
-    fh = open('paramlist_'+paramlist['meta']['casename']+ '.in', 'w')
-    json.dump(paramlist, fh, sort_keys=True, indent=4)
-    fh.close()
-
-    return
-
 if __name__ == '__main__':
     main()
@@ -2,7 +2,13 @@
 # written to be able to use the thermodynamic functions from Pytest
 
 cimport thermodynamic_functions as fun
+cimport utility_functions
+cimport turbulence_functions
+cimport RandomStream
+cimport Workspace
 include "parameters.pxi"
+import thermodynamic_functions
+import numpy as np
 
 cdef class scampy_constants:
     def __init__(self):
@@ -29,6 +35,12 @@ def qv_star_t(p0, T):
 def latent_heat(T):
     return fun.latent_heat(T)
 
+def initialize_lookup_tables(namelist):
+    thermodynamic_functions.initialize_lookup_tables(namelist)
+
+def free_lookup_tables():
+    thermodynamic_functions.free_lookup_tables()
+
 # t_to_prog
 def t_to_thetali_c(p0, T, qt, ql, qi):
     return fun.t_to_thetali_c(p0, T, qt, ql, qi)
@@ -41,6 +53,85 @@ def eos_first_guess_thetal(H, pd, pv, qt):
 def eos(p0, qt, prog) :
     return fun.eos(fun.t_to_thetali_c, fun.eos_first_guess_thetal, p0, qt, prog)
 
+# saturation adjustment with Newton iterations started from T_guess
+def eos_newton(p0, qt, prog, T_guess) :
+    return fun.eos_newton(fun.t_to_thetali_c, fun.eos_first_guess_thetal, fun.dthetali_dT_sat_c, p0, qt, prog, T_guess)
+
 def theta_c(p0, T):
     return fun.theta_c(p0, T)
 
+# mean of a standard normal distribution between two percentiles
+def percentile_bounds_mean_norm(low_percentile, high_percentile):
+    return utility_functions.percentile_bounds_mean_norm(low_percentile, high_percentile)
+
+
+# selection median of a 1-D array, using a scratch buffer of the same length
+def median_c(x):
+    cdef:
+        double [:] xa = np.array(x, dtype=np.double, ndmin=1)
+        double [:] work = np.zeros(xa.shape[0] + 1, dtype=np.double)
+    return utility_functions.median_c(&xa[0] if xa.shape[0] > 0 else &work[0], xa.shape[0], &work[0])
+
+# index of the first minimum of a 1-D array
+def argmin_c(x):
+    cdef:
+        double [:] xa = np.array(x, dtype=np.double, ndmin=1)
+    return utility_functions.argmin_c(&xa[0], xa.shape[0])
+
+def auto_smooth_minimum_c(x, f):
+    cdef:
+        double [:] xa = np.array(x, dtype=np.double, ndmin=1)
+    return utility_functions.auto_smooth_minimum_c(&xa[0], xa.shape[0], f)
+
+def lamb_smooth_minimum_c(x, eps, dz):
+    cdef:
+        double [:] xa = np.array(x, dtype=np.double, ndmin=1)
+    return utility_functions.lamb_smooth_minimum_c(&xa[0], xa.shape[0], eps, dz)
+
+# the next n uniform and Poisson draws of a RandomStream
+def random_uniform(RandomStream.RandomStream stream, n):
+    return np.array([stream.next_uniform() for i in range(n)])
+
+def random_poisson(RandomStream.RandomStream stream, lam, n):
+    return np.array([stream.poisson(lam) for i in range(n)])
+
+# Gauss-Hermite nodes and weights of a standard normal distribution
+def gauss_hermite(order):
+    cdef:
+        double *nodes = utility_functions.gauss_hermite_nodes(order)
+        double *weights = utility_functions.gauss_hermite_weights(order)
+    return (np.array([nodes[m] for m in range(order)]), np.array([weights[m] for m in range(order)]))
+
+# tridiagonal solve of one right hand side, as update_GMV_ED and update_covariance_ED did for every variable
+def tridiag_solve(a, b, c, x):
+    cdef:
+        double [:] aa = np.array(a, dtype=np.double)
+        double [:] ba = np.array(b, dtype=np.double)
+        double [:] ca = np.array(c, dtype=np.double)
+        double [:] xa = np.array(x, dtype=np.double)
+    turbulence_functions.tridiag_solve(xa.shape[0], &xa[0], &aa[0], &ba[0], &ca[0])
+    return np.asarray(xa)
+
+# tridiagonal solve of all rows of x, with the matrix factored once
+def tridiag_solve_factored(a, b, c, x):
+    cdef:
+        double [:] aa = np.array(a, dtype=np.double)
+        double [:] ba = np.array(b, dtype=np.double)
+        double [:] ca = np.array(c, dtype=np.double)
+        double [:,:] xa = np.array(x, dtype=np.double, order='c', ndmin=2)
+        double [:] scratch = np.zeros(xa.shape[1], dtype=np.double)
+        double [:] pivot = np.zeros(xa.shape[1], dtype=np.double)
+    turbulence_functions.tridiag_factor(xa.shape[1], &aa[0], &ba[0], &ca[0], &scratch[0], &pivot[0])
+    turbulence_functions.tridiag_solve_factored(xa.shape[1], xa.shape[0], &xa[0,0], xa.shape[1], &aa[0], &ba[0],
+                                                &scratch[0], &pivot[0])
+    return np.asarray(xa)
+
+# mark, borrow and release of a Workspace, the borrowed rows are returned as one array
+def workspace_mark(Workspace.Workspace work):
+    return work.mark()
+
+def workspace_borrow_rows(Workspace.Workspace work, n):
+    return np.asarray(work.borrow_rows(n))
+
+def workspace_release(Workspace.Workspace work, position):
+    work.release(position)
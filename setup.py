@@ -26,6 +26,7 @@ if sys.platform == 'darwin':
     netcdf_include = '/opt/local/include'
     netcdf_lib = '/opt/local/lib'
     f_compiler = 'gfortran'
+    openmp_args = [] # Apple clang does not ship OpenMP
 elif 'eu' in platform.node():
     #Compile flags for euler @ ETHZ
     library_dirs = ['/cluster/apps/openmpi/1.6.5/x86_64/gcc_4.8.2/lib/']
@@ -41,6 +42,7 @@ elif 'eu' in platform.node():
     netcdf_include = '/cluster/apps/netcdf/4.3.1/x86_64/gcc_4.8.2/openmpi_1.6.5/include'
     netcdf_lib = '/cluster/apps/netcdf/4.3.1/x86_64/gcc_4.8.2/openmpi_1.6.5/lib'
     f_compiler = 'gfortran'
+    openmp_args = ['-fopenmp']
 elif 'sampo' in platform.node():
     #Compile flags for sampo @ Caltech
     library_dirs = os.environ['LD_LIBRARY_PATH'].split(':')
@@ -55,6 +57,7 @@ elif 'sampo' in platform.node():
     netcdf_include = '/export/data1/ajaruga/clones/netcdf-4.4/localnetcdf/include'
     netcdf_lib = '/export/data1/ajaruga/clones/netcdf-4.4/localnetcdf/lib'
     f_compiler = 'gfortran'
+    openmp_args = ['-fopenmp']
 elif 'linux' in sys.platform:
     #Compile flags for Travis (linux)
     library_dirs = []
@@ -70,6 +73,7 @@ elif 'linux' in sys.platform:
     netcdf_include = tmp_path + '/netcdf4/include'
     netcdf_lib = tmp_path + "/netcdf4/lib"
     f_compiler = 'gfortran'
+    openmp_args = ['-fopenmp']
 elif platform.machine()  == 'x86_64':
     #Compile flags for Central @ Caltech
     library_dirs = os.environ['LD_LIBRARY_PATH'].split(':')
@@ -84,6 +88,7 @@ elif platform.machine()  == 'x86_64':
     netcdf_include = '/central/software/netcdf-c/4.6.1/include'
     netcdf_lib = '/central/software/netcdf-c/4.6.1/lib'
     f_compiler = 'gfortran'
+    openmp_args = ['-fopenmp']
 else:
     print('Unknown system platform: ' + sys.platform  + 'or unknown system name: ' + platform.node())
     sys.exit()
@@ -132,21 +137,31 @@ _ext = Extension('TimeStepping', ['TimeStepping.pyx'], include_dirs=include_path
                  runtime_library_dirs=library_dirs)
 extensions.append(_ext)
 
-_ext = Extension('NetCDFIO', ['NetCDFIO.pyx'], include_dirs=include_path,
+_ext = Extension('RandomStream', ['RandomStream.pyx'], include_dirs=include_path,
                  extra_compile_args=extra_compile_args, libraries=libraries, library_dirs=library_dirs,
                  runtime_library_dirs=library_dirs)
 extensions.append(_ext)
 
-_ext = Extension('EDMF_Updrafts', ['EDMF_Updrafts.pyx'], include_dirs=include_path,
+_ext = Extension('Workspace', ['Workspace.pyx'], include_dirs=include_path,
                  extra_compile_args=extra_compile_args, libraries=libraries, library_dirs=library_dirs,
                  runtime_library_dirs=library_dirs)
 extensions.append(_ext)
 
-_ext = Extension('EDMF_Environment', ['EDMF_Environment.pyx'], include_dirs=include_path,
+_ext = Extension('NetCDFIO', ['NetCDFIO.pyx'], include_dirs=include_path,
                  extra_compile_args=extra_compile_args, libraries=libraries, library_dirs=library_dirs,
                  runtime_library_dirs=library_dirs)
 extensions.append(_ext)
 
+_ext = Extension('EDMF_Updrafts', ['EDMF_Updrafts.pyx'], include_dirs=include_path,
+                 extra_compile_args=extra_compile_args + openmp_args, extra_link_args=openmp_args,
+                 libraries=libraries, library_dirs=library_dirs, runtime_library_dirs=library_dirs)
+extensions.append(_ext)
+
+_ext = Extension('EDMF_Environment', ['EDMF_Environment.pyx'], include_dirs=include_path,
+                 extra_compile_args=extra_compile_args + openmp_args, extra_link_args=openmp_args,
+                 libraries=libraries, library_dirs=library_dirs, runtime_library_dirs=library_dirs)
+extensions.append(_ext)
+
 _ext = Extension('EDMF_Rain', ['EDMF_Rain.pyx'], include_dirs=include_path,
                  extra_compile_args=extra_compile_args, libraries=libraries, library_dirs=library_dirs,
                  runtime_library_dirs=library_dirs)
@@ -158,8 +173,8 @@ _ext = Extension('Turbulence', ['Turbulence.pyx'], include_dirs=include_path,
 extensions.append(_ext)
 
 _ext = Extension('Turbulence_PrognosticTKE', ['Turbulence_PrognosticTKE.pyx'], include_dirs=include_path,
-                 extra_compile_args=extra_compile_args, libraries=libraries, library_dirs=library_dirs,
-                 runtime_library_dirs=library_dirs)
+                 extra_compile_args=extra_compile_args + openmp_args, extra_link_args=openmp_args,
+                 libraries=libraries, library_dirs=library_dirs, runtime_library_dirs=library_dirs)
 extensions.append(_ext)
 
 _ext = Extension('ReferenceState', ['ReferenceState.pyx'], include_dirs=include_path,
@@ -112,3 +112,71 @@ def test_eos_saturated(z, rnd, ql):
     assert(np.isclose(T,  res['T'],  rtol = 1e-3))
     if (ql > 1e-7):
         assert(np.isclose(ql, res['ql'], rtol = 1e-2))
+
+
+@given(T = st.floats(min_value = 180, max_value = 340)) # temperature between -93 - 67 C
+def test_lookup_tables(T):
+    """
+    Tests the tabulated pv_star and latent_heat from thermodynamic_functions.pyx
+    against the formulas, using the relative error bound the tables are built for.
+    """
+    pv_s = wrp.pv_star(T)
+    L    = wrp.latent_heat(T)
+
+    namelist = {'thermodynamics': {'lookup_tables': True, 'lookup_dT': 0.1, 'lookup_max_error': 1e-7}}
+    wrp.free_lookup_tables()
+    wrp.initialize_lookup_tables(namelist)
+    pv_s_table = wrp.pv_star(T)
+    L_table    = wrp.latent_heat(T)
+    wrp.free_lookup_tables()
+
+    assert(np.isclose(pv_s, pv_s_table, rtol = 1e-7, atol = 0))
+    assert(np.isclose(L,    L_table,    rtol = 1e-7, atol = 0))
+
+@pytest.mark.parametrize("max_error", [0.0, -1e-5, 1e-14])
+def test_lookup_tables_unreachable_error(max_error):
+    """
+    Check that initialize_lookup_tables rejects a lookup_max_error the tables
+    can not reach, instead of halving the table spacing forever
+    """
+    namelist = {'thermodynamics': {'lookup_tables': True, 'lookup_dT': 0.1, 'lookup_max_error': max_error}}
+    wrp.free_lookup_tables()
+    with pytest.raises(ValueError):
+        wrp.initialize_lookup_tables(namelist)
+
+def test_lookup_tables_shared():
+    """
+    Check that the lookup tables, shared by all simulations in a process, are only set up once:
+    the same settings are accepted again, other settings (also no tables) are rejected
+    """
+    namelist = {'thermodynamics': {'lookup_tables': True, 'lookup_dT': 0.1, 'lookup_max_error': 1e-7}}
+    wrp.free_lookup_tables()
+    wrp.initialize_lookup_tables(namelist)
+    wrp.initialize_lookup_tables(namelist)
+    for other in [{'thermodynamics': {'lookup_tables': True, 'lookup_dT': 0.2, 'lookup_max_error': 1e-7}},
+                  {'thermodynamics': {'lookup_tables': False}}]:
+        with pytest.raises(ValueError):
+            wrp.initialize_lookup_tables(other)
+    wrp.free_lookup_tables()
+    wrp.initialize_lookup_tables({'thermodynamics': {'lookup_tables': False}})
+    with pytest.raises(ValueError):
+        wrp.initialize_lookup_tables(namelist)
+    wrp.free_lookup_tables()
+
+
+@given(p  = st.floats(min_value = 50000,  max_value = 101300),      # pressure between 1013hPa - 500hPa
+       T  = st.floats(min_value = 263.15, max_value = 273.15 + 35), # temperature between -10 - 35 C
+       ql = st.floats(min_value = 0,      max_value = 0.005),       # liquid water specific humidity between 0 - 5 g/kg
+       dT = st.floats(min_value = -20,    max_value = 20))          # error of the first guess temperature
+def test_eos_newton(p, T, ql, dT):
+    """
+    Check if the warm started Newton saturation adjustment
+    finds the correct T and ql from a perturbed first guess
+    """
+    qt = wrp.qv_star_t(p, T) * (1 - ql) + ql
+    thetali = wrp.t_to_thetali_c(p, T, qt, ql, 0)
+
+    res = wrp.eos_newton(p, qt, thetali, T + dT)
+
+    assert(np.isclose(T,  res['T'],  rtol = 1e-5, atol = 0))
+    assert(np.isclose(ql, res['ql'], rtol = 1e-2, atol = 1e-7))
@@ -0,0 +1,143 @@
+import sys
+sys.path.insert(0, "./../")
+
+import json
+
+from netCDF4 import Dataset
+
+import numpy as np
+
+import pytest
+
+from Grid import Grid
+from NetCDFIO import NetCDFIO_Stats
+
+@pytest.fixture
+def setup(tmpdir, monkeypatch):
+    """
+    namelist and paramlist of a small stats file written to a temporary folder
+    """
+    monkeypatch.chdir(tmpdir)
+    namelist = {'meta':     {'simname': 'Test', 'uuid': '00000'},
+                'output':   {'output_root': './'},
+                'grid':     {'nz': 4, 'gw': 2, 'dz': 50.0},
+                'stats_io': {'frequency': 60.0, 'stats_dir': 'stats', 'buffer_records': 10}}
+    paramlist = {'meta': {'casename': 'Test'}}
+    # NetCDFIO_Stats copies both input files to the output folder
+    json.dump(namelist, open('Test.in', 'w'))
+    json.dump(paramlist, open('paramlist_Test.in', 'w'))
+    return {"namelist"  : namelist,
+            "paramlist" : paramlist}
+
+def test_buffered_records(setup):
+    """
+    Tests that the records buffered by NetCDFIO_Stats are in the stats file after close_files,
+    when fewer records than buffer_records were written
+    """
+    nz = setup["namelist"]['grid']['nz']
+    Stats = NetCDFIO_Stats(setup["namelist"], setup["paramlist"], Grid(setup["namelist"]))
+    Stats.add_ts('x')
+    Stats.add_profile('y')
+    for n in range(3):
+        Stats.write_simulation_time(60.0 * n)
+        Stats.write_ts('x', float(n))
+        Stats.write_profile('y', np.arange(nz, dtype=np.double) + n)
+    Stats.close_files()
+
+    data = Dataset('Output.Test.00000/stats/Stats.Test.nc', 'r')
+    assert(np.array_equal(data.groups['timeseries'].variables['t'][:], [0.0, 60.0, 120.0]))
+    assert(np.array_equal(data.groups['timeseries'].variables['x'][:], [0.0, 1.0, 2.0]))
+    assert(np.array_equal(data.groups['profiles'].variables['y'][:],
+                          np.arange(nz)[np.newaxis, :] + np.arange(3)[:, np.newaxis]))
+    data.close()
+
+def test_time_averages(setup):
+    """
+    Tests the running mean, min, max and variance NetCDFIO_Stats writes with time_average on,
+    against numpy for the same samples
+    """
+    nz = setup["namelist"]['grid']['nz']
+    setup["namelist"]['stats_io']['time_average'] = True
+    setup["namelist"]['stats_io']['time_average_minmax'] = True
+    setup["namelist"]['stats_io']['time_average_variance'] = True
+    Stats = NetCDFIO_Stats(setup["namelist"], setup["paramlist"], Grid(setup["namelist"]))
+    Stats.add_ts('x')
+    Stats.add_profile('y')
+
+    x = np.array([3.0, -1.0, 4.0, 1.5, 9.0])
+    y = np.outer(x, np.arange(1, nz + 1, dtype=np.double))
+    for n in range(len(x)):
+        Stats.write_simulation_time(10.0 * n)
+        Stats.write_ts('x', x[n])
+        Stats.write_profile('y', y[n, :])
+    Stats.write_averages()
+    Stats.close_files()
+
+    data = Dataset('Output.Test.00000/stats/Stats.Test.nc', 'r')
+    ts = data.groups['timeseries'].variables
+    profiles = data.groups['profiles'].variables
+    # one record, at the time of the last sample
+    assert(np.array_equal(ts['t'][:], [40.0]))
+    assert(np.isclose(ts['x'][0], np.mean(x)))
+    assert(ts['x_min'][0] == np.min(x))
+    assert(ts['x_max'][0] == np.max(x))
+    assert(np.isclose(ts['x_var'][0], np.var(x)))
+    assert(np.allclose(profiles['y'][0, :], np.mean(y, axis=0)))
+    assert(np.array_equal(profiles['y_min'][0, :], np.min(y, axis=0)))
+    assert(np.array_equal(profiles['y_max'][0, :], np.max(y, axis=0)))
+    assert(np.allclose(profiles['y_var'][0, :], np.var(y, axis=0)))
+    data.close()
+
+def test_time_average_mean_only(setup):
+    """
+    Tests that with time_average on and without min, max and variance only the running mean is written,
+    and that updating the averages in place leaves the sampled profiles unchanged
+    """
+    nz = setup["namelist"]['grid']['nz']
+    setup["namelist"]['stats_io']['time_average'] = True
+    Stats = NetCDFIO_Stats(setup["namelist"], setup["paramlist"], Grid(setup["namelist"]))
+    Stats.add_ts('x')
+    Stats.add_profile('y')
+
+    x = np.array([3.0, -1.0, 4.0, 1.5, 9.0])
+    y = np.outer(x, np.arange(1, nz + 1, dtype=np.double))
+    y_samples = y.copy()
+    for n in range(len(x)):
+        Stats.write_simulation_time(10.0 * n)
+        Stats.write_ts('x', x[n])
+        Stats.write_profile('y', y[n, :])
+    Stats.write_averages()
+    Stats.close_files()
+    assert(np.array_equal(y, y_samples))
+
+    data = Dataset('Output.Test.00000/stats/Stats.Test.nc', 'r')
+    ts = data.groups['timeseries'].variables
+    profiles = data.groups['profiles'].variables
+    assert(sorted(ts.keys()) == ['t', 'x'])
+    assert(sorted(profiles.keys()) == ['t', 'y', 'z', 'z_half'])
+    assert(np.isclose(ts['x'][0], np.mean(x)))
+    assert(np.allclose(profiles['y'][0, :], np.mean(y, axis=0)))
+    data.close()
+
+class FailingStats(NetCDFIO_Stats):
+    """
+    NetCDFIO_Stats whose records cannot be written
+    """
+    def write_records(self, start, t, profiles, ts, n):
+        raise IOError('disk full')
+
+def test_failed_writer_closes_file(setup):
+    """
+    Tests that close_files reports an error of the background writer and still closes the stats file
+    """
+    setup["namelist"]['stats_io']['background_writer'] = True
+    Stats = FailingStats(setup["namelist"], setup["paramlist"], Grid(setup["namelist"]))
+    Stats.add_ts('x')
+    Stats.write_simulation_time(0.0)
+    Stats.write_ts('x', 1.0)
+    with pytest.raises(RuntimeError):
+        Stats.close_files()
+
+    # the file can only be created again once it is closed
+    data = Dataset('Output.Test.00000/stats/Stats.Test.nc', 'w')
+    data.close()
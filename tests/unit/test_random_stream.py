@@ -0,0 +1,61 @@
+import sys
+sys.path.insert(0, "./../")
+
+import numpy as np
+
+import pytest
+import pytest_wrapper as wrp
+
+from RandomStream import RandomStream
+
+# https://hypothesis.readthedocs.io/en/latest/
+from hypothesis import given, strategies as st
+
+@given(seed = st.integers(min_value = 0, max_value = 2**31))
+def test_same_seed(seed):
+    """
+    Check that two RandomStreams with the same seed give the same uniform and Poisson draws,
+    and that another stream number of the same seed gives different draws
+    """
+    namelist = {'stochastic': {'seed': seed}}
+    a = RandomStream(namelist, 7)
+    b = RandomStream(namelist, 7)
+    c = RandomStream(namelist, 7, 1)
+    u = wrp.random_uniform(a, 20)
+    assert(np.array_equal(u, wrp.random_uniform(b, 20)))
+    assert(not np.array_equal(u, wrp.random_uniform(c, 20)))
+    for lam in [0.5, 50.0]:
+        assert(np.array_equal(wrp.random_poisson(a, lam, 20), wrp.random_poisson(b, lam, 20)))
+
+@given(seed = st.integers(min_value = 0, max_value = 2**31),
+       n    = st.integers(min_value = 0, max_value = 20)) # draws before the state is saved
+def test_state_round_trip(seed, n):
+    """
+    Check that a RandomStream continues with the same draws after get_state and set_state,
+    also when the saved state is in the middle of a buffer of draws
+    """
+    namelist = {'stochastic': {'seed': seed}}
+    a = RandomStream(namelist, 7)
+    wrp.random_uniform(a, n)
+    state = {}
+    a.get_state(state, 'Random.')
+    u = wrp.random_uniform(a, 20)
+
+    b = RandomStream({'stochastic': {'seed': seed + 1}}, 7)
+    b.set_state(state, 'Random.')
+    assert(np.array_equal(u, wrp.random_uniform(b, 20)))
+    a.set_state(state, 'Random.')
+    assert(np.array_equal(u, wrp.random_uniform(a, 20)))
+
+@pytest.mark.parametrize("lam", [0.5, 4.0, 10.0, 50.0, 500.0])
+def test_poisson_moments(lam):
+    """
+    Check the mean and variance of the Poisson draws on both sides of the switch from inversion
+    to transformed rejection at lam = 10, within 5 standard errors of the sample moments
+    """
+    n = 100000
+    a = RandomStream({'stochastic': {'seed': 1}}, 1000)
+    x = wrp.random_poisson(a, lam, n)
+    assert(np.array_equal(x, np.floor(x)) and np.min(x) >= 0.0)
+    assert(abs(np.mean(x) - lam) < 5.0 * np.sqrt(lam/n))
+    assert(abs(np.var(x) - lam) < 5.0 * np.sqrt((2.0 * lam**2 + lam)/n))
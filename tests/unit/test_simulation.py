@@ -0,0 +1,208 @@
+import sys
+sys.path.insert(0, "./../")
+
+import os
+import copy
+import json
+import subprocess
+
+import numpy as np
+
+from netCDF4 import Dataset
+
+import pytest
+
+import Simulation1d
+
+def case_setup(case):
+    """
+    namelist and paramlist of a case writing to the current folder
+    """
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    subprocess.check_call([sys.executable, os.path.join(root, 'generate_namelist.py'), case])
+    subprocess.check_call([sys.executable, os.path.join(root, 'generate_paramlist.py'), case])
+    namelist = json.load(open(case + '.in'))
+    paramlist = json.load(open('paramlist_' + case + '.in'))
+    namelist['output']['output_root'] = './'
+    return {"namelist"  : namelist,
+            "paramlist" : paramlist}
+
+@pytest.fixture
+def setup(tmpdir, monkeypatch):
+    """
+    namelist and paramlist of a short Bomex run writing to a temporary folder
+    """
+    monkeypatch.chdir(tmpdir)
+    return case_setup('Bomex')
+
+def run_steps(namelist, paramlist, nsteps):
+    Simulation = Simulation1d.Simulation1d(namelist, paramlist)
+    Simulation.initialize(namelist)
+    for n in range(nsteps):
+        Simulation.step()
+    Simulation.Stats.close_files()
+    return Simulation
+
+def test_time_average_state(setup):
+    """
+    Tests that sampling every timestep for time averaged output does not change the simulation,
+    the state after 20 output intervals (with updrafts) is the same as without time averaging
+    """
+    namelist = setup["namelist"]
+    nsteps = int(20 * namelist['stats_io']['frequency'] / namelist['time_stepping']['dt'])
+    namelist_avg = copy.deepcopy(namelist)
+    namelist_avg['meta']['uuid'] = namelist['meta']['uuid'] + '.avg'
+    namelist_avg['stats_io']['time_average'] = True
+
+    state = run_steps(namelist, setup["paramlist"], nsteps).get_state()
+    state_avg = run_steps(namelist_avg, setup["paramlist"], nsteps).get_state()
+    assert(sorted(state.keys()) == sorted(state_avg.keys()))
+    for name in state:
+        assert np.array_equal(np.asarray(state[name]), np.asarray(state_avg[name])), name
+
+def test_checkpoint_restart_state(setup):
+    """
+    Tests that restarting from a checkpoint does not change the simulation, the state after
+    2 output intervals from a checkpoint written after 2 output intervals is the same as after
+    4 output intervals of an uninterrupted run
+    """
+    namelist = setup["namelist"]
+    nsteps = int(2 * namelist['stats_io']['frequency'] / namelist['time_stepping']['dt'])
+    namelist['restart']['checkpoint_frequency'] = 2 * namelist['stats_io']['frequency']
+    Simulation = run_steps(namelist, setup["paramlist"], nsteps)
+    checkpoint = os.path.join(Simulation.checkpoint_path,
+                              'Checkpoint.Bomex.' + str(int(Simulation.TS.t)) + '.npz')
+
+    namelist_restart = copy.deepcopy(namelist)
+    namelist_restart['meta']['uuid'] = namelist['meta']['uuid'] + '.restart'
+    namelist_restart['restart']['checkpoint_frequency'] = 0.0
+    namelist_restart['restart']['input_file'] = checkpoint
+    state_restart = run_steps(namelist_restart, setup["paramlist"], nsteps).get_state()
+
+    namelist_full = copy.deepcopy(namelist)
+    namelist_full['meta']['uuid'] = namelist['meta']['uuid'] + '.full'
+    namelist_full['restart']['checkpoint_frequency'] = 0.0
+    state_full = run_steps(namelist_full, setup["paramlist"], 2 * nsteps).get_state()
+    assert(sorted(state_restart.keys()) == sorted(state_full.keys()))
+    for name in state_full:
+        assert np.array_equal(np.asarray(state_restart[name]), np.asarray(state_full[name])), name
+
+def test_checkpoint_frequency_time_average(setup):
+    """
+    Tests that checkpoints in between two time averaged stats records are rejected,
+    the time averages are not part of the checkpointed state
+    """
+    namelist = setup["namelist"]
+    namelist['stats_io']['time_average'] = True
+    namelist['restart']['checkpoint_frequency'] = 1.5 * namelist['stats_io']['frequency']
+    with pytest.raises(SystemExit):
+        Simulation1d.Simulation1d(namelist, setup["paramlist"])
+
+def test_fused_updraft_substeps_state(setup):
+    """
+    Tests that running the updraft sub-steps in the fused nogil loop does not change the simulation,
+    the state after 10 output intervals is the same as with the sub-step loop in Python
+    """
+    namelist = setup["namelist"]
+    nsteps = int(10 * namelist['stats_io']['frequency'] / namelist['time_stepping']['dt'])
+    namelist['turbulence']['EDMF_PrognosticTKE']['fused_updraft_substeps'] = True
+    namelist_loop = copy.deepcopy(namelist)
+    namelist_loop['meta']['uuid'] = namelist['meta']['uuid'] + '.loop'
+    namelist_loop['turbulence']['EDMF_PrognosticTKE']['fused_updraft_substeps'] = False
+
+    state = run_steps(namelist, setup["paramlist"], nsteps).get_state()
+    state_loop = run_steps(namelist_loop, setup["paramlist"], nsteps).get_state()
+    assert(sorted(state.keys()) == sorted(state_loop.keys()))
+    for name in state:
+        assert np.array_equal(np.asarray(state[name]), np.asarray(state_loop[name])), name
+
+def test_active_window_state(setup):
+    """
+    Tests that restricting the updraft kernels to the active window does not change the simulation,
+    the state of a growing updraft after 10 minutes with 60 s steps (several sub-steps per step)
+    is the same as with the kernels over the full column. The updraft .new arrays are left out,
+    above the window they hold the grid mean instead of scratch values that are reset every step
+    """
+    namelist = setup["namelist"]
+    namelist['time_stepping']['dt'] = 60.0
+    nsteps = 10
+    namelist['turbulence']['EDMF_PrognosticTKE']['active_window'] = True
+    namelist_full = copy.deepcopy(namelist)
+    namelist_full['meta']['uuid'] = namelist['meta']['uuid'] + '.full'
+    namelist_full['turbulence']['EDMF_PrognosticTKE']['active_window'] = False
+
+    state = run_steps(namelist, setup["paramlist"], nsteps).get_state()
+    state_full = run_steps(namelist_full, setup["paramlist"], nsteps).get_state()
+    assert(np.max(np.nonzero(np.asarray(state['Turb.UpdVar.Area.values'])[0,:] > 0.0)[0]) > 10)
+    assert(sorted(state.keys()) == sorted(state_full.keys()))
+    for name in state:
+        if name.startswith('Turb.UpdVar.') and name.endswith('.new'):
+            continue
+        assert np.array_equal(np.asarray(state[name]), np.asarray(state_full[name])), name
+
+def test_implicit_updraft_top(setup):
+    """
+    Tests that the updraft top (the highest level with more than 1% updraft area) of a growing updraft
+    after one 300 s step with the implicit updraft solver is within one level of the sub-stepped explicit
+    solver, the front rises by several levels in one step
+    """
+    namelist = setup["namelist"]
+    nsteps = int(300.0 / namelist['time_stepping']['dt'])
+    state = run_steps(namelist, setup["paramlist"], nsteps).get_state()
+
+    def updraft_top(state):
+        area = np.asarray(state['Turb.UpdVar.Area.values'])
+        return np.max(np.nonzero(area[0,:] > 0.01)[0])
+
+    tops = {}
+    for solver in ['explicit', 'implicit']:
+        namelist_step = copy.deepcopy(namelist)
+        namelist_step['meta']['uuid'] = namelist['meta']['uuid'] + '.' + solver
+        namelist_step['time_stepping']['dt'] = 300.0
+        namelist_step['turbulence']['EDMF_PrognosticTKE']['updraft_solver'] = solver
+        Simulation = Simulation1d.Simulation1d(namelist_step, setup["paramlist"])
+        Simulation.initialize(namelist_step, state=state)
+        Simulation.step()
+        Simulation.Stats.close_files()
+        tops[solver] = updraft_top(Simulation.get_state())
+    assert(tops['explicit'] > updraft_top(state) + 2)
+    assert(abs(tops['implicit'] - tops['explicit']) <= 1)
+
+def test_fork_output_paths(setup):
+    """
+    Tests that the children forked from two simulations write their stats and checkpoints
+    to different folders
+    """
+    paths = []
+    for uuid in ['parent-aaaaa', 'parent-bbbbb']:
+        namelist = copy.deepcopy(setup["namelist"])
+        namelist['meta']['uuid'] = uuid
+        Simulation = run_steps(namelist, setup["paramlist"], 1)
+        for child in Simulation.fork(namelist, [setup["paramlist"], setup["paramlist"]]):
+            child.Stats.close_files()
+            assert(child.output_path.startswith(Simulation.output_path))
+            assert(os.path.exists(os.path.join(child.output_path, 'stats', 'Stats.Bomex.nc')))
+            paths.append(child.output_path)
+            paths.append(child.checkpoint_path)
+    assert(len(set(paths)) == len(paths))
+
+def test_quadrature_order_min_one(tmpdir, monkeypatch):
+    """
+    Tests that adaptive gaussian quadrature with quadrature_order_min = 1 keeps the state finite,
+    the single quadrature point of the cloudy levels away from cloud edges is the mean
+    """
+    monkeypatch.chdir(tmpdir)
+    setup = case_setup('DYCOMS_RF01')
+    namelist = setup["namelist"]
+    namelist['thermodynamics']['sgs'] = 'quadrature'
+    namelist['thermodynamics']['quadrature_type'] = 'gaussian'
+    namelist['thermodynamics']['quadrature_adaptive'] = True
+    namelist['thermodynamics']['quadrature_order_min'] = 1
+    nsteps = int(2 * namelist['stats_io']['frequency'] / namelist['time_stepping']['dt'])
+
+    state = run_steps(namelist, setup["paramlist"], nsteps).get_state()
+    for name in state:
+        assert np.all(np.isfinite(np.asarray(state[name], dtype=np.double))), name
+    data = Dataset('Output.DYCOMS_RF01.' + namelist['meta']['uuid'][-5:] + '/stats/Stats.DYCOMS_RF01.nc', 'r')
+    assert(np.max(data.groups['timeseries'].variables['env_quadrature_levels_low'][:]) > 0)
+    data.close()
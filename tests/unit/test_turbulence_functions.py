@@ -0,0 +1,55 @@
+import sys
+sys.path.insert(0, "./../")
+
+import numpy as np
+
+import pytest
+import pytest_wrapper as wrp
+
+# https://hypothesis.readthedocs.io/en/latest/
+from hypothesis import given, settings, strategies as st
+
+def thomas_solve(a, b, c, x):
+    """
+    Tridiagonal solve of one right hand side, as tridiag_solve did before the factorization was split out
+    """
+    nz = len(x)
+    x = np.array(x, dtype=np.double)
+    scratch = np.zeros(nz)
+    scratch[0] = c[0]/b[0]
+    x[0] = x[0]/b[0]
+    for i in range(1, nz):
+        m = 1.0/(b[i] - a[i] * scratch[i-1])
+        scratch[i] = c[i] * m
+        x[i] = (x[i] - a[i] * x[i-1])*m
+    for i in range(nz-2, -1, -1):
+        x[i] = x[i] - scratch[i] * x[i+1]
+    return x
+
+@settings(deadline = None)
+@given(nz   = st.integers(min_value = 2, max_value = 80), # number of levels
+       nrhs = st.integers(min_value = 1, max_value = 3),  # variables sharing the matrix, 3 for the scalar covariances
+       seed = st.integers(min_value = 0, max_value = 2**31))
+def test_tridiag_solve_factored(nz, nrhs, seed):
+    """
+    Tests the batched solve of update_GMV_ED and update_covariance_ED (tridiag_factor once and
+    tridiag_solve_factored for all variables) against separate tridiag_solve calls per variable,
+    within 1e-12, on an implicit diffusion matrix with a sink on the diagonal
+    """
+    rng = np.random.RandomState(seed)
+    k_up = rng.uniform(0.0, 10.0, nz) # dt * diffusivity / dz^2 at the upper face of each level
+    k_up[-1] = 0.0
+    k_dn = np.concatenate(([0.0], k_up[:-1]))
+    a = -k_dn
+    c = -k_up
+    b = 1.0 + k_dn + k_up + rng.uniform(0.0, 1.0, nz)
+    x = rng.uniform(-1.0, 1.0, (nrhs, nz)) * 10.0**rng.uniform(-6, 2, (nrhs, 1))
+
+    batched = wrp.tridiag_solve_factored(a, b, c, x)
+    for n in range(nrhs):
+        single = wrp.tridiag_solve(a, b, c, x[n, :])
+        assert(np.allclose(batched[n, :], single, rtol = 1e-12, atol = 0))
+        assert(np.allclose(batched[n, :], thomas_solve(a, b, c, x[n, :]), rtol = 1e-12, atol = 0))
+        matrix = np.diag(b) + np.diag(a[1:], -1) + np.diag(c[:-1], 1)
+        dense = np.linalg.solve(matrix, x[n, :])
+        assert(np.allclose(batched[n, :], dense, rtol = 0, atol = 1e-9 * np.max(np.abs(dense))))
@@ -0,0 +1,72 @@
+import sys
+sys.path.insert(0, "./../")
+
+import numpy as np
+import math as mt
+
+import pytest
+import pytest_wrapper as wrp
+
+# https://hypothesis.readthedocs.io/en/latest/
+from hypothesis import given, strategies as st
+
+@given(x = st.lists(st.floats(min_value = 0, max_value = 1), min_size = 1, max_size = 200)) # updraft area fractions
+def test_median(x):
+    """
+    Tests function median_c from utility_functions.pyx
+    by comparing it with numpy median, for odd and even lengths and repeated values
+    """
+    assert(wrp.median_c(x) == np.median(x))
+
+def test_median_empty():
+    """
+    Tests that median_c from utility_functions.pyx returns NaN for an empty array
+    """
+    assert(mt.isnan(wrp.median_c([])))
+
+@given(l = st.lists(st.floats(min_value = 1e-9, max_value = 1e6), min_size = 3, max_size = 3)) # length scales
+def test_argmin(l):
+    """
+    Tests function argmin_c from utility_functions.pyx
+    by comparing it with numpy argmin
+    """
+    assert(wrp.argmin_c(l) == np.argmin(l))
+
+@given(l = st.lists(st.floats(min_value = 1e-3, max_value = 1e6), min_size = 3, max_size = 3)) # length scales
+def test_smooth_minimum(l):
+    """
+    Tests functions auto_smooth_minimum_c and lamb_smooth_minimum_c from utility_functions.pyx
+    by checking that the smooth minimum lies between the minimum and the maximum of the length scales
+    """
+    for smin in [wrp.auto_smooth_minimum_c(l, 0.1), wrp.lamb_smooth_minimum_c(l, 0.1, 1.5)]:
+        assert(np.min(l) * (1.0 - 1e-12) <= smin <= np.max(l) * (1.0 + 1e-12))
+
+@given(a_total = st.floats(min_value = 1e-3, max_value = 0.3), # surface area of all updrafts
+       n       = st.integers(min_value = 1, max_value = 10))   # number of updrafts
+def test_percentile_bounds_mean_norm(a_total, n):
+    """
+    Tests function percentile_bounds_mean_norm from utility_functions.pyx
+    by comparing it with the mean of the truncated normal distribution from scipy
+    for the percentiles of the updraft surface boundary condition
+    """
+    from scipy.stats import norm, truncnorm
+    a_ = a_total/n
+    for i in range(n):
+        low  = norm.ppf(1.0 - a_total + i * a_)
+        high = norm.ppf(1.0 - a_total + (i + 1) * a_)
+        mean = wrp.percentile_bounds_mean_norm(1.0 - a_total + i * a_, 1.0 - a_total + (i + 1) * a_)
+        assert(np.isclose(mean, truncnorm.mean(low, high), rtol = 1e-8, atol = 0))
+        assert(low <= mean <= high)
+
+@pytest.mark.parametrize("order", range(1, 21))
+def test_gauss_hermite(order):
+    """
+    Tests the Gauss-Hermite tables from utility_functions.pyx: the weights sum to one
+    and the nodes reproduce the moments of a standard normal distribution the order integrates exactly
+    """
+    z, w = wrp.gauss_hermite(order)
+    assert(np.isclose(np.sum(w), 1.0))
+    if order > 1:
+        assert(np.isclose(np.sum(w * z**2), 1.0))
+    if order > 2:
+        assert(np.isclose(np.sum(w * z**4), 3.0))
@@ -0,0 +1,53 @@
+import sys
+sys.path.insert(0, "./../")
+
+import numpy as np
+
+import pytest
+import pytest_wrapper as wrp
+
+from Workspace import Workspace
+
+def test_borrow_release():
+    """
+    Check that borrowed rows are zeroed views of the workspace, that release gives them back
+    to the next borrow and that the requests fitting on the stack are not counted as allocations
+    """
+    work = Workspace(4, 5)
+    mark = wrp.workspace_mark(work)
+    a = wrp.workspace_borrow_rows(work, 1)
+    b = wrp.workspace_borrow_rows(work, 2)
+    assert(a.shape == (1, 5) and b.shape == (2, 5))
+    assert(wrp.workspace_mark(work) == mark + 3)
+    a[:,:] = 1.0
+    b[:,:] = 2.0
+    wrp.workspace_release(work, mark)
+    assert(wrp.workspace_mark(work) == mark)
+
+    c = wrp.workspace_borrow_rows(work, 3)
+    assert(np.array_equal(c, np.zeros((3, 5))))
+    # the rows of c are the rows a and b were borrowed from
+    c[0,0] = 3.0
+    assert(a[0,0] == 3.0)
+    assert(work.allocations == 0)
+
+def test_borrow_fallback():
+    """
+    Check that a request the stack cannot serve is a new zeroed array counted in allocations,
+    which does not move the stack position
+    """
+    work = Workspace(2, 5)
+    a = wrp.workspace_borrow_rows(work, 1)
+    mark = wrp.workspace_mark(work)
+    b = wrp.workspace_borrow_rows(work, 2)
+    assert(np.array_equal(b, np.zeros((2, 5))))
+    assert(work.allocations == 1)
+    assert(wrp.workspace_mark(work) == mark)
+    b[:,:] = 1.0
+    assert(np.array_equal(a, np.zeros((1, 5))))
+
+    # the last free row is still on the stack
+    wrp.workspace_borrow_rows(work, 1)
+    assert(work.allocations == 1)
+    wrp.workspace_borrow_rows(work, 1)
+    assert(work.allocations == 2)
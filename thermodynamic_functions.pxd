@@ -2,34 +2,45 @@ cdef struct eos_struct:
     double T
     double ql
 
-cdef double sd_c(double pd, double T)   nogil
-cdef double sv_c(double pv, double T)   nogil
-cdef double sc_c(double L, double T)   nogil
-cdef double exner_c(double p0, double kappa=?)   nogil
-cdef double theta_c(double p0, double T)   nogil
-cdef double thetali_c(double p0, double T, double qt, double ql, double qi, double L)  nogil
-cdef double theta_virt_c(double p0, double T, double qt, double ql)  nogil
-cdef double theta_eq_c(double p0, double T, double qt, double ql)  nogil
-cdef double pd_c(double p0, double qt, double qv)   nogil
-cdef double pv_c(double p0, double qt, double qv)   nogil
-cdef double density_temperature_c(double T, double qt, double qv)   nogil
-cdef double theta_rho_c(double p0, double T, double qt, double qv)   nogil
-cdef double cpm_c(double qt)   nogil
-cdef double thetas_entropy_c(double s, double qt)   nogil
-cdef double relative_humidity_c(double p0, double qt, double ql, double qi, double T) nogil
-cdef double thetas_t_c(double p0, double T, double qt, double qv, double qc, double L)   nogil
-cdef double entropy_from_thetas_c(double thetas, double qt)   nogil
-cdef double buoyancy_c(double rho0, double rho)   nogil
-cdef double qv_star_c(double p0, double qt,  double pv)   nogil
-cdef double alpha_c(double p0, double T, double  qt, double qv) nogil
-cdef double rho_c(double p0, double T, double  qt, double qv) nogil
-cdef double t_to_entropy_c(double p0, double T,  double qt, double ql, double qi)   nogil
-cdef double t_to_thetali_c(double p0, double T,  double qt, double ql, double qi)   nogil
-cdef double pv_star(double T)   nogil
-cdef double qv_star_t(double p0, double T) nogil
-cdef double latent_heat(double T) nogil
-cdef double eos_first_guess_thetal(double H, double pd, double pv, double qt)    nogil
-cdef double eos_first_guess_entropy(double H, double pd, double pv, double qt )   nogil
-cdef eos_struct eos( double (*t_to_prog)(double, double, double, double, double) nogil,
-                     double (*prog_to_t)(double, double, double, double) nogil,
-                     double p0, double qt, double prog) nogil
+cdef double sd_c(double pd, double T) noexcept nogil
+cdef double sv_c(double pv, double T) noexcept nogil
+cdef double sc_c(double L, double T) noexcept nogil
+cdef double exner_c(double p0, double kappa=?) noexcept nogil
+cdef double theta_c(double p0, double T) noexcept nogil
+cdef double thetali_c(double p0, double T, double qt, double ql, double qi, double L) noexcept nogil
+cdef double theta_virt_c(double p0, double T, double qt, double ql) noexcept nogil
+cdef double theta_eq_c(double p0, double T, double qt, double ql) noexcept nogil
+cdef double pd_c(double p0, double qt, double qv) noexcept nogil
+cdef double pv_c(double p0, double qt, double qv) noexcept nogil
+cdef double density_temperature_c(double T, double qt, double qv) noexcept nogil
+cdef double theta_rho_c(double p0, double T, double qt, double qv) noexcept nogil
+cdef double cpm_c(double qt) noexcept nogil
+cdef double thetas_entropy_c(double s, double qt) noexcept nogil
+cdef double relative_humidity_c(double p0, double qt, double ql, double qi, double T) noexcept nogil
+cdef double thetas_t_c(double p0, double T, double qt, double qv, double qc, double L) noexcept nogil
+cdef double entropy_from_thetas_c(double thetas, double qt) noexcept nogil
+cdef double buoyancy_c(double rho0, double rho) noexcept nogil
+cdef double qv_star_c(double p0, double qt,  double pv) noexcept nogil
+cdef double alpha_c(double p0, double T, double  qt, double qv) noexcept nogil
+cdef double rho_c(double p0, double T, double  qt, double qv) noexcept nogil
+cdef double t_to_entropy_c(double p0, double T,  double qt, double ql, double qi) noexcept nogil
+cdef double t_to_thetali_c(double p0, double T,  double qt, double ql, double qi) noexcept nogil
+cdef double pv_star(double T) noexcept nogil
+cdef double qv_star_t(double p0, double T) noexcept nogil
+cdef double latent_heat(double T) noexcept nogil
+cdef double eos_first_guess_thetal(double H, double pd, double pv, double qt) noexcept nogil
+cdef double eos_first_guess_entropy(double H, double pd, double pv, double qt ) noexcept nogil
+cdef eos_struct eos( double (*t_to_prog)(double, double, double, double, double) noexcept nogil,
+                     double (*prog_to_t)(double, double, double, double) noexcept nogil,
+                     double p0, double qt, double prog) noexcept nogil
+cdef double dthetali_dT_sat_c(double p0, double T, double qt) noexcept nogil
+cdef double dentropy_dT_sat_c(double p0, double T, double qt) noexcept nogil
+cdef eos_struct eos_newton( double (*t_to_prog)(double, double, double, double, double) noexcept nogil,
+                            double (*prog_to_t)(double, double, double, double) noexcept nogil,
+                            double (*dprog_dT)(double, double, double) noexcept nogil,
+                            double p0, double qt, double prog, double T_guess) noexcept nogil
+cdef void eos_column( double (*t_to_prog)(double, double, double, double, double) noexcept nogil,
+                      double (*prog_to_t)(double, double, double, double) noexcept nogil,
+                      double (*dprog_dT)(double, double, double) noexcept nogil,
+                      double [:] p0, double [:] qt, double [:] prog, double [:] T, double [:] ql,
+                      Py_ssize_t kmin, Py_ssize_t kmax) noexcept nogil
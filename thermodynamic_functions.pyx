@@ -1,40 +1,52 @@
 import numpy as np
 cimport numpy as np
 from libc.math cimport sqrt, log, fabs,atan, exp, fmax, pow
+from cpython.mem cimport PyMem_Malloc, PyMem_Free
 include "parameters.pxi"
 
 #Adapated from PyCLES: https://github.com/pressel/pycles
 
-cdef  double sd_c(double pd, double T) nogil :
+# Optional lookup tables for pv_star and latent_heat. The values are linearly interpolated
+# on a uniform temperature grid; outside of [lookup_T_min, lookup_T_max) the formulas are used.
+cdef bint lookup_tables = False
+# settings of the tables in use, None before the first initialize_lookup_tables
+cdef object lookup_settings = None
+cdef double lookup_T_min = 180.0
+cdef double lookup_T_max = 340.0
+cdef double lookup_dTi = 100.0
+cdef double *pv_star_table = NULL
+cdef double *latent_heat_table = NULL
+
+cdef  double sd_c(double pd, double T) noexcept nogil :
     return sd_tilde + cpd*log(T/T_tilde) -Rd*log(pd/p_tilde)
 
 
-cdef  double sv_c(double pv, double T) nogil  :
+cdef  double sv_c(double pv, double T) noexcept nogil  :
     return sv_tilde + cpv*log(T/T_tilde) - Rv * log(pv/p_tilde)
 
-cdef  double sc_c(double L, double T) nogil  :
+cdef  double sc_c(double L, double T) noexcept nogil  :
     return -L/T
 
-cdef double exner_c(double p0, double kappa = kappa) nogil  :
+cdef double exner_c(double p0, double kappa = kappa) noexcept nogil  :
     return (p0/p_tilde)**kappa
 
 
-cdef  double theta_c(double p0, double T) nogil :
+cdef  double theta_c(double p0, double T) noexcept nogil :
     return T / exner_c(p0)
 
 
-cdef  double thetali_c(double p0, double T, double qt, double ql, double qi, double L) nogil  :
+cdef  double thetali_c(double p0, double T, double qt, double ql, double qi, double L) noexcept nogil  :
     # Liquid ice potential temperature consistent with Triopoli and Cotton (1981)
     return theta_c(p0, T) * exp(-latent_heat(T)*(ql/(1.0 - qt) + qi/(1.0 -qt))/(T*cpd))
 
-cdef  double theta_virt_c( double p0, double T, double qt, double ql) nogil :
+cdef  double theta_virt_c( double p0, double T, double qt, double ql) noexcept nogil :
     # qd = 1 - qt
     # qt = qv + ql + qi
     # qr = mr/md+mv+ml+mi
     # Ignacio: This formulation holds when qt = qv + ql (negligible/no ice)
     return theta_c(p0, T) * (1.0 + 0.61 * (qt - ql) - ql);
 
-cdef  double theta_eq_c( double p0, double T, double qt, double ql) nogil :
+cdef  double theta_eq_c( double p0, double T, double qt, double ql) noexcept nogil :
     # From (Durran and Klemp, 1982), eq. 17
     # qd = 1 - qt
     # qt = qv + ql + qi
@@ -42,57 +54,57 @@ cdef  double theta_eq_c( double p0, double T, double qt, double ql) nogil :
     # Ignacio: This formulation holds when qt = qv + ql (negligible/no ice)
     return theta_c(p0, T) * exp(latent_heat(T)*(qt-ql)/(T*cpd));
     
-cdef  double pd_c(double p0, double qt, double qv)  nogil :
+cdef  double pd_c(double p0, double qt, double qv) noexcept nogil :
     return p0*(1.0-qt)/(1.0 - qt + eps_vi * qv)
 
-cdef  double pv_c(double p0, double qt, double qv) nogil  :
+cdef  double pv_c(double p0, double qt, double qv) noexcept nogil  :
     return p0 * eps_vi * qv /(1.0 - qt + eps_vi * qv)
 
 
-cdef  double density_temperature_c(double T, double qt, double qv) nogil  :
+cdef  double density_temperature_c(double T, double qt, double qv) noexcept nogil  :
     return T * (1.0 - qt + eps_vi * qv)
 
-cdef  double theta_rho_c(double p0, double T, double qt, double qv) nogil  :
+cdef  double theta_rho_c(double p0, double T, double qt, double qv) noexcept nogil  :
     return density_temperature_c(T,qt,qv)/exner_c(p0)
 
 
-cdef  double cpm_c(double qt) nogil  :
+cdef  double cpm_c(double qt) noexcept nogil  :
     return (1.0-qt) * cpd + qt * cpv
 
 
-cdef   double thetas_entropy_c(double s, double qt) nogil  :
+cdef   double thetas_entropy_c(double s, double qt) noexcept nogil  :
     return T_tilde*exp((s-(1.0-qt)*sd_tilde - qt*sv_tilde)/cpm_c(qt))
 
-cdef double relative_humidity_c(double p0, double qt, double ql, double qi, double T) nogil:
+cdef double relative_humidity_c(double p0, double qt, double ql, double qi, double T) noexcept nogil:
     cdef double qv = qt-ql-qi
     cdef double pv = pv_c(p0, qt, qv)
     cdef double pv_star_ = pv_star(T)
     return 100.0*pv/pv_star_
 
 
-cdef  double thetas_t_c(double p0, double T, double qt, double qv, double qc, double L) nogil  :
+cdef  double thetas_t_c(double p0, double T, double qt, double qv, double qc, double L) noexcept nogil  :
     cdef double qd = 1.0 - qt
     cdef double pd_ = pd_c(p0,qt,qt-qc)
     cdef double pv_ = pv_c(p0,qt,qt-qc)
     cdef double cpm_ = cpm_c(qt)
     return T * pow(p_tilde/pd_,qd * Rd/cpm_)*pow(p_tilde/pv_,qt*Rv/cpm_)*exp(-L * qc/(cpm_*T))
 
-cdef double entropy_from_thetas_c(double thetas, double qt)  nogil :
+cdef double entropy_from_thetas_c(double thetas, double qt) noexcept nogil :
     return cpm_c(qt) * log(thetas/T_tilde) + (1.0 - qt)*sd_tilde + qt * sv_tilde
 
-cdef  double buoyancy_c(double rho0, double rho)nogil  :
+cdef  double buoyancy_c(double rho0, double rho) noexcept nogil  :
     return g * (rho0 - rho)/rho0
 
-cdef double qv_star_c(const double p0, const double qt, const double pv) nogil  :
+cdef double qv_star_c(const double p0, const double qt, const double pv) noexcept nogil  :
     return eps_v * (1.0 - qt) * pv / (p0 - pv)
 
-cdef  double alpha_c(double p0, double T, double  qt, double qv) nogil  :
+cdef  double alpha_c(double p0, double T, double  qt, double qv) noexcept nogil  :
     return (Rd * T)/p0 * (1.0 - qt + eps_vi * qv)
 
-cdef  double rho_c(double p0, double T, double  qt, double qv) nogil  :
+cdef  double rho_c(double p0, double T, double  qt, double qv) noexcept nogil  :
     return p0 /((Rd * T) * (1.0 - qt + eps_vi * qv))
 
-cdef   double t_to_entropy_c(double p0, double T,  double qt, double ql, double qi) nogil  :
+cdef   double t_to_entropy_c(double p0, double T,  double qt, double ql, double qi) noexcept nogil  :
     cdef double qv = qt - ql - qi
     cdef double pv = pv_c(p0, qt, qv)
     cdef double pd = pd_c(p0, qt, qv)
@@ -100,31 +112,155 @@ cdef   double t_to_entropy_c(double p0, double T,  double qt, double ql, double
     return sd_c(pd,T) * (1.0 - qt) + sv_c(pv,T) * qt + sc_c(L,T)*(ql + qi)
 
 
-cdef  double t_to_thetali_c(double p0, double T,  double qt, double ql, double qi) nogil  :
+cdef  double t_to_thetali_c(double p0, double T,  double qt, double ql, double qi) noexcept nogil  :
     cdef double L = latent_heat(T)
     return thetali_c(p0, T, qt, ql, qi, L)
 
-cdef double pv_star(double T) nogil  :
+cdef inline double pv_star_magnus(double T) noexcept nogil  :
     #    Magnus formula
     cdef double TC = T - 273.15
     return 6.1094*exp((17.625*TC)/float(TC+243.04))*100
 
-cdef double qv_star_t(double p0, double T) nogil:
+cdef inline double lookup_interp(double *table, double T) noexcept nogil  :
+    cdef double x = (T - lookup_T_min) * lookup_dTi
+    cdef Py_ssize_t i = <Py_ssize_t> x
+    cdef double w = x - i
+    return (1.0 - w) * table[i] + w * table[i+1]
+
+cdef double pv_star(double T) noexcept nogil  :
+    if lookup_tables and T >= lookup_T_min and T < lookup_T_max:
+        return lookup_interp(pv_star_table, T)
+    return pv_star_magnus(T)
+
+cdef double qv_star_t(double p0, double T) noexcept nogil:
     cdef double pv = pv_star(T)
     return eps_v * pv / (p0 + (eps_v-1.0)*pv)
 
-cdef  double latent_heat(double T) nogil  :
+cdef inline double latent_heat_polynomial(double T) noexcept nogil  :
     cdef double TC = T - 273.15
     return (2500.8 - 2.36 * TC + 0.0016 * TC *
             TC - 0.00006 * TC * TC * TC) * 1000.0
 
-
-
-cdef  double eos_first_guess_thetal(double H, double pd, double pv, double qt)  nogil :
+cdef  double latent_heat(double T) noexcept nogil  :
+    if lookup_tables and T >= lookup_T_min and T < lookup_T_max:
+        return lookup_interp(latent_heat_table, T)
+    return latent_heat_polynomial(T)
+
+def initialize_lookup_tables(namelist):
+    '''
+    Tabulate pv_star and latent_heat if namelist['thermodynamics']['lookup_tables'] is set.
+    The table spacing lookup_dT is halved until the largest relative interpolation error
+    (checked between the table points) is below lookup_max_error, at most lookup_max_halvings times.
+    The tables are shared by all simulations in a process, so they are built by the first call only;
+    later calls with other settings are rejected until free_lookup_tables is called.
+    '''
+    global lookup_tables, lookup_settings, lookup_T_min, lookup_T_max, lookup_dTi, pv_star_table, latent_heat_table
+    cdef:
+        Py_ssize_t i, n, halvings
+        double dT, T, error, T_min, T_max
+
+    try:
+        use_tables = namelist['thermodynamics']['lookup_tables']
+    except:
+        use_tables = False
+    try:
+        dT = namelist['thermodynamics']['lookup_dT']
+    except:
+        dT = 0.05
+    try:
+        max_error = namelist['thermodynamics']['lookup_max_error']
+    except:
+        max_error = 1e-5
+    try:
+        max_halvings = namelist['thermodynamics']['lookup_max_halvings']
+    except:
+        max_halvings = 10
+    try:
+        T_min = namelist['thermodynamics']['lookup_T_min']
+    except:
+        T_min = 180.0
+    try:
+        T_max = namelist['thermodynamics']['lookup_T_max']
+    except:
+        T_max = 340.0
+
+    if use_tables:
+        settings = (True, dT, max_error, max_halvings, T_min, T_max)
+    else:
+        settings = (False,)
+    if lookup_settings is not None:
+        if settings != lookup_settings:
+            raise ValueError('Thermodynamics: the lookup table settings ' + str(settings) + ' differ from '
+                             + str(lookup_settings) + ', used by another simulation in this process')
+        return
+    if not use_tables:
+        lookup_settings = settings
+        return
+    if not max_error > 0.0:
+        raise ValueError('Thermodynamics: lookup_max_error has to be positive, got ' + str(max_error))
+
+    lookup_T_min = T_min
+    lookup_T_max = T_max
+    halvings = 0
+    while True:
+        n = <Py_ssize_t> ((lookup_T_max - lookup_T_min) / dT) + 2
+        lookup_dTi = 1.0 / dT
+        pv_star_table = <double*> PyMem_Malloc(n * sizeof(double))
+        latent_heat_table = <double*> PyMem_Malloc(n * sizeof(double))
+        if pv_star_table == NULL or latent_heat_table == NULL:
+            free_lookup_tables()
+            raise MemoryError()
+        for i in xrange(n):
+            T = lookup_T_min + i * dT
+            pv_star_table[i] = pv_star_magnus(T)
+            latent_heat_table[i] = latent_heat_polynomial(T)
+
+        # linear interpolation is least accurate half way between the table points
+        error = 0.0
+        for i in xrange(n-1):
+            T = lookup_T_min + (i + 0.5) * dT
+            if T >= lookup_T_max:
+                break
+            error = fmax(error, fabs(lookup_interp(pv_star_table, T) / pv_star_magnus(T) - 1.0))
+            error = fmax(error, fabs(lookup_interp(latent_heat_table, T) / latent_heat_polynomial(T) - 1.0))
+        if error <= max_error:
+            break
+        free_lookup_tables()
+        # the rounding error of the interpolation limits how small the error can get
+        if halvings == max_halvings:
+            raise ValueError('Thermodynamics: lookup_max_error = ' + str(max_error) + ' not reached after '
+                             + str(max_halvings) + ' halvings of lookup_dT, the error is ' + str(error)
+                             + ' with dT = ' + str(dT) + ' K')
+        halvings += 1
+        dT = 0.5 * dT
+
+    lookup_tables = True
+    lookup_settings = settings
+    print('Thermodynamics: pv_star and latent_heat tabulated with dT = ' + str(dT)
+          + ' K, ' + str(n) + ' points, max relative error ' + str(error))
+    return
+
+def free_lookup_tables():
+    '''
+    Go back to the formulas for pv_star and latent_heat, the next initialize_lookup_tables
+    can then use other settings
+    '''
+    global lookup_tables, lookup_settings, pv_star_table, latent_heat_table
+    lookup_tables = False
+    lookup_settings = None
+    PyMem_Free(pv_star_table)
+    PyMem_Free(latent_heat_table)
+    pv_star_table = NULL
+    latent_heat_table = NULL
+    return
+
+
+
+cdef  double eos_first_guess_thetal(double H, double pd, double pv, double qt) noexcept nogil :
     cdef double p0 = pd + pv
     return H * exner_c(p0)
 
-cdef double eos_first_guess_entropy(double H, double pd, double pv, double qt ) nogil   :
+cdef double eos_first_guess_entropy(double H, double pd, double pv, double qt ) noexcept nogil   :
     cdef double qd = 1.0 - qt
     return (T_tilde *exp((H - qd*(sd_tilde - Rd *log(pd/p_tilde))
                               - qt * (sv_tilde - Rv * log(pv/p_tilde)))/((qd*cpd + qt * cpv))))
@@ -134,9 +270,9 @@ cdef double eos_first_guess_entropy(double H, double pd, double pv, double qt )
 
 
 
-cdef eos_struct eos( double (*t_to_prog)(double, double,double,double, double) nogil,
-                     double (*prog_to_t)(double,double, double, double) nogil,
-                     double p0, double qt, double prog) nogil:
+cdef eos_struct eos( double (*t_to_prog)(double, double,double,double, double) noexcept nogil,
+                     double (*prog_to_t)(double,double, double, double) noexcept nogil,
+                     double p0, double qt, double prog) noexcept nogil:
     cdef double qv = qt
     cdef double ql = 0.0
 
@@ -181,3 +317,83 @@ cdef eos_struct eos( double (*t_to_prog)(double, double,double,double, double) n
         _ret.ql = ql_2
 
     return _ret
+
+cdef inline double dlog_pv_star_dT(double T) noexcept nogil  :
+    # derivative of log(pv_star) from the Magnus formula
+    cdef double TC = T - 273.15
+    return 17.625 * 243.04 / ((TC + 243.04) * (TC + 243.04))
+
+cdef inline double dlatent_heat_dT(double T) noexcept nogil  :
+    cdef double TC = T - 273.15
+    return (-2.36 + 0.0032 * TC - 0.00018 * TC * TC) * 1000.0
+
+# Derivatives of the prognostic thermal variable with respect to T along the saturation curve (qv = qv_star(T))
+cdef double dthetali_dT_sat_c(double p0, double T, double qt) noexcept nogil  :
+    cdef double pv = pv_star(T)
+    cdef double qv = qv_star_c(p0, qt, pv)
+    cdef double ql = qt - qv
+    cdef double dqv = qv * p0 / (p0 - pv) * dlog_pv_star_dT(T)
+    cdef double L = latent_heat(T)
+    cdef double dX = (dlatent_heat_dT(T) * ql - L * dqv) / T - L * ql / (T * T)
+    return thetali_c(p0, T, qt, ql, 0.0, L) * (1.0 / T - dX / ((1.0 - qt) * cpd))
+
+cdef double dentropy_dT_sat_c(double p0, double T, double qt) noexcept nogil  :
+    cdef double pv_s = pv_star(T)
+    cdef double qv = qv_star_c(p0, qt, pv_s)
+    cdef double ql = qt - qv
+    cdef double dqv = qv * p0 / (p0 - pv_s) * dlog_pv_star_dT(T)
+    cdef double denom = 1.0 - qt + eps_vi * qv
+    cdef double pv = pv_c(p0, qt, qv)
+    cdef double pd = pd_c(p0, qt, qv)
+    cdef double dpv = p0 * eps_vi * (1.0 - qt) / (denom * denom) * dqv
+    cdef double L = latent_heat(T)
+    cdef double dX = (dlatent_heat_dT(T) * ql - L * dqv) / T - L * ql / (T * T)
+    return (1.0 - qt) * (cpd / T + Rd * dpv / pd) + qt * (cpv / T - Rv * dpv / pv) - dX
+
+cdef eos_struct eos_newton( double (*t_to_prog)(double, double,double,double, double) noexcept nogil,
+                            double (*prog_to_t)(double,double, double, double) noexcept nogil,
+                            double (*dprog_dT)(double, double, double) noexcept nogil,
+                            double p0, double qt, double prog, double T_guess) noexcept nogil:
+    # Saturation adjustment with Newton iterations started from T_guess (e.g. the temperature from the
+    # previous timestep). Same result as eos within the 1e-3 K tolerance; falls back to eos if it does not converge.
+    cdef eos_struct _ret
+    cdef double pv_1 = pv_c(p0,qt,qt )
+    cdef double pd_1 = p0 - pv_1
+    cdef double T_1 = prog_to_t(prog, pd_1, pv_1, qt)
+    cdef double qv_star_1 = qv_star_c(p0,qt,pv_star(T_1))
+    cdef double T, qv_star_, delta_T
+    cdef Py_ssize_t it
+
+    # If not saturated
+    if(qt <= qv_star_1):
+        _ret.T = T_1
+        _ret.ql = 0.0
+        return _ret
+
+    # the saturated temperature is larger than the unsaturated first guess
+    T = fmax(T_guess, T_1)
+    for it in xrange(20):
+        qv_star_ = qv_star_c(p0, qt, pv_star(T))
+        delta_T = (prog - t_to_prog(p0, T, qt, qt - qv_star_, 0.0)) / dprog_dT(p0, T, qt)
+        T += delta_T
+        if fabs(delta_T) <= 1.0e-3:
+            qv_star_ = qv_star_c(p0, qt, pv_star(T))
+            _ret.T = T
+            _ret.ql = fmax(qt - qv_star_, 0.0)
+            return _ret
+
+    return eos(t_to_prog, prog_to_t, p0, qt, prog)
+
+cdef void eos_column( double (*t_to_prog)(double, double,double,double, double) noexcept nogil,
+                      double (*prog_to_t)(double,double, double, double) noexcept nogil,
+                      double (*dprog_dT)(double, double, double) noexcept nogil,
+                      double [:] p0, double [:] qt, double [:] prog, double [:] T, double [:] ql,
+                      Py_ssize_t kmin, Py_ssize_t kmax) noexcept nogil:
+    # Saturation adjustment of a whole column; T holds the first guess on input and the result on output
+    cdef Py_ssize_t k
+    cdef eos_struct sa
+    for k in xrange(kmin, kmax):
+        sa = eos_newton(t_to_prog, prog_to_t, dprog_dT, p0[k], qt[k], prog[k], T[k])
+        T[k]  = sa.T
+        ql[k] = sa.ql
+    return
@@ -17,56 +17,57 @@ cdef struct chi_struct:
     double y1
     double x1
 
-cdef struct entr_in_struct:
+# Input and output of the entrainment closures for the levels of one updraft column.
+# The per-level fields point to n contiguous values, starting at the lowest level of the column.
+cdef struct entr_column_struct:
+    Py_ssize_t n
+
+    # per-level inputs
+    double *z
+    double *w_upd
+    double *b_upd
+    double *a_upd
+    double *a_env
+    double *tke
+    double *RH_upd
+    double *RH_env
+    double *ql_up
+    double *ql_env
+    double *qt_up
+    double *qt_env
+    double *H_up
+    double *H_env
+    double *b_env
+    double *b_mean
+    double *w_env
+    double *p0
+    double *rho0
+    double *env_Hvar
+    double *env_QTvar
+    double *env_HQTcov
+    double *buoy_ed_flux
+    double *poisson
+
+    # inputs that are constant in the column
     double zi
-    double wstar
-    double z
+    double zbl
+    double dz
     double sort_pow
     double c_det
-    double chi_upd
-    double tke_coef
+    double c_ent
     double c_mu
-    double c_ed_mf
     double c_mu0
-    double dz
-    double w_upd
-    double dwdz
-    double b_upd
-    double rd
-    double c_ent
-    double dt
-    double b_mean
-    double b_env
-    double a_upd
-    double a_env
-    double tke
-    double RH_upd
-    double RH_env
-    double ml
-    double T_mean
-    double p0
-    double rho0
-    double T_up
-    double qt_up
-    double ql_up
-    double T_env
-    double qt_env
-    double ql_env
-    double H_up
-    double H_env
-    double w_env
-    double env_Hvar
-    double env_QTvar
-    double env_HQTcov
-    double dw_env
-    double nh_pressure
-    double dw2dz
-    double L
-    double zbl
-    double poisson
-    double buoy_ed_flux
+    double c_ed_mf
+    double chi_upd
+    double tke_coef
     long quadrature_order
 
+    # outputs
+    double *entr_sc
+    double *detr_sc
+    double *sorting_function
+    double *b_mix
+
 cdef struct pressure_in_struct:
     double updraft_top
     char *asp_label
@@ -97,34 +98,34 @@ cdef struct pressure_drag_struct:
     double nh_pressure_adv
     double nh_pressure_drag
 
-cdef entr_struct entr_detr_dry(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_inverse_z(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_inverse_w(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_b_w2(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_env_moisture_deficit(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_env_moisture_deficit_b_ED_MF(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_buoyancy_sorting(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_tke(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_suselj(entr_in_struct entr_in) nogil
-cdef entr_struct entr_detr_none(entr_in_struct entr_in) nogil
-cdef double buoyancy_sorting(entr_in_struct entr_in) nogil
-cdef buoyant_stract buoyancy_sorting_mean(entr_in_struct entr_in) nogil
-
-cdef pressure_buoy_struct pressure_tan18_buoy(pressure_in_struct press_in) nogil
-cdef pressure_drag_struct pressure_tan18_drag(pressure_in_struct press_in) nogil
-cdef pressure_buoy_struct pressure_normalmode_buoy(pressure_in_struct press_in) nogil
-cdef pressure_drag_struct pressure_normalmode_drag(pressure_in_struct press_in) nogil
+cdef void entr_detr_dry(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_inverse_z(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_inverse_w(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_b_w2(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_env_moisture_deficit(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_env_moisture_deficit_b_ED_MF(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_buoyancy_sorting(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_tke(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_suselj(entr_column_struct *col) noexcept nogil
+cdef void entr_detr_none(entr_column_struct *col) noexcept nogil
+cdef double buoyancy_sorting(entr_column_struct *col, Py_ssize_t k) noexcept nogil
+cdef buoyant_stract buoyancy_sorting_mean(entr_column_struct *col, Py_ssize_t k) noexcept nogil
+
+cdef pressure_buoy_struct pressure_tan18_buoy(pressure_in_struct press_in) noexcept nogil
+cdef pressure_drag_struct pressure_tan18_drag(pressure_in_struct press_in) noexcept nogil
+cdef pressure_buoy_struct pressure_normalmode_buoy(pressure_in_struct press_in) noexcept nogil
+cdef pressure_drag_struct pressure_normalmode_drag(pressure_in_struct press_in) noexcept nogil
 
 cdef double get_wstar(double bflux, double zi )
 cdef double get_inversion(double *theta_rho, double *u, double *v, double *z_half,
                           Py_ssize_t kmin, Py_ssize_t kmax, double Ri_bulk_crit)
-cdef double get_mixing_tau(double zi, double wstar) nogil
+cdef double get_mixing_tau(double zi, double wstar) noexcept nogil
 
-cdef double get_surface_tke(double ustar, double wstar, double zLL, double oblength) nogil
-cdef double get_surface_variance(double flux1, double flux2, double ustar, double zLL, double oblength) nogil
+cdef double get_surface_tke(double ustar, double wstar, double zLL, double oblength) noexcept nogil
+cdef double get_surface_variance(double flux1, double flux2, double ustar, double zLL, double oblength) noexcept nogil
 
 
-cdef bint set_cloudbase_flag(double ql, bint current_flag) nogil
+cdef bint set_cloudbase_flag(double ql, bint current_flag) noexcept nogil
 
 cdef void construct_tridiag_diffusion(Py_ssize_t nzg, Py_ssize_t gw, double dzi, double dt,
                                  double *rho_ae_K_m, double *rho, double *ae, double *a,
@@ -138,3 +139,6 @@ cdef void construct_tridiag_diffusion_dirichlet(Py_ssize_t nzg, Py_ssize_t gw, d
                                            double *b, double *c)
 
 cdef void tridiag_solve(Py_ssize_t nz, double *x, double *a, double *b, double *c)
+cdef void tridiag_factor(Py_ssize_t nz, double *a, double *b, double *c, double *scratch, double *pivot) noexcept nogil
+cdef void tridiag_solve_factored(Py_ssize_t nz, Py_ssize_t nrhs, double *x, Py_ssize_t ldx, double *a, double *b,
+                                 double *scratch, double *pivot) noexcept nogil
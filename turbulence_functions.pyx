@@ -7,295 +7,300 @@ from thermodynamic_functions cimport *
 from utility_functions cimport *
 
 # Entrainment Rates
-cdef entr_struct entr_detr_dry(entr_in_struct entr_in)nogil:
-    cdef entr_struct _ret
+# The closures work on a column of levels of one updraft (see entr_column_struct)
+cdef void entr_detr_dry(entr_column_struct *col) noexcept nogil:
+    cdef Py_ssize_t k
     cdef double eps = 1.0 # to avoid division by zero when z = 0 or z_i
     # Following Soares 2004
-    _ret.entr_sc = 0.5*(1.0/entr_in.z + 1.0/fmax(entr_in.zi - entr_in.z, 10.0)) #vkb/(z + 1.0e-3)
-    _ret.detr_sc = 0.0
+    for k in xrange(col.n):
+        col.entr_sc[k] = 0.5*(1.0/col.z[k] + 1.0/fmax(col.zi - col.z[k], 10.0)) #vkb/(z + 1.0e-3)
+        col.detr_sc[k] = 0.0
 
-    return  _ret
+    return
 
-cdef entr_struct entr_detr_inverse_z(entr_in_struct entr_in) nogil:
-    cdef:
-        entr_struct _ret
+cdef void entr_detr_inverse_z(entr_column_struct *col) noexcept nogil:
+    cdef Py_ssize_t k
 
-    _ret.entr_sc = vkb/entr_in.z
-    _ret.detr_sc= 0.0
+    for k in xrange(col.n):
+        col.entr_sc[k] = vkb/col.z[k]
+        col.detr_sc[k] = 0.0
 
-    return _ret
+    return
 
-cdef entr_struct entr_detr_inverse_w(entr_in_struct entr_in) nogil:
+cdef void entr_detr_inverse_w(entr_column_struct *col) noexcept nogil:
     cdef:
-        entr_struct _ret
-
-    eps_w = 1.0/(fmax(fabs(entr_in.w_upd),1.0)* 1000)
-    if entr_in.a_upd>0.0:
-        sorting_function  = buoyancy_sorting(entr_in)
-        _ret.entr_sc = sorting_function*eps_w/2.0
-        _ret.detr_sc = (1.0-sorting_function/2.0)*eps_w
-    else:
-        _ret.entr_sc = 0.0
-        _ret.detr_sc = 0.0
-    return _ret
+        Py_ssize_t k
+        double eps_w, sorting_function
+
+    for k in xrange(col.n):
+        eps_w = 1.0/(fmax(fabs(col.w_upd[k]),1.0)* 1000)
+        if col.a_upd[k]>0.0:
+            sorting_function  = buoyancy_sorting(col, k)
+            col.entr_sc[k] = sorting_function*eps_w/2.0
+            col.detr_sc[k] = (1.0-sorting_function/2.0)*eps_w
+        else:
+            col.entr_sc[k] = 0.0
+            col.detr_sc[k] = 0.0
+    return
 
-cdef entr_struct entr_detr_env_moisture_deficit_b_ED_MF(entr_in_struct entr_in) nogil:
+cdef void entr_detr_env_moisture_deficit_b_ED_MF(entr_column_struct *col) noexcept nogil:
     cdef:
-        entr_struct _ret
-        double moisture_deficit_e, moisture_deficit_d, c_det, mu, db, dw, logistic_e, logistic_d, ed_mf_ratio, bmix
-        double l[2]
-
-    moisture_deficit_d = (fmax((entr_in.RH_upd/100.0)**entr_in.sort_pow-(entr_in.RH_env/100.0)**entr_in.sort_pow,0.0))**(1.0/entr_in.sort_pow)
-    moisture_deficit_e = (fmax((entr_in.RH_env/100.0)**entr_in.sort_pow-(entr_in.RH_upd/100.0)**entr_in.sort_pow,0.0))**(1.0/entr_in.sort_pow)
-    _ret.sorting_function = moisture_deficit_e
-    c_det = entr_in.c_det
-    if (entr_in.ql_up+entr_in.ql_env)==0.0:
-        c_det = 0.0
-
-    dw   = entr_in.w_upd - entr_in.w_env
-    if dw < 0.0:
-        dw -= 0.001
-    else:
-        dw += 0.001
+        Py_ssize_t k
+        double moisture_deficit_e, moisture_deficit_d, c_det, mu, db, dw, logistic_e, logistic_d, ed_mf_ratio
+        double inv_timescale
+
+    mu = col.c_mu/col.c_mu0
+    for k in xrange(col.n):
+        moisture_deficit_d = (fmax((col.RH_upd[k]/100.0)**col.sort_pow-(col.RH_env[k]/100.0)**col.sort_pow,0.0))**(1.0/col.sort_pow)
+        moisture_deficit_e = (fmax((col.RH_env[k]/100.0)**col.sort_pow-(col.RH_upd[k]/100.0)**col.sort_pow,0.0))**(1.0/col.sort_pow)
+        col.sorting_function[k] = moisture_deficit_e
+        c_det = col.c_det
+        if (col.ql_up[k]+col.ql_env[k])==0.0:
+            c_det = 0.0
+
+        dw   = col.w_upd[k] - col.w_env[k]
+        if dw < 0.0:
+            dw -= 0.001
+        else:
+            dw += 0.001
 
-    db = (entr_in.b_upd - entr_in.b_env)
-    mu = entr_in.c_mu/entr_in.c_mu0
+        db = (col.b_upd[k] - col.b_env[k])
 
-    inv_timescale = fabs(db/dw)
-    logistic_e = 1.0/(1.0+exp(-mu*db/dw*(entr_in.chi_upd - entr_in.a_upd/(entr_in.a_upd+entr_in.a_env))))
-    logistic_d = 1.0/(1.0+exp( mu*db/dw*(entr_in.chi_upd - entr_in.a_upd/(entr_in.a_upd+entr_in.a_env))))
+        inv_timescale = fabs(db/dw)
+        logistic_e = 1.0/(1.0+exp(-mu*db/dw*(col.chi_upd - col.a_upd[k]/(col.a_upd[k]+col.a_env[k]))))
+        logistic_d = 1.0/(1.0+exp( mu*db/dw*(col.chi_upd - col.a_upd[k]/(col.a_upd[k]+col.a_env[k]))))
 
-    #Logistic of buoyancy fluxes
-    inv_timescale = fabs(db/dw)
-    ed_mf_ratio = fabs(entr_in.buoy_ed_flux)/(fabs(entr_in.a_upd*entr_in.a_env*(entr_in.w_upd-entr_in.w_env)*(entr_in.b_upd - entr_in.b_env))+1e-8)
-    logistic_e *= (1.0/(1.0+exp(entr_in.c_ed_mf*(ed_mf_ratio-1.0))))
-    _ret.entr_sc = inv_timescale/dw*(entr_in.c_ent*logistic_e + c_det*moisture_deficit_e)
-    _ret.detr_sc = inv_timescale/dw*(entr_in.c_ent*logistic_d + c_det*moisture_deficit_d)
+        #Logistic of buoyancy fluxes
+        inv_timescale = fabs(db/dw)
+        ed_mf_ratio = fabs(col.buoy_ed_flux[k])/(fabs(col.a_upd[k]*col.a_env[k]*(col.w_upd[k]-col.w_env[k])*(col.b_upd[k] - col.b_env[k]))+1e-8)
+        logistic_e *= (1.0/(1.0+exp(col.c_ed_mf*(ed_mf_ratio-1.0))))
+        col.entr_sc[k] = inv_timescale/dw*(col.c_ent*logistic_e + c_det*moisture_deficit_e)
+        col.detr_sc[k] = inv_timescale/dw*(col.c_ent*logistic_d + c_det*moisture_deficit_d)
 
-    return _ret
+    return
 
-cdef entr_struct entr_detr_env_moisture_deficit(entr_in_struct entr_in) nogil:
+cdef void entr_detr_env_moisture_deficit(entr_column_struct *col) noexcept nogil:
     cdef:
-        entr_struct _ret
-        double moisture_deficit_e, moisture_deficit_d, c_det, mu, db, dw, logistic_e, logistic_d, ed_mf_ratio, bmix
+        Py_ssize_t k
+        double moisture_deficit_e, moisture_deficit_d, c_det, mu, db, dw, logistic_e, logistic_d
+        double inv_timescale
         double l[2]
 
-    moisture_deficit_d = (fmax((entr_in.RH_upd/100.0)**entr_in.sort_pow-(entr_in.RH_env/100.0)**entr_in.sort_pow,0.0))**(1.0/entr_in.sort_pow)
-    moisture_deficit_e = (fmax((entr_in.RH_env/100.0)**entr_in.sort_pow-(entr_in.RH_upd/100.0)**entr_in.sort_pow,0.0))**(1.0/entr_in.sort_pow)
-    _ret.sorting_function = moisture_deficit_e
-    c_det = entr_in.c_det
-    if (entr_in.ql_up+entr_in.ql_env)==0.0:
-        c_det = 0.0
-
-    dw   = entr_in.w_upd - entr_in.w_env
-    if dw < 0.0:
-        dw -= 0.001
-    else:
-        dw += 0.001
+    mu = col.c_mu/col.c_mu0
+    for k in xrange(col.n):
+        moisture_deficit_d = (fmax((col.RH_upd[k]/100.0)**col.sort_pow-(col.RH_env[k]/100.0)**col.sort_pow,0.0))**(1.0/col.sort_pow)
+        moisture_deficit_e = (fmax((col.RH_env[k]/100.0)**col.sort_pow-(col.RH_upd[k]/100.0)**col.sort_pow,0.0))**(1.0/col.sort_pow)
+        col.sorting_function[k] = moisture_deficit_e
+        c_det = col.c_det
+        if (col.ql_up[k]+col.ql_env[k])==0.0:
+            c_det = 0.0
+
+        dw   = col.w_upd[k] - col.w_env[k]
+        if dw < 0.0:
+            dw -= 0.001
+        else:
+            dw += 0.001
 
-    db = (entr_in.b_upd - entr_in.b_env)
-    mu = entr_in.c_mu/entr_in.c_mu0
+        db = (col.b_upd[k] - col.b_env[k])
 
-    inv_timescale = fabs(db/dw)
-    logistic_e = 1.0/(1.0+exp(-mu*db/dw*(entr_in.chi_upd - entr_in.a_upd/(entr_in.a_upd+entr_in.a_env))))
-    logistic_d = 1.0/(1.0+exp( mu*db/dw*(entr_in.chi_upd - entr_in.a_upd/(entr_in.a_upd+entr_in.a_env))))
+        logistic_e = 1.0/(1.0+exp(-mu*db/dw*(col.chi_upd - col.a_upd[k]/(col.a_upd[k]+col.a_env[k]))))
+        logistic_d = 1.0/(1.0+exp( mu*db/dw*(col.chi_upd - col.a_upd[k]/(col.a_upd[k]+col.a_env[k]))))
 
-    #smooth min
-    with gil:
-        l[0] = entr_in.tke_coef*fabs(db/sqrt(entr_in.tke+1e-8))
+        #smooth min
+        l[0] = col.tke_coef*fabs(db/sqrt(col.tke[k]+1e-8))
         l[1] = fabs(db/dw)
-        inv_timescale = lamb_smooth_minimum(l, 0.1, 0.0005)
-    _ret.entr_sc = inv_timescale/dw*(entr_in.c_ent*logistic_e + c_det*moisture_deficit_e)
-    _ret.detr_sc = inv_timescale/dw*(entr_in.c_ent*logistic_d + c_det*moisture_deficit_d)
+        inv_timescale = lamb_smooth_minimum_c(l, 2, 0.1, 0.0005)
+        col.entr_sc[k] = inv_timescale/dw*(col.c_ent*logistic_e + c_det*moisture_deficit_e)
+        col.detr_sc[k] = inv_timescale/dw*(col.c_ent*logistic_d + c_det*moisture_deficit_d)
 
-    return _ret
+    return
 
-cdef entr_struct entr_detr_buoyancy_sorting(entr_in_struct entr_in) nogil:
+cdef void entr_detr_buoyancy_sorting(entr_column_struct *col) noexcept nogil:
 
     cdef:
-        entr_struct _ret
-        double eps_bw2, del_bw2, D_, sorting_function, eta, pressure,a1 ,a2 ,c ,d
-
-    ret_b = buoyancy_sorting_mean(entr_in)
-    b_mix = ret_b.b_mix
-    eps_bw2 = entr_in.c_ent*fmax(entr_in.b_upd,0.0) / fmax(entr_in.w_upd * entr_in.w_upd, 1e-2)
-    del_bw2 = entr_in.c_ent*fabs(entr_in.b_upd) / fmax(entr_in.w_upd * entr_in.w_upd, 1e-2)
-    _ret.b_mix = b_mix
-    _ret.sorting_function = ret_b.sorting_function
-    _ret.entr_sc = eps_bw2
-    if entr_in.ql_up>0.0:
-        D_ = 0.5*(1.0+entr_in.sort_pow*(ret_b.sorting_function))
-        _ret.detr_sc = del_bw2*(1.0+entr_in.c_det*D_)
-    else:
-        _ret.detr_sc = 0.0
+        Py_ssize_t k
+        double eps_bw2, del_bw2, D_
+        buoyant_stract ret_b
+
+    for k in xrange(col.n):
+        ret_b = buoyancy_sorting_mean(col, k)
+        eps_bw2 = col.c_ent*fmax(col.b_upd[k],0.0) / fmax(col.w_upd[k] * col.w_upd[k], 1e-2)
+        del_bw2 = col.c_ent*fabs(col.b_upd[k]) / fmax(col.w_upd[k] * col.w_upd[k], 1e-2)
+        col.b_mix[k] = ret_b.b_mix
+        col.sorting_function[k] = ret_b.sorting_function
+        col.entr_sc[k] = eps_bw2
+        if col.ql_up[k]>0.0:
+            D_ = 0.5*(1.0+col.sort_pow*(ret_b.sorting_function))
+            col.detr_sc[k] = del_bw2*(1.0+col.c_det*D_)
+        else:
+            col.detr_sc[k] = 0.0
 
-    return _ret
+    return
 
-cdef buoyant_stract buoyancy_sorting_mean(entr_in_struct entr_in) nogil:
+cdef buoyant_stract buoyancy_sorting_mean(entr_column_struct *col, Py_ssize_t k) noexcept nogil:
 
         cdef:
-            double qv_ ,T_env ,ql_env ,rho_env ,b_env, T_up ,ql_up ,rho_up ,b_up, b_mean, b_mix, qt_mix , H_mix
+            double qv_ ,T_env ,ql_env ,rho_env ,b_env, T_up ,ql_up ,rho_up ,b_up, b_mean, b_mix, qt_mix , H_mix, rho_mix
             double sorting_function = 0.0
             eos_struct sa
             buoyant_stract ret_b
 
-        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, entr_in.qt_env, entr_in.H_env)
-        qv_ = entr_in.qt_env - sa.ql
+        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], col.qt_env[k], col.H_env[k])
+        qv_ = col.qt_env[k] - sa.ql
         T_env = sa.T
         ql_env = sa.ql
-        rho_env = rho_c(entr_in.p0, sa.T, entr_in.qt_env, qv_)
-        b_env = buoyancy_c(entr_in.rho0, rho_env)
+        rho_env = rho_c(col.p0[k], sa.T, col.qt_env[k], qv_)
+        b_env = buoyancy_c(col.rho0[k], rho_env)
 
-        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, entr_in.qt_up, entr_in.H_up)
-        qv_ = entr_in.qt_up - sa.ql
+        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], col.qt_up[k], col.H_up[k])
+        qv_ = col.qt_up[k] - sa.ql
         T_up = sa.T
         ql_up = sa.ql
-        rho_up = rho_c(entr_in.p0, sa.T, entr_in.qt_up, qv_)
-        b_up = buoyancy_c(entr_in.rho0, rho_up)
-
-        b_mean = entr_in.a_upd*b_up +  (1.0-entr_in.a_upd)*b_env
-
-        # qt_mix = (0.25*entr_in.qt_up + 0.75*entr_in.qt_env)
-        # H_mix =  (0.25*entr_in.H_up  + 0.75*entr_in.H_env)
-        qt_mix = (0.5*entr_in.qt_up + 0.5*entr_in.qt_env)
-        H_mix =  (0.5*entr_in.H_up  + 0.5*entr_in.H_env)
-        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, qt_mix, H_mix)
-        qv_ = (entr_in.qt_up+entr_in.qt_env)/2.0 - sa.ql
-        rho_mix = rho_c(entr_in.p0, sa.T, qt_mix, qv_)
-        b_mix = buoyancy_c(entr_in.rho0, rho_mix)-b_mean
+        rho_up = rho_c(col.p0[k], sa.T, col.qt_up[k], qv_)
+        b_up = buoyancy_c(col.rho0[k], rho_up)
+
+        b_mean = col.a_upd[k]*b_up +  (1.0-col.a_upd[k])*b_env
+
+        # qt_mix = (0.25*col.qt_up[k] + 0.75*col.qt_env[k])
+        # H_mix =  (0.25*col.H_up[k]  + 0.75*col.H_env[k])
+        qt_mix = (0.5*col.qt_up[k] + 0.5*col.qt_env[k])
+        H_mix =  (0.5*col.H_up[k]  + 0.5*col.H_env[k])
+        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], qt_mix, H_mix)
+        qv_ = (col.qt_up[k]+col.qt_env[k])/2.0 - sa.ql
+        rho_mix = rho_c(col.p0[k], sa.T, qt_mix, qv_)
+        b_mix = buoyancy_c(col.rho0[k], rho_mix)-b_mean
         sorting_function = -(b_mix)/fmax(fabs(b_up-b_env),0.0000001)
         ret_b.b_mix = b_mix
         ret_b.sorting_function = sorting_function
 
         return ret_b
 
-cdef double buoyancy_sorting(entr_in_struct entr_in) nogil:
+cdef double buoyancy_sorting(entr_column_struct *col, Py_ssize_t k) noexcept nogil:
 
         cdef:
             Py_ssize_t m_q, m_h
             int i_b
 
             double h_hat, qt_hat, sd_h, sd_q, corr, mu_h_star, sigma_h_star, qt_var, T_hat
-            double sqpi_inv = 1.0/sqrt(pi)
-            double sqrt2 = sqrt(2.0)
             double sd_q_lim, bmix, qv_
             double L_, dT, Tmix
+            double T_env, ql_env, rho_env, b_env, T_up, ql_up, rho_up, b_up, b_mean, rho_mix
             double sorting_function = 0.0
             double inner_sorting_function = 0.0
             eos_struct sa
-            double [:] weights
-            double [:] abscissas
-        with gil:
-            abscissas, weights = np.polynomial.hermite.hermgauss(entr_in.quadrature_order)
+            double *nodes = gauss_hermite_nodes(col.quadrature_order)
+            double *weights = gauss_hermite_weights(col.quadrature_order)
 
-        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, entr_in.qt_env, entr_in.H_env)
-        qv_ = entr_in.qt_env - sa.ql
+        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], col.qt_env[k], col.H_env[k])
+        qv_ = col.qt_env[k] - sa.ql
         T_env = sa.T
         ql_env = sa.ql
-        rho_env = rho_c(entr_in.p0, sa.T, entr_in.qt_env, qv_)
-        b_env = buoyancy_c(entr_in.rho0, rho_env)
+        rho_env = rho_c(col.p0[k], sa.T, col.qt_env[k], qv_)
+        b_env = buoyancy_c(col.rho0[k], rho_env)
 
-        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, entr_in.qt_up, entr_in.H_up)
-        qv_ = entr_in.qt_up - sa.ql
+        sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], col.qt_up[k], col.H_up[k])
+        qv_ = col.qt_up[k] - sa.ql
         T_up = sa.T
         ql_up = sa.ql
-        rho_up = rho_c(entr_in.p0, sa.T, entr_in.qt_up, qv_)
-        b_up = buoyancy_c(entr_in.rho0, rho_up)
+        rho_up = rho_c(col.p0[k], sa.T, col.qt_up[k], qv_)
+        b_up = buoyancy_c(col.rho0[k], rho_up)
 
-        b_mean = entr_in.a_upd*b_up +  (1.0-entr_in.a_upd)*b_env
+        b_mean = col.a_upd[k]*b_up +  (1.0-col.a_upd[k])*b_env
 
-        if entr_in.env_QTvar != 0.0 and entr_in.env_Hvar != 0.0:
-            sd_q = sqrt(entr_in.env_QTvar)
-            sd_h = sqrt(entr_in.env_Hvar)
-            corr = fmax(fmin(entr_in.env_HQTcov/fmax(sd_h*sd_q, 1e-13),1.0),-1.0)
+        if col.env_QTvar[k] != 0.0 and col.env_Hvar[k] != 0.0:
+            sd_q = sqrt(col.env_QTvar[k])
+            sd_h = sqrt(col.env_Hvar[k])
+            corr = fmax(fmin(col.env_HQTcov[k]/fmax(sd_h*sd_q, 1e-13),1.0),-1.0)
 
             # limit sd_q to prevent negative qt_hat
-            sd_q_lim = (1e-10 - entr_in.qt_env)/(sqrt2 * abscissas[0])
+            sd_q_lim = (1e-10 - col.qt_env[k])/nodes[0]
             sd_q = fmin(sd_q, sd_q_lim)
             qt_var = sd_q * sd_q
             sigma_h_star = sqrt(fmax(1.0-corr*corr,0.0)) * sd_h
 
-            for m_q in xrange(entr_in.quadrature_order):
-                qt_hat    = (entr_in.qt_env + sqrt2 * sd_q * abscissas[m_q] + entr_in.qt_up)/2.0
-                mu_h_star = entr_in.H_env + sqrt2 * corr * sd_h * abscissas[m_q]
+            for m_q in xrange(col.quadrature_order):
+                qt_hat    = (col.qt_env[k] + sd_q * nodes[m_q] + col.qt_up[k])/2.0
+                mu_h_star = col.H_env[k] + corr * sd_h * nodes[m_q]
                 inner_sorting_function = 0.0
-                for m_h in xrange(entr_in.quadrature_order):
-                    h_hat = (sqrt2 * sigma_h_star * abscissas[m_h] + mu_h_star + entr_in.H_up)/2.0
+                for m_h in xrange(col.quadrature_order):
+                    h_hat = (sigma_h_star * nodes[m_h] + mu_h_star + col.H_up[k])/2.0
                     # condensation - evaporation
-                    sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, qt_hat, h_hat)
+                    sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], qt_hat, h_hat)
                     # calcualte buoyancy
                     qv_ = qt_hat - sa.ql
                     L_ = latent_heat(sa.T)
-                    dT = L_*((entr_in.ql_up+entr_in.ql_env)/2.0- sa.ql)/1004.0
-                    rho_mix = rho_c(entr_in.p0, sa.T, qt_hat, qv_)
-                    bmix = buoyancy_c(entr_in.rho0, rho_mix) - b_mean #- entr_in.dw2dz
+                    dT = L_*((col.ql_up[k]+col.ql_env[k])/2.0- sa.ql)/1004.0
+                    rho_mix = rho_c(col.p0[k], sa.T, qt_hat, qv_)
+                    bmix = buoyancy_c(col.rho0[k], rho_mix) - b_mean #- col.dw2dz
 
                     if bmix >0.0:
-                        inner_sorting_function  += weights[m_h] * sqpi_inv
+                        inner_sorting_function  += weights[m_h]
 
-                sorting_function  += inner_sorting_function * weights[m_q] * sqpi_inv
+                sorting_function  += inner_sorting_function * weights[m_q]
         else:
-            h_hat = ( entr_in.H_env + entr_in.H_up)/2.0
-            qt_hat = ( entr_in.qt_env + entr_in.qt_up)/2.0
+            h_hat = ( col.H_env[k] + col.H_up[k])/2.0
+            qt_hat = ( col.qt_env[k] + col.qt_up[k])/2.0
 
             # condensation
-            sa  = eos(t_to_thetali_c, eos_first_guess_thetal, entr_in.p0, qt_hat, h_hat)
+            sa  = eos(t_to_thetali_c, eos_first_guess_thetal, col.p0[k], qt_hat, h_hat)
             # calcualte buoyancy
-            rho_mix = rho_c(entr_in.p0, sa.T, qt_hat, qt_hat - sa.ql)
-            bmix = buoyancy_c(entr_in.rho0, rho_mix) - entr_in.b_mean
-            if bmix  - entr_in.dw2dz >0.0:
+            rho_mix = rho_c(col.p0[k], sa.T, qt_hat, qt_hat - sa.ql)
+            bmix = buoyancy_c(col.rho0[k], rho_mix) - col.b_mean[k]
+            if bmix >0.0:
                 sorting_function  = 1.0
             else:
                 sorting_function  = 0.0
 
         return sorting_function
 
-cdef entr_struct entr_detr_tke(entr_in_struct entr_in) nogil:
-    cdef entr_struct _ret
-    _ret.detr_sc = fabs(entr_in.b_upd)/ fmax(entr_in.w_upd * entr_in.w_upd, 1e-3)
-    _ret.entr_sc = sqrt(entr_in.tke) / fmax(entr_in.w_upd, 0.01) / fmax(sqrt(entr_in.a_upd), 0.001) / 50000.0
-    return  _ret
+cdef void entr_detr_tke(entr_column_struct *col) noexcept nogil:
+    cdef Py_ssize_t k
+    for k in xrange(col.n):
+        col.detr_sc[k] = fabs(col.b_upd[k])/ fmax(col.w_upd[k] * col.w_upd[k], 1e-3)
+        col.entr_sc[k] = sqrt(col.tke[k]) / fmax(col.w_upd[k], 0.01) / fmax(sqrt(col.a_upd[k]), 0.001) / 50000.0
+    return
 
 
-cdef entr_struct entr_detr_b_w2(entr_in_struct entr_in) nogil:
-    cdef :
-        entr_struct _ret
-        double effective_buoyancy
-    # in cloud portion from Soares 2004
-    if entr_in.z >= entr_in.zi :
-        _ret.detr_sc= 4.0e-3 + 0.12 *fabs(fmin(entr_in.b_upd,0.0)) / fmax(entr_in.w_upd * entr_in.w_upd, 1e-2)
-    else:
-        _ret.detr_sc = 0.0
+cdef void entr_detr_b_w2(entr_column_struct *col) noexcept nogil:
+    cdef Py_ssize_t k
+    for k in xrange(col.n):
+        # in cloud portion from Soares 2004
+        if col.z[k] >= col.zi :
+            col.detr_sc[k] = 4.0e-3 + 0.12 *fabs(fmin(col.b_upd[k],0.0)) / fmax(col.w_upd[k] * col.w_upd[k], 1e-2)
+        else:
+            col.detr_sc[k] = 0.0
 
-    _ret.entr_sc = 0.12 * fmax(entr_in.b_upd,0.0) / fmax(entr_in.w_upd * entr_in.w_upd, 1e-2)
+        col.entr_sc[k] = 0.12 * fmax(col.b_upd[k],0.0) / fmax(col.w_upd[k] * col.w_upd[k], 1e-2)
 
-    return  _ret
+    return
 
-cdef entr_struct entr_detr_suselj(entr_in_struct entr_in) nogil:
+cdef void entr_detr_suselj(entr_column_struct *col) noexcept nogil:
     cdef:
-        entr_struct _ret
+        Py_ssize_t k
         double entr_dry = 2.5e-3
         double l0
 
-    l0 = (entr_in.zbl - entr_in.zi)/10.0
-    if entr_in.z >= entr_in.zi :
-        _ret.detr_sc= 4.0e-3 +  0.12* fabs(fmin(entr_in.b_upd,0.0)) / fmax(entr_in.w_upd * entr_in.w_upd, 1e-2)
-        _ret.entr_sc = 0.002 # 0.1 / entr_in.dz * entr_in.poisson
+    l0 = (col.zbl - col.zi)/10.0
+    for k in xrange(col.n):
+        if col.z[k] >= col.zi :
+            col.detr_sc[k] = 4.0e-3 +  0.12* fabs(fmin(col.b_upd[k],0.0)) / fmax(col.w_upd[k] * col.w_upd[k], 1e-2)
+            col.entr_sc[k] = 0.002 # 0.1 / col.dz * col.poisson[k]
 
-    else:
-        _ret.detr_sc = 0.0
-        _ret.entr_sc = 0.0 #entr_dry # Very low entrainment rate needed for Dycoms to work
+        else:
+            col.detr_sc[k] = 0.0
+            col.entr_sc[k] = 0.0 #entr_dry # Very low entrainment rate needed for Dycoms to work
 
-    return  _ret
+    return
 
-cdef entr_struct entr_detr_none(entr_in_struct entr_in)nogil:
-    cdef entr_struct _ret
-    _ret.entr_sc = 0.0
-    _ret.detr_sc = 0.0
+cdef void entr_detr_none(entr_column_struct *col) noexcept nogil:
+    cdef Py_ssize_t k
+    for k in xrange(col.n):
+        col.entr_sc[k] = 0.0
+        col.detr_sc[k] = 0.0
 
-    return  _ret
+    return
 
-cdef pressure_buoy_struct pressure_tan18_buoy(pressure_in_struct press_in) nogil:
+cdef pressure_buoy_struct pressure_tan18_buoy(pressure_in_struct press_in) noexcept nogil:
     cdef:
         pressure_buoy_struct _ret
 
@@ -304,7 +309,7 @@ cdef pressure_buoy_struct pressure_tan18_buoy(pressure_in_struct press_in) nogil
 
     return _ret
 
-cdef pressure_drag_struct pressure_tan18_drag(pressure_in_struct press_in) nogil:
+cdef pressure_drag_struct pressure_tan18_drag(pressure_in_struct press_in) noexcept nogil:
     cdef:
         pressure_drag_struct _ret
 
@@ -314,7 +319,7 @@ cdef pressure_drag_struct pressure_tan18_drag(pressure_in_struct press_in) nogil
 
     return _ret
 
-cdef pressure_buoy_struct pressure_normalmode_buoy(pressure_in_struct press_in) nogil:
+cdef pressure_buoy_struct pressure_normalmode_buoy(pressure_in_struct press_in) noexcept nogil:
     cdef:
         pressure_buoy_struct _ret
 
@@ -323,7 +328,7 @@ cdef pressure_buoy_struct pressure_normalmode_buoy(pressure_in_struct press_in)
 
     return _ret
 
-cdef pressure_drag_struct pressure_normalmode_drag(pressure_in_struct press_in) nogil:
+cdef pressure_drag_struct pressure_normalmode_drag(pressure_in_struct press_in) noexcept nogil:
     cdef:
         pressure_drag_struct _ret
 
@@ -368,7 +373,7 @@ cdef double get_inversion(double *theta_rho, double *u, double *v, double *z_hal
     return h
 
 # Teixiera convective tau
-cdef double get_mixing_tau(double zi, double wstar) nogil:
+cdef double get_mixing_tau(double zi, double wstar) noexcept nogil:
     # return 0.5 * zi / wstar
     #return zi / (fmax(wstar, 1e-5))
     return zi / (wstar + 0.001)
@@ -379,13 +384,13 @@ cdef double get_mixing_tau(double zi, double wstar) nogil:
 
 # MO scaling of near surface tke and scalar variance
 
-cdef double get_surface_tke(double ustar, double wstar, double zLL, double oblength) nogil:
+cdef double get_surface_tke(double ustar, double wstar, double zLL, double oblength) noexcept nogil:
     if oblength < 0.0:
         return ((3.75 + cbrt(zLL/oblength * zLL/oblength)) * ustar * ustar)
     else:
         return (3.75 * ustar * ustar)
 
-cdef double get_surface_variance(double flux1, double flux2, double ustar, double zLL, double oblength) nogil:
+cdef double get_surface_variance(double flux1, double flux2, double ustar, double zLL, double oblength) noexcept nogil:
     cdef:
         double c_star1 = -flux1/ustar
         double c_star2 = -flux2/ustar
@@ -469,30 +474,48 @@ cdef void construct_tridiag_diffusion_dirichlet(Py_ssize_t nzg, Py_ssize_t gw, d
 
 cdef void tridiag_solve(Py_ssize_t nz, double *x, double *a, double *b, double *c):
     cdef:
-        double * scratch = <double*> PyMem_Malloc(nz * sizeof(double))
+        double * scratch = <double*> PyMem_Malloc(2 * nz * sizeof(double))
+
+    tridiag_factor(nz, a, b, c, &scratch[0], &scratch[nz])
+    tridiag_solve_factored(nz, 1, x, nz, a, b, &scratch[0], &scratch[nz])
+
+    PyMem_Free(scratch)
+    return
+
+# Forward elimination of the matrix (a, b, c) alone, so that it can be reused for every right hand side
+# that shares the matrix; scratch and pivot (the inverse pivots) must hold nz values each
+cdef void tridiag_factor(Py_ssize_t nz, double *a, double *b, double *c, double *scratch, double *pivot) noexcept nogil:
+    cdef:
         Py_ssize_t i
-        double m
 
     scratch[0] = c[0]/b[0]
-    x[0] = x[0]/b[0]
+    pivot[0] = 1.0/b[0]
+    for i in xrange(1,nz):
+        pivot[i] = 1.0/(b[i] - a[i] * scratch[i-1])
+        scratch[i] = c[i] * pivot[i]
+    return
 
-    with nogil:
-        for i in xrange(1,nz):
-            m = 1.0/(b[i] - a[i] * scratch[i-1])
-            scratch[i] = c[i] * m
-            x[i] = (x[i] - a[i] * x[i-1])*m
+# Solves in place for nrhs right hand sides stored in x, the n-th one starting at x[n*ldx] (ldx >= nz),
+# with the matrix factored by tridiag_factor
+cdef void tridiag_solve_factored(Py_ssize_t nz, Py_ssize_t nrhs, double *x, Py_ssize_t ldx, double *a, double *b,
+                                 double *scratch, double *pivot) noexcept nogil:
+    cdef:
+        Py_ssize_t i, n
+        double *xn
 
+    for n in xrange(nrhs):
+        xn = &x[n*ldx]
+        xn[0] = xn[0]/b[0]
+        for i in xrange(1,nz):
+            xn[i] = (xn[i] - a[i] * xn[i-1])*pivot[i]
 
         for i in xrange(nz-2,-1,-1):
-            x[i] = x[i] - scratch[i] * x[i+1]
-
-
-    PyMem_Free(scratch)
+            xn[i] = xn[i] - scratch[i] * xn[i+1]
     return
 
 # Dustbin
 
-cdef bint set_cloudbase_flag(double ql, bint current_flag) nogil:
+cdef bint set_cloudbase_flag(double ql, bint current_flag) noexcept nogil:
     cdef bint new_flag
     if ql > 1.0e-8:
         new_flag = True
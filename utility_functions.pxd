@@ -1,10 +1,16 @@
-cdef double interp2pt(double val1, double val2) nogil
-cdef double logistic(double x, double slope, double mid) nogil
-cpdef double percentile_mean_norm(double percentile, Py_ssize_t nsamples)
-cpdef double percentile_bounds_mean_norm(double low_percentile, double high_percentile, Py_ssize_t nsamples)
-cdef double smooth_minimum(double [:] x, double a) nogil
+cdef double interp2pt(double val1, double val2) noexcept nogil
+cdef double logistic(double x, double slope, double mid) noexcept nogil
+cpdef double percentile_mean_norm(double percentile)
+cpdef double percentile_bounds_mean_norm(double low_percentile, double high_percentile)
+cdef double smooth_minimum(double [:] x, double a) noexcept nogil
 cdef double auto_smooth_minimum(const double [:] x, double f)
 cdef double lamb_smooth_minimum(const double [:] x, double eps, double dz)
-cdef double smooth_minimum2(double [:] x, double l0) nogil
+cdef double auto_smooth_minimum_c(const double *x, Py_ssize_t n, double f) noexcept nogil
+cdef double lamb_smooth_minimum_c(const double *x, Py_ssize_t n, double eps, double dz) noexcept nogil
+cdef Py_ssize_t argmin_c(const double *x, Py_ssize_t n) noexcept nogil
+cdef double smooth_minimum2(double [:] x, double l0) noexcept nogil
 cdef double softmin(double [:] x, double k)
 cdef double hardmin(double [:] x)
+cdef double median_c(const double *x, Py_ssize_t n, double *work) noexcept nogil
+cdef double *gauss_hermite_nodes(Py_ssize_t order) noexcept nogil
+cdef double *gauss_hermite_weights(Py_ssize_t order) noexcept nogil
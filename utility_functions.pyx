@@ -1,6 +1,6 @@
 import numpy as np
 import scipy.special as sp
-from libc.math cimport exp, log
+from libc.math cimport exp, log, NAN
 from scipy.stats import norm
 from scipy.special import lambertw
 cimport cython
@@ -8,31 +8,29 @@ cimport numpy as np
 
 # compute the mean of the values above a given percentile (0 to 1) for a standard normal distribution
 # this gives the surface scalar coefficient for a single updraft or nth updraft of n updrafts
-cpdef double percentile_mean_norm(double percentile, Py_ssize_t nsamples):
-    cdef:
-        double [:] x = norm.rvs(size=nsamples)
-        double xp = norm.ppf(percentile)
-    return np.ma.mean(np.ma.masked_less(x,xp))
+cpdef double percentile_mean_norm(double percentile):
+    return percentile_bounds_mean_norm(percentile, 1.0)
 
 # compute the mean of the values between two percentiles (0 to 1) for a standard normal distribution
 # this gives the surface scalar coefficients for 1 to n-1 updrafts when using n updrafts
-cpdef double percentile_bounds_mean_norm(double low_percentile, double high_percentile, Py_ssize_t nsamples):
+# (mean of the truncated normal distribution, (pdf(a) - pdf(b))/(cdf(b) - cdf(a)), with the
+# survival function in the denominator as the percentiles are close to 1)
+cpdef double percentile_bounds_mean_norm(double low_percentile, double high_percentile):
     cdef:
-        double [:] x = norm.rvs(size=nsamples)
         double xp_low = norm.ppf(low_percentile)
         double xp_high = norm.ppf(high_percentile)
-    return np.ma.mean(np.ma.masked_greater(np.ma.masked_less(x,xp_low),xp_high))
+    return (norm.pdf(xp_low) - norm.pdf(xp_high))/(norm.sf(xp_low) - norm.sf(xp_high))
 
 
-cdef double interp2pt(double val1, double val2) nogil:
+cdef double interp2pt(double val1, double val2) noexcept nogil:
     return 0.5*(val1 + val2)
 
-cdef double logistic(double x, double slope, double mid) nogil:
+cdef double logistic(double x, double slope, double mid) noexcept nogil:
     return 1.0/(1.0 + exp( -slope * (x-mid)))
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef double smooth_minimum(double [:] x, double a) nogil:
+cdef double smooth_minimum(double [:] x, double a) noexcept nogil:
     cdef:
       unsigned int i = 0
       double num, den
@@ -51,74 +49,85 @@ cdef double smooth_minimum(double [:] x, double a) nogil:
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cdef double auto_smooth_minimum( const double [:] x, double f):
+    return auto_smooth_minimum_c(&x[0], x.shape[0], f)
+
+# auto_smooth_minimum for a C array of n values, without copying it
+@cython.cdivision(True)
+cdef double auto_smooth_minimum_c(const double *x, Py_ssize_t n, double f) noexcept nogil:
     cdef:
-      unsigned int i = 0
+      Py_ssize_t i
       double num, den
-      double leng, lmin, lmin2
+      double lmin, lmin2
       double scale
       double a = 1.0
-      np.ndarray[double, ndim=1] x_ = np.empty(len(x))
 
-    lmin = 1.0e5; lmin2 = 1.0e5
-    leng = x.shape[0]
-    while (i<leng):
-      x_[i] = x[i]
-      i += 1
     # Get min and second min values
-    i = 0
-    lmin = min(x_)
-    with nogil:
-      while(i<leng):
-        if (x_[i]<lmin2 and x_[i]>lmin+1.0e-5):
-          lmin2 = x_[i]
-        x_[i] -= lmin
-        i += 1
-
-      # Set relative maximum importance of second min term
-      scale = (lmin2-lmin)/lmin*(1.0/(1.0+exp(lmin2-lmin)))
-      if (scale>f):
-        a = log((lmin2-lmin)/lmin/f-1.0)/(lmin2-lmin)
-
-      i = 0
-      num = 0.0; den = 0.0;
-      while(i<leng):
-        num += x_[i]*exp(-a*(x_[i]))
-        den += exp(-a*(x_[i]))
-        i += 1
-      smin = lmin + num/den
-    return smin
+    lmin = x[0]
+    for i in xrange(1, n):
+      if x[i] < lmin:
+        lmin = x[i]
+    lmin2 = 1.0e5
+    for i in xrange(n):
+      if (x[i]<lmin2 and x[i]>lmin+1.0e-5):
+        lmin2 = x[i]
+
+    # Set relative maximum importance of second min term
+    scale = (lmin2-lmin)/lmin*(1.0/(1.0+exp(lmin2-lmin)))
+    if (scale>f):
+      a = log((lmin2-lmin)/lmin/f-1.0)/(lmin2-lmin)
+
+    num = 0.0; den = 0.0;
+    for i in xrange(n):
+      num += (x[i]-lmin)*exp(-a*(x[i]-lmin))
+      den += exp(-a*(x[i]-lmin))
+    return lmin + num/den
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cdef double lamb_smooth_minimum( const double [:] x, double eps, double dz):
+    return lamb_smooth_minimum_c(&x[0], x.shape[0], eps, dz)
+
+# principal branch of the Lambert W function at 2/e, for the smoothing scale of lamb_smooth_minimum
+cdef double lambertw_2_e = np.real(lambertw(2.0/np.e))
+
+# lamb_smooth_minimum for a C array of n values, without copying it
+@cython.cdivision(True)
+cdef double lamb_smooth_minimum_c(const double *x, Py_ssize_t n, double eps, double dz) noexcept nogil:
     cdef:
-      unsigned int i = 0
+      Py_ssize_t i
       double num, den
-      double leng, xmin
+      double xmin
       double lambda0
-      np.ndarray[double, ndim=1] x_ = np.empty(len(x))
 
-    leng = x.shape[0]
-    # Copy array
-    while (i<leng):
-      x_[i] = x[i]
-      i += 1
-
-    xmin = min(x_)
-    lambda0 = max(xmin*eps/np.real(lambertw(2.0/np.e)), dz)
+    xmin = x[0]
+    for i in xrange(1, n):
+      if x[i] < xmin:
+        xmin = x[i]
+    lambda0 = xmin*eps/lambertw_2_e
+    if dz > lambda0:
+      lambda0 = dz
 
-    i = 0
     num = 0.0; den = 0.0;
-    while(i<leng):
-      num += x_[i]*exp(-(x_[i]-xmin)/lambda0)
-      den += exp(-(x_[i]-xmin)/lambda0)
-      i += 1
-    smin = num/den
-    return smin
+    for i in xrange(n):
+      num += x[i]*exp(-(x[i]-xmin)/lambda0)
+      den += exp(-(x[i]-xmin)/lambda0)
+    return num/den
+
+# index of the first minimum of a C array of n values (of the first NaN, if any), as np.argmin
+cdef Py_ssize_t argmin_c(const double *x, Py_ssize_t n) noexcept nogil:
+    cdef:
+      Py_ssize_t i, imin = 0
+
+    for i in xrange(n):
+      if x[i] != x[i]:
+        return i
+      if x[i] < x[imin]:
+        imin = i
+    return imin
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef double smooth_minimum2(double [:] x, double l0) nogil:
+cdef double smooth_minimum2(double [:] x, double l0) noexcept nogil:
     cdef:
       unsigned int i = 0, numLengths = 0
       double smin = 0.0
@@ -175,3 +184,82 @@ cdef double hardmin(double [:] x):
       i += 1
 
     return min(x)
+
+# median of x[0:n], equal to np.median (the mean of the two central values for even n, nan for n = 0)
+# work has to hold n values and is overwritten
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef double median_c(const double *x, Py_ssize_t n, double *work) noexcept nogil:
+    cdef:
+      Py_ssize_t i, j, lo, hi
+      Py_ssize_t m = n//2
+      double pivot, tmp, lower
+
+    if n == 0:
+        return NAN
+    for i in xrange(n):
+        work[i] = x[i]
+
+    # Wirth's selection: afterwards work[m] is the value of rank m,
+    # with smaller or equal values before it and larger or equal values after it
+    lo = 0
+    hi = n - 1
+    while lo < hi:
+        pivot = work[m]
+        i = lo
+        j = hi
+        while i <= j:
+            while work[i] < pivot:
+                i += 1
+            while pivot < work[j]:
+                j -= 1
+            if i <= j:
+                tmp = work[i]
+                work[i] = work[j]
+                work[j] = tmp
+                i += 1
+                j -= 1
+        if j < m:
+            lo = i
+        if m < i:
+            hi = j
+
+    if n % 2 == 1:
+        return work[m]
+    # the other central value is the largest value before m
+    lower = work[0]
+    for i in xrange(1, m):
+        if work[i] > lower:
+            lower = work[i]
+    return 0.5*(lower + work[m])
+
+# Gauss-Hermite nodes and weights for the quadrature orders 1 to max_quadrature_order,
+# computed once on import so that nogil code does not have to call hermgauss.
+# They are stored transformed to a standard normal distribution, the abscissas times sqrt(2)
+# and the weights over sqrt(pi), so that a quadrature point of a normal distribution is
+# mu + sd*node and of a log-normal distribution exp(mu + sd*node), and the weights sum to one.
+# The nodes of order n start at index n*(n-1)/2.
+cdef Py_ssize_t max_quadrature_order = 20
+cdef double gauss_hermite_z[210]
+cdef double gauss_hermite_p[210]
+
+def initialize_gauss_hermite():
+    cdef Py_ssize_t n, m
+    for n in xrange(1, max_quadrature_order + 1):
+        a, w = np.polynomial.hermite.hermgauss(n)
+        for m in xrange(n):
+            gauss_hermite_z[n*(n-1)//2 + m] = np.sqrt(2.0) * a[m]
+            gauss_hermite_p[n*(n-1)//2 + m] = w[m] / np.sqrt(np.pi)
+    return
+
+initialize_gauss_hermite()
+
+cdef double *gauss_hermite_nodes(Py_ssize_t order) noexcept nogil:
+    if order < 1 or order > max_quadrature_order:
+        return NULL
+    return &gauss_hermite_z[order*(order-1)//2]
+
+cdef double *gauss_hermite_weights(Py_ssize_t order) noexcept nogil:
+    if order < 1 or order > max_quadrature_order:
+        return NULL
+    return &gauss_hermite_p[order*(order-1)//2]